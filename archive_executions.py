@@ -0,0 +1,51 @@
+# archive_executions.py
+#
+# Moves the step results and screenshots of old executions into compressed bundles
+# (see execution_archive.py). Meant to run nightly from cron; archived executions stay
+# viewable on their execution detail page.
+#
+#   python archive_executions.py [--older-than-days 180] [--limit N] [--dry-run]
+import argparse
+import sys
+
+import mysql.connector
+
+from execution_archive import ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_EXECUTIONS, ARCHIVE_DIR, archive_executions
+from models import get_db_connection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old execution details into cold storage.")
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archive executions older than this many days.")
+    parser.add_argument('--limit', type=int, help="Archive at most this many executions.")
+    parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_EXECUTIONS,
+                        help="Executions per transaction.")
+    parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+    args = parser.parse_args()
+    if args.older_than_days < 1:
+        print("--older-than-days must be at least 1.")
+        sys.exit(1)
+
+    conn = get_db_connection()
+    if not conn:
+        print("Failed to connect to the database; see the error above.")
+        sys.exit(1)
+    try:
+        summary = archive_executions(conn, older_than_days=args.older_than_days, limit=args.limit,
+                                     dry_run=args.dry_run, chunk_size=args.chunk_size)
+    except (mysql.connector.Error, OSError) as err:
+        print(f"Archiving failed: {err}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    if args.dry_run:
+        print(f"{summary['executions']} execution(s) with {summary['step_results']} step result(s) would be archived.")
+    else:
+        print(f"Archived {summary['executions']} execution(s), {summary['step_results']} step result(s) and "
+              f"{summary['screenshots']} screenshot(s) to {ARCHIVE_DIR}.")
+
+
+if __name__ == '__main__':
+    main()
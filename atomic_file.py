@@ -0,0 +1,32 @@
+# atomic_file.py
+#
+# Whole-file replacement through a per-write temporary file, so readers never see a partial file.
+import os
+import secrets
+import tempfile
+import time
+
+
+def new_version_token():
+    """A fresh change marker: time-ordered, with a random part so two bumps never collide."""
+    return f'{time.time_ns():x}-{secrets.token_hex(4)}'
+
+
+def write_text_atomic(path, text):
+    """Replaces `path` with `text` (creating its directory). Raises OSError."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            f.write(text)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,30 @@
+# batch_control.py
+#
+# Pause/cancel requests per batch, checked by the runners between test cases and between steps.
+from shared_markers import set_marker, read_marker, clear_marker
+
+CONTROL_PAUSE = 'PAUSE'
+CONTROL_CANCEL = 'CANCEL'
+VALID_CONTROL_ACTIONS = (CONTROL_PAUSE, CONTROL_CANCEL)
+
+BATCH_ID_ENV = 'BATCH_ASSIGNMENT_ID'  # Tells generic_runner.py which batch it belongs to
+
+
+def _control_marker(batch_assignment_id):
+    return f'batch_control:{int(batch_assignment_id)}'
+
+
+def request_control(batch_assignment_id, action):
+    if action not in VALID_CONTROL_ACTIONS:
+        raise ValueError(f"Unknown batch control action: {action}")
+    set_marker(_control_marker(batch_assignment_id), action)
+
+
+def read_control(batch_assignment_id, cached=False):
+    """Returns CONTROL_PAUSE, CONTROL_CANCEL or None. `cached` as in shared_markers.read_marker."""
+    action = read_marker(_control_marker(batch_assignment_id), cached=cached)
+    return action if action in VALID_CONTROL_ACTIONS else None
+
+
+def clear_control(batch_assignment_id):
+    clear_marker(_control_marker(batch_assignment_id))
@@ -7,6 +7,15 @@ import time
 import mysql.connector
 from datetime import datetime
 import subprocess # To call generic_runner.py
+import threading
+import queue
+from batch_control import BATCH_ID_ENV, CONTROL_PAUSE, CONTROL_CANCEL, read_control, clear_control
+from progress_version import bump_progress_version
+from query_cache import bump_data_version
+from db_pool import get_pool
+from rollups import set_assignment_status
+from result_cache import (get_cache_ttl_minutes, get_build_tag, get_device_class, compute_steps_version,
+                          resolve_step_params, build_cache_key, find_cached_pass_execution)
 
 # --- Configuration ---
 DB_CONFIG_BATCH_RUNNER = {
@@ -34,12 +43,102 @@ def log_to_batch_stdout(message_type, message_content):
 
 def get_batch_runner_db_connection():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG_BATCH_RUNNER)
+        conn = get_pool(DB_CONFIG_BATCH_RUNNER, size=2, max_overflow=2).connection() # Main loop + progress stage
         return conn
     except mysql.connector.Error as err:
         log_to_batch_stdout("error", f"Database connection failed: {err}")
         return None
 
+DEVICE_RELEASED_MARKER = "RUNNER_DEVICE_RELEASED" # Printed by generic_runner.py once Appium has quit
+
+
+class BatchProgressStage:
+    """
+    Background stage of the batch pipeline. The main loop hands over each test case
+    once the device is free; this stage drains the rest of the runner output, waits
+    for the runner to persist its results and does the batch progress accounting on
+    its own DB connection, in submission order.
+    """
+    def __init__(self, batch_assignment_id, total_tc_count, completed_count, passed_count):
+        self.batch_assignment_id = batch_assignment_id
+        self.total_tc_count = total_tc_count
+        self.completed_count = completed_count
+        self.passed_count = passed_count
+        self.counts_lock = threading.Lock()
+        self.work_queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, individual_assignment_id, test_case_code, process=None, stderr_thread=None):
+        """`process` is None for test cases that were satisfied without running (result cache)."""
+        self.work_queue.put((individual_assignment_id, test_case_code, process, stderr_thread))
+
+    def finish(self):
+        """Blocks until every submitted test case has been accounted for. Returns (completed, passed)."""
+        self.work_queue.put(None)
+        self.thread.join()
+        with self.counts_lock:
+            return self.completed_count, self.passed_count
+
+    def _run(self):
+        conn = get_batch_runner_db_connection()
+        cursor = conn.cursor(dictionary=True) if conn else None
+        try:
+            while True:
+                item = self.work_queue.get()
+                if item is None:
+                    break
+                individual_assignment_id, test_case_code, process, stderr_thread = item
+                try:
+                    if process:
+                        for line in process.stdout:
+                            log_to_batch_stdout("runner_out", f"[TC:{test_case_code}]> {line.strip()}")
+                        process.wait()
+                        if stderr_thread: stderr_thread.join()
+                        log_to_batch_stdout("info", f"Generic_runner for TC {test_case_code} finished with exit code: {process.returncode}.")
+
+                    # generic_runner.py is responsible for updating the individual test_assignments.Status
+                    # and creating the testexecutions record.
+                    assignment_status = None
+                    if cursor:
+                        conn.commit() # Start a fresh snapshot so the runner's commit is visible
+                        cursor.execute("SELECT Status FROM test_assignments WHERE AssignmentID = %s", (individual_assignment_id,))
+                        updated_assignment_info = cursor.fetchone()
+                        assignment_status = updated_assignment_info['Status'] if updated_assignment_info else None
+
+                    if not (assignment_status or '').startswith('EXECUTED'):
+                        # Stopped by a pause/cancel request; the assignment is back to PENDING
+                        log_to_batch_stdout("info", f"TC {test_case_code} (Assignment {individual_assignment_id}) did not complete "
+                                                    f"(status '{assignment_status}'). Not counted.")
+                        continue
+
+                    with self.counts_lock:
+                        self.completed_count += 1 # Increment after each attempt
+                        if assignment_status == 'EXECUTED_PASS':
+                            self.passed_count += 1
+                        completed, passed = self.completed_count, self.passed_count
+
+                    if cursor:
+                        cursor.execute(
+                            "UPDATE batch_test_assignments SET CompletedTestCases = %s, PassedTestCases = %s WHERE BatchAssignmentID = %s",
+                            (completed, passed, self.batch_assignment_id)
+                        )
+                        conn.commit()
+                        bump_progress_version(self.batch_assignment_id)
+                        bump_data_version()
+                    log_to_batch_stdout("db_update", f"Batch progress: {completed}/{self.total_tc_count} done. Passed: {passed}.")
+                except Exception as e_stage:
+                    log_to_batch_stdout("error", f"Progress stage failed for Assignment {individual_assignment_id}: {e_stage}")
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+
+def _drain_runner_stderr(process, test_case_code):
+    for line in process.stderr:
+        log_to_batch_stdout("runner_err", f"[TC:{test_case_code} ERR]> {line.strip()}")
+
+
 def main_batch_runner():
     global batch_db_conn, batch_db_cursor
 
@@ -75,6 +174,12 @@ def main_batch_runner():
     # Log dynamic inputs carefully, they might be large or sensitive. Maybe just keys or a summary.
     log_to_batch_stdout("debug", f"DYNAMIC_INPUTS_COLLECTED (first 5 keys): {list(all_dynamic_inputs.keys())[:5]}")
 
+    result_cache_ttl_minutes = get_cache_ttl_minutes()
+    build_tag_for_cache = get_build_tag()
+    device_class_for_cache = get_device_class(android_version_arg)
+    if result_cache_ttl_minutes > 0:
+        log_to_batch_stdout("info", f"Result cache enabled: TTL={result_cache_ttl_minutes} min, Build='{build_tag_for_cache}', DeviceClass='{device_class_for_cache}'.")
+
 
     batch_db_conn = get_batch_runner_db_connection()
     if not batch_db_conn:
@@ -83,6 +188,8 @@ def main_batch_runner():
     batch_db_cursor = batch_db_conn.cursor(dictionary=True)
 
     overall_batch_status = "COMPLETED_FAIL" # Default to fail, will be updated if all pass
+    progress_stage = None
+    stop_action = None # PAUSE or CANCEL requested through batch_control
     completed_tc_count_in_batch = 0
     passed_tc_count_in_batch = 0
     total_tc_in_batch_from_db = 0 # Will be fetched
@@ -107,6 +214,7 @@ def main_batch_runner():
                 batch_db_cursor.execute("UPDATE batch_test_assignments SET Status = 'IN_PROGRESS' WHERE BatchAssignmentID = %s", (batch_assignment_id,))
                 log_to_batch_stdout("info", f"Batch {batch_assignment_id} status updated to IN_PROGRESS.")
             batch_db_conn.commit()
+            bump_progress_version(batch_assignment_id)
         elif current_batch_db_status == 'IN_PROGRESS':
             log_to_batch_stdout("info", f"Resuming IN_PROGRESS Batch {batch_assignment_id}.")
             # Fetch current progress to continue accurately
@@ -139,6 +247,9 @@ def main_batch_runner():
 
         log_to_batch_stdout("info", f"Found {len(individual_assignments)} TCs. Initial progress: {completed_tc_count_in_batch}/{total_tc_in_batch_from_db} completed, {passed_tc_count_in_batch} passed.")
 
+        progress_stage = BatchProgressStage(batch_assignment_id, total_tc_in_batch_from_db,
+                                            completed_tc_count_in_batch, passed_tc_count_in_batch)
+
         for i, assignment in enumerate(individual_assignments):
             individual_assignment_id = assignment['AssignmentID']
             test_case_id_to_run = assignment['TestCaseID']
@@ -147,6 +258,12 @@ def main_batch_runner():
 
             log_to_batch_stdout("info", f"--- Starting TC {i+1}/{len(individual_assignments)}: {test_case_code} (AssignmentID: {individual_assignment_id}) ---")
 
+            # Honour pause/cancel requests at test case boundaries
+            stop_action = read_control(batch_assignment_id)
+            if stop_action:
+                log_to_batch_stdout("info", f"Batch {stop_action} requested. Stopping before TC {test_case_code}.")
+                break
+
             # Skip if already executed (e.g., on resume, this specific TC was already done)
             if current_individual_status.startswith("EXECUTED"):
                 log_to_batch_stdout("info", f"TC {test_case_code} (Assignment {individual_assignment_id}) already '{current_individual_status}'. Skipping.")
@@ -155,12 +272,6 @@ def main_batch_runner():
                 # This skip is mainly for safety if somehow an executed test is re-processed.
                 continue
 
-            # Update individual assignment to IN_PROGRESS in DB before running
-            batch_db_cursor.execute("UPDATE test_assignments SET Status = 'IN_PROGRESS' WHERE AssignmentID = %s", (individual_assignment_id,))
-            batch_db_conn.commit()
-            log_to_batch_stdout("db_update", f"Individual Assignment {individual_assignment_id} status set to IN_PROGRESS.")
-
-
             # Prepare dynamic parameters for this specific test case
             tc_specific_dynamic_params = {}
             # 1. Add common params (keys like 'pincode')
@@ -180,6 +291,33 @@ def main_batch_runner():
             
             log_to_batch_stdout("debug", f"Dynamic params for TC {test_case_code}: {json.dumps(tc_specific_dynamic_params)}")
 
+            # Satisfy the assignment from a recent identical PASS run if the result cache is enabled
+            if result_cache_ttl_minutes > 0:
+                batch_db_cursor.execute(
+                    "SELECT StepOrder, Input, ExpectedResponse, InputType, ParamName FROM steps WHERE TestCaseID = %s ORDER BY StepOrder",
+                    (test_case_id_to_run,)
+                )
+                tc_step_rows = batch_db_cursor.fetchall()
+                tc_cache_key = build_cache_key(test_case_id_to_run, compute_steps_version(tc_step_rows),
+                                               resolve_step_params(tc_step_rows, tc_specific_dynamic_params),
+                                               build_tag_for_cache, device_class_for_cache)
+                cached_execution = find_cached_pass_execution(batch_db_cursor, test_case_id_to_run, tc_cache_key, result_cache_ttl_minutes) if tc_step_rows else None
+                if cached_execution:
+                    set_assignment_status(batch_db_cursor, individual_assignment_id, 'EXECUTED_PASS', cached_execution['ExecutionID'])
+                    batch_db_conn.commit()
+                    bump_progress_version(batch_assignment_id)
+                    bump_data_version()
+                    log_to_batch_stdout("cache_hit", f"TC {test_case_code} (Assignment {individual_assignment_id}) satisfied by cached "
+                                                     f"PASS ExecutionID {cached_execution['ExecutionID']} from {cached_execution['ExecutionTime']}. Not re-executed.")
+                    progress_stage.submit(individual_assignment_id, test_case_code)
+                    continue
+
+            # Update individual assignment to IN_PROGRESS in DB before running
+            set_assignment_status(batch_db_cursor, individual_assignment_id, 'IN_PROGRESS')
+            batch_db_conn.commit()
+            bump_progress_version(batch_assignment_id)
+            log_to_batch_stdout("db_update", f"Individual Assignment {individual_assignment_id} status set to IN_PROGRESS.")
+
             # Construct command for generic_runner.py
             generic_runner_script_path = os.path.join(os.path.dirname(__file__), 'generic_runner.py')
             cmd_for_generic_runner = [
@@ -194,6 +332,7 @@ def main_batch_runner():
 
             env_for_generic_runner = os.environ.copy()
             env_for_generic_runner['DYNAMIC_PARAMS'] = json.dumps(tc_specific_dynamic_params)
+            env_for_generic_runner[BATCH_ID_ENV] = str(batch_assignment_id)
             
             log_to_batch_stdout("info", f"Executing generic_runner for TC {test_case_code} (Assignment {individual_assignment_id})")
             
@@ -204,43 +343,37 @@ def main_batch_runner():
                                        env=env_for_generic_runner,
                                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
             
-            # Stream stdout and stderr from generic_runner
+            stderr_thread = threading.Thread(target=_drain_runner_stderr, args=(process, test_case_code), daemon=True)
+            stderr_thread.start()
+
+            # Stream stdout until the runner has released the device (or exited without saying so)
             for line in process.stdout:
                 log_to_batch_stdout("runner_out", f"[TC:{test_case_code}]> {line.strip()}")
-            for line in process.stderr:
-                log_to_batch_stdout("runner_err", f"[TC:{test_case_code} ERR]> {line.strip()}")
-            
-            process.wait()
-            log_to_batch_stdout("info", f"Generic_runner for TC {test_case_code} finished with exit code: {process.returncode}.")
-
-            # generic_runner.py is responsible for updating the individual test_assignments.Status
-            # and creating the testexecutions record.
-
-            # Fetch the final status of the just-run individual assignment
-            batch_db_cursor.execute("SELECT Status FROM test_assignments WHERE AssignmentID = %s", (individual_assignment_id,))
-            updated_assignment_info = batch_db_cursor.fetchone()
-            
-            completed_tc_count_in_batch += 1 # Increment after each attempt
-            if updated_assignment_info and updated_assignment_info['Status'] == 'EXECUTED_PASS':
-                passed_tc_count_in_batch += 1
-            
-            # Update batch progress in DB immediately
-            batch_db_cursor.execute(
-                "UPDATE batch_test_assignments SET CompletedTestCases = %s, PassedTestCases = %s WHERE BatchAssignmentID = %s",
-                (completed_tc_count_in_batch, passed_tc_count_in_batch, batch_assignment_id)
-            )
-            batch_db_conn.commit()
-            log_to_batch_stdout("db_update", f"Batch progress: {completed_tc_count_in_batch}/{total_tc_in_batch_from_db} done. Passed: {passed_tc_count_in_batch}.")
+                if line.strip() == DEVICE_RELEASED_MARKER:
+                    break
 
-            # Optional: Small delay if needed
-            # time.sleep(1) 
+            # Result persistence and progress accounting continue in the background while the next TC dials
+            log_to_batch_stdout("info", f"Device released by TC {test_case_code}. Handing over to progress stage.")
+            progress_stage.submit(individual_assignment_id, test_case_code, process, stderr_thread)
 
         # After all TCs in the batch are processed
+        completed_tc_count_in_batch, passed_tc_count_in_batch = progress_stage.finish()
+        progress_stage = None
+        stop_action = stop_action or read_control(batch_assignment_id) # May have arrived during the last TC
         if completed_tc_count_in_batch >= total_tc_in_batch_from_db: # Use >= for safety
             if passed_tc_count_in_batch == total_tc_in_batch_from_db:
                 overall_batch_status = "COMPLETED_PASS"
             else:
                 overall_batch_status = "COMPLETED_FAIL"
+            clear_control(batch_assignment_id)
+        elif stop_action == CONTROL_CANCEL:
+            overall_batch_status = "CANCELLED"
+            clear_control(batch_assignment_id)
+            log_to_batch_stdout("info", f"Batch {batch_assignment_id} cancelled after {completed_tc_count_in_batch}/{total_tc_in_batch_from_db} TCs.")
+        elif stop_action == CONTROL_PAUSE:
+            # Stays IN_PROGRESS with its progress intact; the control file marks it as paused until resumed
+            overall_batch_status = "IN_PROGRESS"
+            log_to_batch_stdout("info", f"Batch {batch_assignment_id} paused after {completed_tc_count_in_batch}/{total_tc_in_batch_from_db} TCs.")
         else:
             log_to_batch_stdout("warning", f"Batch loop finished, but not all TCs processed. "
                                          f"Completed: {completed_tc_count_in_batch}, Total in DB: {total_tc_in_batch_from_db}. Batch status set to FAIL.")
@@ -252,6 +385,8 @@ def main_batch_runner():
         log_to_batch_stdout("traceback", traceback.format_exc())
         overall_batch_status = "COMPLETED_FAIL" # Or a specific ERROR status
     finally:
+        if progress_stage: # Loop aborted; still account for the test cases already handed over
+            completed_tc_count_in_batch, passed_tc_count_in_batch = progress_stage.finish()
         if batch_db_conn and batch_db_cursor: # Ensure they were initialized
             try:
                 # Final update to batch_test_assignments
@@ -264,6 +399,8 @@ def main_batch_runner():
                     (overall_batch_status, final_completed, final_passed, batch_assignment_id)
                 )
                 batch_db_conn.commit()
+                bump_progress_version(batch_assignment_id)
+                bump_data_version()
                 log_to_batch_stdout("db_update", f"Final BatchAssignmentID {batch_assignment_id} status: {overall_batch_status}. "
                                                f"Completed: {final_completed}, Passed: {final_passed}.")
             except Exception as e_db_final_batch:
@@ -0,0 +1,114 @@
+# benchmark_bulk_assign.py
+#
+# Times batch assignment creation the old way (BatchTestAssignment.create, then one
+# TestAssignment.create_for_batch call per test case) against
+# BatchTestAssignment.create_with_assignments (one transaction, multi-row INSERTs).
+# Every batch it creates is deleted again, rollups included, so it can be pointed at a
+# development database; don't run it against production.
+#
+#   python benchmark_bulk_assign.py [--sizes 10,100,5000] [--repeat 3]
+#                                   [--assigned-to USER_ID] [--assigned-by USER_ID]
+#
+# Test case IDs are taken from the testcases table and repeated when a size needs more
+# assignments than there are test cases.
+import argparse
+import itertools
+import statistics
+import sys
+import time
+
+import mysql.connector
+
+from models import BatchTestAssignment, TestAssignment, get_db_connection
+from rollups import ensure_rollup_tables, count_assignments
+
+REFERENCE_NAME = 'benchmark_bulk_assign'
+
+
+def _first_user_id(cursor, role):
+    cursor.execute("SELECT UserID FROM users WHERE Role = %s ORDER BY UserID LIMIT 1", (role,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _delete_batch(batch_assignment_id):
+    conn = get_db_connection()
+    ensure_rollup_tables(conn)
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        count_assignments(cursor, "ta.BatchAssignmentID = %s", (batch_assignment_id,), sign=-1)
+        cursor.execute("DELETE FROM test_assignments WHERE BatchAssignmentID = %s", (batch_assignment_id,))
+        cursor.execute("DELETE FROM batch_test_assignments WHERE BatchAssignmentID = %s", (batch_assignment_id,))
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def create_per_row(test_case_ids, assigned_to, assigned_by):
+    batch_assignment_id = BatchTestAssignment.create(
+        assigned_to_user_id=assigned_to, assigned_by_user_id=assigned_by, assignment_type='CUSTOM_GROUP',
+        reference_id=0, reference_name=REFERENCE_NAME, total_test_cases=len(test_case_ids))
+    for test_case_id in test_case_ids:
+        TestAssignment.create_for_batch(test_case_id, assigned_to, assigned_by, 'MEDIUM', None, batch_assignment_id)
+    return batch_assignment_id
+
+
+def create_bulk(test_case_ids, assigned_to, assigned_by):
+    return BatchTestAssignment.create_with_assignments(
+        assigned_to_user_id=assigned_to, assigned_by_user_id=assigned_by, assignment_type='CUSTOM_GROUP',
+        reference_id=0, reference_name=REFERENCE_NAME, test_case_ids=test_case_ids)
+
+
+def time_creation(create, test_case_ids, assigned_to, assigned_by, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        batch_assignment_id = create(test_case_ids, assigned_to, assigned_by)
+        timings.append(time.perf_counter() - started)
+        if not batch_assignment_id:
+            raise RuntimeError(f"{create.__name__} failed; see the error above.")
+        _delete_batch(batch_assignment_id)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and bulk batch assignment creation.")
+    parser.add_argument('--sizes', default='10,100,5000', help="Comma-separated assignment counts per batch.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size and method; the median is reported.")
+    parser.add_argument('--assigned-to', type=int, help="Tester UserID (default: the first tester).")
+    parser.add_argument('--assigned-by', type=int, help="Manager/admin UserID (default: the first manager).")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    conn = get_db_connection()
+    if not conn:
+        print("Failed to connect to the database; see the error above.")
+        sys.exit(1)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT TestCaseID FROM testcases ORDER BY TestCaseID")
+        all_test_case_ids = [row[0] for row in cursor.fetchall()]
+        assigned_to = args.assigned_to or _first_user_id(cursor, 'tester')
+        assigned_by = args.assigned_by or _first_user_id(cursor, 'manager') or _first_user_id(cursor, 'admin')
+    finally:
+        cursor.close()
+        conn.close()
+    if not all_test_case_ids or not assigned_to or not assigned_by:
+        print("Need at least one test case, one tester and one manager or admin in the database.")
+        sys.exit(1)
+
+    print(f"{'size':>6} {'per-row (s)':>12} {'bulk (s)':>10} {'speed-up':>9}")
+    for size in sizes:
+        test_case_ids = list(itertools.islice(itertools.cycle(all_test_case_ids), size))
+        per_row = time_creation(create_per_row, test_case_ids, assigned_to, assigned_by, args.repeat)
+        bulk = time_creation(create_bulk, test_case_ids, assigned_to, assigned_by, args.repeat)
+        print(f"{size:>6} {per_row:>12.3f} {bulk:>10.3f} {per_row / bulk if bulk else float('inf'):>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
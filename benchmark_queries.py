@@ -0,0 +1,282 @@
+# benchmark_queries.py
+#
+# Measures the hot queries with and without the composite indexes of migration 2
+# (migrations.py). The app tables are cloned (CREATE TABLE ... LIKE, so columns and
+# keys but no rows and no foreign keys) into a scratch database, which is filled with
+# a synthetic dataset. The script then prints each query's EXPLAIN plan and p50/p95
+# latency without the migration 2 and 3 indexes, adds the migration 2 indexes, and
+# measures again.
+#
+#   python benchmark_queries.py [--scratch-db ussd_benchmark[_suffix]] [--scale 1.0]
+#                               [--iterations 200] [--keep]
+#
+# --scale 1.0 means 2,000 test cases with 8 steps each, 100,000 executions with 3 step
+# results each, 100,000 test assignments in 2,000 batches, and 20,000 individual ones.
+# The scratch database is dropped at the end unless --keep is given. The app's own
+# database is only read, to copy the table definitions.
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from migrations import HOT_QUERY_INDEXES, SEARCH_INDEXES, add_missing_indexes, existing_indexes
+from models import DB_CONFIG
+
+SCRATCH_DB_PREFIX = 'ussd_benchmark'  # The scratch database is dropped, so only names starting with this are accepted
+TABLES = ('users', 'testcases', 'steps', 'testexecutions', 'stepresults',
+          'batch_test_assignments', 'test_assignments')
+INSERT_CHUNK_ROWS = 1000
+STATUSES = ('PENDING', 'IN_PROGRESS', 'EXECUTED_PASS', 'EXECUTED_FAIL')
+PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+HISTORY_DAYS = 365
+
+# (name, SQL, function(dataset) -> params)
+HOT_QUERIES = (
+    ('next pending test of a batch', """
+        SELECT ta.AssignmentID, ta.TestCaseID FROM test_assignments ta
+        WHERE ta.BatchAssignmentID = %s AND ta.Status = 'PENDING'
+        ORDER BY ta.AssignmentID ASC LIMIT 1
+    """, lambda d: (random.choice(d['batch_ids']),)),
+    ("tester's open individual assignments", """
+        SELECT ta.AssignmentID, ta.TestCaseID, ta.Status, ta.Priority, ta.AssignmentDate
+        FROM test_assignments ta
+        WHERE ta.AssignedToUserID = %s AND ta.BatchAssignmentID IS NULL
+            AND ta.Status IN ('PENDING', 'IN_PROGRESS')
+        ORDER BY FIELD(ta.Priority, 'HIGH', 'MEDIUM', 'LOW'), ta.AssignmentDate ASC
+    """, lambda d: (random.choice(d['tester_ids']),)),
+    ('executions per day and status, one week', """
+        SELECT DATE(ExecutionTime) AS Day, OverallStatus, COUNT(*) AS Executions
+        FROM testexecutions
+        WHERE ExecutionTime >= %s AND ExecutionTime < %s
+        GROUP BY DATE(ExecutionTime), OverallStatus
+    """, lambda d: _week(d['now'])),
+    ('latest result of an execution step', """
+        SELECT Status FROM stepresults
+        WHERE ExecutionID = %s AND StepID = %s
+        ORDER BY EndTime DESC LIMIT 1
+    """, lambda d: random.choice(d['step_results'])),
+    ('steps of a test case in order', """
+        SELECT StepID, StepOrder, Input, ExpectedResponse, InputType, ParamName
+        FROM steps WHERE TestCaseID = %s ORDER BY StepOrder
+    """, lambda d: (random.choice(d['test_case_ids']),)),
+)
+
+
+def _week(now):
+    start = now - timedelta(days=random.randint(7, HISTORY_DAYS))
+    return start, start + timedelta(days=7)
+
+
+def _insert(cursor, sql, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+        cursor.executemany(sql, rows[start:start + INSERT_CHUNK_ROWS])
+
+
+def _ids(cursor, sql):
+    cursor.execute(sql)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_scratch_tables(cursor, source_db, scratch_db):
+    cursor.execute(f"DROP DATABASE IF EXISTS `{scratch_db}`")
+    cursor.execute(f"CREATE DATABASE `{scratch_db}`")
+    cursor.execute(f"USE `{scratch_db}`")
+    for table in TABLES:
+        cursor.execute(f"CREATE TABLE `{table}` LIKE `{source_db}`.`{table}`")
+
+
+def drop_benchmarked_indexes(cursor):
+    """Removes the migration 2 and 3 indexes the source tables already had, for the 'before' run."""
+    existing = existing_indexes(cursor)
+    for table, index, _, _ in HOT_QUERY_INDEXES + SEARCH_INDEXES:
+        if (table, index) in existing:
+            cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+
+
+def seed(conn, cursor, scale):
+    """Fills the scratch tables; returns the IDs the query parameters are drawn from."""
+    n_testers = max(2, int(50 * scale))
+    n_test_cases = max(10, int(2000 * scale))
+    n_executions = max(100, int(100000 * scale))
+    n_batches = max(10, int(2000 * scale))
+    n_individual = max(100, int(20000 * scale))
+    steps_per_test_case = 8
+    results_per_execution = 3
+    now = datetime.now().replace(microsecond=0)
+
+    def some_time():
+        return now - timedelta(seconds=random.randint(0, HISTORY_DAYS * 86400))
+
+    _insert(cursor, "INSERT INTO users (Username, Password, Role) VALUES (%s, %s, %s)",
+            [('bench_manager', '-', 'manager')] + [(f'bench_tester_{i}', '-', 'tester') for i in range(n_testers)])
+    manager_id = _ids(cursor, "SELECT UserID FROM users WHERE Role = 'manager'")[0]
+    tester_ids = _ids(cursor, "SELECT UserID FROM users WHERE Role = 'tester'")
+
+    _insert(cursor, """INSERT INTO testcases (Code, Name, Module, Module_id, Description, CreatedBy, CreatedAt, ModifiedBy, ModifiedAt)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            [(f'BENCH-{i:06d}', f'Benchmark case {i}', f'Module {i % 40}', i % 40 + 1, 'Synthetic test case',
+              manager_id, now, manager_id, now) for i in range(n_test_cases)])
+    test_case_ids = _ids(cursor, "SELECT TestCaseID FROM testcases")
+
+    _insert(cursor, """INSERT INTO steps (TestCaseID, StepOrder, Input, ExpectedResponse, InputType, ParamName, InpType)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            [(tc_id, order, f'*{order}#', 'OK', 'static', None, None)
+             for tc_id in test_case_ids for order in random.sample(range(1, steps_per_test_case + 1), steps_per_test_case)])
+    cursor.execute("SELECT TestCaseID, StepID FROM steps")
+    step_ids = {}
+    for tc_id, step_id in cursor.fetchall():
+        step_ids.setdefault(tc_id, []).append(step_id)
+    conn.commit()
+
+    execution_rows = []
+    for _ in range(n_executions):
+        tc_id = random.choice(test_case_ids)
+        execution_rows.append((tc_id, None, 'bench-device', random.choice(tester_ids), some_time(),
+                               random.choice(('PASS', 'PASS', 'PASS', 'FAIL')), None))
+    _insert(cursor, """INSERT INTO testexecutions (TestCaseID, SuiteID, DeviceID, ExecutedBy, ExecutionTime, OverallStatus, Parameters)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""", execution_rows)
+    cursor.execute("SELECT ExecutionID, TestCaseID, ExecutionTime FROM testexecutions")
+    executions = cursor.fetchall()
+    conn.commit()
+
+    result_rows = []
+    for execution_id, tc_id, executed_at in executions:
+        for step_id in random.sample(step_ids[tc_id], results_per_execution):
+            ended = executed_at + timedelta(seconds=random.randint(1, 120))
+            result_rows.append((execution_id, step_id, '*1#', 'OK', 'PASS', None, executed_at, ended, 1.0, None))
+    _insert(cursor, """INSERT INTO stepresults (ExecutionID, StepID, ActualInput, ActualOutput, Status, Screenshot,
+                                                StartTime, EndTime, Duration, LogMessage)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""", result_rows)
+    conn.commit()
+
+    batches_per_tester = {}
+    _insert(cursor, """INSERT INTO batch_test_assignments (AssignedToUserID, AssignedByUserID, AssignmentType, ReferenceID,
+                                                           ReferenceName, Priority, Notes, TotalTestCases, Status, AssignmentDate)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            [(random.choice(tester_ids), manager_id, 'CUSTOM_GROUP', 0, f'Benchmark batch {i}', 'MEDIUM', None,
+              n_executions // n_batches, 'PENDING', some_time()) for i in range(n_batches)])
+    cursor.execute("SELECT BatchAssignmentID, AssignedToUserID FROM batch_test_assignments")
+    for batch_id, tester_id in cursor.fetchall():
+        batches_per_tester[batch_id] = tester_id
+    batch_ids = list(batches_per_tester)
+
+    assignment_rows = []
+    for batch_id, tester_id in batches_per_tester.items():
+        for tc_id in random.sample(test_case_ids, min(len(test_case_ids), n_executions // n_batches)):
+            assignment_rows.append((tc_id, tester_id, manager_id, 'MEDIUM', None, batch_id,
+                                    random.choice(STATUSES), some_time()))
+    for _ in range(n_individual):
+        assignment_rows.append((random.choice(test_case_ids), random.choice(tester_ids), manager_id,
+                                random.choice(PRIORITIES), None, None, random.choice(STATUSES), some_time()))
+    _insert(cursor, """INSERT INTO test_assignments (TestCaseID, AssignedToUserID, AssignedByUserID, Priority, Notes,
+                                                     BatchAssignmentID, Status, AssignmentDate)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", assignment_rows)
+    conn.commit()
+
+    for table in TABLES:
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    print(f"Seeded {len(test_case_ids)} test cases, {len(executions)} executions, {len(result_rows)} step results, "
+          f"{len(assignment_rows)} assignments in {len(batch_ids)} batches.")
+    return {
+        'now': now,
+        'tester_ids': tester_ids,
+        'test_case_ids': test_case_ids,
+        'batch_ids': batch_ids,
+        'step_results': [(row[0], row[1]) for row in random.sample(result_rows, min(len(result_rows), 10000))],
+    }
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [c[0] for c in cursor.description]
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        print(f"      {plan.get('table')}: type={plan.get('type')} key={plan.get('key')} "
+              f"rows={plan.get('rows')} extra={plan.get('Extra') or ''}")
+
+
+def measure(cursor, sql, make_params, dataset, iterations):
+    """(p50, p95) in milliseconds over `iterations` runs with fresh random parameters."""
+    timings = []
+    for _ in range(iterations):
+        params = make_params(dataset)
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), statistics.quantiles(timings, n=20)[18]
+
+
+def run_queries(cursor, dataset, iterations, label):
+    print(f"\n== {label} ==")
+    results = {}
+    for name, sql, make_params in HOT_QUERIES:
+        print(f"  {name}")
+        explain(cursor, sql, make_params(dataset))
+        results[name] = measure(cursor, sql, make_params, dataset, iterations)
+        print(f"      p50={results[name][0]:.2f} ms  p95={results[name][1]:.2f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN and time the hot queries before and after migration 2.")
+    parser.add_argument('--scratch-db', default=SCRATCH_DB_PREFIX,
+                        help=f"Database to create; dropped first and at the end. Must start with '{SCRATCH_DB_PREFIX}'.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Dataset size multiplier.")
+    parser.add_argument('--iterations', type=int, default=200, help="Runs per query and phase.")
+    parser.add_argument('--keep', action='store_true', help="Don't drop the scratch database at the end.")
+    args = parser.parse_args()
+    source_db = DB_CONFIG['database']
+    if not re.fullmatch(re.escape(SCRATCH_DB_PREFIX) + r'\w*', args.scratch_db):
+        print(f"--scratch-db must start with '{SCRATCH_DB_PREFIX}' and contain only letters, digits and underscores.")
+        sys.exit(1)
+    if args.scratch_db == source_db:
+        print(f"--scratch-db must not be the app database ({source_db}).")
+        sys.exit(1)
+
+    config = {key: value for key, value in DB_CONFIG.items() if key not in ('database', 'autocommit')}
+    try:
+        conn = mysql.connector.connect(**config)
+    except mysql.connector.Error as err:
+        print(f"Failed to connect to MySQL: {err}")
+        sys.exit(1)
+    cursor = conn.cursor()
+    try:
+        create_scratch_tables(cursor, source_db, args.scratch_db)
+        drop_benchmarked_indexes(cursor)
+        dataset = seed(conn, cursor, args.scale)
+
+        before = run_queries(cursor, dataset, args.iterations, "Without the composite indexes")
+        started = time.perf_counter()
+        add_missing_indexes(cursor, HOT_QUERY_INDEXES)
+        for table in TABLES:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        print(f"\nMigration 2 indexes built in {time.perf_counter() - started:.1f} s.")
+        after = run_queries(cursor, dataset, args.iterations, "With the composite indexes")
+
+        print(f"\n{'query':<42} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10}")
+        for name, _, _ in HOT_QUERIES:
+            print(f"{name:<42} {before[name][0]:>11.2f} {after[name][0]:>10.2f} "
+                  f"{before[name][1]:>11.2f} {after[name][1]:>10.2f}")
+    except mysql.connector.Error as err:
+        print(f"Benchmark failed: {err}")
+        sys.exit(1)
+    finally:
+        if not args.keep:
+            try:
+                cursor.execute(f"DROP DATABASE IF EXISTS `{args.scratch_db}`")
+            except mysql.connector.Error as err:
+                print(f"Could not drop {args.scratch_db}: {err}")
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
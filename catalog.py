@@ -0,0 +1,106 @@
+# catalog.py
+#
+# Per-process application -> suite -> test case tree, reloaded when the shared catalog version changes.
+import os
+import threading
+import time
+
+import mysql.connector
+
+from shared_markers import bump_marker, read_marker
+
+CATALOG_TTL_SECONDS = int(os.environ.get('CATALOG_TTL_SECONDS', '600'))
+
+CATALOG_VERSION_MARKER = 'catalog_version'
+
+
+def bump_catalog_version():
+    """Marks the catalog as changed. Never raises; a failed bump only leaves the old tree in use until its TTL."""
+    bump_marker(CATALOG_VERSION_MARKER)
+
+
+def read_catalog_version():
+    return read_marker(CATALOG_VERSION_MARKER, cached=True) or ''
+
+
+def _sort_key(value):
+    return (value or '').lower()  # Close to MySQL's case-insensitive ORDER BY
+
+
+class Catalog:
+    def __init__(self, applications, suites, test_cases, memberships):
+        self.applications = sorted(applications, key=lambda a: _sort_key(a['name']))
+        self.applications_by_id = {a['id']: a for a in self.applications}
+        self.suites_by_id = {s['SuiteID']: s for s in suites}
+        self.test_cases_by_id = {tc['TestCaseID']: tc for tc in test_cases}
+        self.test_cases = sorted(test_cases, key=lambda tc: _sort_key(tc['Code']))
+
+        self._suites_by_app = {}
+        for suite in sorted(suites, key=lambda s: _sort_key(s['Name'])):
+            self._suites_by_app.setdefault(suite['AppType'], []).append(suite)
+
+        self._test_case_ids_by_suite = {}
+        for row in memberships:
+            if row['TestCaseID'] in self.test_cases_by_id:
+                self._test_case_ids_by_suite.setdefault(row['SuiteID'], set()).add(row['TestCaseID'])
+        self.suite_linked_test_case_ids = set().union(*self._test_case_ids_by_suite.values())
+
+    @staticmethod
+    def load(conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT id, name FROM application")
+            applications = cursor.fetchall()
+            cursor.execute("SELECT SuiteID, Name, AppType FROM testsuites")
+            suites = cursor.fetchall()
+            cursor.execute("SELECT TestCaseID, Code, Name, Module FROM testcases")
+            test_cases = cursor.fetchall()
+            cursor.execute("SELECT SuiteID, TestCaseID FROM suitetestcases")
+            memberships = cursor.fetchall()
+        finally:
+            cursor.close()
+        return Catalog(applications, suites, test_cases, memberships)
+
+    def suites_for_application(self, app_id):
+        """Suites of an application, ordered by name."""
+        return list(self._suites_by_app.get(app_id, []))
+
+    def test_cases_for_suite(self, suite_id):
+        """Test cases linked to a suite, ordered by code."""
+        return sorted((self.test_cases_by_id[tc_id] for tc_id in self._test_case_ids_by_suite.get(suite_id, ())),
+                      key=lambda tc: _sort_key(tc['Code']))
+
+
+_catalog = None  # (Catalog, catalog version, expires at); shared between requests, so treat it as read-only
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(connect):
+    """
+    The process's Catalog, reloaded through `connect()` (a function returning a DB
+    connection) when the catalog version changed or the TTL ran out. If `connect()`
+    gives no connection the previous tree is kept; with none loaded yet, or if the load
+    itself fails, raises mysql.connector.Error.
+    """
+    global _catalog
+    version = read_catalog_version()
+    now = time.monotonic()
+    entry = _catalog
+    if entry and entry[1] == version and entry[2] > now:
+        return entry[0]
+    with _catalog_lock:
+        entry = _catalog
+        if entry and entry[1] == version and entry[2] > now:
+            return entry[0]  # Another request reloaded it while we waited
+        conn = connect()
+        if not conn:
+            if entry:
+                return entry[0]  # Stale, but better than failing the page; retried next request
+            raise mysql.connector.Error(msg="No database connection to load the catalog")
+        try:
+            catalog = Catalog.load(conn)
+        finally:
+            if conn.is_connected():
+                conn.close()
+        _catalog = (catalog, version, now + CATALOG_TTL_SECONDS)
+        return catalog
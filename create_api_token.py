@@ -0,0 +1,39 @@
+# create_api_token.py
+#
+# Issues (or revokes) a bearer token for the CI API (/api/v1/...). The token acts as
+# the given user: a tester token creates batches for that tester, a manager or admin
+# token may assign batches to any tester.
+#
+#   python create_api_token.py <username> "<token name>"
+#   python create_api_token.py --revoke <token id>
+import sys
+
+from models import ApiToken, User
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--revoke':
+        if ApiToken.revoke(int(sys.argv[2])):
+            print(f"Token {sys.argv[2]} revoked.")
+        else:
+            print(f"Token {sys.argv[2]} not found or already revoked.")
+        sys.exit(0)
+
+    if len(sys.argv) != 3:
+        print('Usage: python create_api_token.py <username> "<token name>" | --revoke <token id>')
+        sys.exit(1)
+
+    username, token_name = sys.argv[1], sys.argv[2]
+    user = User.find_by_username(username)
+    if not user:
+        print(f"User '{username}' not found.")
+        sys.exit(1)
+
+    token_id, raw_token = ApiToken.create(user.id, token_name)
+    if not token_id:
+        print("Failed to create the token; see the error above.")
+        sys.exit(1)
+
+    print(f"Token {token_id} ('{token_name}') created for {username} ({user.role}).")
+    print("Store it now; it cannot be shown again:\n")
+    print(f"    {raw_token}\n")
+    print("Send it as:  Authorization: Bearer <token>")
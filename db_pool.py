@@ -0,0 +1,203 @@
+# db_pool.py
+#
+# One MySQL connection pool per connection config; close() on a borrowed connection hands it back.
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+DEFAULT_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))  # Kept idle for reuse
+DEFAULT_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', '10'))  # Opened under load, closed when returned
+DEFAULT_RECYCLE_SECONDS = int(os.environ.get('DB_POOL_RECYCLE_SECONDS', '1800'))
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', '10'))  # Then PoolError, a mysql.connector.Error
+DEFAULT_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+
+class PooledConnection:
+    """
+    A borrowed connection. Behaves like the underlying MySQL connection, except that
+    close() returns it to the pool and is_connected() only says whether it is still
+    borrowed (the pool already checked it on borrow, so no extra round trip).
+    """
+
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise mysql.connector.errors.OperationalError(msg="Connection has been returned to the pool.")
+        return getattr(raw, name)
+
+    def is_connected(self):
+        return self._raw is not None
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # A caller that forgot close(): give the slot back rather than leak it
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, db_config, size=DEFAULT_POOL_SIZE, max_overflow=DEFAULT_MAX_OVERFLOW,
+                 recycle_seconds=DEFAULT_RECYCLE_SECONDS, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 pre_ping=DEFAULT_PRE_PING, name=None):
+        self.db_config = dict(db_config)
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.recycle_seconds = recycle_seconds
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.name = name or f"{db_config.get('user')}@{db_config.get('host')}/{db_config.get('database')}"
+        self._idle = deque()  # (raw connection, created at), most recently returned on the right
+        self._in_use = 0
+        self._opening = 0     # Slots reserved by borrowers that are connecting right now
+        self._cond = threading.Condition()
+        self._stats = {'borrowed': 0, 'created': 0, 'recycled': 0, 'failed_pings': 0, 'discarded': 0,
+                       'waits': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'peak_in_use': 0}
+
+    def connection(self):
+        """Borrows a healthy connection; raises PoolError if none frees up within the timeout."""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use + self._opening < self.size + self.max_overflow:
+                    raw, created_at = None, None
+                    self._opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(msg=f"Connection pool '{self.name}' exhausted "
+                                        f"({self.size + self.max_overflow} connections in use for {self.timeout}s).")
+                if not waited:
+                    waited = True
+                    self._stats['waits'] += 1
+                wait_started = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats['wait_seconds'] += time.monotonic() - wait_started
+
+        if raw is not None:
+            raw = self._check_borrowed(raw, created_at)
+        else:
+            try:
+                raw = self._open()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if raw is not None:
+                        self._in_use += 1
+                    self._cond.notify()
+        with self._cond:
+            self._stats['borrowed'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+        return PooledConnection(self, raw)
+
+    def _open(self):
+        raw = mysql.connector.connect(**self.db_config)
+        raw._pool_created_at = time.monotonic()
+        with self._cond:
+            self._stats['created'] += 1
+        return raw
+
+    def _check_borrowed(self, raw, created_at):
+        """Replaces an idle connection that is too old or no longer answers; keeps the borrowed slot."""
+        replace = False
+        if self.recycle_seconds and time.monotonic() - created_at > self.recycle_seconds:
+            replace = True
+            with self._cond:
+                self._stats['recycled'] += 1
+        elif self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                replace = True
+                with self._cond:
+                    self._stats['failed_pings'] += 1
+        if not replace:
+            return raw
+        self._close_quietly(raw)
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, raw):
+        keep = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()  # Never hand the next borrower someone else's open transaction
+        except Exception:
+            keep = False
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append((raw, getattr(raw, '_pool_created_at', time.monotonic())))
+                raw = None
+            else:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+        if raw is not None:
+            self._close_quietly(raw)  # Overflow or broken connection
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(name=self.name, size=self.size, max_overflow=self.max_overflow,
+                         idle=len(self._idle), in_use=self._in_use,
+                         avg_wait_ms=round(stats['wait_seconds'] * 1000 / stats['waits'], 2) if stats['waits'] else 0.0)
+            stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config, **pool_settings):
+    """The process-wide pool for `db_config` (created on first use with `pool_settings`)."""
+    key = tuple(sorted((k, str(v)) for k, v in db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_config, **pool_settings)
+        return pool
+
+
+def pool_metrics():
+    """Metrics of every pool in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.metrics() for pool in pools]
@@ -1,6 +1,6 @@
 # decorators.py
 from functools import wraps
-from flask import abort
+from flask import abort, g, jsonify, request
 from flask_login import current_user
 
 def role_required(role_name):
@@ -21,4 +21,24 @@ def role_required(role_name):
 admin_required = role_required('admin')
 manager_required = role_required('manager')
 tester_required = role_required('tester')
-manager_or_admin_required = role_required(['admin', 'manager'])
\ No newline at end of file
+manager_or_admin_required = role_required(['admin', 'manager'])
+
+
+def api_token_required(f):
+    """
+    For the CI API: authenticates 'Authorization: Bearer <token>' instead of a session.
+    The token's user is available as g.api_user and the token as g.api_token_id.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from models import ApiToken, User # Imported here so decorators.py stays importable without a database
+        auth_header = request.headers.get('Authorization', '')
+        raw_token = auth_header[len('Bearer '):].strip() if auth_header.startswith('Bearer ') else ''
+        token = ApiToken.authenticate(raw_token)
+        user = User.get(token['UserID']) if token else None
+        if not user:
+            return jsonify({'status': 'error', 'message': 'A valid API token is required.'}), 401
+        g.api_user = user
+        g.api_token_id = token['TokenID']
+        return f(*args, **kwargs)
+    return decorated_function
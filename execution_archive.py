@@ -0,0 +1,232 @@
+# execution_archive.py
+#
+# Moves the step results and screenshots of old executions into monthly zip bundles under ARCHIVE_DIR.
+import json
+import os
+import secrets
+import shutil
+import zipfile
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from migrations import TABLE_DDL
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_CHUNK_EXECUTIONS = 200  # Executions per transaction
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get('EXECUTION_ARCHIVE_DIR') or os.path.join(BASE_DIR, 'archive')
+REPORTS_DIR = os.path.join(BASE_DIR, 'static', 'reports')
+
+STEPS_MEMBER = 'steps.json'
+_PRECOMPRESSED = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.zip', '.gz')
+
+_table_ready = False
+
+
+def ensure_archive_table(conn):
+    """Creates archived_executions once per process (DDL; call outside a transaction)."""
+    global _table_ready
+    if _table_ready:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL['archived_executions'])
+        _table_ready = True
+    finally:
+        cursor.close()
+
+
+def _report_file(relative_path):
+    """Absolute path of a file under static/reports, or None if `relative_path` points outside it."""
+    path = os.path.normpath(os.path.join(REPORTS_DIR, relative_path or ''))
+    return path if path.startswith(REPORTS_DIR + os.sep) else None
+
+
+def _screenshot_files(execution_id, step_results):
+    """{path inside static/reports: absolute path} of an execution's screenshot files on disk."""
+    files = {}
+    subdir = f'screenshots_exec_{execution_id}'
+    subdir_path = os.path.join(REPORTS_DIR, subdir)
+    if os.path.isdir(subdir_path):
+        for name in os.listdir(subdir_path):
+            path = os.path.join(subdir_path, name)
+            if os.path.isfile(path):
+                files[f'{subdir}/{name}'] = path
+    for step in step_results:  # Screenshots recorded outside the usual directory
+        relative = (step.get('Screenshot') or '').replace('\\', '/')
+        path = _report_file(relative)
+        if path and relative not in files and os.path.isfile(path):
+            files[relative] = path
+    return files
+
+
+def _write_bundle(month, executions):
+    """
+    Writes one bundle for `executions` ([(execution_id, step_results, screenshot_files)])
+    and returns its path relative to ARCHIVE_DIR.
+    """
+    relative_path = f"{month[:4]}/executions_{month}_{secrets.token_hex(4)}.zip"
+    path = os.path.join(ARCHIVE_DIR, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+            for execution_id, step_results, screenshot_files in executions:
+                bundle.writestr(f'{execution_id}/{STEPS_MEMBER}', json.dumps(step_results, default=str))
+                for relative, file_path in screenshot_files.items():
+                    stored = zipfile.ZIP_STORED if relative.lower().endswith(_PRECOMPRESSED) else zipfile.ZIP_DEFLATED
+                    bundle.write(file_path, f'{execution_id}/{relative}', compress_type=stored)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relative_path
+
+
+def _remove_screenshots(execution_id, screenshot_files):
+    for path in screenshot_files.values():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    shutil.rmtree(os.path.join(REPORTS_DIR, f'screenshots_exec_{execution_id}'), ignore_errors=True)
+
+
+def _archive_chunk(conn, cursor, rows):
+    """
+    Archives the executions of `rows` (ExecutionID, ExecutionTime); returns (step results,
+    screenshots). The bundle is complete before the rows go, and the rows before the
+    screenshots, so a crash leaves at worst an unreferenced bundle or archived files.
+    """
+    execution_ids = [row['ExecutionID'] for row in rows]
+    placeholders = ', '.join(['%s'] * len(execution_ids))
+    cursor.execute(f"""
+        SELECT sr.*, s.StepOrder, s.Input AS OriginalStepInput, s.ExpectedResponse AS OriginalExpectedResponse
+        FROM stepresults sr LEFT JOIN steps s ON sr.StepID = s.StepID
+        WHERE sr.ExecutionID IN ({placeholders})
+        ORDER BY sr.ExecutionID, s.StepOrder
+    """, execution_ids)
+    steps_by_execution = {}
+    for step in cursor.fetchall():
+        steps_by_execution.setdefault(step['ExecutionID'], []).append(step)
+
+    by_month = {}
+    for row in rows:
+        step_results = steps_by_execution.get(row['ExecutionID'], [])
+        by_month.setdefault(row['ExecutionTime'].strftime('%Y-%m'), []).append(
+            (row['ExecutionID'], step_results, _screenshot_files(row['ExecutionID'], step_results)))
+
+    index_rows = []
+    for month, executions in by_month.items():
+        bundle_path = _write_bundle(month, executions)
+        index_rows.extend((execution_id, bundle_path, len(step_results), len(screenshot_files))
+                          for execution_id, step_results, screenshot_files in executions)
+
+    try:
+        conn.start_transaction()
+        cursor.execute(f"""
+            INSERT INTO archived_executions (ExecutionID, BundlePath, StepResultCount, ScreenshotCount)
+            VALUES {', '.join(['(%s, %s, %s, %s)'] * len(index_rows))}
+        """, [value for row in index_rows for value in row])
+        cursor.execute(f"DELETE FROM stepresults WHERE ExecutionID IN ({placeholders})", execution_ids)
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+
+    for executions in by_month.values():
+        for execution_id, _, screenshot_files in executions:
+            _remove_screenshots(execution_id, screenshot_files)
+    return (sum(len(steps) for steps in steps_by_execution.values()),
+            sum(row[3] for row in index_rows))
+
+
+def archive_executions(conn, older_than_days=ARCHIVE_AFTER_DAYS, limit=None, dry_run=False,
+                       chunk_size=ARCHIVE_CHUNK_EXECUTIONS, log=print):
+    """
+    Moves the step results and screenshots of executions older than `older_than_days`
+    (at most `limit` executions) into bundles. With `dry_run`, only counts them.
+    Returns {'executions', 'step_results', 'screenshots'}. Raises mysql.connector.Error
+    or OSError; chunks archived before the error stay archived.
+    """
+    ensure_archive_table(conn)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    summary = {'executions': 0, 'step_results': 0, 'screenshots': 0}
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if dry_run:
+            cursor.execute("""
+                SELECT COUNT(*) AS Executions, COALESCE(SUM(
+                    (SELECT COUNT(*) FROM stepresults sr WHERE sr.ExecutionID = te.ExecutionID)), 0) AS StepResults
+                FROM testexecutions te
+                WHERE te.ExecutionTime < %s
+                  AND NOT EXISTS (SELECT 1 FROM archived_executions ae WHERE ae.ExecutionID = te.ExecutionID)
+            """, (cutoff,))
+            row = cursor.fetchone()
+            summary['executions'] = min(row['Executions'], limit) if limit else row['Executions']
+            summary['step_results'] = int(row['StepResults'])
+            return summary
+
+        while limit is None or summary['executions'] < limit:
+            batch = chunk_size if limit is None else min(chunk_size, limit - summary['executions'])
+            cursor.execute("""
+                SELECT te.ExecutionID, te.ExecutionTime
+                FROM testexecutions te
+                WHERE te.ExecutionTime < %s
+                  AND NOT EXISTS (SELECT 1 FROM archived_executions ae WHERE ae.ExecutionID = te.ExecutionID)
+                ORDER BY te.ExecutionTime, te.ExecutionID
+                LIMIT %s
+            """, (cutoff, batch))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            step_results, screenshots = _archive_chunk(conn, cursor, rows)
+            summary['executions'] += len(rows)
+            summary['step_results'] += step_results
+            summary['screenshots'] += screenshots
+            log(f"  archived {summary['executions']} execution(s) up to {rows[-1]['ExecutionTime']}")
+        return summary
+    finally:
+        cursor.close()
+
+
+def find_archived_execution(cursor, execution_id):
+    """The archived_executions row of an execution, or None if it wasn't archived."""
+    try:
+        cursor.execute("SELECT * FROM archived_executions WHERE ExecutionID = %s", (execution_id,))
+    except mysql.connector.Error as err:
+        if err.errno == 1146:  # ER_NO_SUCH_TABLE: nothing was ever archived
+            return None
+        raise
+    return cursor.fetchone()
+
+
+def _bundle(bundle_path):
+    path = os.path.normpath(os.path.join(ARCHIVE_DIR, bundle_path))
+    if not path.startswith(os.path.normpath(ARCHIVE_DIR) + os.sep):
+        raise OSError(f"Bundle path outside the archive: {bundle_path}")
+    return zipfile.ZipFile(path)
+
+
+def load_archived_steps(execution_id, bundle_path):
+    """The step results of an archived execution, as stored by archive_executions. Raises OSError."""
+    try:
+        with _bundle(bundle_path) as bundle:
+            return json.loads(bundle.read(f'{execution_id}/{STEPS_MEMBER}'))
+    except (KeyError, zipfile.BadZipFile, ValueError) as e:
+        raise OSError(f"Archived steps of execution {execution_id} unreadable in {bundle_path}: {e}")
+
+
+def read_archived_file(execution_id, bundle_path, relative_path):
+    """Bytes of an archived screenshot (`relative_path` as in stepresults.Screenshot), or None."""
+    relative_path = (relative_path or '').replace('\\', '/')
+    if not relative_path or relative_path == STEPS_MEMBER:
+        return None
+    try:
+        with _bundle(bundle_path) as bundle:
+            return bundle.read(f'{execution_id}/{relative_path}')
+    except (KeyError, zipfile.BadZipFile, OSError):
+        return None
@@ -0,0 +1,104 @@
+# executor_client.py
+#
+# HTTP client for executor_service.py with the same methods as job_executor.JobExecutor.
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from run_registry import DeviceBusyError
+
+EXECUTOR_URL_ENV = 'EXECUTOR_URL'      # e.g. http://127.0.0.1:5055
+EXECUTOR_TOKEN_ENV = 'EXECUTOR_TOKEN'  # Shared secret sent as X-Executor-Token
+TOKEN_HEADER = 'X-Executor-Token'
+DEFAULT_TIMEOUT_SECONDS = 10
+
+
+class ExecutorUnavailable(Exception):
+    pass
+
+
+class ExecutorClient:
+    def __init__(self, base_url, token=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, params=None, body=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(url, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if self.token:
+            req.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, json.loads(resp.read().decode('utf-8') or 'null')
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read().decode('utf-8') or 'null')
+            except ValueError:
+                payload = None
+            return e.code, payload
+        except (urllib.error.URLError, OSError) as e:
+            raise ExecutorUnavailable(f"Executor service at {self.base_url} is unavailable: {e}")
+
+    # --- Same interface as JobExecutor ---
+    def submit(self, kind, args, device_id, user_id=None, assignment_id=None, batch_assignment_id=None,
+               env=None, wait_for_job_id=None, resume_batch_after=None):
+        status, payload = self._request('POST', '/jobs', body={
+            'kind': kind, 'args': [str(arg) for arg in args], 'device_id': device_id, 'user_id': user_id,
+            'assignment_id': assignment_id, 'batch_assignment_id': batch_assignment_id, 'env': env or {},
+            'wait_for_job_id': wait_for_job_id, 'resume_batch_after': resume_batch_after,
+        })
+        if status == 409:
+            raise DeviceBusyError(device_id, (payload or {}).get('job_id'))
+        if status != 200:
+            raise ValueError((payload or {}).get('message', f"Executor rejected the job (HTTP {status})."))
+        return payload
+
+    def get(self, job_id):
+        status, payload = self._request('GET', f'/jobs/{urllib.parse.quote(job_id)}')
+        return payload if status == 200 else None
+
+    def list_jobs(self, device_id=None, batch_assignment_id=None, user_id=None, kind=None, active_only=False):
+        status, payload = self._request('GET', '/jobs', params={
+            'device_id': device_id, 'batch_assignment_id': batch_assignment_id, 'user_id': user_id,
+            'kind': kind, 'active': '1' if active_only else None,
+        })
+        return payload.get('jobs', []) if status == 200 else []
+
+    def owns_job(self, job_id):
+        return False  # Every read is a round trip to the executor service
+
+    def read_output(self, job_id, offset=None):
+        status, payload = self._request('GET', f'/jobs/{urllib.parse.quote(job_id)}/output', params={'offset': offset})
+        return payload if status == 200 else None
+
+    def cancel(self, job_id):
+        status, payload = self._request('POST', f'/jobs/{urllib.parse.quote(job_id)}/cancel')
+        return status == 200 and bool(payload.get('cancelled'))
+
+    def claim_post_run(self, job_id):
+        status, payload = self._request('POST', f'/jobs/{urllib.parse.quote(job_id)}/claim')
+        return status == 200 and bool(payload.get('claimed'))
+
+    def resume_batch(self, batch_assignment_id):
+        status, payload = self._request('POST', f'/batches/{int(batch_assignment_id)}/resume')
+        return status == 200 and bool(payload.get('resumed'))
+
+
+def get_executor(logger=None):
+    """ExecutorClient for EXECUTOR_URL if set, otherwise an in-process JobExecutor sharing state through shared_run_store.py."""
+    base_url = os.environ.get(EXECUTOR_URL_ENV, '').strip()
+    if base_url:
+        token = os.environ.get(EXECUTOR_TOKEN_ENV)
+        if not token:
+            raise RuntimeError(f"{EXECUTOR_TOKEN_ENV} must be set when {EXECUTOR_URL_ENV} is.")
+        return ExecutorClient(base_url, token=token)
+    from job_executor import JobExecutor  # In-process: runner jobs live and die with this web server
+    from shared_run_store import store_from_env
+    return JobExecutor(logger=logger, store=store_from_env())
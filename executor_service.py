@@ -0,0 +1,160 @@
+# executor_service.py
+#
+# Standalone service that owns the runner processes, so web workers can restart without stopping tests.
+#
+#   python executor_service.py [--host 127.0.0.1] [--port 5055]
+#
+# Job API (JSON):
+#   POST /jobs                      submit {kind, args, device_id, user_id, assignment_id,
+#                                   batch_assignment_id, env, wait_for_job_id, resume_batch_after}
+#   GET  /jobs?device_id=&batch_assignment_id=&user_id=&kind=&active=1
+#   GET  /jobs/<job_id>             status
+#   GET  /jobs/<job_id>/output?offset=   output after a byte offset
+#   GET  /jobs/<job_id>/stream      output as Server-Sent Events (id = byte offset)
+#   POST /jobs/<job_id>/cancel      stop the runner process
+#   POST /jobs/<job_id>/claim       true once per finished job (post-run bookkeeping)
+#   POST /batches/<id>/resume       relaunch a paused batch
+#
+# Bind it to localhost (the default). EXECUTOR_TOKEN is required: every request must
+# send it as X-Executor-Token, and the service refuses to start without it.
+import argparse
+import hmac
+import json
+import logging
+import os
+import time
+
+from flask import Flask, Response, jsonify, request
+
+from executor_client import EXECUTOR_TOKEN_ENV, TOKEN_HEADER
+from job_executor import JobExecutor
+from run_registry import DeviceBusyError
+from shared_run_store import store_from_env
+
+STREAM_POLL_SECONDS = 0.5
+STREAM_KEEPALIVE_SECONDS = 15
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+service = Flask(__name__)
+service.logger.setLevel(logging.INFO)
+executor = JobExecutor(logger=service.logger, store=store_from_env())
+
+
+@service.before_request
+def check_token():
+    expected = os.environ.get(EXECUTOR_TOKEN_ENV)
+    if not expected:
+        return jsonify({'status': 'error', 'message': f'{EXECUTOR_TOKEN_ENV} is not configured.'}), 503
+    if not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ''), expected):
+        return jsonify({'status': 'error', 'message': 'Invalid executor token.'}), 401
+
+
+def _optional_int(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+@service.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True) or {}
+    device_id = (data.get('device_id') or '').strip()
+    if not device_id or not isinstance(data.get('args'), list):
+        return jsonify({'status': 'error', 'message': 'device_id and args are required.'}), 400
+    try:
+        job = executor.submit(data.get('kind'), data['args'], device_id,
+                              user_id=_optional_int(data.get('user_id')),
+                              assignment_id=_optional_int(data.get('assignment_id')),
+                              batch_assignment_id=_optional_int(data.get('batch_assignment_id')),
+                              env=data.get('env') or {},
+                              wait_for_job_id=data.get('wait_for_job_id'),
+                              resume_batch_after=_optional_int(data.get('resume_batch_after')))
+    except DeviceBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'job_id': e.run_id}), 409
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(job)
+
+
+@service.route('/jobs', methods=['GET'])
+def list_jobs():
+    jobs = executor.list_jobs(device_id=request.args.get('device_id') or None,
+                              batch_assignment_id=_optional_int(request.args.get('batch_assignment_id')),
+                              user_id=_optional_int(request.args.get('user_id')),
+                              kind=request.args.get('kind') or None,
+                              active_only=request.args.get('active') == '1')
+    return jsonify({'jobs': jobs})
+
+
+@service.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = executor.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': f'Unknown job {job_id}.'}), 404
+    return jsonify(job)
+
+
+@service.route('/jobs/<job_id>/output', methods=['GET'])
+def job_output(job_id):
+    output = executor.read_output(job_id, request.args.get('offset', type=int))
+    if output is None:
+        return jsonify({'status': 'error', 'message': f'Unknown job {job_id}.'}), 404
+    return jsonify(output)
+
+
+@service.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    if not executor.get(job_id):
+        return jsonify({'status': 'error', 'message': f'Unknown job {job_id}.'}), 404
+    try:
+        offset = int(request.headers.get('Last-Event-ID') or request.args.get('offset') or 0)
+    except ValueError:
+        offset = 0
+
+    def generate():
+        nonlocal offset
+        last_sent = time.time()
+        while True:
+            job = executor.get(job_id)
+            output = executor.read_output(job_id, offset)
+            if not job or output is None:
+                return
+            offset = output['offset']
+            if output['text'] or output['reset']:
+                yield f"id: {offset}\nevent: output\ndata: {json.dumps(output)}\n\n"
+                last_sent = time.time()
+            if not job['running']:
+                yield f"event: done\ndata: {json.dumps(job)}\n\n"
+                return
+            if time.time() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            time.sleep(STREAM_POLL_SECONDS)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@service.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    return jsonify({'cancelled': executor.cancel(job_id)})
+
+
+@service.route('/jobs/<job_id>/claim', methods=['POST'])
+def claim_job(job_id):
+    return jsonify({'claimed': executor.claim_post_run(job_id)})
+
+
+@service.route('/batches/<int:batch_assignment_id>/resume', methods=['POST'])
+def resume_batch(batch_assignment_id):
+    return jsonify({'resumed': executor.resume_batch(batch_assignment_id)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='USSD test execution service')
+    parser.add_argument('--host', default=os.environ.get('EXECUTOR_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('EXECUTOR_PORT', '5055')))
+    cli_args = parser.parse_args()
+    if not os.environ.get(EXECUTOR_TOKEN_ENV):
+        parser.error(f"set {EXECUTOR_TOKEN_ENV} to the shared secret the web app sends")
+    service.run(host=cli_args.host, port=cli_args.port, threaded=True, debug=False)
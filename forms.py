@@ -1,8 +1,8 @@
 # forms.py
 from flask_wtf import FlaskForm
 from wtforms import (StringField, PasswordField, SubmitField, SelectField,
-                   BooleanField, TextAreaField, SelectMultipleField) # Added SelectMultipleField
-from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Optional, Regexp
+                   BooleanField, TextAreaField, SelectMultipleField, IntegerField) # Added SelectMultipleField
+from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Optional, Regexp, NumberRange
 from wtforms.widgets import ListWidget, CheckboxInput # For SelectMultipleField with checkboxes
 
 from models import User # Assuming models.py is in the same directory or accessible
@@ -87,6 +87,18 @@ class AssignSuiteForm(BaseAssignmentForm):
     submit = SubmitField('Assign Entire Suite')
 
 class AssignApplicationForm(BaseAssignmentForm):
+    selection_mode = SelectField(
+        'Test Selection',
+        choices=[('FULL', 'All test cases'),
+                 ('INCREMENTAL', 'Incremental: changed, previously failed or never run')],
+        default='FULL'
+    )
+    fill_with_stable = BooleanField('Fill remaining capacity with a rotating sample of stable test cases')
+    max_test_cases = IntegerField(
+        'Batch Capacity (max test cases)',
+        validators=[Optional(), NumberRange(min=1, message="Capacity must be at least 1.")],
+        render_kw={"placeholder": "Only used to fill with stable test cases"}
+    )
     submit = SubmitField('Assign All Tests for Application')
 
 class AssignCustomGroupForm(BaseAssignmentForm):
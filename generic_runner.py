@@ -11,6 +11,14 @@ from appium.options.android import UiAutomator2Options
 from appium.webdriver.common.appiumby import AppiumBy
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from result_cache import (get_build_tag, get_device_class, compute_steps_version,
+                          resolve_step_params, build_cache_key, record_pass_execution)
+from ussd_rate_limiter import UssdSessionLimiter, short_code_of
+from batch_control import BATCH_ID_ENV, read_control
+from progress_version import bump_progress_version
+from query_cache import bump_data_version
+from db_pool import get_pool
+from rollups import count_executions, set_assignment_status
 # from openpyxl import Workbook # Excel reporting can be kept if desired
 # from openpyxl.styles import PatternFill
 # from openpyxl.chart import BarChart, Reference
@@ -36,7 +44,7 @@ def log_to_stdout(message):
 
 def get_runner_db_connection():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG_RUNNER)
+        conn = get_pool(DB_CONFIG_RUNNER, size=1, max_overflow=1).connection()
         return conn
     except mysql.connector.Error as err:
         log_to_stdout(f"RUNNER_ERROR: Database connection failed: {err}")
@@ -265,8 +273,12 @@ def main_runner():
     execution_overall_status = "PASS"
     final_log_message = "Execution started but did not complete successfully."
     appium_session_started = False
+    ussd_limiter = UssdSessionLimiter(DB_CONFIG_RUNNER)
+    limiter_wait_total_sec = 0.0
     summary_stats = {'TotalSteps': 0, 'Attempted': 0, 'Passed': 0, 'Failed': 0}
     override_response_text_for_current_iteration = None
+    batch_id_for_control = os.environ.get(BATCH_ID_ENV)
+    stopped_by_control = None # PAUSE/CANCEL requested for the batch while this test case was running
     
     try:
         db_cursor.execute("SELECT DeviceID FROM devices WHERE SerialNumber = %s", (device_id_arg,))
@@ -279,12 +291,30 @@ def main_runner():
             log_to_stdout(f"RUNNER_INFO: Created new device ID {db_device_id_for_exec} for SN {device_id_arg}")
         db_conn.commit()
 
+        log_to_stdout(f"RUNNER_INFO: Fetching steps for TestCaseID: {testcase_id_arg}")
+        db_cursor.execute(
+            "SELECT StepID, StepOrder, Input, ExpectedResponse, InputType, ParamName FROM steps WHERE TestCaseID = %s ORDER BY StepOrder",
+            (testcase_id_arg,)
+        )
+        db_step_rows = db_cursor.fetchall()
+        summary_stats['TotalSteps'] = len(db_step_rows)
+
+        # Identify this run for the batch result cache (see result_cache.py)
+        steps_version = compute_steps_version(db_step_rows)
+        build_tag = get_build_tag()
+        device_class = get_device_class(android_version_arg)
+        cache_key = build_cache_key(testcase_id_arg, steps_version,
+                                    resolve_step_params(db_step_rows, dynamic_params),
+                                    build_tag, device_class)
+
         default_suite_id = 1 
         execution_start_time = datetime.now()
         initial_db_status = 'NOT EXECUTED'
         exec_params_to_store = {
             "device_id": device_id_arg, "android_version": android_version_arg,
-            "dynamic_inputs": dynamic_params, "password_provided": bool(password_arg)
+            "dynamic_inputs": dynamic_params, "password_provided": bool(password_arg),
+            "assignment_id": assignment_id_arg, "build_tag": build_tag, "device_class": device_class,
+            "steps_version": steps_version, "cache_key": cache_key
         }
         
         sql_insert_execution = """
@@ -296,17 +326,10 @@ def main_runner():
             execution_start_time, initial_db_status, json.dumps(exec_params_to_store)
         ))
         current_execution_id = db_cursor.lastrowid
+        count_executions(db_cursor, "te.ExecutionID = %s", (current_execution_id,))
         db_conn.commit()
         log_to_stdout(f"RUNNER_INFO: Created TestExecutionID: {current_execution_id} status {initial_db_status}")
 
-        log_to_stdout(f"RUNNER_INFO: Fetching steps for TestCaseID: {testcase_id_arg}")
-        db_cursor.execute(
-            "SELECT StepID, StepOrder, Input, ExpectedResponse, InputType, ParamName FROM steps WHERE TestCaseID = %s ORDER BY StepOrder",
-            (testcase_id_arg,)
-        )
-        db_step_rows = db_cursor.fetchall()
-        summary_stats['TotalSteps'] = len(db_step_rows)
-
         if not db_step_rows:
             final_log_message = f"No steps defined for TestCaseID {testcase_id_arg}."
             execution_overall_status = "FAIL"
@@ -361,6 +384,11 @@ def main_runner():
         hard_fail_occurred_in_loop = False 
 
         while current_step_index < len(processed_steps_for_appium):
+            if batch_id_for_control:
+                stopped_by_control = read_control(batch_id_for_control)
+                if stopped_by_control:
+                    log_to_stdout(f"RUNNER_INFO: Batch {stopped_by_control} requested. Stopping before step index {current_step_index}.")
+                    break
             step_data = processed_steps_for_appium[current_step_index]
             summary_stats['Attempted'] += 1
             step_db_id = step_data['db_step_id']
@@ -370,10 +398,22 @@ def main_runner():
             
             step_status = "FAIL"
             actual_response_text = "No response captured or step failed before response."
-            step_start_time_dt = datetime.now()
             db_screenshot_path = None
             step_log_message_details = []
 
+            # Wait for a gateway session slot before dialing; the wait is kept out of the step's latency
+            if step_order == 1 and input_to_send.startswith('*') and input_to_send.endswith('#') \
+                    and not override_response_text_for_current_iteration:
+                limiter_wait_sec = ussd_limiter.acquire(input_to_send)
+                limiter_wait_total_sec += limiter_wait_sec
+                log_to_stdout(f"RUNNER_LIMITER: Session slot for {short_code_of(input_to_send)} acquired after {limiter_wait_sec:.3f}s wait.")
+                step_log_message_details.append(f"Limiter wait: {limiter_wait_sec:.3f}s (excluded from duration).")
+                exec_params_to_store['limiter_wait_seconds'] = round(limiter_wait_total_sec, 3)
+                db_cursor.execute("UPDATE testexecutions SET Parameters = %s WHERE ExecutionID = %s",
+                                  (json.dumps(exec_params_to_store), current_execution_id))
+                db_conn.commit()
+            step_start_time_dt = datetime.now()
+
             log_to_stdout(f"RUNNER_STEP Start: Order={step_order} (Index: {current_step_index}), Input='{input_to_send}', Expected KWs='{expected_kws}'")
 
             try:
@@ -571,7 +611,10 @@ def main_runner():
 
         log_to_stdout("RUNNER_INFO: Main step execution loop completed.")
 
-        if hard_fail_occurred_in_loop:
+        if stopped_by_control:
+            execution_overall_status = "NOT EXECUTED"
+            final_log_message = f"Stopped at a step boundary by batch {stopped_by_control} request after {summary_stats['Attempted']} step(s)."
+        elif hard_fail_occurred_in_loop:
             execution_overall_status = "FAIL"
             final_log_message = f"Execution failed due to an unrecoverable error or persistent step failure. Defined: {summary_stats['TotalSteps']}."
         elif summary_stats['Attempted'] == 0 and summary_stats['TotalSteps'] > 0:
@@ -681,12 +724,23 @@ def main_runner():
             except Exception as e_quit:
                 log_to_stdout(f"RUNNER_WARN: Error quitting Appium driver: {e_quit}")
 
+        ussd_limiter.release()
+        # batch_runner.py starts the next test case on this device as soon as it sees this line;
+        # the database updates below overlap with that run.
+        log_to_stdout("RUNNER_DEVICE_RELEASED")
+
         if current_execution_id and db_conn and db_cursor:
             try:
                 db_final_log_message = (final_log_message[:1990] + '...') if len(final_log_message) > 1990 else final_log_message
+                # The dashboards' daily rollup moves the execution from its initial to its final status
+                count_executions(db_cursor, "te.ExecutionID = %s", (current_execution_id,), sign=-1)
                 db_cursor.execute("UPDATE testexecutions SET OverallStatus = %s, LogMessage = %s WHERE ExecutionID = %s",
                                   (execution_overall_status, db_final_log_message, current_execution_id))
+                count_executions(db_cursor, "te.ExecutionID = %s", (current_execution_id,))
+                if execution_overall_status == "PASS":
+                    record_pass_execution(db_cursor, current_execution_id, cache_key, execution_start_time)
                 db_conn.commit()
+                bump_data_version()
                 log_to_stdout(f"RUNNER_DB: Final TestExecutionID {current_execution_id} status: {execution_overall_status}. Log: '{db_final_log_message}'")
             except Exception as e_db_final:
                 log_to_stdout(f"RUNNER_ERROR: Failed to update final execution status for ID {current_execution_id}: {e_db_final}")
@@ -695,13 +749,15 @@ def main_runner():
             assignment_final_db_status = "EXECUTED_FAIL"
             if execution_overall_status == "PASS": 
                 assignment_final_db_status = "EXECUTED_PASS"
+            elif stopped_by_control:
+                assignment_final_db_status = "PENDING" # Runs again when the batch is resumed
             
             try:
-                db_cursor.execute(
-                    "UPDATE test_assignments SET Status = %s, ExecutionID = %s WHERE AssignmentID = %s AND AssignedToUserID = %s",
-                    (assignment_final_db_status, current_execution_id, assignment_id_arg, executed_by_user_id_arg)
-                )
+                set_assignment_status(db_cursor, assignment_id_arg, assignment_final_db_status, current_execution_id,
+                                      extra_where=" AND ta.AssignedToUserID = %s", extra_params=(executed_by_user_id_arg,))
                 db_conn.commit()
+                bump_progress_version(os.environ.get(BATCH_ID_ENV))
+                bump_data_version()
                 log_to_stdout(f"RUNNER_DB: AssignmentID {assignment_id_arg} status updated to {assignment_final_db_status}.")
             except Exception as e_assign_final:
                 log_to_stdout(f"RUNNER_ERROR: Failed to update final assignment status for ID {assignment_id_arg}: {e_assign_final}")
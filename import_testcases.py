@@ -0,0 +1,42 @@
+# import_testcases.py
+#
+# Imports test cases and their steps from a CSV or XLSX spreadsheet (format described
+# in testcase_import.py). Progress is printed after every chunk; rows that fail
+# validation are listed at the end and the rest of the file is imported.
+#
+#   python import_testcases.py <file.csv|file.xlsx> <username> [--dry-run] [--chunk-size N]
+import argparse
+import sys
+
+from models import User, get_db_connection
+from testcase_import import IMPORT_CHUNK_TEST_CASES, TestCaseImporter
+
+
+def print_progress(summary):
+    print(f"  {summary['rows_read']} row(s) read, {summary['imported']} test case(s) done, "
+          f"{summary['skipped']} skipped", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import test cases from CSV or XLSX.")
+    parser.add_argument('path')
+    parser.add_argument('username', help="Recorded as CreatedBy/ModifiedBy of the imported test cases.")
+    parser.add_argument('--dry-run', action='store_true', help="Validate the file without writing anything.")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_TEST_CASES,
+                        help="Test cases per transaction.")
+    args = parser.parse_args()
+
+    user = User.find_by_username(args.username)
+    if not user:
+        print(f"User '{args.username}' not found.")
+        sys.exit(1)
+
+    importer = TestCaseImporter(get_db_connection, user.id, chunk_size=args.chunk_size,
+                                on_progress=print_progress, dry_run=args.dry_run)
+    summary = importer.run(args.path)
+    for error in summary['errors']:
+        print(f"Line {error['line']} ({error['code'] or 'no code'}): {error['message']}")
+    if summary['error_count'] > len(summary['errors']):
+        print(f"... and {summary['error_count'] - len(summary['errors'])} more.")
+    print(summary['message'])
+    sys.exit(0 if summary['status'] == 'completed' else 1)
@@ -0,0 +1,331 @@
+# job_executor.py
+#
+# Owns the runner processes (generic_runner.py, batch_runner.py), their RunRegistry and their live output.
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from batch_control import CONTROL_PAUSE, read_control, clear_control
+from live_output import LiveOutputBuffer
+from models import BatchTestAssignment
+from progress_version import bump_progress_version
+from result_cache import RESULT_CACHE_TTL_ENV, BUILD_TAG_ENV
+from run_registry import RunRegistry, DeviceBusyError, new_run_id, RUN_RUNNING, RUN_FINISHED, RUN_CANCELLED
+from shared_markers import set_marker, read_markers, clear_marker
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNNER_SCRIPTS = {
+    'test': os.path.join(BASE_DIR, 'generic_runner.py'),
+    'batch': os.path.join(BASE_DIR, 'batch_runner.py'),
+}
+
+# The only environment variables a job may set for its runner process; everything else
+# (PATH, PYTHONPATH, LD_PRELOAD, ...) comes from the executor's own environment.
+RUNNER_ENV_KEYS = ('DYNAMIC_PARAMS', RESULT_CACHE_TTL_ENV, BUILD_TAG_ENV)
+
+# Runner output is kept in memory (see live_output.py); finished runs are optionally
+# spilled to gzip files here for later inspection.
+LIVE_OUTPUT_SPILL = os.environ.get('LIVE_OUTPUT_SPILL', '1') == '1'
+LIVE_OUTPUT_ARCHIVE_DIR = os.path.join(BASE_DIR, 'static', 'reports', 'live_output_archive')
+REPORT_PATH_MARKER = 'report saved at:'
+
+# Shared store cadence: output is mirrored at most this often (or once this much is
+# pending), and owned jobs are heartbeated / checked for remote cancel requests.
+OUTPUT_FLUSH_SECONDS = 1.0
+OUTPUT_FLUSH_BYTES = 64 * 1024
+HEARTBEAT_SECONDS = 15
+
+
+def _resume_marker(batch_assignment_id):
+    return f'batch_resume:{int(batch_assignment_id)}'
+
+
+def new_live_output_buffer(run_id):
+    spill_path = os.path.join(LIVE_OUTPUT_ARCHIVE_DIR, f'{run_id}.txt.gz') if LIVE_OUTPUT_SPILL else None
+    return LiveOutputBuffer(run_id, spill_path=spill_path)
+
+
+class JobExecutor:
+    def __init__(self, registry=None, logger=None, store=None):
+        self.registry = registry or RunRegistry()  # Jobs owned (started) by this executor
+        self.store = store                         # Optional shared_run_store.SharedRunStore; other workers see our jobs there
+        self.log = logger.info if logger else print
+        self._resume_lock = threading.Lock()
+        self._heartbeat_thread = None
+        self._heartbeat_lock = threading.Lock()
+
+    # --- Job API (mirrored by executor_client.ExecutorClient) ---
+    def submit(self, kind, args, device_id, user_id=None, assignment_id=None, batch_assignment_id=None,
+               env=None, wait_for_job_id=None, resume_batch_after=None):
+        """
+        Starts a runner job and returns its status dict. `args` are the runner's command
+        line arguments and `env` extra environment variables (RUNNER_ENV_KEYS only). With `wait_for_job_id` the
+        job queues behind that job on the same device (pre-emption); with
+        `resume_batch_after` a batch paused for this job is resumed once it finishes.
+        Raises DeviceBusyError if the device is in use and no job to wait for was given,
+        ValueError for an unknown kind or environment variable.
+        """
+        if kind not in RUNNER_SCRIPTS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        disallowed = sorted(set(env or {}) - set(RUNNER_ENV_KEYS))
+        if disallowed:
+            raise ValueError(f"Environment variables not allowed for runner jobs: {', '.join(map(str, disallowed))}")
+        self.registry.prune()
+        run_id = new_run_id()
+        prefix = f'batch_{batch_assignment_id}_out' if kind == 'batch' else 'test_output'
+        output_id = f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{run_id}'
+        # The shared store sees every worker's jobs, so it decides whether the device is free
+        shared = self.store is not None and self.store.start(
+            run_id, kind, device_id, user_id, assignment_id, batch_assignment_id, output_id,
+            allow_busy=bool(wait_for_job_id))
+        run = self.registry.start(device_id, user_id, assignment_id, batch_assignment_id, kind=kind,
+                                  allow_busy=bool(wait_for_job_id) or shared, run_id=run_id)
+        run.args = [str(arg) for arg in args]
+        run.env = {str(k): str(v) for k, v in (env or {}).items()}
+        run.output_buffer = new_live_output_buffer(output_id)
+        if self.store:
+            self.store.prune()
+            self._ensure_heartbeat()
+        run.thread = threading.Thread(target=self._run_job, args=(run, wait_for_job_id, resume_batch_after), daemon=True)
+        run.thread.start()
+        bump_progress_version(batch_assignment_id)  # The batch page shows whether a job is running
+        self.log(f"Executor: submitted {kind} job {run.run_id} on device {device_id}.")
+        return run.to_dict()
+
+    def get(self, job_id):
+        run = self.registry.get(job_id)  # Jobs this executor owns are current in memory
+        if run:
+            return run.to_dict()
+        return self.store.get(job_id) if self.store else None
+
+    def owns_job(self, job_id):
+        """True if the job's state and output are in this process's memory (reads cost no query)."""
+        return self.registry.get(job_id) is not None
+
+    def list_jobs(self, device_id=None, batch_assignment_id=None, user_id=None, kind=None, active_only=False):
+        if self.store:
+            return self.store.find(device_id, batch_assignment_id, user_id, kind, active_only)
+        return [run.to_dict() for run in self.registry.find(device_id, batch_assignment_id, user_id, kind, active_only)]
+
+    def read_output(self, job_id, offset=None):
+        """Returns {'text', 'offset', 'reset', 'output_id'} for output after `offset`, or None."""
+        run = self.registry.get(job_id)
+        if not run or not run.output_buffer:
+            # Started by another worker: read the copy it mirrors to the shared store
+            return self.store.read_output(job_id, offset) if self.store else None
+        text, next_offset, reset = run.output_buffer.read_from(offset)
+        return {'text': text, 'offset': next_offset, 'reset': reset, 'output_id': run.output_buffer.run_id}
+
+    def cancel(self, job_id):
+        """Stops a job immediately. Batches should rather be cancelled through batch_control."""
+        run = self.registry.get(job_id)
+        if not run and self.store:
+            # The owning executor picks the request up on its next heartbeat
+            return self.store.request_cancel(job_id)
+        if not run or not run.running:
+            return False
+        run.cancel_requested = True
+        process = run.process
+        if process and process.poll() is None:
+            process.terminate()
+        return True
+
+    def claim_post_run(self, job_id):
+        if self.store:
+            return self.store.claim_post_run(job_id)
+        return self.registry.claim_post_run(job_id)
+
+    def resume_batch(self, batch_assignment_id, hand_over=False):
+        """
+        Relaunches a paused batch with the arguments it was started with. Returns False if
+        the batch is not paused, is still winding down, or its device is busy. Only the
+        executor that ran the batch has its arguments (the device password is never
+        stored); with `hand_over` another executor asks that one, through a shared
+        resume marker it checks on every heartbeat, and returns True.
+        """
+        with self._resume_lock:
+            jobs = self.list_jobs(batch_assignment_id=batch_assignment_id, kind='batch')
+            if not jobs or jobs[0]['running'] or read_control(batch_assignment_id) != CONTROL_PAUSE:
+                return False
+            last = self.registry.get(jobs[0]['job_id'])
+            if not last:
+                if not (hand_over and self.store):
+                    return False
+                try:
+                    set_marker(_resume_marker(batch_assignment_id), jobs[0]['job_id'])
+                except (mysql.connector.Error, OSError) as e:
+                    self.log(f"Executor: could not hand over resume of batch {batch_assignment_id}: {e}")
+                    return False
+                return True
+            if self.list_jobs(device_id=last.device_id, active_only=True):
+                return False
+            clear_control(batch_assignment_id)
+            try:
+                self.submit('batch', last.args, last.device_id, last.user_id, batch_assignment_id=batch_assignment_id, env=last.env)
+            except DeviceBusyError:
+                return False
+            return True
+
+    def _take_resume_requests(self):
+        """Resumes the batches other executors asked this one to resume (see resume_batch)."""
+        owned = {run.batch_assignment_id for run in self.registry.find(kind='batch') if not run.running}
+        requested = read_markers([_resume_marker(batch_id) for batch_id in owned if batch_id])
+        for batch_id in owned:
+            if batch_id and requested.get(_resume_marker(batch_id)) and clear_marker(_resume_marker(batch_id)):
+                if self.resume_batch(batch_id):
+                    self.log(f"Executor: resumed batch {batch_id} as asked by another executor.")
+
+    # --- Shared store upkeep ---
+    def _ensure_heartbeat(self):
+        with self._heartbeat_lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+                self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        """Keeps owned jobs from being expired as orphans and applies cancels and resumes requested by other workers."""
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                owned = [run.run_id for run in self.registry.find(active_only=True)]
+                for job_id in self.store.heartbeat(owned):
+                    self.log(f"Executor: job {job_id} cancelled from another worker.")
+                    self.cancel(job_id)
+                self._take_resume_requests()
+            except Exception as e:
+                self.log(f"Executor: heartbeat failed: {e}")
+
+    def _wait_for_job(self, job_id):
+        waiting_for = self.registry.get(job_id)
+        if waiting_for:
+            waiting_for.done.wait()
+            return
+        while self.store:
+            # Owned by another worker; poll the shared store until it lets the device go
+            job = self.store.get(job_id)
+            if not job or not job['running']:
+                return
+            time.sleep(1)
+
+    # --- Runner process handling ---
+    def _run_job(self, run, wait_for_job_id, resume_batch_after):
+        output_buffer = run.output_buffer
+        report_path = None
+        process = None
+        state = RUN_FINISHED
+        mirror = _OutputMirror(self.store, run.run_id) if self.store else None
+        try:
+            if wait_for_job_id:
+                # Pre-empting another job: start once it has stopped at a boundary and released the device
+                self.log(f"Executor: job {run.run_id} waiting for job {wait_for_job_id} to release device {run.device_id}.")
+                self._wait_for_job(wait_for_job_id)
+            if run.cancel_requested:
+                state = RUN_CANCELLED
+                return
+
+            command = [sys.executable, RUNNER_SCRIPTS[run.kind]] + run.args
+            env = os.environ.copy()
+            env.update(run.env)
+            creation_flags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+                                       creationflags=creation_flags, env=env)
+            run.process = process
+            run.state = RUN_RUNNING
+            if self.store: self.store.set_running(run.run_id)
+            bump_progress_version(run.batch_assignment_id)
+
+            for line in process.stdout:
+                output_buffer.append(line)
+                if mirror: mirror.append(line)
+                line_strip = line.strip()
+                if REPORT_PATH_MARKER in line_strip.lower():
+                    report_path = line_strip[line_strip.lower().index(REPORT_PATH_MARKER) + len(REPORT_PATH_MARKER):].strip()
+            process.wait()
+            self.log(f"Executor: job {run.run_id} (PID {process.pid}) finished with exit code {process.returncode}.")
+            if run.cancel_requested:
+                state = RUN_CANCELLED
+            if not report_path and run.kind == 'test':
+                if process.returncode != 0:
+                    report_path = f"Test script error (exit code {process.returncode}). No report path found."
+                else:
+                    report_path = f"Test completed (exit code {process.returncode}). Report path marker not found."
+
+        except Exception as e:
+            msg = f"Unexpected error running {run.kind} job {run.run_id}: {e}"
+            self.log(msg)
+            output_buffer.append(f"\n{msg}\n")
+            if mirror: mirror.append(f"\n{msg}\n")
+            report_path = f"Execution failed: {e}"
+            if run.kind == 'batch' and run.batch_assignment_id:
+                # batch_runner.py normally sets the final status; it never got the chance
+                BatchTestAssignment.update_status(run.batch_assignment_id, 'COMPLETED_FAIL')
+        finally:
+            if process and process.poll() is None:
+                self.log(f"Executor: terminating runaway runner PID {process.pid}.")
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+            spill_path = output_buffer.close()
+            if spill_path: self.log(f"Executor: output of job {run.run_id} archived to {spill_path}.")
+            exit_code = process.returncode if process else None
+            if self.store:
+                mirror.flush()
+                self.store.finish(run.run_id, report_path, exit_code, state)
+            self.registry.finish(run.run_id, report_path, exit_code, state)
+            bump_progress_version(run.batch_assignment_id)
+            if resume_batch_after and self.resume_batch(resume_batch_after, hand_over=True):
+                self.log(f"Executor: resumed pre-empted batch {resume_batch_after} after job {run.run_id}.")
+
+
+class _OutputMirror:
+    """
+    Batches a job's output into the shared store, keeping byte offsets in step with its
+    LiveOutputBuffer. Output is written at most OUTPUT_FLUSH_SECONDS after it arrived.
+    """
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.offset = 0
+        self.pending = []
+        self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def append(self, text):
+        data = text.encode('utf-8', errors='replace')
+        with self.lock:
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+            due = self.pending_bytes >= OUTPUT_FLUSH_BYTES or time.monotonic() - self.last_flush >= OUTPUT_FLUSH_SECONDS
+            if not due and self.timer is None:
+                # A quiet runner (e.g. waiting on a USSD reply) must not hold its last lines back
+                self.timer = threading.Timer(OUTPUT_FLUSH_SECONDS, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            data = b''.join(self.pending)
+            start_offset = self.offset
+            self.offset += len(data)
+            self.pending = []
+            self.pending_bytes = 0
+            self.last_flush = time.monotonic()
+            # Written under the lock so chunks reach the store in offset order
+            if data:
+                self.store.append_output(self.job_id, start_offset, data)
@@ -0,0 +1,82 @@
+# live_output.py
+#
+# Bounded buffer of a runner's live output, read from absolute byte offsets that hold for the whole run.
+import gzip
+import os
+import threading
+from collections import deque
+
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024  # Retained per run; older output is dropped first
+
+
+class LiveOutputBuffer:
+    def __init__(self, run_id, max_bytes=DEFAULT_MAX_BYTES, spill_path=None):
+        self.run_id = run_id
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.finished = False
+        self._chunks = deque()   # (absolute start offset, utf-8 bytes)
+        self._start_offset = 0   # Offset of the oldest retained byte
+        self._end_offset = 0     # Offset just past the newest byte
+        self._retained_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def end_offset(self):
+        with self._lock:
+            return self._end_offset
+
+    def append(self, text):
+        if not text:
+            return
+        data = text.encode('utf-8', errors='replace')
+        with self._lock:
+            self._chunks.append((self._end_offset, data))
+            self._end_offset += len(data)
+            self._retained_bytes += len(data)
+            while self._retained_bytes > self.max_bytes and len(self._chunks) > 1:
+                _, dropped = self._chunks.popleft()
+                self._retained_bytes -= len(dropped)
+                self._start_offset += len(dropped)
+
+    def read_from(self, offset):
+        """
+        Returns (text, next_offset, reset). `reset` is True when `offset` is outside the
+        retained window (output was dropped, or it belongs to another run); the text
+        then starts at the oldest retained byte and the reader should start over.
+        """
+        with self._lock:
+            reset = offset is None or offset < self._start_offset or offset > self._end_offset
+            if reset:
+                offset = self._start_offset
+            parts = []
+            for chunk_start, data in self._chunks:
+                chunk_end = chunk_start + len(data)
+                if chunk_end <= offset:
+                    continue
+                parts.append(data[max(0, offset - chunk_start):])
+            return b''.join(parts).decode('utf-8', errors='replace'), self._end_offset, reset
+
+    def get_text(self):
+        return self.read_from(None)[0]
+
+    def dropped_bytes(self):
+        with self._lock:
+            return self._start_offset
+
+    def close(self):
+        """Marks the run finished and spills the retained output if a spill path was given."""
+        self.finished = True
+        if not self.spill_path:
+            return None
+        try:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with gzip.open(self.spill_path, 'wt', encoding='utf-8') as f:
+                dropped = self.dropped_bytes()
+                if dropped:
+                    f.write(f"[... first {dropped} bytes of output were not retained ...]\n")
+                f.write(self.get_text())
+            return self.spill_path
+        except OSError as e:
+            print(f"Failed to spill live output for run {self.run_id}: {e}")
+            return None
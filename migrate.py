@@ -0,0 +1,50 @@
+# migrate.py
+#
+# Applies the schema migrations of migrations.py to the app database, then backfills the
+# dashboard rollups (rollups.py) if they have never been built.
+#
+#   python migrate.py             apply everything pending
+#   python migrate.py --to 2      apply pending migrations up to version 2
+#   python migrate.py --status    list the migrations and whether they are applied
+import argparse
+import sys
+
+import mysql.connector
+
+from migrations import MIGRATIONS, applied_versions, apply_migrations
+from models import get_db_connection
+from rollups import rebuild_rollups, rollups_built
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the versioned schema migrations.")
+    parser.add_argument('--to', type=int, help="Stop after this version.")
+    parser.add_argument('--status', action='store_true', help="Only show which migrations are applied.")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        print("Failed to connect to the database; see the error above.")
+        sys.exit(1)
+    try:
+        if args.status:
+            done = applied_versions(conn)
+            for version, description, _ in MIGRATIONS:
+                state = f"applied {done[version]}" if version in done else "pending"
+                print(f"{version:>3}  {description:<45} {state}")
+            return
+        applied = apply_migrations(conn, target=args.to)
+        print(f"Applied {len(applied)} migration(s)." if applied else "Nothing to apply.")
+        # The dashboards read the live tables until the rollups have been backfilled once
+        if args.to is None and not rollups_built(conn):
+            print("Backfilled the dashboard rollups." if rebuild_rollups(conn)
+                  else "Another rollup rebuild is in progress; run rebuild_rollups.py later.")
+    except mysql.connector.Error as err:
+        print(f"Migration failed: {err}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# migrations.py
+#
+# Versioned, idempotent schema changes, applied in order by migrate.py and recorded in schema_migrations.
+import mysql.connector
+
+TABLE_DDL = {
+    'api_tokens': """
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            TokenID INT AUTO_INCREMENT PRIMARY KEY,
+            UserID INT NOT NULL,
+            Name VARCHAR(100) NOT NULL,
+            TokenHash CHAR(64) NOT NULL UNIQUE,
+            TokenPrefix VARCHAR(16) NOT NULL,
+            CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            LastUsedAt DATETIME NULL,
+            RevokedAt DATETIME NULL,
+            INDEX idx_api_tokens_user (UserID)
+        )
+    """,
+    'api_idempotency_keys': """
+        CREATE TABLE IF NOT EXISTS api_idempotency_keys (
+            IdempotencyID INT AUTO_INCREMENT PRIMARY KEY,
+            TokenID INT NOT NULL,
+            IdempotencyKey VARCHAR(255) NOT NULL,
+            RequestHash CHAR(64) NOT NULL,
+            ResponseStatus INT NULL,
+            ResponseBody MEDIUMTEXT NULL,
+            CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_api_idempotency (TokenID, IdempotencyKey)
+        )
+    """,
+    'runner_jobs': """
+        CREATE TABLE IF NOT EXISTS runner_jobs (
+            JobID VARCHAR(32) PRIMARY KEY,
+            Kind VARCHAR(10) NOT NULL,
+            State VARCHAR(12) NOT NULL,
+            DeviceID VARCHAR(100) NOT NULL,
+            UserID INT NULL,
+            AssignmentID INT NULL,
+            BatchAssignmentID INT NULL,
+            OutputID VARCHAR(150) NULL,
+            ReportPath TEXT NULL,
+            ExitCode INT NULL,
+            OwnerID VARCHAR(150) NOT NULL,
+            CancelRequested TINYINT(1) NOT NULL DEFAULT 0,
+            PostRunClaimed TINYINT(1) NOT NULL DEFAULT 0,
+            StartedAt DATETIME(6) NOT NULL,
+            FinishedAt DATETIME(6) NULL,
+            HeartbeatAt DATETIME NOT NULL,
+            INDEX idx_runner_jobs_device (DeviceID, State),
+            INDEX idx_runner_jobs_batch (BatchAssignmentID, StartedAt),
+            INDEX idx_runner_jobs_user (UserID, StartedAt),
+            INDEX idx_runner_jobs_state (State, FinishedAt)
+        )
+    """,
+    'runner_job_output': """
+        CREATE TABLE IF NOT EXISTS runner_job_output (
+            JobID VARCHAR(32) NOT NULL,
+            StartOffset BIGINT NOT NULL,
+            Chunk MEDIUMBLOB NOT NULL,
+            PRIMARY KEY (JobID, StartOffset)
+        )
+    """,
+    'rollup_executions_daily': """
+        CREATE TABLE IF NOT EXISTS rollup_executions_daily (
+            Day DATE NOT NULL,
+            ApplicationID INT NOT NULL,         -- 0: test case without an application
+            OverallStatus VARCHAR(50) NOT NULL,
+            ExecutionCount INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (Day, ApplicationID, OverallStatus),
+            INDEX idx_rollup_exec_app (ApplicationID, OverallStatus)
+        )
+    """,
+    'rollup_assignments': """
+        CREATE TABLE IF NOT EXISTS rollup_assignments (
+            Priority VARCHAR(10) NOT NULL,
+            Status VARCHAR(50) NOT NULL,
+            AssignmentCount INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (Priority, Status)
+        )
+    """,
+    'rollup_meta': """
+        CREATE TABLE IF NOT EXISTS rollup_meta (
+            Name VARCHAR(50) PRIMARY KEY,
+            BuiltAt DATETIME NOT NULL
+        )
+    """,
+    'archived_executions': """
+        CREATE TABLE IF NOT EXISTS archived_executions (
+            ExecutionID INT PRIMARY KEY,
+            BundlePath VARCHAR(255) NOT NULL,   -- relative to the archive directory
+            StepResultCount INT NOT NULL,
+            ScreenshotCount INT NOT NULL,
+            ArchivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_archived_executions_bundle (BundlePath)
+        )
+    """,
+    'result_cache_entries': """
+        CREATE TABLE IF NOT EXISTS result_cache_entries (
+            ExecutionID INT PRIMARY KEY,
+            CacheKey CHAR(64) NOT NULL,         -- result_cache.build_cache_key
+            ExecutionTime DATETIME NOT NULL,
+            INDEX idx_result_cache_key_time (CacheKey, ExecutionTime)
+        )
+    """,
+    'shared_markers': """
+        CREATE TABLE IF NOT EXISTS shared_markers (
+            Name VARCHAR(100) PRIMARY KEY,      -- e.g. data_version, batch_control:<id>
+            Value VARCHAR(64) NOT NULL,
+            UpdatedAt DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+        )
+    """,
+}
+
+# (table, index name, columns, kind)
+HOT_QUERY_INDEXES = (
+    ('test_assignments', 'idx_ta_batch_status', ('BatchAssignmentID', 'Status'), 'INDEX'),
+    ('test_assignments', 'idx_ta_user_status_priority', ('AssignedToUserID', 'Status', 'Priority'), 'INDEX'),
+    ('testexecutions', 'idx_te_time_status', ('ExecutionTime', 'OverallStatus'), 'INDEX'),
+    ('stepresults', 'idx_sr_exec_step_end', ('ExecutionID', 'StepID', 'EndTime'), 'INDEX'),
+    ('steps', 'idx_steps_tc_order', ('TestCaseID', 'StepOrder'), 'INDEX'),
+)
+
+SEARCH_INDEXES = (
+    ('testcases', 'ft_testcases_search', ('Code', 'Name', 'Module', 'Description'), 'FULLTEXT'),
+    ('users', 'ft_users_username', ('Username',), 'FULLTEXT'),
+    ('batch_test_assignments', 'ft_batches_search', ('ReferenceName', 'Notes'), 'FULLTEXT'),
+    ('testexecutions', 'idx_te_time_id', ('ExecutionTime', 'ExecutionID'), 'INDEX'),
+    ('testexecutions', 'idx_te_executor_time_id', ('ExecutedBy', 'ExecutionTime', 'ExecutionID'), 'INDEX'),
+    ('batch_test_assignments', 'idx_bta_date_id', ('AssignmentDate', 'BatchAssignmentID'), 'INDEX'),
+)
+
+# (version, description, steps); a step is a DDL string or an index tuple
+MIGRATIONS = (
+    (1, 'App-managed tables', tuple(TABLE_DDL[table] for table in (
+        'api_tokens', 'api_idempotency_keys', 'runner_jobs', 'runner_job_output',
+        'rollup_executions_daily', 'rollup_assignments', 'rollup_meta'))),
+    (2, 'Composite indexes for the hot queries', HOT_QUERY_INDEXES),
+    (3, 'Full-text search and keyset paging indexes', SEARCH_INDEXES),
+    (4, 'Index of executions moved to cold storage', (TABLE_DDL['archived_executions'],)),
+    (5, 'Result cache lookup by key', (TABLE_DDL['result_cache_entries'], """
+        INSERT IGNORE INTO result_cache_entries (ExecutionID, CacheKey, ExecutionTime)
+        SELECT ExecutionID, JSON_UNQUOTE(JSON_EXTRACT(Parameters, '$.cache_key')), ExecutionTime
+        FROM testexecutions
+        WHERE OverallStatus = 'PASS' AND JSON_VALID(Parameters)
+          AND JSON_EXTRACT(Parameters, '$.cache_key') IS NOT NULL
+    """)),
+    (6, 'Markers shared by all hosts', (TABLE_DDL['shared_markers'],)),
+)
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            Version INT PRIMARY KEY,
+            Description VARCHAR(200) NOT NULL,
+            AppliedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def existing_indexes(cursor):
+    """{(table, index name)} of the current database; table names lower-cased."""
+    cursor.execute("""
+        SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    return {(table.lower(), index) for table, index in cursor.fetchall()}
+
+
+def add_missing_indexes(cursor, indexes):
+    """Adds the (table, name, columns, kind) indexes that don't exist yet. Returns the names added."""
+    existing = existing_indexes(cursor)
+    added = []
+    for table, index, columns, kind in indexes:
+        if (table, index) in existing:
+            continue
+        index_kind = 'FULLTEXT INDEX' if kind == 'FULLTEXT' else 'INDEX'
+        cursor.execute(f"ALTER TABLE {table} ADD {index_kind} {index} ({', '.join(columns)})")
+        added.append(index)
+    return added
+
+
+def applied_versions(conn):
+    """{version: applied at} of the migrations recorded in schema_migrations."""
+    cursor = conn.cursor()
+    try:
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT Version, AppliedAt FROM schema_migrations")
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def apply_migrations(conn, target=None, log=print):
+    """
+    Applies the pending migrations up to `target` (default: all) in version order and
+    returns the versions applied. DDL commits implicitly, so each migration is recorded
+    right after its last step; a failure raises mysql.connector.Error and leaves the
+    earlier migrations recorded.
+    """
+    done = applied_versions(conn)
+    applied = []
+    cursor = conn.cursor()
+    try:
+        for version, description, steps in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            log(f"Applying {version}: {description}")
+            for step in steps:
+                if isinstance(step, str):
+                    cursor.execute(step)
+                else:
+                    for index in add_missing_indexes(cursor, (step,)):
+                        log(f"  added index {index} on {step[0]}")
+            cursor.execute("INSERT INTO schema_migrations (Version, Description) VALUES (%s, %s)",
+                           (version, description))
+            conn.commit()
+            applied.append(version)
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return applied
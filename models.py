@@ -5,6 +5,19 @@ import mysql.connector
 from functools import wraps # For decorators
 import datetime # For default timestamps
 from collections import defaultdict
+import json
+import copy
+import hashlib
+import os
+import secrets
+import threading
+import time
+from result_cache import compute_steps_version
+from progress_version import bump_progress_version
+from query_cache import bump_data_version, read_data_version
+from db_pool import get_pool
+from migrations import TABLE_DDL
+from rollups import rollup_sources, count_assignments, set_assignment_status
 
 # --- Database Configuration ---
 DB_CONFIG = {
@@ -15,15 +28,38 @@ DB_CONFIG = {
     'autocommit': True # Important: This affects transaction handling
 }
 
+# Users loaded for Flask-Login are cached per process for this long. User.update,
+# activate, deactivate and delete drop the entry at once in the process that made the
+# change; other worker processes pick the change up when their entry expires, so a
+# deactivation takes effect everywhere within USER_CACHE_TTL_SECONDS.
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+
+# TestAssignment.get_statistics_cached serves the dashboard cards and the assignment
+# statistics endpoints from memory for this long, so frequent polling costs no queries.
+ASSIGNMENT_STATS_TTL_SECONDS = int(os.environ.get('ASSIGNMENT_STATS_TTL_SECONDS', '15'))
+
+# Rows per multi-row INSERT when a batch's test assignments are created in bulk; keeps
+# each statement well under max_allowed_packet.
+BULK_INSERT_ROWS = 500
+
+# An Idempotency-Key still "processing" after this long belongs to a request that died
+# (worker killed, connection lost) before recording its response; the next request with
+# the key takes it over instead of getting 409 forever.
+IDEMPOTENCY_PROCESSING_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_PROCESSING_TIMEOUT_SECONDS', '300'))
+
 def get_db_connection():
+    # Borrowed from the process-wide pool (db_pool.py); close() hands it back
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_pool(DB_CONFIG).connection()
         return conn
     except mysql.connector.Error as err:
         print(f"Database connection error in models: {err}")
         return None
 
 class User:
+    _cache = {}  # user_id -> (User, expires at); see USER_CACHE_TTL_SECONDS
+    _cache_lock = threading.Lock()
+
     def __init__(self, id, username, password_hash, role, is_active=True):
         self.id = id
         self.username = username
@@ -72,6 +108,33 @@ class User:
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def get_cached(user_id):
+        """User.get behind the per-process cache; used by the Flask-Login user loader."""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with User._cache_lock:
+            entry = User._cache.get(user_id)
+        if entry and entry[1] > now:
+            return copy.copy(entry[0])  # Requests get their own object; the cached one stays pristine
+        user = User.get(user_id)
+        if user and USER_CACHE_TTL_SECONDS > 0: # Misses and DB errors are not cached
+            with User._cache_lock:
+                if len(User._cache) >= 10000:
+                    User._cache = {uid: e for uid, e in User._cache.items() if e[1] > now}
+                User._cache[user_id] = (user, now + USER_CACHE_TTL_SECONDS)
+            return copy.copy(user)
+        return user
+
+    @staticmethod
+    def invalidate_cache(user_id=None):
+        """Drops one cached user, or all of them."""
+        with User._cache_lock:
+            if user_id is None:
+                User._cache.clear()
+            else:
+                User._cache.pop(int(user_id), None)
+
     @staticmethod
     def find_by_username(username):
         conn = None
@@ -177,6 +240,7 @@ class User:
             sql_query = f"UPDATE users SET {', '.join(sql_parts)} WHERE UserID = %s"
             cursor.execute(sql_query, tuple(params))
             # conn.commit()
+            User.invalidate_cache(user_id)
             return True, "User updated successfully."
         except mysql.connector.Error as db_err:
             # if conn and not DB_CONFIG.get('autocommit', False): conn.rollback()
@@ -214,6 +278,7 @@ class User:
 
             cursor.execute("UPDATE users SET IsActive = %s WHERE UserID = %s", (status, user_id))
             # conn.commit()
+            User.invalidate_cache(user_id)
             if cursor.rowcount == 0:
                 return False, "User not found or status already set."
             action = "activated" if status else "deactivated"
@@ -295,6 +360,7 @@ class User:
 
             cursor.execute("DELETE FROM users WHERE UserID = %s", (user_id_to_delete,))
             # conn.commit()
+            User.invalidate_cache(user_id_to_delete)
             if cursor.rowcount == 0:
                  return False, "User not found or could not be deleted."
             return True, "User deleted successfully."
@@ -383,6 +449,55 @@ class BatchTestAssignment:
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def create_with_assignments(assigned_to_user_id, assigned_by_user_id, assignment_type, reference_id,
+                                reference_name, test_case_ids, priority='MEDIUM', notes=None):
+        """
+        Creates the batch and one PENDING test assignment per test case in a single
+        transaction, with multi-row INSERTs of BULK_INSERT_ROWS rows, so either the
+        whole batch exists afterwards or nothing does. Returns the BatchAssignmentID,
+        or None on a database error (after rolling back).
+        """
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return None
+            cursor = conn.cursor()
+            conn.start_transaction()
+            cursor.execute("""
+                INSERT INTO batch_test_assignments
+                (AssignedToUserID, AssignedByUserID, AssignmentType, ReferenceID, ReferenceName,
+                 Priority, Notes, TotalTestCases, Status, AssignmentDate)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'PENDING', NOW())
+            """, (assigned_to_user_id, assigned_by_user_id, assignment_type,
+                  reference_id, reference_name, priority, notes, len(test_case_ids)))
+            batch_assignment_id = cursor.lastrowid
+            for start in range(0, len(test_case_ids), BULK_INSERT_ROWS):
+                chunk = test_case_ids[start:start + BULK_INSERT_ROWS]
+                values_sql = ', '.join(["(%s, %s, %s, %s, %s, %s, 'PENDING', NOW())"] * len(chunk))
+                params = []
+                for test_case_id in chunk:
+                    params.extend((test_case_id, assigned_to_user_id, assigned_by_user_id,
+                                   priority, notes, batch_assignment_id))
+                cursor.execute(f"""
+                    INSERT INTO test_assignments
+                    (TestCaseID, AssignedToUserID, AssignedByUserID, Priority, Notes, BatchAssignmentID, Status, AssignmentDate)
+                    VALUES {values_sql}
+                """, tuple(params))
+            count_assignments(cursor, "ta.BatchAssignmentID = %s", (batch_assignment_id,))
+            conn.commit()
+            bump_data_version()
+            return batch_assignment_id
+        except mysql.connector.Error as err:
+            print(f"DB error creating BatchTestAssignment with {len(test_case_ids)} assignments: {err}")
+            if conn and conn.is_connected() and conn.in_transaction:
+                conn.rollback()
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
     @staticmethod
     def get(batch_assignment_id):
         conn = None
@@ -403,6 +518,42 @@ class BatchTestAssignment:
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def get_with_assignments(batch_assignment_id):
+        """
+        The batch and the statuses of its test assignments in one query, for progress polling.
+        Returns (BatchTestAssignment, [{'AssignmentID', 'TestCaseID', 'Status', 'ExecutionID'}, ...])
+        or (None, []).
+        """
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return None, []
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT bta.*, ta.AssignmentID AS TA_AssignmentID, ta.TestCaseID AS TA_TestCaseID,
+                       ta.Status AS TA_Status, ta.ExecutionID AS TA_ExecutionID
+                FROM batch_test_assignments bta
+                LEFT JOIN test_assignments ta ON ta.BatchAssignmentID = bta.BatchAssignmentID
+                WHERE bta.BatchAssignmentID = %s
+                ORDER BY ta.AssignmentID
+            """, (batch_assignment_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                return None, []
+            batch = BatchTestAssignment(**{k: v for k, v in rows[0].items() if not k.startswith('TA_')})
+            assignments = [{'AssignmentID': row['TA_AssignmentID'], 'TestCaseID': row['TA_TestCaseID'],
+                            'Status': row['TA_Status'], 'ExecutionID': row['TA_ExecutionID']}
+                           for row in rows if row['TA_AssignmentID'] is not None]
+            return batch, assignments
+        except mysql.connector.Error as err:
+            print(f"DB error in BatchTestAssignment.get_with_assignments({batch_assignment_id}): {err}")
+            return None, []
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
     @staticmethod
     def get_for_tester(user_id, status_list=('PENDING', 'IN_PROGRESS')):
         conn = None
@@ -445,6 +596,8 @@ class BatchTestAssignment:
             cursor.execute("UPDATE batch_test_assignments SET Status = %s WHERE BatchAssignmentID = %s",
                            (status, batch_assignment_id))
             # conn.commit()
+            bump_progress_version(batch_assignment_id)
+            bump_data_version()
             return cursor.rowcount > 0
         except mysql.connector.Error as err:
             print(f"DB error updating BatchTestAssignment status: {err}")
@@ -453,6 +606,42 @@ class BatchTestAssignment:
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def start_run(batch_assignment_id):
+        """
+        Sets the batch IN_PROGRESS with its counters recounted from its test assignments:
+        batch_runner.py skips assignments that were already executed, so a re-run or a
+        resumed batch starts from exactly those.
+        """
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return False
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE batch_test_assignments bta
+                LEFT JOIN (
+                    SELECT BatchAssignmentID,
+                           SUM(Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL')) AS Completed,
+                           SUM(Status = 'EXECUTED_PASS') AS Passed
+                    FROM test_assignments WHERE BatchAssignmentID = %s GROUP BY BatchAssignmentID
+                ) ta ON ta.BatchAssignmentID = bta.BatchAssignmentID
+                SET bta.Status = 'IN_PROGRESS',
+                    bta.CompletedTestCases = COALESCE(ta.Completed, 0),
+                    bta.PassedTestCases = COALESCE(ta.Passed, 0)
+                WHERE bta.BatchAssignmentID = %s
+            """, (batch_assignment_id, batch_assignment_id))
+            bump_progress_version(batch_assignment_id)
+            bump_data_version()
+            return cursor.rowcount > 0
+        except mysql.connector.Error as err:
+            print(f"DB error starting BatchTestAssignment run: {err}")
+            return False
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
     @staticmethod
     def update_progress(batch_assignment_id, completed_increment=0, passed_increment=0):
         conn = None
@@ -470,6 +659,8 @@ class BatchTestAssignment:
             """
             cursor.execute(sql, (completed_increment, passed_increment, batch_assignment_id))
             # conn.commit()
+            bump_progress_version(batch_assignment_id)
+            bump_data_version()
             return cursor.rowcount > 0
         except mysql.connector.Error as err:
             print(f"DB error updating BatchTestAssignment progress: {err}")
@@ -703,6 +894,31 @@ class TestCaseModel: # Renamed to avoid conflict with table name if used directl
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def get_test_cases_by_ids(test_case_ids):
+        """Existing test cases among `test_case_ids`, in the order given. Unknown IDs are left out."""
+        conn = None
+        cursor = None
+        test_cases = []
+        if not test_case_ids:
+            return test_cases
+        try:
+            conn = get_db_connection()
+            if not conn: return test_cases
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ','.join(['%s'] * len(test_case_ids))
+            cursor.execute(f"SELECT TestCaseID, Code, Name FROM testcases WHERE TestCaseID IN ({placeholders})",
+                           tuple(test_case_ids))
+            found = {row['TestCaseID']: row for row in cursor.fetchall()}
+            test_cases = [found[tc_id] for tc_id in dict.fromkeys(test_case_ids) if tc_id in found]
+            return test_cases
+        except mysql.connector.Error as err:
+            print(f"DB error in TestCaseModel.get_test_cases_by_ids: {err}")
+            return test_cases
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
     @staticmethod
     def get_test_cases_for_application(app_id):
         conn = None
@@ -730,8 +946,95 @@ class TestCaseModel: # Renamed to avoid conflict with table name if used directl
             if cursor: cursor.close()
             if conn and conn.is_connected(): conn.close()
 
+    @staticmethod
+    def get_incremental_test_cases_for_application(app_id, max_test_cases=None, fill_with_stable=False):
+        """
+        Change-based selection for regression batches. A test case is selected when it
+        has never been executed, its last execution did not PASS, or it changed since
+        that execution (ModifiedAt is newer, or the steps content hash differs from the
+        one recorded by generic_runner.py). Each returned row carries a SelectionReason.
+
+        With fill_with_stable, remaining capacity up to max_test_cases is topped up with
+        stable cases, least recently executed first, so every stable case is covered in
+        rotation over successive runs. Required cases are never dropped to honour the cap.
+        """
+        conn = None
+        cursor = None
+        selected = []
+        try:
+            conn = get_db_connection()
+            if not conn: return selected
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT app_tc.TestCaseID, app_tc.Code, app_tc.Name, app_tc.ModifiedAt,
+                       te.ExecutionTime AS LastExecutionTime, te.OverallStatus AS LastOverallStatus,
+                       te.Parameters AS LastParameters
+                FROM (
+                    SELECT DISTINCT tc.TestCaseID, tc.Code, tc.Name, tc.ModifiedAt
+                    FROM testcases tc
+                    JOIN suitetestcases stc ON tc.TestCaseID = stc.TestCaseID
+                    JOIN testsuites ts ON stc.SuiteID = ts.SuiteID
+                    WHERE ts.AppType = %s
+                ) app_tc
+                LEFT JOIN (
+                    SELECT TestCaseID, MAX(ExecutionID) AS LastExecutionID
+                    FROM testexecutions
+                    WHERE OverallStatus <> 'NOT EXECUTED'
+                    GROUP BY TestCaseID
+                ) last_exec ON last_exec.TestCaseID = app_tc.TestCaseID
+                LEFT JOIN testexecutions te ON te.ExecutionID = last_exec.LastExecutionID
+                ORDER BY app_tc.Code
+            """, (app_id,))
+            candidates = cursor.fetchall()
+            if not candidates: return selected
+
+            test_case_ids = [row['TestCaseID'] for row in candidates]
+            placeholders = ', '.join(['%s'] * len(test_case_ids))
+            cursor.execute(f"""
+                SELECT TestCaseID, StepOrder, Input, ExpectedResponse, InputType, ParamName
+                FROM steps WHERE TestCaseID IN ({placeholders})
+            """, tuple(test_case_ids))
+            steps_by_tc = defaultdict(list)
+            for step in cursor.fetchall():
+                steps_by_tc[step['TestCaseID']].append(step)
+
+            stable = []
+            for row in candidates:
+                last_params = row.pop('LastParameters')
+                if row['LastExecutionTime'] is None:
+                    row['SelectionReason'] = 'NEVER_RUN'
+                elif row['LastOverallStatus'] != 'PASS':
+                    row['SelectionReason'] = 'FAILED'
+                elif row['ModifiedAt'] and row['ModifiedAt'] > row['LastExecutionTime']:
+                    row['SelectionReason'] = 'CHANGED'
+                else:
+                    try:
+                        last_steps_version = (json.loads(last_params) if last_params else {}).get('steps_version')
+                    except (json.JSONDecodeError, TypeError, AttributeError):
+                        last_steps_version = None
+                    if last_steps_version and last_steps_version != compute_steps_version(steps_by_tc[row['TestCaseID']]):
+                        row['SelectionReason'] = 'CHANGED'
+                    else:
+                        row['SelectionReason'] = 'STABLE'
+                (stable if row['SelectionReason'] == 'STABLE' else selected).append(row)
+
+            if fill_with_stable and max_test_cases and len(selected) < max_test_cases:
+                stable.sort(key=lambda r: r['LastExecutionTime'])
+                selected.extend(stable[:max_test_cases - len(selected)])
+            return selected
+        except mysql.connector.Error as err:
+            print(f"DB error in TestCaseModel.get_incremental_test_cases_for_application({app_id}): {err}")
+            return selected
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
 # --- Individual Test Assignment Model (enhancements might be needed) ---
 class TestAssignment: # Your existing single test assignment logic would go here or be enhanced
+    STATISTICS_BUCKETS = ('total', 'completed', 'passed', 'failed', 'in_progress', 'pending')
+    _stats_cache = None  # (stats, computed at epoch, expires at monotonic, data version); see ASSIGNMENT_STATS_TTL_SECONDS
+    _stats_lock = threading.Lock()
+
     @staticmethod
     def create_for_batch(test_case_id, assigned_to_user_id, assigned_by_user_id,
                          priority, notes, batch_assignment_id):
@@ -747,10 +1050,14 @@ class TestAssignment: # Your existing single test assignment logic would go here
                 (TestCaseID, AssignedToUserID, AssignedByUserID, Priority, Notes, BatchAssignmentID, Status, AssignmentDate)
                 VALUES (%s, %s, %s, %s, %s, %s, 'PENDING', NOW())
             """
+            conn.start_transaction() # The assignment and its rollup count land together
             cursor.execute(sql, (test_case_id, assigned_to_user_id, assigned_by_user_id,
                                   priority, notes, batch_assignment_id))
-            # conn.commit()
-            return cursor.lastrowid
+            assignment_id = cursor.lastrowid
+            count_assignments(cursor, "ta.AssignmentID = %s", (assignment_id,))
+            conn.commit()
+            bump_data_version()
+            return assignment_id
         except mysql.connector.Error as err:
             print(f"DB error creating individual TestAssignment for batch: {err}")
             return None
@@ -794,17 +1101,11 @@ class TestAssignment: # Your existing single test assignment logic would go here
             conn = get_db_connection()
             if not conn: return False
             cursor = conn.cursor()
-            sql = "UPDATE test_assignments SET Status = %s"
-            params = [status]
-            if execution_id:
-                sql += ", ExecutionID = %s"
-                params.append(execution_id)
-            sql += " WHERE AssignmentID = %s"
-            params.append(assignment_id)
-            
-            cursor.execute(sql, tuple(params))
-            # conn.commit()
-            return cursor.rowcount > 0
+            conn.start_transaction() # The status change and its rollup counts land together
+            updated = set_assignment_status(cursor, assignment_id, status, execution_id)
+            conn.commit()
+            bump_data_version()
+            return updated > 0
         except mysql.connector.Error as err:
             print(f"DB error updating TestAssignment status for ID {assignment_id}: {err}")
             return False
@@ -902,134 +1203,249 @@ class TestAssignment: # Your existing single test assignment logic would go here
                     if cursor: cursor.close()
                     if conn and conn.is_connected(): conn.close()
 
-    def count_all():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM test_assignments")
-        count_assigned = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM batch_test_assignments")
-        count_batch_assigned = cursor.fetchone()[0]
-        count = count_assigned + count_batch_assigned
-        conn.close()
-        return count
-
     @staticmethod
-    def count_completed():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query_assigned = """
-            SELECT COUNT(*) FROM test_assignments 
-            WHERE Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL')
+    def get_statistics():
         """
-        cursor.execute(query_assigned)
-        completed_assigned = cursor.fetchone()[0]
+        Assignment counts per bucket (total, completed, passed, failed, in_progress,
+        pending), individual and batch assignments combined, as a dict. One conditional
+        aggregation over the rollup_assignments summary (or the live table until it is
+        backfilled) and one over batch_test_assignments, on a single connection. None on
+        a database error.
+        """
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return None
+            _, assignments_source = rollup_sources(conn)
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT SUM(r.AssignmentCount) AS total,
+                       SUM(CASE WHEN r.Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL') THEN r.AssignmentCount ELSE 0 END) AS completed,
+                       SUM(CASE WHEN r.Status = 'EXECUTED_PASS' THEN r.AssignmentCount ELSE 0 END) AS passed,
+                       SUM(CASE WHEN r.Status = 'EXECUTED_FAIL' THEN r.AssignmentCount ELSE 0 END) AS failed,
+                       SUM(CASE WHEN r.Status = 'IN_PROGRESS' THEN r.AssignmentCount ELSE 0 END) AS in_progress,
+                       SUM(CASE WHEN r.Status = 'PENDING' THEN r.AssignmentCount ELSE 0 END) AS pending
+                FROM {assignments_source}
+            """)
+            individual = cursor.fetchone() or {}
+            cursor.execute("""
+                SELECT COUNT(*) AS total,
+                       SUM(CASE WHEN Status IN ('COMPLETED_PASS', 'COMPLETED_FAIL') THEN 1 ELSE 0 END) AS completed,
+                       SUM(CASE WHEN Status = 'COMPLETED_PASS' THEN 1 ELSE 0 END) AS passed,
+                       SUM(CASE WHEN Status = 'COMPLETED_FAIL' THEN 1 ELSE 0 END) AS failed,
+                       SUM(CASE WHEN Status = 'IN_PROGRESS' THEN 1 ELSE 0 END) AS in_progress,
+                       SUM(CASE WHEN Status = 'PENDING' THEN 1 ELSE 0 END) AS pending
+                FROM batch_test_assignments
+            """)
+            batch = cursor.fetchone() or {}
+            return {bucket: int(individual.get(bucket) or 0) + int(batch.get(bucket) or 0)
+                    for bucket in TestAssignment.STATISTICS_BUCKETS}
+        except mysql.connector.Error as err:
+            print(f"Error fetching assignment statistics: {err}")
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
-        query_batch_assigned = """
-            SELECT COUNT(*) FROM batch_test_assignments 
-            WHERE Status IN ('COMPLETED_PASS', 'COMPLETED_FAIL')
+    @staticmethod
+    def get_statistics_cached():
         """
+        get_statistics behind a per-process cache of ASSIGNMENT_STATS_TTL_SECONDS, for
+        the dashboard and the statistics endpoints; a data version bump (query_cache.py)
+        drops it early. Returns (stats, computed_at epoch).
+        """
+        now = time.monotonic()
+        data_version = read_data_version()
+        with TestAssignment._stats_lock:
+            entry = TestAssignment._stats_cache
+            if entry and entry[2] > now and entry[3] == data_version:
+                return dict(entry[0]), entry[1]
+            stats = TestAssignment.get_statistics()
+            if stats is None:
+                return None, None # Errors are not cached
+            computed_at = time.time()
+            TestAssignment._stats_cache = (stats, computed_at, now + ASSIGNMENT_STATS_TTL_SECONDS, data_version)
+            return dict(stats), computed_at
+
+
+class ApiToken:
+    """
+    Bearer tokens for the CI API. Only a SHA-256 hash of each token is stored; the
+    plain token is shown once, when it is created.
+    """
+    TOKEN_PREFIX = 'ussd_'
+    _table_ready = False
 
-        cursor.execute(query_batch_assigned)
-        completed_batch_assigned = cursor.fetchone()[0]
+    @staticmethod
+    def _ensure_table(cursor):
+        if ApiToken._table_ready:
+            return
+        cursor.execute(TABLE_DDL['api_tokens'])
+        ApiToken._table_ready = True
 
-        completed = completed_assigned + completed_batch_assigned
+    @staticmethod
+    def _hash(raw_token):
+        return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
 
-        conn.close()
-        return completed
+    @staticmethod
+    def create(user_id, name):
+        """Returns (token_id, plain token) or (None, None)."""
+        conn = None
+        cursor = None
+        raw_token = ApiToken.TOKEN_PREFIX + secrets.token_urlsafe(32)
+        try:
+            conn = get_db_connection()
+            if not conn: return None, None
+            cursor = conn.cursor()
+            ApiToken._ensure_table(cursor)
+            cursor.execute("INSERT INTO api_tokens (UserID, Name, TokenHash, TokenPrefix) VALUES (%s, %s, %s, %s)",
+                           (user_id, name, ApiToken._hash(raw_token), raw_token[:12]))
+            return cursor.lastrowid, raw_token
+        except mysql.connector.Error as err:
+            print(f"DB error creating API token for user {user_id}: {err}")
+            return None, None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
     @staticmethod
-    def count_pending():
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    def authenticate(raw_token):
+        """Returns {'TokenID', 'UserID'} for a valid, unrevoked token of an active user, else None."""
+        conn = None
+        cursor = None
+        if not raw_token or not raw_token.startswith(ApiToken.TOKEN_PREFIX):
+            return None
+        try:
+            conn = get_db_connection()
+            if not conn: return None
+            cursor = conn.cursor(dictionary=True)
+            ApiToken._ensure_table(cursor)
+            cursor.execute("""
+                SELECT t.TokenID, t.UserID
+                FROM api_tokens t
+                JOIN users u ON u.UserID = t.UserID
+                WHERE t.TokenHash = %s AND t.RevokedAt IS NULL AND u.IsActive = 1
+            """, (ApiToken._hash(raw_token),))
+            token = cursor.fetchone()
+            if token:
+                cursor.execute("UPDATE api_tokens SET LastUsedAt = NOW() WHERE TokenID = %s", (token['TokenID'],))
+            return token
+        except mysql.connector.Error as err:
+            print(f"DB error authenticating API token: {err}")
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
-        query_pending = """
-            SELECT COUNT(*) FROM test_assignments 
-            WHERE Status = 'PENDING'
-        """
-        cursor.execute(query_pending)
-        pending_assigned = cursor.fetchone()[0]
+    @staticmethod
+    def revoke(token_id):
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return False
+            cursor = conn.cursor()
+            ApiToken._ensure_table(cursor)
+            cursor.execute("UPDATE api_tokens SET RevokedAt = NOW() WHERE TokenID = %s AND RevokedAt IS NULL", (token_id,))
+            return cursor.rowcount > 0
+        except mysql.connector.Error as err:
+            print(f"DB error revoking API token {token_id}: {err}")
+            return False
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
-        query_batch_pending = """
-            SELECT COUNT(*) FROM batch_test_assignments 
-            WHERE Status = 'PENDING'
-        """
-        cursor.execute(query_batch_pending)
-        pending_batch_assigned = cursor.fetchone()[0]
 
-        pending = pending_assigned + pending_batch_assigned
-        
-        conn.close()
-        return pending
+class ApiIdempotencyKey:
+    """
+    Remembers the response to each (token, Idempotency-Key) pair so a retried CI call
+    gets the original answer instead of creating and launching a second batch.
+    """
+    _table_ready = False
 
     @staticmethod
-    def count_pass():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query_pass = """
-            SELECT COUNT(*) FROM test_assignments 
-            WHERE Status = 'EXECUTED_PASS'
-        """
-        cursor.execute(query_pass)
-        assigned_pass = cursor.fetchone()[0]
+    def _ensure_table(cursor):
+        if ApiIdempotencyKey._table_ready:
+            return
+        cursor.execute(TABLE_DDL['api_idempotency_keys'])
+        ApiIdempotencyKey._table_ready = True
 
-        query_batch_pass = """
-            SELECT COUNT(*) FROM batch_test_assignments 
-            WHERE Status = 'COMPLETED_PASS'
-        """
-        cursor.execute(query_batch_pass)
-        completed_batch_pass = cursor.fetchone()[0]
-
-        passtests = assigned_pass + completed_batch_pass
-        
-        conn.close()
-        return passtests
+    @staticmethod
+    def hash_request(payload):
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
 
     @staticmethod
-    def count_fail():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query_fail = """
-            SELECT COUNT(*) FROM test_assignments 
-            WHERE Status = 'EXECUTED_FAIL'
+    def reserve(token_id, key, request_hash):
         """
-        cursor.execute(query_fail)
-        assigned_fail = cursor.fetchone()[0]
-
-        query_batch_fail = """
-            SELECT COUNT(*) FROM batch_test_assignments 
-            WHERE Status = 'COMPLETED_FAIL'
+        Claims `key` for a new request. Returns None when the claim succeeded; otherwise
+        the existing row ({'RequestHash', 'ResponseStatus', 'ResponseBody'}), whose
+        ResponseStatus is None while the first request is still being processed. A claim
+        without a response older than IDEMPOTENCY_PROCESSING_TIMEOUT_SECONDS is taken over.
         """
-        cursor.execute(query_batch_fail)
-        completed_batch_fail = cursor.fetchone()[0]
-
-        failtests = assigned_fail + completed_batch_fail
-        
-        conn.close()
-        return failtests
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: raise mysql.connector.Error("No database connection.")
+            cursor = conn.cursor(dictionary=True)
+            ApiIdempotencyKey._ensure_table(cursor)
+            try:
+                cursor.execute("INSERT INTO api_idempotency_keys (TokenID, IdempotencyKey, RequestHash) VALUES (%s, %s, %s)",
+                               (token_id, key, request_hash))
+                return None
+            except mysql.connector.IntegrityError:
+                cursor.execute("""
+                    UPDATE api_idempotency_keys SET RequestHash = %s, CreatedAt = NOW()
+                    WHERE TokenID = %s AND IdempotencyKey = %s AND ResponseStatus IS NULL
+                      AND CreatedAt < NOW() - INTERVAL %s SECOND
+                """, (request_hash, token_id, key, IDEMPOTENCY_PROCESSING_TIMEOUT_SECONDS))
+                if cursor.rowcount > 0:
+                    return None  # Stale claim of an interrupted request
+                cursor.execute("""
+                    SELECT RequestHash, ResponseStatus, ResponseBody FROM api_idempotency_keys
+                    WHERE TokenID = %s AND IdempotencyKey = %s
+                """, (token_id, key))
+                return cursor.fetchone()
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
-    
     @staticmethod
-    def count_inprogress():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query_inprogress = """
-            SELECT COUNT(*) FROM test_assignments 
-            WHERE Status = 'IN_PROGRESS'
-        """
-        cursor.execute(query_inprogress)
-        assigned_inprogress = cursor.fetchone()[0]
-
-        query_batch_inprogress = """
-            SELECT COUNT(*) FROM batch_test_assignments 
-            WHERE Status = 'IN_PROGRESS'
-        """
-        cursor.execute(query_batch_inprogress)
-        completed_batch_inprogress = cursor.fetchone()[0]
+    def complete(token_id, key, status_code, body):
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return False
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE api_idempotency_keys SET ResponseStatus = %s, ResponseBody = %s
+                WHERE TokenID = %s AND IdempotencyKey = %s
+            """, (status_code, json.dumps(body, default=str), token_id, key))
+            return cursor.rowcount > 0
+        except mysql.connector.Error as err:
+            print(f"DB error storing idempotent response for key {key}: {err}")
+            return False
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
 
-        inprogresstests = assigned_inprogress + completed_batch_inprogress
-        
-        conn.close()
-        return inprogresstests
\ No newline at end of file
+    @staticmethod
+    def release(token_id, key):
+        """Forgets a key whose request failed before doing anything, so the client can retry it."""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            if not conn: return False
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM api_idempotency_keys WHERE TokenID = %s AND IdempotencyKey = %s AND ResponseStatus IS NULL",
+                           (token_id, key))
+            return cursor.rowcount > 0
+        except mysql.connector.Error as err:
+            print(f"DB error releasing idempotency key {key}: {err}")
+            return False
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
@@ -0,0 +1,20 @@
+# progress_version.py
+#
+# Change marker per batch; bumped after every progress commit and used in get_batch_progress's ETag.
+from shared_markers import bump_marker, read_marker
+
+
+def _version_marker(batch_assignment_id):
+    return f'batch_progress:{int(batch_assignment_id)}'
+
+
+def bump_progress_version(batch_assignment_id):
+    """Marks the batch's progress as changed. Never raises; a failed bump only costs a full poll later."""
+    if not batch_assignment_id:
+        return
+    bump_marker(_version_marker(batch_assignment_id))
+
+
+def read_progress_version(batch_assignment_id, cached=False):
+    """Current marker, or None if the batch was never bumped (pollers then always get a full response)."""
+    return read_marker(_version_marker(batch_assignment_id), cached=cached)
@@ -0,0 +1,78 @@
+# query_cache.py
+#
+# Per-process LRU of dashboard query results, keyed by the shared data version and bounded by a TTL.
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from shared_markers import bump_marker, read_marker
+
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get('QUERY_CACHE_TTL_SECONDS', '300'))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '256'))
+
+DATA_VERSION_MARKER = 'data_version'
+
+
+def bump_data_version():
+    """Marks the dashboard data as changed. Never raises; a failed bump only leaves results cached until their TTL."""
+    bump_marker(DATA_VERSION_MARKER)
+
+
+def read_data_version():
+    """Current data version, or '' if nothing was bumped yet."""
+    return read_marker(DATA_VERSION_MARKER, cached=True) or ''
+
+
+class QueryCache:
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (data version, key) -> (result, expires at), most recently used last
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get_or_load(self, key, loader):
+        """
+        The cached result for `key` under the current data version, else loader()'s.
+        Exceptions from loader propagate and nothing is cached. Callers get a copy, so
+        they may modify what they receive.
+        """
+        if self.ttl_seconds <= 0:
+            return loader()
+        cache_key = (read_data_version(), key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(cache_key)
+                self._stats['hits'] += 1
+                return copy.deepcopy(entry[0])
+            if entry:
+                del self._entries[cache_key]
+                self._stats['expired'] += 1
+            self._stats['misses'] += 1
+        result = loader()
+        with self._lock:
+            self._entries[cache_key] = (copy.deepcopy(result), now + self.ttl_seconds)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # Least recently used, typically an old data version
+                self._stats['evictions'] += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), max_entries=self.max_entries, ttl_seconds=self.ttl_seconds)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+query_cache = QueryCache()
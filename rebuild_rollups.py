@@ -0,0 +1,24 @@
+# rebuild_rollups.py
+#
+# Recomputes the dashboard rollup tables (see rollups.py) from testexecutions and
+# test_assignments. Run it after bulk imports or manual data fixes, or whenever the
+# dashboard figures look off; it is safe to run while the app is up.
+#
+#   python rebuild_rollups.py
+import sys
+
+from models import get_db_connection
+from rollups import rebuild_rollups
+
+if __name__ == '__main__':
+    conn = get_db_connection()
+    if not conn:
+        print("Failed to connect to the database; see the error above.")
+        sys.exit(1)
+    try:
+        if not rebuild_rollups(conn):
+            print("Another rebuild is in progress; try again later.")
+            sys.exit(1)
+    finally:
+        conn.close()
+    print("Rollup tables rebuilt.")
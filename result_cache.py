@@ -0,0 +1,124 @@
+# result_cache.py
+#
+# Opt-in reuse of recent PASS executions whose test case, inputs, build and device class all match.
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+RESULT_CACHE_TTL_ENV = 'RESULT_CACHE_TTL_MINUTES'  # Set (> 0) by the web app to enable the cache for a batch
+BUILD_TAG_ENV = 'BUILD_TAG'  # Optional app/build identifier supplied with the batch
+NO_BUILD_TAG = 'UNSPECIFIED'
+
+STEP_VERSION_COLUMNS = ('StepOrder', 'Input', 'ExpectedResponse', 'InputType', 'ParamName')
+
+
+def get_cache_ttl_minutes():
+    """Returns the TTL from the environment, or 0 when the cache is disabled."""
+    try:
+        return max(0, int(os.environ.get(RESULT_CACHE_TTL_ENV, '0')))
+    except ValueError:
+        return 0
+
+
+def get_build_tag():
+    return (os.environ.get(BUILD_TAG_ENV) or '').strip() or NO_BUILD_TAG
+
+
+def get_device_class(android_version):
+    """Devices are grouped by Android major version, e.g. '13.0.1' -> 'android-13'."""
+    major = str(android_version or '').strip().split('.')[0]
+    return f"android-{major or 'unknown'}"
+
+
+def compute_steps_version(step_rows):
+    """
+    Content hash of a test case's steps. Any edit to an input, expected response
+    or dynamic parameter mapping produces a new version.
+    """
+    normalized = [
+        [str(row.get(col) if row.get(col) is not None else '') for col in STEP_VERSION_COLUMNS]
+        for row in sorted(step_rows, key=lambda r: r['StepOrder'])
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode('utf-8')).hexdigest()[:16]
+
+
+def resolve_step_params(step_rows, dynamic_params):
+    """Only the dynamic params actually consumed by the steps take part in the key."""
+    resolved = {}
+    for row in step_rows:
+        param_name = row.get('ParamName')
+        if row.get('InputType') == 'dynamic' and param_name and param_name in dynamic_params:
+            resolved[param_name] = dynamic_params[param_name]
+    return resolved
+
+
+def build_cache_key(test_case_id, steps_version, resolved_params, build_tag, device_class):
+    key_material = json.dumps({
+        'tc': int(test_case_id),
+        'steps': steps_version,
+        'params': resolved_params,
+        'build': build_tag,
+        'device_class': device_class,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+def find_cached_pass_execution(cursor, test_case_id, cache_key, ttl_minutes):
+    """
+    Returns {'ExecutionID', 'ExecutionTime'} of the newest PASS execution with the same
+    cache key inside the TTL window, or None. `cursor` must be a dictionary cursor.
+    """
+    if ttl_minutes <= 0:
+        return None
+    not_before = datetime.now() - timedelta(minutes=ttl_minutes)
+    try:
+        cursor.execute("""
+            SELECT rc.ExecutionID, rc.ExecutionTime
+            FROM result_cache_entries rc
+            JOIN testexecutions te ON te.ExecutionID = rc.ExecutionID
+            WHERE rc.CacheKey = %s AND rc.ExecutionTime >= %s
+              AND te.TestCaseID = %s AND te.OverallStatus = 'PASS'
+            ORDER BY rc.ExecutionTime DESC
+            LIMIT 1
+        """, (cache_key, not_before, test_case_id))
+    except mysql.connector.Error as err:
+        if err.errno == 1146:  # ER_NO_SUCH_TABLE: migration 5 not applied yet, nothing cached
+            return None
+        raise
+    row = cursor.fetchone()
+    return {'ExecutionID': row['ExecutionID'], 'ExecutionTime': row['ExecutionTime']} if row else None
+
+
+def record_pass_execution(cursor, execution_id, cache_key, execution_time):
+    """
+    Makes a PASS execution findable by find_cached_pass_execution; call in the
+    transaction that sets the PASS. Returns False if result_cache_entries is missing.
+    """
+    try:
+        cursor.execute("""
+            INSERT IGNORE INTO result_cache_entries (ExecutionID, CacheKey, ExecutionTime)
+            VALUES (%s, %s, %s)
+        """, (execution_id, cache_key, execution_time))
+    except mysql.connector.Error as err:
+        if err.errno == 1146:
+            return False
+        raise
+    return True
+
+
+def is_cached_link(parameters, assignment_id):
+    """
+    True when an execution linked to `assignment_id` was originally recorded for a
+    different assignment, i.e. the link was satisfied from the result cache.
+    """
+    if isinstance(parameters, str):
+        try:
+            parameters = json.loads(parameters)
+        except json.JSONDecodeError:
+            return False
+    if not isinstance(parameters, dict) or 'cache_key' not in parameters:
+        return False
+    return parameters.get('assignment_id') != assignment_id
@@ -0,0 +1,148 @@
+# rollups.py
+#
+# Dashboard summary tables, kept equal to a GROUP BY over the live tables by the code that writes them.
+import mysql.connector
+
+from migrations import TABLE_DDL
+
+REBUILD_LOCK_NAME = 'rollups_rebuild'
+REBUILD_LOCK_TIMEOUT_SECONDS = 60
+
+_tables_ready = False
+_built = False
+
+# The same figures straight from the live tables, for databases whose rollups haven't been
+# backfilled yet (see rollup_sources). Aliased r, like the rollup tables in the dashboard queries.
+LIVE_EXECUTIONS_DAILY = """(
+    SELECT DATE(te.ExecutionTime) AS Day, COALESCE(ts.AppType, 0) AS ApplicationID,
+           te.OverallStatus, COUNT(*) AS ExecutionCount
+    FROM testexecutions te
+    LEFT JOIN testcases tc ON te.TestCaseID = tc.TestCaseID
+    LEFT JOIN testsuites ts ON tc.Module_id = ts.SuiteID
+    GROUP BY DATE(te.ExecutionTime), COALESCE(ts.AppType, 0), te.OverallStatus
+) r"""
+LIVE_ASSIGNMENTS = """(
+    SELECT COALESCE(ta.Priority, 'MEDIUM') AS Priority, ta.Status, COUNT(*) AS AssignmentCount
+    FROM test_assignments ta
+    GROUP BY COALESCE(ta.Priority, 'MEDIUM'), ta.Status
+) r"""
+
+
+def ensure_rollup_tables(conn):
+    """
+    Creates the rollup tables once per process, for the command-line tools (normally
+    migration 1 already did). DDL commits implicitly, so call it before a transaction.
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+    cursor = conn.cursor()
+    try:
+        for table in ('rollup_executions_daily', 'rollup_assignments', 'rollup_meta'):
+            cursor.execute(TABLE_DDL[table])
+        _tables_ready = True
+    finally:
+        cursor.close()
+
+
+# Writers call these with sign=-1 for the affected rows before changing or deleting them and
+# with sign=+1 after inserting or changing them, in the same transaction.
+def count_executions(cursor, where_sql, params, sign=1):
+    """Adds (sign=1) or removes (sign=-1) the testexecutions rows matching `where_sql` (alias te) to/from the daily rollup."""
+    cursor.execute(f"""
+        INSERT INTO rollup_executions_daily (Day, ApplicationID, OverallStatus, ExecutionCount)
+        SELECT DATE(te.ExecutionTime), COALESCE(ts.AppType, 0), te.OverallStatus, %s * COUNT(*)
+        FROM testexecutions te
+        LEFT JOIN testcases tc ON te.TestCaseID = tc.TestCaseID
+        LEFT JOIN testsuites ts ON tc.Module_id = ts.SuiteID
+        WHERE {where_sql}
+        GROUP BY DATE(te.ExecutionTime), COALESCE(ts.AppType, 0), te.OverallStatus
+        ON DUPLICATE KEY UPDATE ExecutionCount = ExecutionCount + VALUES(ExecutionCount)
+    """, (sign,) + tuple(params))
+
+
+def count_assignments(cursor, where_sql, params, sign=1):
+    """Adds (sign=1) or removes (sign=-1) the test_assignments rows matching `where_sql` (alias ta) to/from the rollup."""
+    cursor.execute(f"""
+        INSERT INTO rollup_assignments (Priority, Status, AssignmentCount)
+        SELECT COALESCE(ta.Priority, 'MEDIUM'), ta.Status, %s * COUNT(*)
+        FROM test_assignments ta
+        WHERE {where_sql}
+        GROUP BY COALESCE(ta.Priority, 'MEDIUM'), ta.Status
+        ON DUPLICATE KEY UPDATE AssignmentCount = AssignmentCount + VALUES(AssignmentCount)
+    """, (sign,) + tuple(params))
+
+
+def set_assignment_status(cursor, assignment_id, status, execution_id=None, extra_where='', extra_params=()):
+    """
+    UPDATE of one assignment's Status (and ExecutionID) that keeps rollup_assignments in
+    step. Run it inside the caller's transaction; returns the number of rows updated.
+    """
+    where_sql = "ta.AssignmentID = %s" + extra_where
+    params = (assignment_id,) + tuple(extra_params)
+    count_assignments(cursor, where_sql, params, sign=-1)
+    if execution_id:
+        cursor.execute(f"UPDATE test_assignments ta SET ta.Status = %s, ta.ExecutionID = %s WHERE {where_sql}",
+                       (status, execution_id) + params)
+    else:
+        cursor.execute(f"UPDATE test_assignments ta SET ta.Status = %s WHERE {where_sql}", (status,) + params)
+    updated = cursor.rowcount
+    count_assignments(cursor, where_sql, params, sign=1)
+    return updated
+
+
+def rebuild_rollups(conn):
+    """Recomputes every rollup from the live tables in one transaction. Returns False if another rebuild holds the lock."""
+    global _built
+    ensure_rollup_tables(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (REBUILD_LOCK_NAME, REBUILD_LOCK_TIMEOUT_SECONDS))
+        if cursor.fetchone()[0] != 1:
+            return False
+        try:
+            conn.start_transaction()
+            cursor.execute("DELETE FROM rollup_executions_daily")
+            count_executions(cursor, "1 = 1", ())
+            cursor.execute("DELETE FROM rollup_assignments")
+            count_assignments(cursor, "1 = 1", ())
+            cursor.execute("REPLACE INTO rollup_meta (Name, BuiltAt) VALUES ('rollups', NOW())")
+            conn.commit()
+            _built = True
+            return True
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (REBUILD_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def rollups_built(conn):
+    """True once rebuild_rollups has backfilled the tables (remembered for the process)."""
+    global _built
+    if _built:
+        return True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT BuiltAt FROM rollup_meta WHERE Name = 'rollups'")
+        _built = cursor.fetchone() is not None
+    except mysql.connector.Error as err:
+        if err.errno != 1146: # ER_NO_SUCH_TABLE: migrations not applied yet
+            raise
+    finally:
+        cursor.close()
+    return _built
+
+
+def rollup_sources(conn):
+    """
+    (executions, assignments) table expressions, aliased r, for the dashboard queries:
+    the rollup tables once built, otherwise the equivalent aggregates over the live
+    tables. The backfill itself only runs from migrate.py or rebuild_rollups.py.
+    """
+    if rollups_built(conn):
+        return 'rollup_executions_daily r', 'rollup_assignments r'
+    return LIVE_EXECUTIONS_DAILY, LIVE_ASSIGNMENTS
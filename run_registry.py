@@ -0,0 +1,153 @@
+# run_registry.py
+#
+# In-process registry of runner jobs by run ID and device serial; a device is refused only while it has an active job.
+import threading
+import uuid
+from datetime import datetime
+
+MAX_FINISHED_RUNS = 100  # Finished runs kept for late pollers before they are pruned
+
+RUN_QUEUED = 'QUEUED'        # Waiting for another job to release the device
+RUN_RUNNING = 'RUNNING'
+RUN_FINISHED = 'FINISHED'
+RUN_CANCELLED = 'CANCELLED'  # Cancelled before or while running
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:16]
+
+
+class DeviceBusyError(Exception):
+    def __init__(self, device_id, run_id):
+        super().__init__(f"Device {device_id} is already running test run {run_id}.")
+        self.device_id = device_id
+        self.run_id = run_id
+
+
+class TestRun:
+    def __init__(self, run_id, device_id, user_id, assignment_id=None, batch_assignment_id=None, kind='test'):
+        self.run_id = run_id
+        self.kind = kind  # 'test' (generic_runner.py) or 'batch' (batch_runner.py)
+        self.device_id = device_id
+        self.user_id = user_id
+        self.assignment_id = assignment_id
+        self.batch_assignment_id = batch_assignment_id
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.state = RUN_QUEUED
+        self.running = True  # Queued or running; the device is taken either way
+        self.report_path = None
+        self.exit_code = None
+        self.output_buffer = None
+        self.process = None
+        self.thread = None
+        self.args = []  # Runner arguments and extra environment, kept so a paused batch can be resumed
+        self.env = {}
+        self.cancel_requested = False
+        self.post_run_done = False  # Batch bookkeeping after the run happens exactly once
+        self.lock = threading.Lock()  # Per-run; guards post-run bookkeeping
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'job_id': self.run_id,
+            'kind': self.kind,
+            'state': self.state,
+            'running': self.running,
+            'device_id': self.device_id,
+            'user_id': self.user_id,
+            'assignment_id': self.assignment_id,
+            'batch_assignment_id': self.batch_assignment_id,
+            'report_path': self.report_path,
+            'exit_code': self.exit_code,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'output_id': self.output_buffer.run_id if self.output_buffer else None,
+        }
+
+
+class RunRegistry:
+    def __init__(self, max_finished_runs=MAX_FINISHED_RUNS):
+        self.max_finished_runs = max_finished_runs
+        self._runs = {}            # run_id -> TestRun
+        self._active_by_device = {}  # device serial -> run_id
+        self._lock = threading.Lock()
+
+    def start(self, device_id, user_id, assignment_id=None, batch_assignment_id=None, kind='test', allow_busy=False,
+              run_id=None):
+        """
+        Registers a new run for `device_id`. Raises DeviceBusyError if the device is in use,
+        unless `allow_busy` is set (a job queued behind the current one, e.g. pre-emption).
+        `run_id` is generated unless the caller has already reserved one (see shared_run_store.py).
+        """
+        with self._lock:
+            active_run_id = self._active_by_device.get(device_id)
+            if active_run_id and self._runs[active_run_id].running and not allow_busy:
+                raise DeviceBusyError(device_id, active_run_id)
+            run_id = run_id or new_run_id()
+            run = TestRun(run_id, device_id, user_id, assignment_id, batch_assignment_id, kind)
+            self._runs[run_id] = run
+            self._active_by_device[device_id] = run_id
+            return run
+
+    def get(self, run_id):
+        return self._runs.get(run_id)
+
+    def active_run_for_device(self, device_id):
+        run = self._runs.get(self._active_by_device.get(device_id))
+        return run if run and run.running else None
+
+    def find(self, device_id=None, batch_assignment_id=None, user_id=None, kind=None, active_only=False):
+        """Runs matching every given filter, newest first."""
+        runs = [run for run in list(self._runs.values())
+                if (device_id is None or run.device_id == device_id)
+                and (batch_assignment_id is None or run.batch_assignment_id == batch_assignment_id)
+                and (user_id is None or run.user_id == user_id)
+                and (kind is None or run.kind == kind)
+                and (not active_only or run.running)]
+        return sorted(runs, key=lambda run: run.started_at, reverse=True)
+
+    def latest_for_user(self, user_id):
+        """Most recently started run of a user; for clients that do not send a run ID."""
+        runs = self.find(user_id=user_id, kind='test')
+        return runs[0] if runs else None
+
+    def finish(self, run_id, report_path, exit_code=None, state=RUN_FINISHED):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if not run:
+                return
+            run.report_path = report_path
+            run.exit_code = exit_code
+            run.process = None
+            run.thread = None
+            run.finished_at = datetime.now()
+            run.state = state
+            run.running = False
+            if self._active_by_device.get(run.device_id) == run_id:
+                # A job queued behind this one takes the device over
+                queued = [r for r in self._runs.values() if r.device_id == run.device_id and r.running]
+                if queued:
+                    self._active_by_device[run.device_id] = max(queued, key=lambda r: r.started_at).run_id
+                else:
+                    del self._active_by_device[run.device_id]
+        run.done.set()
+
+    def claim_post_run(self, run_id):
+        """True exactly once per finished run; the caller then does the post-run bookkeeping."""
+        run = self._runs.get(run_id)
+        if not run or run.running:
+            return False
+        with run.lock:
+            if run.post_run_done:
+                return False
+            run.post_run_done = True
+            return True
+
+    def prune(self):
+        """Drops the oldest finished runs beyond max_finished_runs."""
+        with self._lock:
+            finished = sorted((run for run in self._runs.values() if not run.running),
+                              key=lambda run: run.finished_at)
+            for run in finished[:max(0, len(finished) - self.max_finished_runs)]:
+                del self._runs[run.run_id]
@@ -1,7 +1,7 @@
 # --- Existing Imports ---
 from collections import defaultdict
 from flask import (Flask, render_template, request, jsonify, Response,
-                   redirect, url_for, flash, session, send_file)
+                   redirect, url_for, flash, session, send_file, g)
 import subprocess
 import os
 import math
@@ -10,6 +10,8 @@ import time
 import json
 import sys
 import io
+import secrets
+import tempfile
 from flask_cors import CORS
 import mysql.connector
 import logging # For better logging
@@ -22,8 +24,8 @@ from flask_login import (LoginManager, login_user, logout_user,
 from android_helper import get_android_version, get_connected_device
 
 # --- MODEL IMPORTS ---
-from models import (User, BatchTestAssignment, CustomTestGroup, TestCaseModel, TestAssignment,
-                    get_db_connection as get_db_conn_from_models) # Use this for new DB interactions
+from models import (User, BatchTestAssignment, CustomTestGroup, TestCaseModel, TestAssignment, ApiIdempotencyKey,
+                    ASSIGNMENT_STATS_TTL_SECONDS, get_db_connection as get_db_conn_from_models) # Use this for new DB interactions
 
 # --- FORM IMPORTS ---
 # Assuming you will create these new forms or adapt existing ones
@@ -31,7 +33,21 @@ from forms import (LoginForm, CreateUserForm, AssignTestCaseForm, EditUserForm,
                    AssignSuiteForm, AssignApplicationForm, AssignCustomGroupForm, # NEW Forms
                    CreateEditCustomGroupForm) # NEW Form
 
-from decorators import admin_required, manager_required, tester_required, manager_or_admin_required
+from decorators import admin_required, manager_required, tester_required, manager_or_admin_required, api_token_required
+from result_cache import RESULT_CACHE_TTL_ENV, BUILD_TAG_ENV, is_cached_link
+from batch_control import CONTROL_PAUSE, CONTROL_CANCEL, request_control, read_control, clear_control
+from progress_version import read_progress_version
+from db_pool import get_pool, pool_metrics
+from rollups import rollup_sources, count_executions, count_assignments
+from query_cache import query_cache, bump_data_version
+from catalog import get_catalog, bump_catalog_version
+from search_index import (fulltext_ready, boolean_query, encode_cursor, decode_cursor,
+                          TESTCASE_MATCH, USER_MATCH, BATCH_MATCH)
+from testcase_import import (TestCaseImporter, IMPORT_CHUNK_TEST_CASES, write_import_status, read_import_status,
+                             SUPPORTED_EXTENSIONS as SUPPORTED_IMPORT_EXTENSIONS)
+from execution_archive import find_archived_execution, load_archived_steps, read_archived_file
+from run_registry import DeviceBusyError
+from executor_client import get_executor, ExecutorUnavailable
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -70,10 +86,6 @@ app.logger.setLevel(logging.INFO)
 
 
 
-batch_test_processes = {}
-batch_state_lock = threading.Lock()
-
-
 # --- Flask-Login Setup ---
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -83,20 +95,52 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(int(user_id))
-
-# --- Global State for Test Run (from your existing code) ---
-test_status = {
-    'running': False,
-    'output_file': None,
-    'final_output': '',
-    'report_path': None,
-    'process': None,
-    'thread': None,
-    'current_assignment_id': None, # To track which individual assignment is running
-    'current_batch_assignment_id': None # To track if it's part of a batch
-}
-state_lock = threading.Lock()
+    # Cached per process with a short TTL (models.USER_CACHE_TTL_SECONDS); admin changes invalidate it
+    return User.get_cached(int(user_id))
+
+# --- Runner jobs ---
+# Ad-hoc test runs and batch runs are executed by a JobExecutor (see job_executor.py).
+# With EXECUTOR_URL set it is the standalone executor_service.py and these routes are
+# thin clients, so web workers can be restarted or scaled out without touching running
+# tests; otherwise jobs run inside this process.
+executor = get_executor(logger=app.logger)
+
+
+@app.errorhandler(ExecutorUnavailable)
+def handle_executor_unavailable(e):
+    app.logger.error(str(e))
+    return jsonify({'status': 'error', 'message': 'The test execution service is unavailable. Please try again shortly.'}), 503
+
+
+def _latest_batch_job(batch_assignment_id):
+    """Most recent runner job of a batch (status dict), or None."""
+    jobs = executor.list_jobs(batch_assignment_id=batch_assignment_id, kind='batch')
+    return jobs[0] if jobs else None
+
+
+SSE_POLL_SECONDS = 0.5         # How often a stream checks for new runner output
+SSE_KEEPALIVE_SECONDS = 15     # Comment line sent on idle streams so proxies keep them open
+SSE_PROGRESS_REFRESH_SECONDS = 10 # Batch counters are re-read on new output, or at least this often
+SSE_STORE_POLL_SECONDS = 2     # Jobs of other workers: shared store reads at most this often between progress changes
+
+
+def sse_event(event, data, event_id=None):
+    """Formats one Server-Sent Event; `data` is sent as a single JSON line."""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(generator):
+    return Response(generator, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def get_last_event_id():
+    """EventSource sends Last-Event-ID when it reconnects; a first connection may pass it as a query arg."""
+    return request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or ''
+
 
 # --- Database Configuration (from your existing code or models.py) ---
 DB_CONFIG = {
@@ -108,12 +152,13 @@ DB_CONFIG = {
 
 def get_db_connection(): # Your existing function for older parts of code
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_pool(DB_CONFIG).connection() # Pooled; close() returns it (db_pool.py)
         return conn
     except mysql.connector.Error as err:
         app.logger.error(f"Original get_db_connection error: {err}")
         raise
 
+
 # --- USER ACTIVATION/DEACTIVATION (Existing) ---
 @app.route('/admin/users/deactivate/<int:user_id>', methods=['POST'])
 @login_required
@@ -226,156 +271,19 @@ def admin_dashboard():
 
     user_name = current_user.username
     total_users = User.count_all()  # Count all users in the table
-    total_tests = TestAssignment.count_all()
-    completed_tests = TestAssignment.count_completed()
-    pass_tests = TestAssignment.count_pass()
-    fail_tests = TestAssignment.count_fail()
-    inprogress_tests = TestAssignment.count_inprogress()
-    pending_tests = TestAssignment.count_pending()
-
-    completed_percent = 0
-    if total_tests > 0:
-        completed_percent = round((completed_tests / total_tests) * 100)
+    assignment_stats, _ = TestAssignment.get_statistics_cached()
+    assignment_stats = assignment_stats or dict.fromkeys(TestAssignment.STATISTICS_BUCKETS, 0)
+    total_tests = assignment_stats['total']
+    pass_tests = assignment_stats['passed']
+    fail_tests = assignment_stats['failed']
+    inprogress_tests = assignment_stats['in_progress']
+    pending_tests = assignment_stats['pending']
+    completed_percent = _completed_percent(assignment_stats)
 
     stats = {}
 
     try:
-        query_total_tests = "SELECT COUNT(TestCaseID) as count FROM testcases;"
-        result_total_tests = execute_sql_query(query_total_tests, fetch_one=True)
-        stats['total_tests'] = result_total_tests['count'] if result_total_tests and result_total_tests['count'] is not None else 0
-
-        # 2. Total Executions
-        query_adhoc_executions = "SELECT COUNT(ExecutionID) as count FROM testexecutions;"
-        result_adhoc = execute_sql_query(query_adhoc_executions, fetch_one=True)
-        adhoc_exec_count = result_adhoc['count'] if result_adhoc and result_adhoc['count'] is not None else 0
-        adhoc_exec_count = int(adhoc_exec_count) if adhoc_exec_count is not None else 0
-
-        query_batch_tc_executions = "SELECT SUM(CompletedTestCases) as sum_completed FROM batch_test_assignments WHERE Status LIKE 'COMPLETED_%';"
-        result_batch_tc = execute_sql_query(query_batch_tc_executions, fetch_one=True)
-        batch_tc_exec_count = result_batch_tc['sum_completed'] if result_batch_tc and result_batch_tc['sum_completed'] is not None else 0
-        batch_tc_exec_count = int(batch_tc_exec_count) if batch_tc_exec_count is not None else 0
-        stats['total_executions'] = adhoc_exec_count + batch_tc_exec_count
-
-        # 3. Passed Executions
-        query_adhoc_passed = "SELECT COUNT(ExecutionID) as count FROM testexecutions WHERE OverallStatus = 'PASS';"
-        result_adhoc_passed = execute_sql_query(query_adhoc_passed, fetch_one=True)
-        adhoc_passed_count = result_adhoc_passed['count'] if result_adhoc_passed and result_adhoc_passed['count'] is not None else 0
-        adhoc_passed_count = int(adhoc_passed_count) if adhoc_passed_count is not None else 0
-
-        query_batch_passed_tc = "SELECT SUM(PassedTestCases) as sum_passed FROM batch_test_assignments WHERE Status LIKE 'COMPLETED_%';"
-        result_batch_passed = execute_sql_query(query_batch_passed_tc, fetch_one=True)
-        batch_passed_count = result_batch_passed['sum_passed'] if result_batch_passed and result_batch_passed['sum_passed'] is not None else 0
-        batch_passed_count = int(batch_passed_count) if batch_passed_count is not None else 0
-        stats['passed_executions'] = adhoc_passed_count + batch_passed_count
-
-        # 4. Failed Executions
-        total_exec = stats.get('total_executions', 0)
-        passed_exec = stats.get('passed_executions', 0)
-        stats['failed_executions'] = total_exec - passed_exec
-
-        # 5. Active Testers
-        query_active_testers = "SELECT COUNT(UserID) as count FROM users WHERE Role = 'tester' AND IsActive = 1;"
-        result_active_testers = execute_sql_query(query_active_testers, fetch_one=True)
-        stats['active_testers'] = result_active_testers['count'] if result_active_testers and result_active_testers['count'] is not None else 0
-
-
-        # --- Data for Charts (Manager/Admin) ---
-        if current_user.role in ['admin', 'manager']:
-            # Chart 1: Executions by Batch
-            query_batch_summary = """
-                SELECT BatchAssignmentID, ReferenceName, PassedTestCases, (CompletedTestCases - PassedTestCases) as FailedTestCases
-                FROM batch_test_assignments
-                WHERE Status LIKE 'COMPLETED_%'
-                ORDER BY AssignmentDate DESC
-                LIMIT 5;
-            """
-            batch_execution_data = execute_sql_query(query_batch_summary)
-            stats['batch_chart_labels'] = [b['ReferenceName'] for b in batch_execution_data] if batch_execution_data else []
-            stats['batch_chart_pass_data'] = [int(b['PassedTestCases']) if b['PassedTestCases'] is not None else 0 for b in batch_execution_data] if batch_execution_data else []
-            stats['batch_chart_fail_data'] = [int(b['FailedTestCases']) if b['FailedTestCases'] is not None else 0 for b in batch_execution_data] if batch_execution_data else []
-
-            # Chart 2: Executions by Application (Pass/Fail from adhoc)
-            query_app_summary = """
-                SELECT
-                    app.name as ApplicationName,
-                    SUM(CASE WHEN te.OverallStatus = 'PASS' THEN 1 ELSE 0 END) as PassedCount,
-                    SUM(CASE WHEN te.OverallStatus = 'FAIL' THEN 1 ELSE 0 END) as FailedCount
-                FROM testexecutions te
-                JOIN testcases tc ON te.TestCaseID = tc.TestCaseID
-                JOIN testsuites ts ON tc.Module_id = ts.SuiteID
-                JOIN application app ON ts.AppType = app.id
-                GROUP BY app.name
-                ORDER BY app.name;
-            """
-            app_execution_data = execute_sql_query(query_app_summary)
-            stats['app_chart_labels'] = []
-            stats['app_chart_pass_data'] = []
-            stats['app_chart_fail_data'] = []
-            if app_execution_data:
-                for app_data in app_execution_data:
-                    stats['app_chart_labels'].append(app_data['ApplicationName'])
-                    stats['app_chart_pass_data'].append(int(app_data['PassedCount']) if app_data['PassedCount'] is not None else 0)
-                    stats['app_chart_fail_data'].append(int(app_data['FailedCount']) if app_data['FailedCount'] is not None else 0)
-
-            # MODIFIED: Chart for ALL Test Assignments by Priority
-            # MODIFIED: Chart for ALL EXECUTED Test Assignments by Priority
-            stats['priority_pie_labels'] = ['HIGH', 'MEDIUM', 'LOW'] # Match ENUM values case
-            # Updated Colors: High: Green (#28a745), Medium: Blue (#007bff), Low: Red (#dc3545)
-            stats['priority_pie_colors'] = ['#28a745', '#007bff', '#dc3545'] 
-            
-            # MODIFIED QUERY: Count all executed (passed or failed) assignments by priority
-            query_executed_by_priority = """
-                SELECT
-                    Priority, 
-                    COUNT(*) as count
-                FROM test_assignments  
-                WHERE Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL') 
-                GROUP BY Priority;
-            """
-            priority_results = execute_sql_query(query_executed_by_priority)
-            
-            priority_counts_from_db = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0} 
-            if priority_results:
-                for row in priority_results:
-                    priority_key = row.get('Priority') 
-                    if priority_key in priority_counts_from_db: 
-                        priority_counts_from_db[priority_key] = int(row['count']) if row['count'] is not None else 0
-            
-            stats['priority_pie_data'] = [
-                priority_counts_from_db.get('HIGH', 0), 
-                priority_counts_from_db.get('MEDIUM', 0),
-                priority_counts_from_db.get('LOW', 0)
-            ]
-
-
-            execution_trend_dates = []
-            execution_trend_pass = []
-            execution_trend_fail = []
-            for i in range(6, -1, -1): 
-                day_date = datetime.now() - timedelta(days=i)
-                day_str = day_date.strftime('%Y-%m-%d')
-                execution_trend_dates.append(day_date.strftime('%b %d'))
-
-                query_trend_pass = """
-                    SELECT COUNT(ExecutionID) as count
-                    FROM testexecutions
-                    WHERE OverallStatus = 'PASS' AND DATE(ExecutionTime) = %s;
-                """
-                pass_count_result = execute_sql_query(query_trend_pass, params=(day_str,), fetch_one=True)
-                execution_trend_pass.append(int(pass_count_result['count']) if pass_count_result and pass_count_result['count'] is not None else 0)
-
-                query_trend_fail = """
-                    SELECT COUNT(ExecutionID) as count
-                    FROM testexecutions
-                    WHERE OverallStatus = 'FAIL' AND DATE(ExecutionTime) = %s;
-                """
-                fail_count_result = execute_sql_query(query_trend_fail, params=(day_str,), fetch_one=True)
-                execution_trend_fail.append(int(fail_count_result['count']) if fail_count_result and fail_count_result['count'] is not None else 0)
-
-            stats['execution_trend_dates'] = execution_trend_dates
-            stats['execution_trend_pass_data'] = execution_trend_pass
-            stats['execution_trend_fail_data'] = execution_trend_fail
-
+        stats.update(_dashboard_stats(include_charts=current_user.role in ['admin', 'manager'], trend_days=_trend_days_arg()))
     except Exception as e:
         print(f"Error in analytics_dashboard: {e}") # Good for server-side logging
         flash(f"Error fetching analytics data: {str(e)}. Please try again later or contact support.", "danger")
@@ -397,6 +305,8 @@ def admin_dashboard():
         stats.setdefault('execution_trend_dates', [])
         stats.setdefault('execution_trend_pass_data', [])
         stats.setdefault('execution_trend_fail_data', [])
+        stats.setdefault('execution_trend_days', _trend_days_arg())
+        stats.setdefault('execution_trend_ranges', list(TREND_RANGES))
 
     return render_template(
         'admin/index.html', 
@@ -412,6 +322,56 @@ def admin_dashboard():
         stats=stats
         )
 
+
+def _completed_percent(assignment_stats):
+    if not assignment_stats['total']:
+        return 0
+    return round((assignment_stats['completed'] / assignment_stats['total']) * 100)
+
+
+def _assignment_stats_response():
+    """
+    TestAssignment.get_statistics_cached as JSON. The ETag changes only when a count
+    does, and Cache-Control lets clients reuse a response for the server-side TTL.
+    """
+    assignment_stats, computed_at = TestAssignment.get_statistics_cached()
+    if assignment_stats is None:
+        return jsonify({'status': 'error', 'message': 'Could not load assignment statistics.'}), 500
+    assignment_stats['completed_percent'] = _completed_percent(assignment_stats)
+    etag = '-'.join(str(assignment_stats[bucket]) for bucket in TestAssignment.STATISTICS_BUCKETS)
+    cache_control = f'private, max-age={ASSIGNMENT_STATS_TTL_SECONDS}'
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({'status': 'success', 'stats': assignment_stats,
+                            'computed_at': datetime.fromtimestamp(computed_at).isoformat(timespec='seconds')})
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+@app.route('/admin/assignment_stats')
+@login_required
+@admin_required
+def admin_assignment_stats():
+    """Assignment counts behind the admin dashboard cards, polled by the dashboard page."""
+    return _assignment_stats_response()
+
+
+@app.route('/api/v1/assignment-stats', methods=['GET'])
+@api_token_required
+def api_assignment_stats():
+    """Assignment counts for external monitors (Bearer token)."""
+    return _assignment_stats_response()
+
+
+@app.route('/admin/db_pool_metrics')
+@login_required
+@admin_required
+def db_pool_metrics():
+    """Connection pool and query cache metrics of this worker process (see db_pool.py, query_cache.py), as JSON."""
+    return jsonify({'status': 'success', 'pid': os.getpid(), 'pools': pool_metrics(), 'query_cache': query_cache.metrics()})
+
 @app.route('/manager/dashboard')
 @login_required
 @manager_or_admin_required # Assuming admin can also view manager dashboard
@@ -476,12 +436,17 @@ def tester_dashboard():
         cursor = conn.cursor(dictionary=True)
 
         search_query = request.args.get('search', '').strip()
-
-        like_pattern = f"%{search_query}%"
+        use_fulltext = bool(search_query) and fulltext_ready(conn)
 
         # --- Individual test cases ---
         if search_query:
-            ind_query = """
+            search_filter, search_params = _search_filter(
+                search_query,
+                [f"ta.TestCaseID IN (SELECT TestCaseID FROM testcases WHERE {TESTCASE_MATCH})",
+                 f"ta.AssignedByUserID IN (SELECT UserID FROM users WHERE {USER_MATCH})"],
+                ['tc.Code', 'tc.Name', 'tc.Description', 'u_assigner.Username', 'ta.Priority', 'tc.Module'],
+                exact_columns=['ta.Priority'], use_fulltext=use_fulltext)
+            ind_query = f"""
                 SELECT
                     ta.AssignmentID, tc.Code, tc.Name, tc.Module,
                     u_assigner.Username AS AssignedBy, ta.AssignmentDate, ta.Status, ta.Notes, ta.Priority
@@ -490,17 +455,10 @@ def tester_dashboard():
                 JOIN users u_assigner ON ta.AssignedByUserID = u_assigner.UserID
                 WHERE ta.AssignedToUserID = %s AND ta.BatchAssignmentID IS NULL
                     AND ta.Status IN ('PENDING', 'IN_PROGRESS')
-                    AND (
-                        tc.Code LIKE %s OR
-                        tc.Name LIKE %s OR
-                        tc.Description LIKE %s OR
-                        u_assigner.Username LIKE %s OR
-                        ta.Priority LIKE %s OR
-                        tc.Module LIKE %s
-                    )
+                    AND {search_filter}
                 ORDER BY FIELD(ta.Priority, 'HIGH', 'MEDIUM', 'LOW'), ta.AssignmentDate ASC
             """
-            cursor.execute(ind_query, (current_user.id, like_pattern, like_pattern, like_pattern, like_pattern, like_pattern, like_pattern))
+            cursor.execute(ind_query, (current_user.id, *search_params))
         else:
             ind_query = """
                 SELECT
@@ -519,21 +477,21 @@ def tester_dashboard():
 
         # --- Batch test assignments ---
         if search_query:
-            batch_query = """
+            search_filter, search_params = _search_filter(
+                search_query,
+                [f"bta.BatchAssignmentID IN (SELECT BatchAssignmentID FROM batch_test_assignments WHERE {BATCH_MATCH})",
+                 f"bta.AssignedByUserID IN (SELECT UserID FROM users WHERE {USER_MATCH})"],
+                ['bta.ReferenceName', 'bta.Notes', 'u_assigner.Username', 'bta.Status', 'bta.Priority'],
+                exact_columns=['bta.Status', 'bta.Priority'], use_fulltext=use_fulltext)
+            batch_query = f"""
                 SELECT bta.*, u_assigner.Username AS AssignedByUsername
                 FROM batch_test_assignments bta
                 JOIN users u_assigner ON bta.AssignedByUserID = u_assigner.UserID
                 WHERE bta.AssignedToUserID = %s AND bta.Status IN ('PENDING', 'IN_PROGRESS')
-                    AND (
-                        bta.ReferenceName LIKE %s OR
-                        bta.Notes LIKE %s OR
-                        u_assigner.Username LIKE %s OR
-                        bta.Status LIKE %s OR
-                        bta.Priority LIKE %s
-                    )
+                    AND {search_filter}
                 ORDER BY FIELD(bta.Priority, 'HIGH', 'MEDIUM', 'LOW'), bta.AssignmentDate ASC
             """
-            cursor.execute(batch_query, (current_user.id, like_pattern, like_pattern, like_pattern, like_pattern, like_pattern))
+            cursor.execute(batch_query, (current_user.id, *search_params))
         else:
             batch_query = """
                 SELECT bta.*, u_assigner.Username AS AssignedByUsername
@@ -758,13 +716,16 @@ def delete_test_case(testcase_id):
     cursor = conn.cursor()
 
     try:
-        # Delete dependent records first
+        # Delete dependent records first; the dashboard rollups forget them in the same transaction
+        count_executions(cursor, "te.TestCaseID = %s", (testcase_id,), sign=-1)
+        count_assignments(cursor, "ta.TestCaseID = %s", (testcase_id,), sign=-1)
         cursor.execute("DELETE FROM testexecutions WHERE TestCaseID = %s", (testcase_id,))
         cursor.execute("DELETE FROM steps WHERE TestCaseID = %s", (testcase_id,))
         cursor.execute("DELETE FROM suitetestcases WHERE TestCaseID = %s", (testcase_id,))
         cursor.execute("DELETE FROM testcases WHERE TestCaseID = %s", (testcase_id,))
         cursor.execute("DELETE FROM test_assignments WHERE TestCaseID = %s", (testcase_id,))
         conn.commit()
+        _catalog_changed()
         flash("Test case and all related data were deleted.", "success")
     except mysql.connector.Error as err:
         conn.rollback()
@@ -813,13 +774,24 @@ def edit_test_case(testcase_id):
                 flash("Invalid module selected.", "danger")
                 return redirect(request.url)
 
+            cursor.execute("SELECT Module_id FROM testcases WHERE TestCaseID = %s", (testcase_id,))
+            current_row = cursor.fetchone()
+            # A new module can mean a new application, so the case's executions move rollup rows
+            module_changed = bool(current_row) and str(current_row['Module_id']) != str(module_id)
+
+            conn.start_transaction()
+            if module_changed:
+                count_executions(cursor, "te.TestCaseID = %s", (testcase_id,), sign=-1)
             # Update both Module (name) and Module_id (SuiteID)
             cursor.execute("""
                 UPDATE testcases
                 SET Code=%s, Name=%s, Module=%s, Module_id=%s, Description=%s, ModifiedBy=%s, ModifiedAt=NOW()
                 WHERE TestCaseID=%s
             """, (code, name, module_name, module_id, description, modified_by, testcase_id))
+            if module_changed:
+                count_executions(cursor, "te.TestCaseID = %s", (testcase_id,), sign=1)
             conn.commit()
+            _catalog_changed() # Also bumps the data version the dashboards cache on
             flash("Test case updated successfully.", "success")
             # return redirect(url_for('edit_test_case'))
 
@@ -855,6 +827,58 @@ def edit_test_case(testcase_id):
     return render_template('admin/edit_test_case.html', testcase=testcase, app_type_id=app_type_id, current_apptype=current_apptype)
 
 
+@app.route('/admin/import-testcases', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_testcases():
+    """
+    Upload of a CSV/XLSX spreadsheet of test cases (format in testcase_import.py). The
+    import runs in a background thread; the page polls import_testcases_status.
+    """
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        extension = os.path.splitext(upload.filename or '')[1].lower() if upload else ''
+        if extension not in SUPPORTED_IMPORT_EXTENSIONS:
+            flash(f"Choose a {' or '.join(SUPPORTED_IMPORT_EXTENSIONS)} file to import.", 'danger')
+            return redirect(url_for('import_testcases'))
+
+        fd, upload_path = tempfile.mkstemp(prefix='testcase_import_', suffix=extension)
+        os.close(fd)
+        upload.save(upload_path)
+        import_id = secrets.token_hex(8)
+        dry_run = request.form.get('dry_run') == 'on'
+        user_id, username = current_user.id, current_user.username
+        write_import_status(import_id, {'status': 'running', 'rows_read': 0, 'imported': 0, 'skipped': 0,
+                                        'errors': [], 'error_count': 0, 'message': None,
+                                        'filename': upload.filename, 'dry_run': dry_run})
+
+        def run_import():
+            def on_progress(summary):
+                write_import_status(import_id, dict(summary, filename=upload.filename, dry_run=dry_run))
+            try:
+                summary = TestCaseImporter(get_db_connection, user_id, on_progress=on_progress, dry_run=dry_run).run(upload_path)
+                app.logger.info(f"Admin {username} {'validated' if dry_run else 'imported'} '{upload.filename}': {summary['message']}")
+            finally:
+                os.remove(upload_path)
+
+        threading.Thread(target=run_import, name=f'testcase-import-{import_id}', daemon=True).start()
+        return redirect(url_for('import_testcases', import_id=import_id))
+
+    return render_template('admin/import_testcases.html', title='Import Test Cases',
+                           import_id=request.args.get('import_id'),
+                           chunk_size=IMPORT_CHUNK_TEST_CASES)
+
+
+@app.route('/admin/import-testcases/<import_id>/status')
+@login_required
+@admin_required
+def import_testcases_status(import_id):
+    summary = read_import_status(import_id)
+    if summary is None:
+        return jsonify({'status': 'error', 'message': 'Unknown import.'}), 404
+    return jsonify(summary)
+
+
 @app.route('/admin/create-testcase', methods=['GET'])
 @login_required
 @admin_required
@@ -982,6 +1006,7 @@ def create_testcase_in_db_with_user(payload):
 
         if not DB_CONFIG.get('autocommit', False):
             conn.commit()
+        _catalog_changed()
 
         return testcase_id
 
@@ -1125,8 +1150,11 @@ def assign_test_case(testcase_id):
                             (TestCaseID, AssignedToUserID, AssignedByUserID, Status, Notes, Priority, BatchAssignmentID)
                             VALUES (%s, %s, %s, 'PENDING', %s, %s, NULL)
                         """
+                        conn_assign.start_transaction() # The assignment and its rollup count land together
                         cursor_assign.execute(sql_insert, (testcase_id, assigned_to_user_id, assigned_by_user_id, notes_from_form, selected_priority))
-                        # conn_assign.commit() # autocommit handles this
+                        count_assignments(cursor_assign, "ta.AssignmentID = %s", (cursor_assign.lastrowid,))
+                        conn_assign.commit()
+                        bump_data_version()
                         flash(f'Test Case "{test_case["Code"]}" assigned successfully.', 'success')
                         app.logger.info(f"Manager {current_user.username} assigned TC {testcase_id} to user {assigned_to_user_id}.")
             return redirect(url_for('assign_test_case', testcase_id=testcase_id)) # Or back to the suite/app view
@@ -1173,32 +1201,19 @@ def assign_suite(suite_id):
             return redirect(url_for('assign_suite', suite_id=suite_id))
 
         try:
-            batch_id = BatchTestAssignment.create(
+            batch_id = BatchTestAssignment.create_with_assignments(
                 assigned_to_user_id=assigned_to_user_id,
                 assigned_by_user_id=current_user.id,
                 assignment_type='SUITE',
                 reference_id=suite_id,
                 reference_name=suite_details['Name'],
-                total_test_cases=len(test_cases_in_suite),
+                test_case_ids=[tc['TestCaseID'] for tc in test_cases_in_suite],
                 priority=priority,
                 notes=notes
             )
             if not batch_id:
                 raise Exception("Failed to create batch assignment record.")
 
-            for tc in test_cases_in_suite:
-                ind_assign_id = TestAssignment.create_for_batch(
-                    test_case_id=tc['TestCaseID'],
-                    assigned_to_user_id=assigned_to_user_id,
-                    assigned_by_user_id=current_user.id,
-                    priority=priority,
-                    notes=notes,
-                    batch_assignment_id=batch_id
-                )
-                if not ind_assign_id:
-                     # Log this, decide if to rollback batch or continue
-                    app.logger.error(f"Failed to create individual assignment for TC {tc['TestCaseID']} in batch {batch_id}")
-
             flash(f'Suite "{suite_details["Name"]}" assigned successfully.', 'success')
             app.logger.info(f"Manager {current_user.username} assigned SUITE {suite_id} to user {assigned_to_user_id}.")
         except Exception as e:
@@ -1239,36 +1254,42 @@ def assign_application(app_id):
         priority = form.priority.data
         notes = form.notes.data.strip() if form.notes.data else None
 
-        test_cases_in_app = TestCaseModel.get_test_cases_for_application(app_id) # Get all unique TCs
+        incremental = form.selection_mode.data == 'INCREMENTAL'
+        if incremental:
+            test_cases_in_app = TestCaseModel.get_incremental_test_cases_for_application(
+                app_id, max_test_cases=form.max_test_cases.data, fill_with_stable=form.fill_with_stable.data)
+            if not test_cases_in_app:
+                flash(f'No changed, failed or never-run test cases for application "{app_details["name"]}". Nothing to assign.', 'info')
+                return redirect(url_for('assign_application', app_id=app_id))
+            reason_counts = defaultdict(int)
+            for tc in test_cases_in_app:
+                reason_counts[tc['SelectionReason']] += 1
+            selection_summary = ', '.join(f"{reason.replace('_', ' ').lower()}: {count}" for reason, count in sorted(reason_counts.items()))
+        else:
+            test_cases_in_app = TestCaseModel.get_test_cases_for_application(app_id) # Get all unique TCs
         if not test_cases_in_app:
             flash(f'No test cases found for application "{app_details["name"]}". Cannot assign.', 'warning')
             return redirect(url_for('manager_dashboard'))
 
         try:
-            batch_id = BatchTestAssignment.create(
+            batch_id = BatchTestAssignment.create_with_assignments(
                 assigned_to_user_id=assigned_to_user_id,
                 assigned_by_user_id=current_user.id,
                 assignment_type='APPLICATION',
                 reference_id=app_id,
                 reference_name=app_details['name'],
-                total_test_cases=len(test_cases_in_app),
+                test_case_ids=[tc['TestCaseID'] for tc in test_cases_in_app],
                 priority=priority,
                 notes=notes
             )
             if not batch_id:
                 raise Exception("Failed to create batch assignment record for application.")
-
-            for tc in test_cases_in_app:
-                TestAssignment.create_for_batch(
-                    test_case_id=tc['TestCaseID'],
-                    assigned_to_user_id=assigned_to_user_id,
-                    assigned_by_user_id=current_user.id,
-                    priority=priority,
-                    notes=notes,
-                    batch_assignment_id=batch_id
-                )
-            flash(f'All test cases for application "{app_details["name"]}" assigned successfully.', 'success')
-            app.logger.info(f"Manager {current_user.username} assigned APPLICATION {app_id} to user {assigned_to_user_id}.")
+            if incremental:
+                flash(f'Incremental batch of {len(test_cases_in_app)} test case(s) for application "{app_details["name"]}" assigned successfully ({selection_summary}).', 'success')
+                app.logger.info(f"Manager {current_user.username} assigned INCREMENTAL APPLICATION {app_id} to user {assigned_to_user_id} ({selection_summary}).")
+            else:
+                flash(f'All test cases for application "{app_details["name"]}" assigned successfully.', 'success')
+                app.logger.info(f"Manager {current_user.username} assigned APPLICATION {app_id} to user {assigned_to_user_id}.")
         except Exception as e:
             app.logger.error(f"Error assigning application {app_id}: {e}", exc_info=True)
             flash(f'Error assigning application: {e}', 'danger')
@@ -1486,28 +1507,18 @@ def assign_custom_group(group_id):
             return redirect(url_for('list_custom_groups'))
 
         try:
-            batch_id = BatchTestAssignment.create(
+            batch_id = BatchTestAssignment.create_with_assignments(
                 assigned_to_user_id=assigned_to_user_id,
                 assigned_by_user_id=current_user.id,
                 assignment_type='CUSTOM_GROUP',
                 reference_id=group_id,
                 reference_name=custom_group.Name,
-                total_test_cases=len(test_cases_in_group),
+                test_case_ids=[tc_item['TestCaseID'] for tc_item in test_cases_in_group],
                 priority=priority,
                 notes=notes
             )
             if not batch_id:
                 raise Exception("Failed to create batch assignment record for custom group.")
-
-            for tc_item in test_cases_in_group:
-                TestAssignment.create_for_batch(
-                    test_case_id=tc_item['TestCaseID'],
-                    assigned_to_user_id=assigned_to_user_id,
-                    assigned_by_user_id=current_user.id,
-                    priority=priority,
-                    notes=notes,
-                    batch_assignment_id=batch_id
-                )
             flash(f'Custom group "{custom_group.Name}" assigned successfully.', 'success')
             app.logger.info(f"Manager {current_user.username} assigned CUSTOM_GROUP {group_id} to user {assigned_to_user_id}.")
         except Exception as e:
@@ -1862,21 +1873,10 @@ def generate_report():
                 """)
                 batches = cursor.fetchall()
 
-                # Get test cases
-                cursor.execute("""
-                    SELECT TestCaseID, Code, Name
-                    FROM testcases
-                    ORDER BY Code
-                """)
-                test_cases = cursor.fetchall()
-
-                # Get applications
-                cursor.execute("""
-                    SELECT id, name
-                    FROM application
-                    ORDER BY name
-                """)
-                applications = cursor.fetchall()
+        # Test cases and applications come from the catalog
+        catalog = _catalog()
+        test_cases = [{'TestCaseID': tc['TestCaseID'], 'Code': tc['Code'], 'Name': tc['Name']} for tc in catalog.test_cases]
+        applications = catalog.applications
 
         return render_template(
             'manager/generate_report.html',
@@ -2022,40 +2022,51 @@ def get_batch_progress(batch_assignment_id):
             logout_user()
             return redirect(url_for("login"))
 
-    global batch_test_processes, batch_state_lock
-    batch_db_assignment = BatchTestAssignment.get(batch_assignment_id) # Get fresh status from DB
+    offset_arg = request.args.get('offset', type=int) # Bytes of live output the client already has
+    output_id_arg = request.args.get('output_id')
+    # Read before anything else: a change after this point only costs the client one extra full poll
+    progress_version = read_progress_version(batch_assignment_id)
+    control_state = read_control(batch_assignment_id)
+
+    def progress_etag(output_id, output_offset):
+        # The user ID keeps one tester's ETag from answering for another tester's batch
+        return f"{current_user.id}-{progress_version}-{output_id}-{output_offset}-{control_state}"
+
+    if progress_version and output_id_arg and offset_arg is not None and request.if_none_match:
+        # Nothing changed since the client's copy: same progress marker and no new output
+        output = executor.read_output(output_id_arg, offset_arg)
+        if output and not output['text'] and not output['reset']:
+            etag = progress_etag(output_id_arg, output['offset'])
+            if request.if_none_match.contains_weak(etag):
+                not_modified = app.response_class(status=304)
+                not_modified.set_etag(etag, weak=True)
+                not_modified.headers['Cache-Control'] = 'private, no-cache'
+                return not_modified
+
+    batch_db_assignment, batch_tc_rows = BatchTestAssignment.get_with_assignments(batch_assignment_id) # Fresh status, one query
     if not batch_db_assignment or batch_db_assignment.AssignedToUserID != current_user.id:
         return jsonify({'status': 'error', 'message': 'Batch not found or unauthorized.'}), 403
 
-    is_running_from_state = False
-    live_log_output = "Awaiting batch runner output..."
-    output_file_path = None # Corrected from output_file
-
-    with batch_state_lock:
-        batch_proc_info_state = batch_test_processes.get(batch_assignment_id)
-        if batch_proc_info_state:
-            process_obj = batch_proc_info_state.get('process')
-            output_file_path = batch_proc_info_state.get('output_file') # Use the correct variable
-            if process_obj and process_obj.poll() is None:
-                is_running_from_state = True
+    next_offset, output_reset = offset_arg, False
+    live_log_output = "Awaiting batch runner output..." if offset_arg is None else ""
+    output_id = None
+
+    batch_job = _latest_batch_job(batch_assignment_id)
+    is_running_from_state = bool(batch_job and batch_job['running'])
+
+    if batch_job:
+        output_id = batch_job['job_id']
+        # A resumed or re-run batch is a new job; start the client over from its beginning
+        read_offset = offset_arg if output_id_arg == output_id else None
+        output = executor.read_output(output_id, read_offset)
+        if output:
+            live_log_output = output['text']
+            if offset_arg is not None:
+                next_offset, output_reset = output['offset'], output['reset']
     
-    if output_file_path and os.path.exists(output_file_path):
-        try:
-            with open(output_file_path, 'r', encoding='utf-8') as f:
-                live_log_output = f.read()
-        except Exception as e:
-            live_log_output = f"Error reading batch output: {e}"
-    elif is_running_from_state:
-        live_log_output = "Batch runner active, log file pending..."
-    
-    individual_statuses = {}
-    with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT AssignmentID, Status FROM test_assignments WHERE BatchAssignmentID = %s", (batch_assignment_id,))
-            for row in cursor.fetchall(): # Corrected from r to row
-                individual_statuses[row['AssignmentID']] = row['Status']
-            
-    return jsonify({
+    individual_statuses = {row['AssignmentID']: row['Status'] for row in batch_tc_rows}
+
+    response_data = {
         'batch_assignment_id': batch_assignment_id, # Corrected variable name
         'is_running': is_running_from_state and batch_db_assignment.Status == 'IN_PROGRESS',
         'overall_status': batch_db_assignment.Status,
@@ -2063,9 +2074,112 @@ def get_batch_progress(batch_assignment_id):
         'completed_test_cases': batch_db_assignment.CompletedTestCases,
         'passed_test_cases': batch_db_assignment.PassedTestCases,
         'live_output': live_log_output,
+        'control_state': control_state,
+        'is_paused': control_state == CONTROL_PAUSE and not is_running_from_state,
         'individual_tc_statuses': individual_statuses
         # 'report_path_summary': None # batch_runner.py needs to communicate this if it creates one
-    })
+    }
+    if offset_arg is not None:
+        response_data['offset'] = next_offset
+        response_data['reset'] = output_reset
+        response_data['output_id'] = output_id
+    response = jsonify(response_data)
+    if progress_version and offset_arg is not None:
+        # Browsers revalidate with If-None-Match on the next poll of the same URL and get a 304
+        response.set_etag(progress_etag(output_id, next_offset), weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def batch_progress_events(batch_assignment_id, last_event_id=''):
+    """
+    Server-Sent Events for a batch run. Emits 'output' events with new runner output
+    (id '<job id>:<byte offset>', so a reconnect resumes where it left off), 'progress'
+    events when the batch counters change and a final 'done'. Callers check access.
+    """
+    resume_output_id, _, resume_offset = (last_event_id or '').rpartition(':')
+    try:
+        resume_offset = int(resume_offset)
+    except ValueError:
+        resume_output_id, resume_offset = '', 0
+
+    def read_progress_snapshot():
+        batch, assignment_rows = BatchTestAssignment.get_with_assignments(batch_assignment_id)
+        statuses = {row['AssignmentID']: row['Status'] for row in assignment_rows}
+        return {
+            'overall_status': batch.Status if batch else None,
+            'total_test_cases': batch.TotalTestCases if batch else 0,
+            'completed_test_cases': batch.CompletedTestCases if batch else 0,
+            'passed_test_cases': batch.PassedTestCases if batch else 0,
+            'individual_tc_statuses': statuses
+        }
+
+    output_id, offset = resume_output_id, resume_offset
+    last_snapshot = None
+    last_progress_check = 0
+    last_version = None
+    last_job_check = None
+    batch_job = None
+    last_sent = time.time()
+    while True:
+        version = read_progress_version(batch_assignment_id, cached=True)
+        # A job run by this process is read from memory every tick; one run elsewhere costs
+        # shared store queries, so it is only re-read when the progress marker moved or
+        # every SSE_STORE_POLL_SECONDS
+        job_read = bool(batch_job and batch_job['running'] and executor.owns_job(batch_job['job_id']))
+        if job_read:
+            batch_job = executor.get(batch_job['job_id'])
+        elif last_job_check is None or version != last_version or time.time() - last_job_check >= SSE_STORE_POLL_SECONDS:
+            last_job_check = time.time()
+            batch_job = _latest_batch_job(batch_assignment_id)
+            job_read = True
+        is_running = bool(batch_job and batch_job['running'])
+
+        new_output = ''
+        if batch_job and job_read:
+            if batch_job['job_id'] != output_id:
+                output_id, offset = batch_job['job_id'], None
+            output = executor.read_output(output_id, offset)
+            if output:
+                new_output, offset, reset = output['text'], output['offset'], output['reset']
+                if new_output or reset:
+                    yield sse_event('output', {'text': new_output, 'reset': reset, 'offset': offset}, f"{output_id}:{offset}")
+                    last_sent = time.time()
+
+        # Without a marker (never bumped) fall back to refreshing on output and on a timer
+        changed = version != last_version if version else (new_output or time.time() - last_progress_check >= SSE_PROGRESS_REFRESH_SECONDS)
+        if changed or not is_running or last_snapshot is None:
+            last_progress_check = time.time()
+            last_version = version
+            snapshot = read_progress_snapshot()
+            if snapshot != last_snapshot:
+                last_snapshot = snapshot
+                yield sse_event('progress', snapshot)
+                last_sent = time.time()
+
+        if not is_running:
+            control_state = read_control(batch_assignment_id)
+            yield sse_event('done', {'overall_status': last_snapshot['overall_status'],
+                                     'is_paused': control_state == CONTROL_PAUSE})
+            return
+        if time.time() - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = time.time()
+        time.sleep(SSE_POLL_SECONDS)
+
+
+@app.route('/tester/stream_batch_progress/<int:batch_assignment_id>')
+@login_required
+@tester_required
+def stream_batch_progress(batch_assignment_id):
+    """Server-Sent Events version of get_batch_progress; see batch_progress_events."""
+    if current_user.role.lower() != 'tester':
+        return jsonify({'status': 'error', 'message': 'Unauthorized.'}), 403
+
+    batch_db_assignment = BatchTestAssignment.get(batch_assignment_id)
+    if not batch_db_assignment or batch_db_assignment.AssignedToUserID != current_user.id:
+        return jsonify({'status': 'error', 'message': 'Batch not found or unauthorized.'}), 403
+
+    return sse_response(batch_progress_events(batch_assignment_id, get_last_event_id()))
 
 # --- NEW: Endpoint to start/resume a batch run ---
 @app.route('/tester/start_batch_run', methods=['POST'])
@@ -2135,11 +2249,137 @@ def start_batch_run():
         app.logger.info(f"Batch {batch_assignment_id} completed or no more pending tests. Final status: {completed_status}.")
         return jsonify({'status': 'batch_complete', 'message': f'All tests in batch {batch_assignment.ReferenceName} are processed.', 'final_status': completed_status})
 
-# In run_test.py (your main app file)
+# --- Endpoint to PAUSE / RESUME / CANCEL a Batch Execution ---
+@app.route('/tester/batch_control/<int:batch_assignment_id>', methods=['POST'])
+@login_required
+@tester_required
+def batch_control_action(batch_assignment_id):
+
+    if current_user.role.lower() != 'tester':
+        flash("Unauthorized access. You have been logged out.", "danger")
+        logout_user()
+        return redirect(url_for("login"))
+
+    data = request.get_json() or {}
+    action = (data.get('action') or '').strip().lower()
+
+    batch_assignment = BatchTestAssignment.get(batch_assignment_id)
+    if not batch_assignment or batch_assignment.AssignedToUserID != current_user.id:
+        return jsonify({'status': 'error', 'message': 'Batch not found or unauthorized.'}), 403
+
+    batch_job = _latest_batch_job(batch_assignment_id)
+    is_running = bool(batch_job and batch_job['running'])
+
+    if action == 'pause':
+        if not is_running:
+            return jsonify({'status': 'error', 'message': 'Batch is not running.'}), 400
+        request_control(batch_assignment_id, CONTROL_PAUSE)
+        message = 'Pause requested. The batch stops at the next step or test case boundary.'
+    elif action == 'cancel':
+        if is_running:
+            request_control(batch_assignment_id, CONTROL_CANCEL)
+            message = 'Cancel requested. The batch stops at the next step or test case boundary.'
+        elif batch_assignment.Status in ['PENDING', 'IN_PROGRESS']:
+            clear_control(batch_assignment_id)
+            BatchTestAssignment.update_status(batch_assignment_id, 'CANCELLED')
+            message = 'Batch cancelled.'
+        else:
+            return jsonify({'status': 'error', 'message': f'Batch cannot be cancelled in its current state: {batch_assignment.Status}.'}), 400
+    elif action == 'resume':
+        if read_control(batch_assignment_id) != CONTROL_PAUSE:
+            return jsonify({'status': 'error', 'message': 'Batch is not paused.'}), 400
+        if is_running:
+            clear_control(batch_assignment_id) # Pause not reached yet; simply withdraw it
+            message = 'Pause request withdrawn.'
+        elif executor.resume_batch(batch_assignment_id):
+            message = 'Batch resumed.'
+        else:
+            # Runner details were lost (e.g. app restart); the tester re-submits the inputs to continue
+            clear_control(batch_assignment_id)
+            return jsonify({'status': 'resubmit', 'message': 'Batch is ready to continue. Execute it again to resume from where it stopped.'})
+    else:
+        return jsonify({'status': 'error', 'message': f'Unknown action: {action}.'}), 400
+
+    app.logger.info(f"Tester {current_user.username} requested {action.upper()} for batch {batch_assignment_id}.")
+    return jsonify({'status': 'ok', 'action': action, 'message': message})
 
-# ... (other imports and Flask app setup) ...
-# ... (global batch_test_processes, batch_state_lock definitions) ...
-# ... (other routes) ...
+
+def _launch_batch(batch_assignment, device_id, android_ver, password, dynamic_inputs, use_result_cache=False,
+                  result_cache_ttl_minutes=60, build_tag='', preempt=False, queue_if_busy=False):
+    """
+    Submits batch_runner.py for `batch_assignment` on `device_id`, running as the assigned
+    tester. A busy device is refused unless `preempt` (pause the running batch and resume
+    it afterwards) or `queue_if_busy` (start once the device's last job has finished).
+    Returns (job, None, None) or (None, error message, HTTP status).
+    """
+    batch_id = batch_assignment.BatchAssignmentID
+    current_job = _latest_batch_job(batch_id)
+    if current_job and current_job['running']:
+        app.logger.info(f"Batch {batch_id} is already running.")
+        return None, f'Batch {batch_id} is already running.', 409
+
+    preempted_batch_id = None
+    wait_for_job_id = None
+    active_jobs = executor.list_jobs(device_id=device_id, active_only=True) # Newest first
+    if active_jobs and queue_if_busy:
+        wait_for_job_id = active_jobs[0]['job_id']
+        app.logger.info(f"Batch {batch_id} queued on device {device_id} behind job {wait_for_job_id}.")
+    elif active_jobs:
+        job = active_jobs[0]
+        if job['kind'] != 'batch':
+            return None, f'Device {device_id} is busy with test run {job["job_id"]}.', 409
+        if not preempt:
+            return None, (f'Device {device_id} is busy with batch {job["batch_assignment_id"]}. '
+                          f'Pause it or pre-empt it to run this batch now.'), 409
+        # The running batch is paused once this one is submitted (below) and resumes after it
+        preempted_batch_id, wait_for_job_id = job['batch_assignment_id'], job['job_id']
+    clear_control(batch_id)
+
+
+    # IN_PROGRESS, with the counters recounted: a re-run skips the assignments already executed
+    previous_status = batch_assignment.Status
+    if not BatchTestAssignment.start_run(batch_id):
+        app.logger.error(f"Failed to update batch {batch_id} status to IN_PROGRESS in DB.")
+        return None, 'Failed to update batch status in database.', 500
+
+
+    args_for_batch_runner = [
+        str(batch_id),
+        str(batch_assignment.AssignedToUserID),
+        device_id,
+        android_ver,
+        password if password else "NO_PASSWORD_PLACEHOLDER",
+        json.dumps(dynamic_inputs or {})
+    ]
+
+    # Result cache settings travel to batch_runner.py (and on to generic_runner.py) via the environment
+    env_for_batch_runner = {}
+    env_for_batch_runner[RESULT_CACHE_TTL_ENV] = str(max(0, result_cache_ttl_minutes)) if use_result_cache else '0'
+    env_for_batch_runner[BUILD_TAG_ENV] = build_tag
+    if use_result_cache:
+        app.logger.info(f"Result cache enabled for batch {batch_id}: TTL={result_cache_ttl_minutes} min, Build='{build_tag or 'UNSPECIFIED'}'.")
+    # Avoid logging all dynamic inputs if they can be very large or sensitive
+
+    try:
+        batch_job = executor.submit('batch', args_for_batch_runner, device_id, user_id=batch_assignment.AssignedToUserID,
+                                    batch_assignment_id=batch_id, env=env_for_batch_runner,
+                                    wait_for_job_id=wait_for_job_id, resume_batch_after=preempted_batch_id)
+    except DeviceBusyError as e:
+        BatchTestAssignment.update_status(batch_id, previous_status)
+        return None, str(e), 409
+    except ValueError as e:
+        BatchTestAssignment.update_status(batch_id, previous_status)
+        app.logger.error(f"Executor rejected batch {batch_id}: {e}")
+        return None, str(e), 500
+    except ExecutorUnavailable:
+        BatchTestAssignment.update_status(batch_id, previous_status)
+        raise  # handle_executor_unavailable answers 503
+    if preempted_batch_id:
+        # Pause the running batch at its next boundary; the submitted job waits for that
+        request_control(preempted_batch_id, CONTROL_PAUSE)
+        app.logger.info(f"Batch {batch_id} pre-empts batch {preempted_batch_id} on device {device_id}.")
+    app.logger.info(f"Submitted batch runner job {batch_job['job_id']} for BatchAssignmentID {batch_id}.")
+    return batch_job, None, None
 
 
 # --- Endpoint to LAUNCH a Batch Execution ---
@@ -2153,8 +2393,6 @@ def execute_batch():
         logout_user()
         return redirect(url_for("login"))
 
-    global batch_test_processes, batch_state_lock # Ensure access to global state
-
     data = request.get_json()
     app.logger.debug(f"Received data for /execute_batch: {data}") # Log received data
 
@@ -2163,6 +2401,13 @@ def execute_batch():
     android_ver_arg = data.get('android_version', '').strip()
     password_arg = data.get('password', '').strip()
     all_dynamic_inputs_arg = data.get('dynamic_inputs', {})
+    preempt_arg = bool(data.get('preempt', False))
+    use_result_cache = bool(data.get('use_result_cache', False))
+    build_tag_arg = (data.get('build_tag') or '').strip()
+    try:
+        result_cache_ttl_minutes = int(data.get('result_cache_ttl_minutes') or 60)
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Result cache TTL must be a whole number of minutes.'}), 400
 
     if not batch_assignment_id_str: # Check if the string itself is missing or empty
         app.logger.error("Missing batch_assignment_id in execute_batch request.")
@@ -2193,103 +2438,242 @@ def execute_batch():
         app.logger.warning(f"Attempt to run batch {batch_assignment_id} with invalid status: {batch_assignment.Status}")
         return jsonify({'status': 'error', 'message': f'Batch cannot be run in its current state: {batch_assignment.Status}.'}), 400
 
-    with batch_state_lock:
-        current_process_info = batch_test_processes.get(batch_assignment.BatchAssignmentID)
-        if current_process_info and current_process_info.get('process') and \
-           current_process_info['process'].poll() is None:
-            app.logger.info(f"Batch {batch_assignment.BatchAssignmentID} is already running.")
-            return jsonify({'status': 'error', 'message': f'Batch {batch_assignment.BatchAssignmentID} is already running.'}), 409
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_dir = os.path.join(app.static_folder, 'reports', 'batch_live_output')
-        os.makedirs(output_dir, exist_ok=True)
-        output_file = os.path.join(output_dir, f'batch_{batch_assignment.BatchAssignmentID}_out_{timestamp}.txt')
-        
-        # Initialize or update the entry for this batch
-        batch_test_processes[batch_assignment.BatchAssignmentID] = {
-            'process': None, 
-            'output_file': output_file, 
-            'thread': None,
-            'final_log': '', # Reset final log for a new run
-            'report_path_summary': None # Reset summary report path
-        }
-        app.logger.info(f"Prepared state for batch {batch_assignment.BatchAssignmentID}, output file: {output_file}")
+    batch_job, error_message, error_status = _launch_batch(
+        batch_assignment, device_id_arg, android_ver_arg, password_arg, all_dynamic_inputs_arg,
+        use_result_cache=use_result_cache, result_cache_ttl_minutes=result_cache_ttl_minutes,
+        build_tag=build_tag_arg, preempt=preempt_arg)
+    if not batch_job:
+        return jsonify({'status': 'error', 'message': error_message}), error_status
 
+    app.logger.info(f"Tester {current_user.username} launched batch {batch_assignment.BatchAssignmentID} as job {batch_job['job_id']}.")
+    return jsonify({'status': 'batch_execution_started', 'message': f'Batch {batch_assignment.BatchAssignmentID} execution process initiated.'})
 
-    # Update batch status to IN_PROGRESS (models.py method handles DB)
-    # Reset progress if re-running a failed batch
-    if batch_assignment.Status == 'COMPLETED_FAIL':
-        if BatchTestAssignment.update_progress(batch_assignment.BatchAssignmentID): # Ensure this model method exists
-             app.logger.info(f"Resetting progress for re-run of failed batch {batch_assignment.BatchAssignmentID}")
-        else:
-            app.logger.error(f"Failed to reset progress for batch {batch_assignment.BatchAssignmentID}")
-            # Decide if this is critical enough to stop execution
-    
-    if not BatchTestAssignment.update_status(batch_assignment.BatchAssignmentID, 'IN_PROGRESS'):
-        app.logger.error(f"Failed to update batch {batch_assignment.BatchAssignmentID} status to IN_PROGRESS in DB.")
-        # Potentially revert state_lock changes or handle error more gracefully
-        return jsonify({'status': 'error', 'message': 'Failed to update batch status in database.'}), 500
-
-
-    batch_runner_script_path = os.path.join(os.path.dirname(__file__), 'batch_runner.py')
-    cmd_for_batch_runner = [
-        sys.executable, batch_runner_script_path,
-        str(batch_assignment.BatchAssignmentID),
-        str(current_user.id),
-        device_id_arg,
-        android_ver_arg,
-        password_arg if password_arg else "NO_PASSWORD_PLACEHOLDER",
-        json.dumps(all_dynamic_inputs_arg)
-    ]
 
-    app.logger.info(f"Tester {current_user.username} initiating BATCH execution for BatchAssignmentID {batch_assignment.BatchAssignmentID}.")
-    app.logger.info(f"Batch Runner Command: {' '.join(cmd_for_batch_runner)}")
-    # Avoid logging all dynamic inputs if they can be very large or sensitive
-    # app.logger.debug(f"Batch Runner Dynamic Inputs: {all_dynamic_inputs_arg}")
+# ******************************************************************************
+# * CI API (token authenticated, JSON)                                         *
+# ******************************************************************************
+# Lets pipelines create a batch from test case IDs, a suite, an application or a custom
+# group, queue it on a device and follow it. Authenticate with
+# 'Authorization: Bearer <token>' (see create_api_token.py). POST /api/v1/batches
+# honours an Idempotency-Key header: a retried call gets the original response instead
+# of a second batch.
+CI_PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+
+
+def _api_error(message, status):
+    return {'status': 'error', 'message': message}, status
+
+
+def _api_batch_status(batch_assignment):
+    """JSON status of a batch for the CI API: counters, per-test statuses and its runner job."""
+    batch_id = batch_assignment.BatchAssignmentID
+    fresh_batch, assignment_rows = BatchTestAssignment.get_with_assignments(batch_id)
+    batch_assignment = fresh_batch or batch_assignment
+    statuses = {row['AssignmentID']: {'test_case_id': row['TestCaseID'], 'status': row['Status'], 'execution_id': row['ExecutionID']}
+                for row in assignment_rows}
+    batch_job = _latest_batch_job(batch_id)
+    return {
+        'batch_assignment_id': batch_id,
+        'reference_name': batch_assignment.ReferenceName,
+        'assigned_to_user_id': batch_assignment.AssignedToUserID,
+        'overall_status': batch_assignment.Status,
+        'control_state': read_control(batch_id),
+        'total_test_cases': batch_assignment.TotalTestCases,
+        'completed_test_cases': batch_assignment.CompletedTestCases,
+        'passed_test_cases': batch_assignment.PassedTestCases,
+        'assignments': statuses,
+        'job': batch_job,
+        'status_url': url_for('api_batch_status', batch_assignment_id=batch_id, _external=True),
+        'stream_url': url_for('api_stream_batch', batch_assignment_id=batch_id, _external=True),
+    }
+
 
+def _api_can_view_batch(user, batch_assignment):
+    return (user.role in ('admin', 'manager') or batch_assignment.AssignedToUserID == user.id
+            or batch_assignment.AssignedByUserID == user.id)
 
-    def run_batch_runner_subprocess_thread(command, current_batch_id_for_thread, output_file_for_thread):
-        global batch_test_processes, batch_state_lock # Thread needs access to globals
-        process = None
+
+def _create_ci_batch(user, data):
+    """Returns (body, HTTP status, created) for POST /api/v1/batches."""
+    priority = (data.get('priority') or 'MEDIUM').upper()
+    if priority not in CI_PRIORITIES:
+        return _api_error(f"priority must be one of {', '.join(CI_PRIORITIES)}.", 400) + (False,)
+    notes = (data.get('notes') or '').strip() or None
+
+    # Testers queue work for themselves; managers and admins pick the tester
+    try:
+        tester_id = int(data['tester_id']) if data.get('tester_id') not in (None, '') else None
+    except (TypeError, ValueError):
+        return _api_error('tester_id must be an integer user ID.', 400) + (False,)
+    if user.role == 'tester':
+        if tester_id not in (None, user.id):
+            return _api_error('Testers can only create batches for themselves.', 403) + (False,)
+        tester_id = user.id
+    elif user.role in ('manager', 'admin'):
+        testers = {t['UserID'] for t in (User.get_testers() or [])}
+        if tester_id not in testers:
+            return _api_error('tester_id must be the ID of an active tester.', 400) + (False,)
+    else:
+        return _api_error('This token cannot create batches.', 403) + (False,)
+
+    # What to run: exactly one source
+    sources = [key for key in ('test_case_ids', 'suite_id', 'application_id', 'custom_group_id') if data.get(key)]
+    if len(sources) != 1:
+        return _api_error('Give exactly one of test_case_ids, suite_id, application_id or custom_group_id.', 400) + (False,)
+    source = sources[0]
+    try:
+        if source == 'test_case_ids':
+            requested_ids = data['test_case_ids']
+            if not isinstance(requested_ids, list) or not all(
+                    isinstance(tc_id, int) and not isinstance(tc_id, bool) for tc_id in requested_ids):
+                return _api_error('test_case_ids must be a list of integer test case IDs.', 400) + (False,)
+            test_cases = TestCaseModel.get_test_cases_by_ids(requested_ids)
+            missing = sorted(set(requested_ids) - {tc['TestCaseID'] for tc in test_cases})
+            if missing:
+                return _api_error(f"Unknown test case IDs: {missing}.", 400) + (False,)
+            # AssignmentType only knows SUITE/APPLICATION/CUSTOM_GROUP; an ad-hoc list is an unsaved custom group
+            assignment_type, reference_id = 'CUSTOM_GROUP', 0
+            reference_name = (data.get('reference_name') or '').strip() or f"CI batch ({len(test_cases)} test cases)"
+        elif source == 'suite_id':
+            reference_id = int(data['suite_id'])
+            suite = get_suite_by_id_for_dashboard(reference_id)
+            if not suite:
+                return _api_error(f"Unknown suite {reference_id}.", 404) + (False,)
+            assignment_type, reference_name = 'SUITE', suite['Name']
+            test_cases = TestCaseModel.get_test_cases_for_suite(reference_id)
+        elif source == 'application_id':
+            reference_id = int(data['application_id'])
+            application = get_application_by_id_for_dashboard(reference_id)
+            if not application:
+                return _api_error(f"Unknown application {reference_id}.", 404) + (False,)
+            assignment_type, reference_name = 'APPLICATION', application['name']
+            if (data.get('selection_mode') or 'FULL').upper() == 'INCREMENTAL':
+                max_test_cases = int(data['max_test_cases']) if data.get('max_test_cases') else None
+                test_cases = TestCaseModel.get_incremental_test_cases_for_application(
+                    reference_id, max_test_cases=max_test_cases, fill_with_stable=bool(data.get('fill_with_stable')))
+            else:
+                test_cases = TestCaseModel.get_test_cases_for_application(reference_id)
+        else:
+            reference_id = int(data['custom_group_id'])
+            custom_group = CustomTestGroup.get(reference_id)
+            if not custom_group:
+                return _api_error(f"Unknown custom group {reference_id}.", 404) + (False,)
+            assignment_type, reference_name = 'CUSTOM_GROUP', custom_group.Name
+            test_cases = CustomTestGroup.get_items(reference_id)
+    except (TypeError, ValueError):
+        return _api_error(f"{source} must be an integer ID (or a list of them).", 400) + (False,)
+    if not test_cases:
+        return _api_error('No test cases selected; nothing to run.', 422) + (False,)
+
+    execute = data.get('execute')
+    if execute is not None:
+        if not isinstance(execute, dict) or not (execute.get('device_id') and execute.get('android_version')):
+            return _api_error('execute needs device_id and android_version.', 400) + (False,)
         try:
-            app.logger.info(f"Batch runner thread for {current_batch_id_for_thread} using output file: {output_file_for_thread}")
-            with open(output_file_for_thread, 'w', encoding='utf-8') as f_out:
-                creation_flags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                process = subprocess.Popen(command, stdout=f_out, stderr=subprocess.STDOUT, text=True, bufsize=1, creationflags=creation_flags)
-                
-                with batch_state_lock:
-                    if current_batch_id_for_thread in batch_test_processes: # Check if entry still exists
-                         batch_test_processes[current_batch_id_for_thread]['process'] = process
-                    else: # Batch might have been cancelled or state cleared
-                        app.logger.warning(f"State for batch {current_batch_id_for_thread} was cleared before process could be stored. Terminating process.")
-                        if process: process.terminate() # Terminate if we can't track it
-                        return
+            result_cache_ttl_minutes = int(execute.get('result_cache_ttl_minutes') or 60)
+        except (TypeError, ValueError):
+            return _api_error('execute.result_cache_ttl_minutes must be a whole number of minutes.', 400) + (False,)
+
+    batch_id = BatchTestAssignment.create_with_assignments(
+        assigned_to_user_id=tester_id,
+        assigned_by_user_id=user.id,
+        assignment_type=assignment_type,
+        reference_id=reference_id,
+        reference_name=reference_name,
+        test_case_ids=[tc['TestCaseID'] for tc in test_cases],
+        priority=priority,
+        notes=notes
+    )
+    if not batch_id:
+        return _api_error('Failed to create the batch assignment.', 500) + (False,)
+    app.logger.info(f"CI API: user {user.username} created batch {batch_id} ({assignment_type} {reference_id}, {len(test_cases)} test cases) for tester {tester_id}.")
+
+    batch_assignment = BatchTestAssignment.get(batch_id)
+    launch_error = None
+    if execute is not None:
+        # CI work queues behind whatever the device is doing instead of being refused
+        try:
+            batch_job, launch_error, _ = _launch_batch(
+                batch_assignment, execute['device_id'].strip(), execute['android_version'].strip(),
+                (execute.get('password') or '').strip(), execute.get('dynamic_inputs') or {},
+                use_result_cache=bool(execute.get('use_result_cache')), result_cache_ttl_minutes=result_cache_ttl_minutes,
+                build_tag=(execute.get('build_tag') or '').strip(), queue_if_busy=True)
+        except ExecutorUnavailable as e:
+            app.logger.error(str(e))
+            launch_error = 'The test execution service is unavailable; the batch was created but not started.'
+        batch_assignment = BatchTestAssignment.get(batch_id)
+
+    body = dict(_api_batch_status(batch_assignment), status='created')
+    if launch_error:
+        body['launch_error'] = launch_error
+    return body, 201, True
+
+
+@app.route('/api/v1/batches', methods=['POST'])
+@api_token_required
+def api_create_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        body, status = _api_error('Expected a JSON object.', 400)
+        return jsonify(body), status
+
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if idempotency_key:
+        if len(idempotency_key) > 255:
+            body, status = _api_error('Idempotency-Key must be at most 255 characters.', 400)
+            return jsonify(body), status
+        request_hash = ApiIdempotencyKey.hash_request(data)
+        try:
+            existing = ApiIdempotencyKey.reserve(g.api_token_id, idempotency_key, request_hash)
+        except mysql.connector.Error as err:
+            app.logger.error(f"CI API: idempotency store unavailable: {err}")
+            body, status = _api_error('Could not record the Idempotency-Key; please retry.', 503)
+            return jsonify(body), status
+        if existing:
+            if existing['RequestHash'] != request_hash:
+                body, status = _api_error('This Idempotency-Key was already used with a different request.', 422)
+                return jsonify(body), status
+            if existing['ResponseStatus'] is None:
+                body, status = _api_error('A request with this Idempotency-Key is still being processed.', 409)
+                return jsonify(body), status
+            replay = Response(existing['ResponseBody'], status=existing['ResponseStatus'], mimetype='application/json')
+            replay.headers['Idempotent-Replayed'] = 'true'
+            return replay
 
+    try:
+        body, status, created = _create_ci_batch(g.api_user, data)
+    except Exception as e:
+        app.logger.error(f"CI API: error creating batch: {e}", exc_info=True)
+        body, status, created = _api_error(f'Error creating batch: {e}', 500) + (False,)
+
+    if idempotency_key:
+        # Remember anything that created a batch; let the client retry anything that did not
+        if created:
+            ApiIdempotencyKey.complete(g.api_token_id, idempotency_key, status, body)
+        else:
+            ApiIdempotencyKey.release(g.api_token_id, idempotency_key)
+    return jsonify(body), status
+
+
+@app.route('/api/v1/batches/<int:batch_assignment_id>', methods=['GET'])
+@api_token_required
+def api_batch_status(batch_assignment_id):
+    batch_assignment = BatchTestAssignment.get(batch_assignment_id)
+    if not batch_assignment or not _api_can_view_batch(g.api_user, batch_assignment):
+        body, status = _api_error('Batch not found or not accessible with this token.', 404)
+        return jsonify(body), status
+    return jsonify(_api_batch_status(batch_assignment))
+
+
+@app.route('/api/v1/batches/<int:batch_assignment_id>/stream', methods=['GET'])
+@api_token_required
+def api_stream_batch(batch_assignment_id):
+    batch_assignment = BatchTestAssignment.get(batch_assignment_id)
+    if not batch_assignment or not _api_can_view_batch(g.api_user, batch_assignment):
+        body, status = _api_error('Batch not found or not accessible with this token.', 404)
+        return jsonify(body), status
+    return sse_response(batch_progress_events(batch_assignment_id, get_last_event_id()))
 
-                process.wait() # Wait for batch_runner.py to complete
-                
-                app.logger.info(f"Batch runner (PID {process.pid if process else 'N/A'}) for BatchID {current_batch_id_for_thread} completed with exit code {process.returncode if process else 'N/A'}.")
-                # The batch_runner.py script is responsible for updating the final DB status of the batch.
-
-        except Exception as e_thread:
-            app.logger.error(f"Exception in batch runner thread for BatchID {current_batch_id_for_thread}: {e_thread}", exc_info=True)
-            # Attempt to mark batch as failed if thread itself crashes before/during Popen
-            BatchTestAssignment.update_status(current_batch_id_for_thread, 'COMPLETED_FAIL')
-        finally:
-            with batch_state_lock:
-                if current_batch_id_for_thread in batch_test_processes:
-                    batch_test_processes[current_batch_id_for_thread]['process'] = None
-                    batch_test_processes[current_batch_id_for_thread]['thread'] = None
-            app.logger.info(f"Batch runner thread for BatchID {current_batch_id_for_thread} finished.")
-
-    thread = threading.Thread(target=run_batch_runner_subprocess_thread, args=(cmd_for_batch_runner, batch_assignment.BatchAssignmentID, output_file))
-    with batch_state_lock:
-        batch_test_processes[batch_assignment.BatchAssignmentID]['thread'] = thread
-    thread.start()
-
-    app.logger.info(f"Launched batch runner thread for BatchAssignmentID {batch_assignment.BatchAssignmentID}.")
-    return jsonify({'status': 'batch_execution_started', 'message': f'Batch {batch_assignment.BatchAssignmentID} execution process initiated.'})
-   
 
 # ******************************************************************************
 # * EXISTING ROUTES TO BE MODIFIED/PROTECTED                                   *
@@ -2297,16 +2681,6 @@ def execute_batch():
 @app.route('/')
 @login_required
 def index():
-    with state_lock: # Your existing cleanup
-        if test_status['output_file'] and not test_status['running']:
-            try:
-                if os.path.exists(test_status['output_file']): os.remove(test_status['output_file'])
-            except OSError as e: app.logger.error(f"Error cleaning up file {test_status['output_file']}: {e}")
-            finally:
-                 test_status['output_file'] = None
-                 test_status['final_output'] = ''
-                 test_status['report_path'] = None
-
     if current_user.role == 'admin': return redirect(url_for('admin_dashboard'))
     elif current_user.role == 'manager': return redirect(url_for('manager_dashboard'))
     elif current_user.role == 'tester': return redirect(url_for('tester_dashboard'))
@@ -2322,23 +2696,6 @@ def run_test():
     if not (current_user.role == 'tester' or current_user.role == 'admin'):
         return jsonify({'status': 'error', 'message': 'You are not authorized to run tests.'}), 403
 
-    global test_status
-    with state_lock:
-        if test_status['running']:
-            return jsonify({'status': 'error', 'message': 'A test is already running.'}), 409
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        output_dir = os.path.join(app.static_folder, 'reports', 'live_output') # Ensure live_output is under static if served directly
-        os.makedirs(output_dir, exist_ok=True)
-        output_file_path = os.path.join(output_dir, f'test_output_{timestamp}.txt')
-
-        test_status['running'] = True
-        test_status['output_file'] = output_file_path
-        test_status['final_output'] = ''
-        test_status['report_path'] = None
-        test_status['process'] = None
-        test_status['thread'] = None
-
     data = request.get_json()
     device_id = data.get('device_id', '').strip()
     android_ver = data.get('android_version', '').strip()
@@ -2348,154 +2705,217 @@ def run_test():
     # batch_assignment_id_from_form = data.get('batch_assignment_id') # Passed from run_assigned_test.html if part of batch
 
     if not testcase_id:
-        with state_lock: test_status['running'] = False
         return jsonify({'status': 'error', 'message': 'Test Case ID is missing.'}), 400
+    if not device_id:
+        return jsonify({'status': 'error', 'message': 'Device ID is missing.'}), 400
 
-    # Store current assignment context globally for get_progress to use
-    with state_lock:
-        test_status['current_assignment_id'] = individual_assignment_id
-        # Find BatchAssignmentID if individual_assignment_id is provided
-        current_batch_id = None
-        if individual_assignment_id:
-            with get_db_conn_from_models() as conn:
-                with conn.cursor(dictionary=True) as cursor:
-                    cursor.execute("SELECT BatchAssignmentID FROM test_assignments WHERE AssignmentID = %s", (individual_assignment_id,))
-                    res = cursor.fetchone()
-                    if res: current_batch_id = res['BatchAssignmentID']
-        test_status['current_batch_assignment_id'] = current_batch_id
-
+    # Find BatchAssignmentID if individual_assignment_id is provided
+    current_batch_id = None
+    previous_status = None
+    if individual_assignment_id:
+        with get_db_conn_from_models() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT BatchAssignmentID, Status FROM test_assignments WHERE AssignmentID = %s", (individual_assignment_id,))
+                res = cursor.fetchone()
+                if res: current_batch_id, previous_status = res['BatchAssignmentID'], res['Status']
 
+    # Statuses changed here are put back if the run cannot be submitted
+    assignment_status_changed = False
+    batch_status_changed = False
     if individual_assignment_id:
         # Update individual assignment status to 'IN_PROGRESS'
         # Use TestAssignment.update_status from models.py
         if not TestAssignment.update_status(individual_assignment_id, 'IN_PROGRESS'):
             app.logger.warning(f"Failed to update assignment {individual_assignment_id} to IN_PROGRESS for user {current_user.id}.")
         else:
+            assignment_status_changed = previous_status is not None and previous_status != 'IN_PROGRESS'
             app.logger.info(f"Assignment {individual_assignment_id} status updated to IN_PROGRESS.")
         # If it's part of a batch, ensure batch is also IN_PROGRESS
-        if test_status['current_batch_assignment_id']:
-            batch_assign = BatchTestAssignment.get(test_status['current_batch_assignment_id'])
+        if current_batch_id:
+            batch_assign = BatchTestAssignment.get(current_batch_id)
             if batch_assign and batch_assign.Status == 'PENDING':
-                BatchTestAssignment.update_status(test_status['current_batch_assignment_id'], 'IN_PROGRESS')
+                batch_status_changed = bool(BatchTestAssignment.update_status(current_batch_id, 'IN_PROGRESS'))
 
+    def revert_statuses():
+        if assignment_status_changed:
+            TestAssignment.update_status(individual_assignment_id, previous_status)
+        if batch_status_changed:
+            BatchTestAssignment.update_status(current_batch_id, 'PENDING')
 
-    runner_path = os.path.join(os.path.dirname(__file__), 'generic_runner.py')
-    cmd = [
-        sys.executable, runner_path,
-        device_id, android_ver, str(testcase_id), str(current_user.id)
-    ]
-    cmd.append(password if password else "NO_PASSWORD_PLACEHOLDER")
-    cmd.append(str(individual_assignment_id) if individual_assignment_id else "NO_ASSIGNMENT_ID_PLACEHOLDER")
+
+    args = [device_id, android_ver, str(testcase_id), str(current_user.id)]
+    args.append(password if password else "NO_PASSWORD_PLACEHOLDER")
+    args.append(str(individual_assignment_id) if individual_assignment_id else "NO_ASSIGNMENT_ID_PLACEHOLDER")
 
     dynamic_params = {k: v for k, v in data.items() if k not in ('device_id','android_version','password','test_case', 'assignment_id')}
-    env = os.environ.copy()
-    env['DYNAMIC_PARAMS'] = json.dumps(dynamic_params)
+    env = {'DYNAMIC_PARAMS': json.dumps(dynamic_params)}
+
+    # Runs are exclusive per device, not globally; the executor refuses a device with any active job
+    try:
+        run = executor.submit('test', args, device_id, user_id=current_user.id, assignment_id=individual_assignment_id,
+                              batch_assignment_id=current_batch_id, env=env)
+    except DeviceBusyError as e:
+        revert_statuses()
+        return jsonify({'status': 'error', 'message': str(e), 'run_id': e.run_id}), 409
+    except ValueError as e:
+        revert_statuses()
+        app.logger.error(f"Executor rejected test run for test case {testcase_id}: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    except ExecutorUnavailable:
+        revert_statuses()
+        raise  # handle_executor_unavailable answers 503
+
+    app.logger.info(f"User {current_user.username} started test run {run['job_id']} on device {device_id} (test case {testcase_id}).")
+    return jsonify({'status': 'started', 'assignment_id': individual_assignment_id, 'run_id': run['job_id']})
+
+
+def _get_run_for_request():
+    """
+    Resolves ?run_id= to the job status dict of a run the current user may see. Clients
+    that do not send a run ID get their own most recent run. Returns (run, error_response).
+    """
+    run_id = request.args.get('run_id', '').strip()
+    if run_id:
+        run = executor.get(run_id)
+    else:
+        runs = executor.list_jobs(user_id=current_user.id, kind='test')
+        run = runs[0] if runs else None
+    if not run:
+        if run_id:
+            return None, (jsonify({'status': 'error', 'message': f'Unknown test run {run_id}.'}), 404)
+        return None, None
+    if run['user_id'] != current_user.id and current_user.role != 'admin':
+        return None, (jsonify({'status': 'error', 'message': 'You are not authorized to view this test run.'}), 403)
+    return run, None
+
+
+def _finish_run_bookkeeping(run):
+    """Batch progress update after a finished run of a batch assignment; the executor lets only one caller claim it."""
+    if not executor.claim_post_run(run['job_id']):
+        return
+    run_id, assignment_id, batch_assignment_id = run['job_id'], run['assignment_id'], run['batch_assignment_id']
+
+    app.logger.info(f"Test run {run_id} for assignment {assignment_id} (part of batch {batch_assignment_id}) has finished.")
+
+    # generic_runner.py should have updated test_assignments.Status and test_assignments.ExecutionID
+    if not batch_assignment_id:
+        return
 
-    app.logger.info(f"User {current_user.username} initiating test. Command: {' '.join(cmd)}")
-    thread = threading.Thread(target=run_test_subprocess, args=(cmd, output_file_path, env))
-    with state_lock: test_status['thread'] = thread
-    thread.start()
+    # Determine if the test was a pass or fail based on test_assignments status (which generic_runner updated)
+    individual_assignment_status = None
+    with get_db_conn_from_models() as conn:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT Status FROM test_assignments WHERE AssignmentID = %s", (assignment_id,))
+            res = cursor.fetchone()
+            if res: individual_assignment_status = res['Status']
+
+    passed_increment = 1 if individual_assignment_status == 'EXECUTED_PASS' else 0
+    BatchTestAssignment.update_progress(batch_assignment_id, completed_increment=1, passed_increment=passed_increment)
+    app.logger.info(f"Updated progress for batch {batch_assignment_id}.")
+
+    # Check if the batch is now fully complete
+    batch_assign_obj = BatchTestAssignment.get(batch_assignment_id)
+    if batch_assign_obj and batch_assign_obj.CompletedTestCases >= batch_assign_obj.TotalTestCases:
+        final_batch_status = 'COMPLETED_FAIL' # Assume fail
+        if batch_assign_obj.PassedTestCases == batch_assign_obj.TotalTestCases:
+            final_batch_status = 'COMPLETED_PASS'
+        BatchTestAssignment.update_status(batch_assignment_id, final_batch_status)
+        app.logger.info(f"Batch {batch_assignment_id} marked as {final_batch_status}.")
 
-    return jsonify({'status': 'started', 'assignment_id': individual_assignment_id, 'output_file': output_file_path})
 
 # --- /get-progress MODIFIED ---
 @app.route('/get-progress')
 @login_required
 def get_progress():
-    global test_status
+    # Clients that send ?offset=<bytes already received> get only the new output plus the next offset
+    offset_arg = request.args.get('offset', type=int)
+    next_offset, output_reset = offset_arg, False
     output_content = ""
-    is_running = False
-    report_path = None
-    error_message = None
-    current_assignment_id_from_state = None
-    current_batch_assignment_id_from_state = None
-
-    with state_lock:
-        is_running = test_status['running']
-        current_output_file = test_status['output_file']
-        report_path_from_state = test_status['report_path']
-        current_assignment_id_from_state = test_status.get('current_assignment_id')
-        current_batch_assignment_id_from_state = test_status.get('current_batch_assignment_id')
-
 
-        if current_output_file and os.path.exists(current_output_file):
-            try:
-                with open(current_output_file, 'r', encoding='utf-8') as f:
-                    output_content = f.read()
-            except Exception as e:
-                error_message = f"Error reading output file: {e}"
-                app.logger.error(f"Error reading output file {current_output_file}: {e}", exc_info=True)
-        elif current_output_file and not os.path.exists(current_output_file) and is_running:
-             output_content = "Output file not yet available..."
-
-        if not is_running and test_status['final_output']:
-             output_content = test_status['final_output']
-             report_path = test_status['report_path'] # Use the one set by runner
-        elif is_running: # If still running, report path is not final
-            report_path = None
-        else: # Not running, no final_output means it might have just finished or error
-            report_path = report_path_from_state
-
-
-    # Logic to handle post-test run updates, especially for batches
-    if not is_running and current_assignment_id_from_state:
-        # This means a generic_runner.py process just finished for current_assignment_id_from_state
-        app.logger.info(f"Test for assignment {current_assignment_id_from_state} (part of batch {current_batch_assignment_id_from_state}) has finished.")
-
-        # generic_runner.py should have updated test_assignments.Status and test_assignments.ExecutionID
-
-        if current_batch_assignment_id_from_state:
-            # Update batch progress
-            # Determine if the last test was a pass or fail based on test_assignments status (which generic_runner updated)
-            individual_assignment_status = None
-            with get_db_conn_from_models() as conn:
-                with conn.cursor(dictionary=True) as cursor:
-                    cursor.execute("SELECT Status FROM test_assignments WHERE AssignmentID = %s", (current_assignment_id_from_state,))
-                    res = cursor.fetchone()
-                    if res: individual_assignment_status = res['Status']
-            
-            passed_increment = 1 if individual_assignment_status == 'EXECUTED_PASS' else 0
-            BatchTestAssignment.update_progress(current_batch_assignment_id_from_state, completed_increment=1, passed_increment=passed_increment)
-            app.logger.info(f"Updated progress for batch {current_batch_assignment_id_from_state}.")
-
-            # Check if the batch is now fully complete
-            batch_assign_obj = BatchTestAssignment.get(current_batch_assignment_id_from_state)
-            if batch_assign_obj and batch_assign_obj.CompletedTestCases >= batch_assign_obj.TotalTestCases:
-                final_batch_status = 'COMPLETED_FAIL' # Assume fail
-                if batch_assign_obj.PassedTestCases == batch_assign_obj.TotalTestCases:
-                    final_batch_status = 'COMPLETED_PASS'
-                BatchTestAssignment.update_status(current_batch_assignment_id_from_state, final_batch_status)
-                app.logger.info(f"Batch {current_batch_assignment_id_from_state} marked as {final_batch_status}.")
-
-
-        # Reset current assignment tracking in global state AFTER processing
-        with state_lock:
-            test_status['current_assignment_id'] = None
-            test_status['current_batch_assignment_id'] = None # We will get the next one via start_batch_run if needed
-
-    # Cleanup of temporary output file
-    if not is_running and current_output_file:
-         with state_lock:
-              if test_status['output_file'] == current_output_file and not test_status['running']:
-                   try:
-                        if os.path.exists(current_output_file): os.remove(current_output_file)
-                   except OSError as e: app.logger.error(f"Error cleaning up final file {current_output_file}: {e}")
-                   finally:
-                        test_status['output_file'] = None
-                        test_status['final_output'] = ''
-                        # test_status['report_path'] is already set with the final path
+    run, error_response = _get_run_for_request()
+    if error_response:
+        return error_response
+    if not run:
+        return jsonify({'output': '', 'running': False, 'report_path': None, 'run_id': None,
+                        'current_assignment_id': None, 'current_batch_assignment_id': None})
+
+    # Only this run's output is read, so pollers of other runs never wait on each other
+    is_running = run['running']
+    output = executor.read_output(run['job_id'], offset_arg)
+    if output:
+        output_content = output['text']
+        if offset_arg is not None:
+            next_offset, output_reset = output['offset'], output['reset']
+    report_path = None if is_running else run['report_path'] # Report path is only final once the run ends
+
+    if not is_running and run['assignment_id']:
+        _finish_run_bookkeeping(run)
 
     response_data = {
         'output': output_content,
         'running': is_running,
         'report_path': report_path,
-        'current_assignment_id': current_assignment_id_from_state, # Send to client for context
-        'current_batch_assignment_id': current_batch_assignment_id_from_state # Send to client
+        'run_id': run['job_id'],
+        'device_id': run['device_id'],
+        'current_assignment_id': run['assignment_id'], # Send to client for context
+        'current_batch_assignment_id': run['batch_assignment_id'] # Send to client
     }
-    if error_message: response_data['error'] = error_message
+    if offset_arg is not None:
+        response_data['offset'] = next_offset
+        response_data['reset'] = output_reset
     return jsonify(response_data)
 
 
+@app.route('/stream-progress')
+@login_required
+def stream_progress():
+    """
+    Server-Sent Events version of /get-progress for one ad-hoc run (?run_id=). Emits
+    'output' events (id = byte offset, so a reconnect resumes where it left off) and a
+    final 'done'. The client then makes one /get-progress call, which performs the
+    post-run bookkeeping and returns the report path.
+    """
+    run, error_response = _get_run_for_request()
+    if error_response:
+        return error_response
+    try:
+        offset = int(get_last_event_id() or 0)
+    except ValueError:
+        offset = 0
+
+    def generate():
+        nonlocal offset
+        if not run:
+            yield sse_event('done', {'running': False})
+            return
+        run_id = run['job_id']
+        last_sent = time.time()
+        last_job_check = None
+        while True:
+            # Runs of other workers are read from the shared store, at most every SSE_STORE_POLL_SECONDS
+            if executor.owns_job(run_id) or last_job_check is None or time.time() - last_job_check >= SSE_STORE_POLL_SECONDS:
+                last_job_check = time.time()
+                job = executor.get(run_id)
+                is_running = bool(job and job['running'])
+                new_output, reset = '', False
+                output = executor.read_output(run_id, offset)
+                if output:
+                    new_output, offset, reset = output['text'], output['offset'], output['reset']
+                if new_output or reset:
+                    yield sse_event('output', {'text': new_output, 'reset': reset, 'offset': offset}, offset)
+                    last_sent = time.time()
+
+                if not is_running:
+                    yield sse_event('done', {'running': False, 'run_id': run_id})
+                    return
+            if time.time() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            time.sleep(SSE_POLL_SECONDS)
+
+    return sse_response(generate())
+
+
 # --- OTHER EXISTING API ROUTES (largely unchanged for this scope) ---
 @app.route('/test-case/<int:tcid>/params')
 @login_required
@@ -2560,8 +2980,43 @@ def api_test_cases_list():
 
 
 # --- Test Results Views (EXISTING) ---
-def get_adhoc_executions_for_user(user_id, role, search_query=None):
-    adhoc_executions = []
+ADHOC_PAGE_SIZE = 200 # Ad-hoc executions per page of the results overview
+BATCH_RESULTS_PAGE_SIZE = 50 # Batches per page of the results overview
+
+
+def _search_filter(search_query, fulltext_conditions, like_columns, exact_columns=(), use_fulltext=True):
+    """
+    SQL condition and params for a search box. The term goes through the full-text
+    indexes (search_index.py): each of `fulltext_conditions` takes the boolean query
+    once; `exact_columns` (status/priority-like values) are compared to the upper-cased
+    term. A term without any indexable word, or a database without the indexes
+    (`use_fulltext` False, see fulltext_ready), falls back to LIKE over `like_columns`.
+    """
+    search_query = search_query.strip()
+    fulltext_query = boolean_query(search_query) if use_fulltext else None
+    if fulltext_query:
+        conditions = list(fulltext_conditions) + [f"{column} = %s" for column in exact_columns]
+        params = [fulltext_query] * len(fulltext_conditions) + [search_query.upper()] * len(exact_columns)
+    else:
+        conditions = [f"{column} LIKE %s" for column in like_columns]
+        params = [f"%{search_query}%"] * len(like_columns)
+    return "(" + " OR ".join(conditions) + ")", params
+
+
+def _keyset_page(rows, page_size, time_key, id_key):
+    """Trims a LIMIT page_size + 1 result to the page; returns (rows, cursor of the next page or None)."""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1][time_key], rows[-1][id_key])
+
+
+def get_adhoc_executions_for_user(user_id, role, search_query=None, before=None, page_size=ADHOC_PAGE_SIZE):
+    """
+    One page of ad-hoc executions, newest first, and the cursor of the next page (None
+    on the last one). `before` is such a cursor; pages seek on (ExecutionTime,
+    ExecutionID), so any page costs the same as the first.
+    """
     with get_db_conn_from_models() as conn:
         with conn.cursor(dictionary=True) as cursor:
             query_fields = """
@@ -2585,29 +3040,31 @@ def get_adhoc_executions_for_user(user_id, role, search_query=None):
                 filter_conditions.append("te.ExecutedBy = %s")
                 query_params.append(user_id)
 
-            if search_query:
-                search_like = f"%{search_query.strip()}%"
-                search_filter = """
-                    (
-                        tc.Module LIKE %s OR
-                        te.OverallStatus LIKE %s OR
-                        u_executor.Username LIKE %s OR
-                        tc.Name LIKE %s OR
-                        tc.Code LIKE %s
-                    )
-                """
+            if search_query and search_query.strip():
+                search_filter, search_params = _search_filter(
+                    search_query,
+                    [f"te.TestCaseID IN (SELECT TestCaseID FROM testcases WHERE {TESTCASE_MATCH})",
+                     f"te.ExecutedBy IN (SELECT UserID FROM users WHERE {USER_MATCH})"],
+                    ['tc.Module', 'te.OverallStatus', 'u_executor.Username', 'tc.Name', 'tc.Code'],
+                    exact_columns=['te.OverallStatus'], use_fulltext=fulltext_ready(conn))
                 filter_conditions.append(search_filter)
-                query_params.extend([search_like] * 5)
+                query_params.extend(search_params)
+
+            seek = decode_cursor(before)
+            if seek:
+                filter_conditions.append("(te.ExecutionTime < %s OR (te.ExecutionTime = %s AND te.ExecutionID < %s))")
+                query_params.extend([seek[0], seek[0], seek[1]])
 
             full_query = query_fields + query_from_join
             if filter_conditions:
                 full_query += " WHERE " + " AND ".join(filter_conditions)
-            full_query += " ORDER BY te.ExecutionTime DESC LIMIT 200;"
+            full_query += " ORDER BY te.ExecutionTime DESC, te.ExecutionID DESC LIMIT %s;"
+            query_params.append(page_size + 1)
 
             cursor.execute(full_query, tuple(query_params))
             adhoc_executions = cursor.fetchall()
 
-    return adhoc_executions
+    return _keyset_page(adhoc_executions, page_size, 'ExecutionTime', 'ExecutionID')
 
 
 @app.route('/test-results')
@@ -2615,6 +3072,7 @@ def get_adhoc_executions_for_user(user_id, role, search_query=None):
 def test_results_overview():
     completed_batch_assignments = []
     adhoc_test_executions = []
+    next_batch_cursor = next_adhoc_cursor = None
     conn = None  # Initialize conn for the finally block
 
     try:
@@ -2631,7 +3089,6 @@ def test_results_overview():
         cursor = conn.cursor(dictionary=True)
 
         search_query = request.args.get('search', '').strip()
-        search_like = f"%{search_query}%" if search_query else None
 
         batch_query_base = """
             SELECT bta.*, 
@@ -2652,35 +3109,49 @@ def test_results_overview():
             app.logger.info(f"Tester filter will be applied for batches: AssignedToUserID = {current_user.id}")
 
         if search_query:
-            search_filter = """
-                (
-                    u_tester.Username LIKE %s OR
-                    u_assigner.Username LIKE %s OR
-                    bta.AssignmentType LIKE %s OR
-                    bta.Status LIKE %s OR
-                    bta.ReferenceName LIKE %s OR
-                    bta.Priority LIKE %s OR
-                    DATE_FORMAT(bta.AssignmentDate, '%%Y-%%m-%%d') LIKE %s
-                )
-            """
+            fulltext_conditions = [
+                f"bta.BatchAssignmentID IN (SELECT BatchAssignmentID FROM batch_test_assignments WHERE {BATCH_MATCH})",
+                f"bta.AssignedToUserID IN (SELECT UserID FROM users WHERE {USER_MATCH})",
+                f"bta.AssignedByUserID IN (SELECT UserID FROM users WHERE {USER_MATCH})",
+            ]
+            search_filter, search_params = _search_filter(
+                search_query, fulltext_conditions,
+                ['u_tester.Username', 'u_assigner.Username', 'bta.AssignmentType', 'bta.Status',
+                 'bta.ReferenceName', 'bta.Priority', "DATE_FORMAT(bta.AssignmentDate, '%%Y-%%m-%%d')"],
+                exact_columns=['bta.AssignmentType', 'bta.Status', 'bta.Priority'],
+                use_fulltext=fulltext_ready(conn))
+            try: # A date finds the batches assigned that day, through the paging index
+                search_day = datetime.strptime(search_query, '%Y-%m-%d')
+                search_filter = f"({search_filter} OR (bta.AssignmentDate >= %s AND bta.AssignmentDate < %s))"
+                search_params += [search_day, search_day + timedelta(days=1)]
+            except ValueError:
+                pass
             all_dynamic_filters.append(search_filter)
-            batch_params.extend([search_like] * 7)
+            batch_params.extend(search_params)
+
+        batch_seek = decode_cursor(request.args.get('batch_before'))
+        if batch_seek:
+            all_dynamic_filters.append("(bta.AssignmentDate < %s OR (bta.AssignmentDate = %s AND bta.BatchAssignmentID < %s))")
+            batch_params.extend([batch_seek[0], batch_seek[0], batch_seek[1]])
 
         batch_query = batch_query_base
         if all_dynamic_filters:
             batch_query += " WHERE " + " AND ".join(all_dynamic_filters)
-        batch_query += " ORDER BY bta.AssignmentDate DESC LIMIT 50;"
+        batch_query += " ORDER BY bta.AssignmentDate DESC, bta.BatchAssignmentID DESC LIMIT %s;"
+        batch_params.append(BATCH_RESULTS_PAGE_SIZE + 1)
 
         app.logger.info(f"Final Batch Query for Results: {batch_query}")
         app.logger.info(f"Batch Query Params: {tuple(batch_params)}")
 
         cursor.execute(batch_query, tuple(batch_params))
-        completed_batch_assignments = cursor.fetchall()
+        completed_batch_assignments, next_batch_cursor = _keyset_page(
+            cursor.fetchall(), BATCH_RESULTS_PAGE_SIZE, 'AssignmentDate', 'BatchAssignmentID')
         app.logger.info(f"Fetched {len(completed_batch_assignments)} batch assignments for results page.")
         cursor.close()
 
         # Fetch Ad-hoc executions with search
-        adhoc_test_executions = get_adhoc_executions_for_user(current_user.id, current_user.role, search_query)
+        adhoc_test_executions, next_adhoc_cursor = get_adhoc_executions_for_user(
+            current_user.id, current_user.role, search_query, before=request.args.get('exec_before'))
 
     except mysql.connector.Error as err:
         app.logger.error(f"DB error in test_results_overview for {current_user.username}: {err}", exc_info=True)
@@ -2708,6 +3179,8 @@ def test_results_overview():
                            title="Test Execution Results",
                            batch_assignments=completed_batch_assignments,
                            grouped_adhoc_executions=sorted_grouped_adhoc_executions,
+                           next_batch_cursor=next_batch_cursor,
+                           next_adhoc_cursor=next_adhoc_cursor,
                            user_role=current_user.role)
 
 
@@ -2746,7 +3219,7 @@ def batch_execution_detail(batch_assignment_id):
         with conn.cursor(dictionary=True) as cursor:
             # This query links testexecutions through test_assignments to the batch
             query_executions = """
-                SELECT te.ExecutionID, te.ExecutionTime, te.OverallStatus,
+                SELECT te.ExecutionID, te.ExecutionTime, te.OverallStatus, te.Parameters,
                        tc.TestCaseID, tc.Code AS TestCaseCode, tc.Name AS TestCaseName,
                        ta.AssignmentID as IndividualAssignmentID, ta.Status as IndividualAssignmentStatus
                        /* Add other fields like ExecutedByUsername if needed */
@@ -2761,7 +3234,10 @@ def batch_execution_detail(batch_assignment_id):
             # Typically, each individual assignment in a batch is executed once per batch run.
             cursor.execute(query_executions, (batch_assignment_id,))
             individual_executions_in_batch = cursor.fetchall()
-            
+
+    for exec_row in individual_executions_in_batch:
+        exec_row['IsCachedResult'] = is_cached_link(exec_row.pop('Parameters', None), exec_row['IndividualAssignmentID'])
+
     app.logger.debug(f"Batch details: {batch_assignment_details}")
     app.logger.debug(f"Individual executions in batch: {individual_executions_in_batch}")
 
@@ -2773,6 +3249,17 @@ def batch_execution_detail(batch_assignment_id):
                            executions=individual_executions_in_batch)
 
 
+def _tester_can_view_execution(cursor, execution_id):
+    # Cached results are linked to the tester's assignment but were executed by whoever ran them first
+    cursor.execute("""
+        SELECT te.ExecutionID FROM testexecutions te
+        WHERE te.ExecutionID = %s
+          AND (te.ExecutedBy = %s OR EXISTS (SELECT 1 FROM test_assignments ta
+                                             WHERE ta.ExecutionID = te.ExecutionID AND ta.AssignedToUserID = %s))
+    """, (execution_id, current_user.id, current_user.id))
+    return cursor.fetchone() is not None
+
+
 @app.route('/test-results/execution/<int:execution_id>')
 @login_required
 def execution_detail(execution_id):
@@ -2791,8 +3278,7 @@ def execution_detail(execution_id):
         with conn.cursor(dictionary=True) as cursor:
             # Authorization check for tester
             if current_user.role == 'tester':
-                cursor.execute("SELECT te.ExecutionID FROM testexecutions te WHERE te.ExecutionID = %s AND te.ExecutedBy = %s", (execution_id, current_user.id))
-                if not cursor.fetchone():
+                if not _tester_can_view_execution(cursor, execution_id):
                     flash("You are not authorized to view this execution detail.", "danger")
                     # No conn.close() here, 'with' statement handles it if this was the only operation.
                     # However, since we have more ops, better to close explicitly at the end or error.
@@ -2832,13 +3318,22 @@ def execution_detail(execution_id):
 
 
 
-            # Fetch step results
-            cursor.execute("""
-                SELECT sr.*, s.StepOrder, s.Input AS OriginalStepInput, s.ExpectedResponse AS OriginalExpectedResponse
-                FROM stepresults sr JOIN steps s ON sr.StepID = s.StepID
-                WHERE sr.ExecutionID = %s ORDER BY s.StepOrder;
-            """, (execution_id,))
-            step_results = cursor.fetchall()
+            # Fetch step results; those of archived executions are read from their bundle
+            archived = find_archived_execution(cursor, execution_id)
+            execution_summary['Archived'] = archived
+            if archived:
+                try:
+                    step_results = load_archived_steps(execution_id, archived['BundlePath'])
+                except OSError as e:
+                    app.logger.error(f"Could not read archived steps of execution {execution_id}: {e}")
+                    flash("The archived step results of this execution could not be read.", "warning")
+            else:
+                cursor.execute("""
+                    SELECT sr.*, s.StepOrder, s.Input AS OriginalStepInput, s.ExpectedResponse AS OriginalExpectedResponse
+                    FROM stepresults sr JOIN steps s ON sr.StepID = s.StepID
+                    WHERE sr.ExecutionID = %s ORDER BY s.StepOrder;
+                """, (execution_id,))
+                step_results = cursor.fetchall()
 
             # --- Fetch BatchAssignmentID if this execution is part of a batch ---
             # This assumes 'ExecutionID' in 'test_assignments' is updated by generic_runner.py
@@ -2881,6 +3376,33 @@ def execution_detail(execution_id):
     )
 
 
+@app.route('/test-results/execution/<int:execution_id>/archived/<path:screenshot_path>')
+@login_required
+def archived_execution_file(execution_id, screenshot_path):
+    """A screenshot of an archived execution, served from its cold-storage bundle."""
+    conn = get_db_connection()
+    if not conn:
+        return "Database connection error.", 503
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            if current_user.role == 'tester' and not _tester_can_view_execution(cursor, execution_id):
+                return "Not authorized.", 403
+            archived = find_archived_execution(cursor, execution_id)
+    except mysql.connector.Error as db_err:
+        app.logger.error(f"DB error in archived_execution_file for {execution_id}: {db_err}")
+        return "Database error.", 500
+    finally:
+        conn.close()
+
+    data = read_archived_file(execution_id, archived['BundlePath'], screenshot_path) if archived else None
+    if data is None:
+        return "Not found.", 404
+    mimetype = 'image/png' if screenshot_path.lower().endswith('.png') else 'application/octet-stream'
+    response = send_file(BytesIO(data), mimetype=mimetype, download_name=os.path.basename(screenshot_path))
+    response.headers['Cache-Control'] = 'private, max-age=86400'  # Archived files never change
+    return response
+
+
 # --- Existing Helper Functions (get_modules, get_applications, etc.) ---
 # Ensure these use get_db_conn_from_models() if they interact with new models or for consistency
 @app.route('/get-modules') # Used by create_testcase.html
@@ -2888,10 +3410,8 @@ def get_modules():
     app_type = request.args.get('appType', type=int)
     if not app_type: return jsonify([]), 400
     try:
-        with get_db_conn_from_models() as conn:
-            with conn.cursor(dictionary=True) as cursor:
-                cursor.execute("SELECT SuiteID, Name FROM testsuites WHERE AppType = %s ORDER BY Name", (app_type,))
-                return jsonify(cursor.fetchall())
+        return jsonify([{'SuiteID': suite['SuiteID'], 'Name': suite['Name']}
+                        for suite in _catalog().suites_for_application(app_type)])
     except Exception as e:
         app.logger.error(f"Error in /get-modules: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -2903,10 +3423,7 @@ def get_applications(): # This seems to be the same as get_apptypes
 @app.route('/apptype') # Used by create_testcase.html
 def get_apptypes():
     try:
-        with get_db_conn_from_models() as conn:
-            with conn.cursor(dictionary=True) as cursor:
-                cursor.execute("SELECT id, name FROM application ORDER BY name")
-                return jsonify(cursor.fetchall())
+        return jsonify(_catalog().applications)
     except Exception as e:
         app.logger.error(f"Error in /apptype: {e}", exc_info=True)
         return jsonify([]), 500
@@ -2932,6 +3449,7 @@ def add_module():
                     VALUES (%s, %s, %s, %s, %s, %s)
                 """, (module_name, app_type, description, now, now, current_user.id))
                 # conn.commit() # autocommit
+                _catalog_changed()
                 return jsonify(success=True, module_id=cursor.lastrowid)
     except mysql.connector.Error as e:
         # conn.rollback() # if not autocommit
@@ -2940,17 +3458,29 @@ def add_module():
              return jsonify(success=False, error=f"A module with name '{module_name}' might already exist for this application type."), 409
         return jsonify(success=False, error=str(e)), 500
 
-def execute_sql_query(query_string, params=None, fetch_one=False):
+def _run_sql_query(query_string, params, fetch_one):
+    with get_db_conn_from_models() as conn: # Use your context manager
+        with conn.cursor(dictionary=True) as cursor: # dictionary=True is good for dict results
+            cursor.execute(query_string, params or ())
+            if fetch_one:
+                row = cursor.fetchone()
+                return row # Already a dict
+            else:
+                rows = cursor.fetchall()
+                return rows # Already a list of dicts
+
+
+def execute_sql_query(query_string, params=None, fetch_one=False, use_cache=True):
+    """
+    Read-only query for the dashboards and analytics. Results are served from the
+    query cache (query_cache.py) until the runners bump the data version or the TTL
+    expires; pass use_cache=False for a query that must see uncommitted-elsewhere data.
+    """
     try:
-        with get_db_conn_from_models() as conn: # Use your context manager
-            with conn.cursor(dictionary=True) as cursor: # dictionary=True is good for dict results
-                cursor.execute(query_string, params or ())
-                if fetch_one:
-                    row = cursor.fetchone()
-                    return row # Already a dict
-                else:
-                    rows = cursor.fetchall()
-                    return rows # Already a list of dicts
+        if not use_cache:
+            return _run_sql_query(query_string, params, fetch_one)
+        return query_cache.get_or_load((query_string, tuple(params or ()), fetch_one),
+                                       lambda: _run_sql_query(query_string, params, fetch_one))
     except mysql.connector.Error as err:
         # Log the error for debugging
         # You might have a global app logger: current_app.logger.error(f"DB Query Error: {err} in query: {query_string}")
@@ -2961,6 +3491,110 @@ def execute_sql_query(query_string, params=None, fetch_one=False):
         return None if fetch_one else []
 
 
+TREND_RANGES = (7, 30, 90, 365) # Days the execution trend chart can show (?trend_days=)
+
+
+def _trend_days_arg():
+    trend_days = request.args.get('trend_days', type=int)
+    return trend_days if trend_days in TREND_RANGES else TREND_RANGES[0]
+
+
+def _execution_trend(days, executions_source):
+    """Daily ad-hoc PASS/FAIL counts for the last `days` days (today included), zero-filled; `executions_source` from rollup_sources."""
+    first_day = (datetime.now() - timedelta(days=days - 1)).date()
+    trend_counts = {(row['Day'], row['OverallStatus']): int(row['count'] or 0) for row in execute_sql_query(f"""
+        SELECT r.Day, r.OverallStatus, SUM(r.ExecutionCount) AS count
+        FROM {executions_source}
+        WHERE r.Day >= %s AND r.OverallStatus IN ('PASS', 'FAIL')
+        GROUP BY r.Day, r.OverallStatus;
+    """, params=(first_day,))}
+    trend_days = [first_day + timedelta(days=i) for i in range(days)]
+    return {
+        'execution_trend_days': days,
+        'execution_trend_ranges': list(TREND_RANGES),
+        'execution_trend_dates': [day.strftime('%b %d') for day in trend_days],
+        'execution_trend_pass_data': [trend_counts.get((day, 'PASS'), 0) for day in trend_days],
+        'execution_trend_fail_data': [trend_counts.get((day, 'FAIL'), 0) for day in trend_days],
+    }
+
+
+def _dashboard_stats(include_charts=True, trend_days=TREND_RANGES[0]):
+    """
+    Figures and chart data shared by admin_dashboard and analytics_dashboard. Execution
+    and assignment counts come from the rollup tables (rollups.py), so a page view costs a
+    handful of small indexed queries instead of scans over testexecutions; until
+    migrate.py has backfilled them the same figures are aggregated from the live tables.
+    """
+    with get_db_conn_from_models() as conn:
+        executions_source, assignments_source = rollup_sources(conn)
+
+    stats = {}
+    result_total_tests = execute_sql_query("SELECT COUNT(TestCaseID) as count FROM testcases;", fetch_one=True)
+    stats['total_tests'] = result_total_tests['count'] if result_total_tests and result_total_tests['count'] is not None else 0
+
+    # Executions: ad-hoc ones from the daily rollup, batch ones from the per-batch counters
+    executions_by_status = {row['OverallStatus']: int(row['count'] or 0) for row in execute_sql_query(
+        f"SELECT r.OverallStatus, SUM(r.ExecutionCount) AS count FROM {executions_source} GROUP BY r.OverallStatus")}
+    batch_totals = execute_sql_query("""
+        SELECT SUM(CompletedTestCases) AS sum_completed, SUM(PassedTestCases) AS sum_passed
+        FROM batch_test_assignments WHERE Status LIKE 'COMPLETED_%'
+    """, fetch_one=True) or {}
+    stats['total_executions'] = sum(executions_by_status.values()) + int(batch_totals.get('sum_completed') or 0)
+    stats['passed_executions'] = executions_by_status.get('PASS', 0) + int(batch_totals.get('sum_passed') or 0)
+    stats['failed_executions'] = stats['total_executions'] - stats['passed_executions']
+
+    result_active_testers = execute_sql_query("SELECT COUNT(UserID) as count FROM users WHERE Role = 'tester' AND IsActive = 1;", fetch_one=True)
+    stats['active_testers'] = result_active_testers['count'] if result_active_testers and result_active_testers['count'] is not None else 0
+
+    if not include_charts:
+        return stats
+
+    # Chart 1: Executions by Batch
+    batch_execution_data = execute_sql_query("""
+        SELECT BatchAssignmentID, ReferenceName, PassedTestCases, (CompletedTestCases - PassedTestCases) as FailedTestCases
+        FROM batch_test_assignments
+        WHERE Status LIKE 'COMPLETED_%'
+        ORDER BY AssignmentDate DESC
+        LIMIT 5;
+    """)
+    stats['batch_chart_labels'] = [b['ReferenceName'] for b in batch_execution_data]
+    stats['batch_chart_pass_data'] = [int(b['PassedTestCases'] or 0) for b in batch_execution_data]
+    stats['batch_chart_fail_data'] = [int(b['FailedTestCases'] or 0) for b in batch_execution_data]
+
+    # Chart 2: Executions by Application (Pass/Fail from adhoc)
+    app_execution_data = execute_sql_query(f"""
+        SELECT app.name AS ApplicationName,
+               SUM(CASE WHEN r.OverallStatus = 'PASS' THEN r.ExecutionCount ELSE 0 END) AS PassedCount,
+               SUM(CASE WHEN r.OverallStatus = 'FAIL' THEN r.ExecutionCount ELSE 0 END) AS FailedCount
+        FROM {executions_source}
+        JOIN application app ON r.ApplicationID = app.id
+        GROUP BY app.name
+        ORDER BY app.name;
+    """)
+    stats['app_chart_labels'] = [row['ApplicationName'] for row in app_execution_data]
+    stats['app_chart_pass_data'] = [int(row['PassedCount'] or 0) for row in app_execution_data]
+    stats['app_chart_fail_data'] = [int(row['FailedCount'] or 0) for row in app_execution_data]
+
+    # Chart 3: executed test assignments by priority
+    stats['priority_pie_labels'] = ['HIGH', 'MEDIUM', 'LOW'] # Match ENUM values case
+    # High: Green (#28a745), Medium: Blue (#007bff), Low: Red (#dc3545)
+    stats['priority_pie_colors'] = ['#28a745', '#007bff', '#dc3545']
+    priority_counts = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0}
+    for row in execute_sql_query(f"""
+        SELECT r.Priority, SUM(r.AssignmentCount) AS count
+        FROM {assignments_source}
+        WHERE r.Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL')
+        GROUP BY r.Priority;
+    """):
+        if row['Priority'] in priority_counts:
+            priority_counts[row['Priority']] = int(row['count'] or 0)
+    stats['priority_pie_data'] = [priority_counts['HIGH'], priority_counts['MEDIUM'], priority_counts['LOW']]
+
+    # Chart 4: Execution Trend (adhoc) over the selected range
+    stats.update(_execution_trend(trend_days, executions_source))
+    return stats
+
+
 @app.route('/analytics')
 @login_required
 def analytics_dashboard():
@@ -2973,147 +3607,7 @@ def analytics_dashboard():
     stats = {}
 
     try:
-        # 1. Total Tests Defined
-        query_total_tests = "SELECT COUNT(TestCaseID) as count FROM testcases;"
-        result_total_tests = execute_sql_query(query_total_tests, fetch_one=True)
-        stats['total_tests'] = result_total_tests['count'] if result_total_tests and result_total_tests['count'] is not None else 0
-
-        # 2. Total Executions
-        query_adhoc_executions = "SELECT COUNT(ExecutionID) as count FROM testexecutions;"
-        result_adhoc = execute_sql_query(query_adhoc_executions, fetch_one=True)
-        adhoc_exec_count = result_adhoc['count'] if result_adhoc and result_adhoc['count'] is not None else 0
-        adhoc_exec_count = int(adhoc_exec_count) if adhoc_exec_count is not None else 0
-
-        query_batch_tc_executions = "SELECT SUM(CompletedTestCases) as sum_completed FROM batch_test_assignments WHERE Status LIKE 'COMPLETED_%';"
-        result_batch_tc = execute_sql_query(query_batch_tc_executions, fetch_one=True)
-        batch_tc_exec_count = result_batch_tc['sum_completed'] if result_batch_tc and result_batch_tc['sum_completed'] is not None else 0
-        batch_tc_exec_count = int(batch_tc_exec_count) if batch_tc_exec_count is not None else 0
-        stats['total_executions'] = adhoc_exec_count + batch_tc_exec_count
-
-        # 3. Passed Executions
-        query_adhoc_passed = "SELECT COUNT(ExecutionID) as count FROM testexecutions WHERE OverallStatus = 'PASS';"
-        result_adhoc_passed = execute_sql_query(query_adhoc_passed, fetch_one=True)
-        adhoc_passed_count = result_adhoc_passed['count'] if result_adhoc_passed and result_adhoc_passed['count'] is not None else 0
-        adhoc_passed_count = int(adhoc_passed_count) if adhoc_passed_count is not None else 0
-
-        query_batch_passed_tc = "SELECT SUM(PassedTestCases) as sum_passed FROM batch_test_assignments WHERE Status LIKE 'COMPLETED_%';"
-        result_batch_passed = execute_sql_query(query_batch_passed_tc, fetch_one=True)
-        batch_passed_count = result_batch_passed['sum_passed'] if result_batch_passed and result_batch_passed['sum_passed'] is not None else 0
-        batch_passed_count = int(batch_passed_count) if batch_passed_count is not None else 0
-        stats['passed_executions'] = adhoc_passed_count + batch_passed_count
-
-        # 4. Failed Executions
-        total_exec = stats.get('total_executions', 0)
-        passed_exec = stats.get('passed_executions', 0)
-        stats['failed_executions'] = total_exec - passed_exec
-
-        # 5. Active Testers
-        query_active_testers = "SELECT COUNT(UserID) as count FROM users WHERE Role = 'tester' AND IsActive = 1;"
-        result_active_testers = execute_sql_query(query_active_testers, fetch_one=True)
-        stats['active_testers'] = result_active_testers['count'] if result_active_testers and result_active_testers['count'] is not None else 0
-
-
-        # --- Data for Charts (Manager/Admin) ---
-        if current_user.role in ['admin', 'manager']:
-            # Chart 1: Executions by Batch
-            query_batch_summary = """
-                SELECT BatchAssignmentID, ReferenceName, PassedTestCases, (CompletedTestCases - PassedTestCases) as FailedTestCases
-                FROM batch_test_assignments
-                WHERE Status LIKE 'COMPLETED_%'
-                ORDER BY AssignmentDate DESC
-                LIMIT 5;
-            """
-            batch_execution_data = execute_sql_query(query_batch_summary)
-            stats['batch_chart_labels'] = [b['ReferenceName'] for b in batch_execution_data] if batch_execution_data else []
-            stats['batch_chart_pass_data'] = [int(b['PassedTestCases']) if b['PassedTestCases'] is not None else 0 for b in batch_execution_data] if batch_execution_data else []
-            stats['batch_chart_fail_data'] = [int(b['FailedTestCases']) if b['FailedTestCases'] is not None else 0 for b in batch_execution_data] if batch_execution_data else []
-
-            # Chart 2: Executions by Application (Pass/Fail from adhoc)
-            query_app_summary = """
-                SELECT
-                    app.name as ApplicationName,
-                    SUM(CASE WHEN te.OverallStatus = 'PASS' THEN 1 ELSE 0 END) as PassedCount,
-                    SUM(CASE WHEN te.OverallStatus = 'FAIL' THEN 1 ELSE 0 END) as FailedCount
-                FROM testexecutions te
-                JOIN testcases tc ON te.TestCaseID = tc.TestCaseID
-                JOIN testsuites ts ON tc.Module_id = ts.SuiteID
-                JOIN application app ON ts.AppType = app.id
-                GROUP BY app.name
-                ORDER BY app.name;
-            """
-            app_execution_data = execute_sql_query(query_app_summary)
-            # print(app_execution_data)
-            stats['app_chart_labels'] = []
-            stats['app_chart_pass_data'] = []
-            stats['app_chart_fail_data'] = []
-            if app_execution_data:
-                for app_data in app_execution_data:
-                    stats['app_chart_labels'].append(app_data['ApplicationName'])
-                    stats['app_chart_pass_data'].append(int(app_data['PassedCount']) if app_data['PassedCount'] is not None else 0)
-                    stats['app_chart_fail_data'].append(int(app_data['FailedCount']) if app_data['FailedCount'] is not None else 0)
-                
-            print(stats)
-
-            # MODIFIED: Chart for ALL Test Assignments by Priority
-            # MODIFIED: Chart for ALL EXECUTED Test Assignments by Priority
-            stats['priority_pie_labels'] = ['HIGH', 'MEDIUM', 'LOW'] # Match ENUM values case
-            # Updated Colors: High: Green (#28a745), Medium: Blue (#007bff), Low: Red (#dc3545)
-            stats['priority_pie_colors'] = ['#28a745', '#007bff', '#dc3545'] 
-            
-            # MODIFIED QUERY: Count all executed (passed or failed) assignments by priority
-            query_executed_by_priority = """
-                SELECT
-                    Priority, 
-                    COUNT(*) as count
-                FROM test_assignments  
-                WHERE Status IN ('EXECUTED_PASS', 'EXECUTED_FAIL') 
-                GROUP BY Priority;
-            """
-            priority_results = execute_sql_query(query_executed_by_priority)
-            
-            priority_counts_from_db = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0} 
-            if priority_results:
-                for row in priority_results:
-                    priority_key = row.get('Priority') 
-                    if priority_key in priority_counts_from_db: 
-                        priority_counts_from_db[priority_key] = int(row['count']) if row['count'] is not None else 0
-            
-            stats['priority_pie_data'] = [
-                priority_counts_from_db.get('HIGH', 0), 
-                priority_counts_from_db.get('MEDIUM', 0),
-                priority_counts_from_db.get('LOW', 0)
-            ]
-
-    # ... (rest of the code remains the same) ...
-            # Chart 3: Execution Trend Over Time (adhoc)
-            execution_trend_dates = []
-            execution_trend_pass = []
-            execution_trend_fail = []
-            for i in range(6, -1, -1): 
-                day_date = datetime.now() - timedelta(days=i)
-                day_str = day_date.strftime('%Y-%m-%d')
-                execution_trend_dates.append(day_date.strftime('%b %d'))
-
-                query_trend_pass = """
-                    SELECT COUNT(ExecutionID) as count
-                    FROM testexecutions
-                    WHERE OverallStatus = 'PASS' AND DATE(ExecutionTime) = %s;
-                """
-                pass_count_result = execute_sql_query(query_trend_pass, params=(day_str,), fetch_one=True)
-                execution_trend_pass.append(int(pass_count_result['count']) if pass_count_result and pass_count_result['count'] is not None else 0)
-
-                query_trend_fail = """
-                    SELECT COUNT(ExecutionID) as count
-                    FROM testexecutions
-                    WHERE OverallStatus = 'FAIL' AND DATE(ExecutionTime) = %s;
-                """
-                fail_count_result = execute_sql_query(query_trend_fail, params=(day_str,), fetch_one=True)
-                execution_trend_fail.append(int(fail_count_result['count']) if fail_count_result and fail_count_result['count'] is not None else 0)
-
-            stats['execution_trend_dates'] = execution_trend_dates
-            stats['execution_trend_pass_data'] = execution_trend_pass
-            stats['execution_trend_fail_data'] = execution_trend_fail
-
+        stats.update(_dashboard_stats(include_charts=current_user.role in ['admin', 'manager'], trend_days=_trend_days_arg()))
     except Exception as e:
         print(f"Error in analytics_dashboard: {e}") # Good for server-side logging
         flash(f"Error fetching analytics data: {str(e)}. Please try again later or contact support.", "danger")
@@ -3135,85 +3629,14 @@ def analytics_dashboard():
         stats.setdefault('execution_trend_dates', [])
         stats.setdefault('execution_trend_pass_data', [])
         stats.setdefault('execution_trend_fail_data', [])
+        stats.setdefault('execution_trend_days', _trend_days_arg())
+        stats.setdefault('execution_trend_ranges', list(TREND_RANGES))
         # print(f"Stats on error: {stats}") # Be cautious with logging sensitive data
 
     return render_template('analytics/analytics_dashboard.html',  user_role=current_user.role, title="System Analytics", stats=stats)
 
 
 # --- HELPER: run_test_subprocess (Your existing function, assumed to be defined below) ---
-def run_test_subprocess(cmd, output_file_path, env):
-    global test_status
-    full_output = ""
-    final_report_path = None
-    error_occurred = False
-
-    app.logger.info(f"Starting subprocess: {' '.join(cmd)} with env DYNAMIC_PARAMS: {env.get('DYNAMIC_PARAMS')}")
-    proc = None # Define proc outside try block for access in finally
-
-    try:
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                text=True, bufsize=1, universal_newlines=True, env=env)
-        with state_lock: test_status['process'] = proc
-
-        with open(output_file_path, 'w', encoding='utf-8') as f_out:
-            f_out.seek(0)
-            f_out.truncate()
-            for line in proc.stdout:
-                line_strip = line.strip()
-                app.logger.debug(f"RUNNER_STDOUT: {line_strip}")
-                f_out.write(line)
-                full_output += line
-                if 'report saved at:' in line_strip.lower():
-                    final_report_path = line_strip.split('report saved at:', 1)[-1].strip()
-                f_out.flush()
-
-            stderr_output = proc.stderr.read()
-            if stderr_output:
-                app.logger.error(f"RUNNER_STDERR: {stderr_output.strip()}")
-                f_out.write("\n--- STDERR ---\n" + stderr_output)
-                full_output += "\n--- STDERR ---\n" + stderr_output
-                error_occurred = True
-                f_out.flush()
-
-        proc.wait()
-        app.logger.info(f"Subprocess finished with exit code: {proc.returncode}")
-        if proc.returncode != 0: error_occurred = True
-
-        if not final_report_path:
-            if error_occurred:
-                final_report_path = f"Test script error (exit code {proc.returncode}). No report path found."
-            else:
-                final_report_path = f"Test completed (exit code {proc.returncode}). Report path marker not found."
-
-    except FileNotFoundError:
-        msg = "Error: Python executable or runner script not found."
-        app.logger.error(msg, exc_info=True)
-        full_output += f"\n{msg}\n"; error_occurred = True
-        final_report_path = "Execution failed: Script not found."
-    except Exception as e:
-        msg = f"Unexpected error running test subprocess: {e}"
-        app.logger.error(msg, exc_info=True)
-        full_output += f"\n{msg}\n"; error_occurred = True
-        final_report_path = f"Execution failed: {e}"
-    finally:
-        if proc and proc.poll() is None: # If process is still running (e.g. main thread exited due to error)
-            app.logger.warning(f"Terminating runaway subprocess PID {proc.pid}")
-            proc.terminate()
-            try:
-                proc.wait(timeout=5) # Wait a bit for termination
-            except subprocess.TimeoutExpired:
-                app.logger.error(f"Subprocess PID {proc.pid} did not terminate gracefully, killing.")
-                proc.kill()
-
-        with state_lock:
-            test_status['running'] = False
-            test_status['final_output'] = full_output
-            test_status['report_path'] = final_report_path
-            test_status['process'] = None
-            test_status['thread'] = None
-            # current_assignment_id and current_batch_assignment_id are handled by get_progress
-        app.logger.info(f"Test subprocess processing complete. Report: {final_report_path}")
-
 @app.route('/forgot_password', methods=['GET'])
 def forgot_password():
     return render_template('auth/forgot-password.html')
@@ -3297,43 +3720,56 @@ def edit_profile():
 
 
 
+def _catalog():
+    return get_catalog(get_db_conn_from_models)
+
+
+def _from_catalog(read, default):
+    """read(catalog), or `default` if the catalog can't be loaded (the database is down)."""
+    try:
+        return read(_catalog())
+    except mysql.connector.Error as err:
+        app.logger.error(f"Could not load the catalog: {err}")
+        return default
+
+
+def _catalog_changed():
+    """Call after committing a change to applications, suites, test cases or suite membership."""
+    bump_catalog_version()
+    bump_data_version() # The dashboards count test cases too
+
+
 def get_all_applications_for_dashboard():
-    with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id, name FROM application ORDER BY name")
-            return cursor.fetchall()
+    return _from_catalog(lambda catalog: list(catalog.applications), [])
 def get_application_by_id_for_dashboard(app_id):
-    with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id, name FROM application WHERE id = %s", (app_id,))
-            return cursor.fetchone()
+    return _from_catalog(lambda catalog: catalog.applications_by_id.get(app_id), None)
 def get_suites_for_application_for_dashboard(app_id):
-    with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT SuiteID, Name, AppType FROM testsuites WHERE AppType = %s ORDER BY Name", (app_id,))
-            return cursor.fetchall()
+    return _from_catalog(lambda catalog: catalog.suites_for_application(app_id), [])
 def get_suite_by_id_for_dashboard(suite_id):
-     with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT SuiteID, Name, AppType FROM testsuites WHERE SuiteID = %s", (suite_id,))
-            return cursor.fetchone()
+    return _from_catalog(lambda catalog: catalog.suites_by_id.get(suite_id), None)
 def get_test_cases_for_suite_for_dashboard(suite_id):
+    """The suite's test cases from the catalog, with who they are pending for (one query over the pending assignments)."""
+    test_cases = [dict(tc) for tc in _from_catalog(lambda catalog: catalog.test_cases_for_suite(suite_id), [])]
+    if not test_cases:
+        return test_cases
     with get_db_conn_from_models() as conn:
         with conn.cursor(dictionary=True) as cursor:
-            query = """
-                SELECT tc.TestCaseID, tc.Code, tc.Name, tc.Module,
-                       GROUP_CONCAT(DISTINCT IF(ta.Status = 'PENDING', u_assigned.Username, NULL) SEPARATOR ', ') AS pending_assigned_to_usernames,
-                       (SELECT COUNT(*) FROM test_assignments ta_count
-                        WHERE ta_count.TestCaseID = tc.TestCaseID AND ta_count.Status = 'PENDING') AS pending_assignments_count
-                FROM testcases tc
-                JOIN suitetestcases stc ON tc.TestCaseID = stc.TestCaseID
-                LEFT JOIN test_assignments ta ON tc.TestCaseID = ta.TestCaseID AND ta.Status = 'PENDING'
+            placeholders = ', '.join(['%s'] * len(test_cases))
+            cursor.execute(f"""
+                SELECT ta.TestCaseID,
+                       GROUP_CONCAT(DISTINCT u_assigned.Username SEPARATOR ', ') AS pending_assigned_to_usernames,
+                       COUNT(*) AS pending_assignments_count
+                FROM test_assignments ta
                 LEFT JOIN users u_assigned ON ta.AssignedToUserID = u_assigned.UserID
-                WHERE stc.SuiteID = %s
-                GROUP BY tc.TestCaseID ORDER BY tc.Code;
-            """
-            cursor.execute(query, (suite_id,))
-            return cursor.fetchall()
+                WHERE ta.Status = 'PENDING' AND ta.TestCaseID IN ({placeholders})
+                GROUP BY ta.TestCaseID
+            """, tuple(tc['TestCaseID'] for tc in test_cases))
+            pending = {row['TestCaseID']: row for row in cursor.fetchall()}
+    for tc in test_cases:
+        row = pending.get(tc['TestCaseID'], {})
+        tc['pending_assigned_to_usernames'] = row.get('pending_assigned_to_usernames')
+        tc['pending_assignments_count'] = row.get('pending_assignments_count', 0)
+    return test_cases
 
 def get_testcase_dynamic_params_from_db(tcid): # Your existing helper
     with get_db_connection() as conn: # Original connection
@@ -3342,81 +3778,36 @@ def get_testcase_dynamic_params_from_db(tcid): # Your existing helper
             return cursor.fetchall()
 
 def get_all_test_cases_for_dashboard(): # Helper for custom group form
-    with get_db_conn_from_models() as conn:
-        with conn.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT TestCaseID, Code, Name, Module FROM testcases ORDER BY Module, Code")
-            return cursor.fetchall()
+    return _from_catalog(lambda catalog: sorted(catalog.test_cases, key=lambda tc: ((tc['Module'] or '').lower(), (tc['Code'] or '').lower())), [])
 
 def get_test_cases_for_custom_group_selection():
     """
-    Fetches all test cases, attempting to group them by application and suite.
-    Also identifies test cases not linked to any suite.
+    All test cases grouped by application and suite, plus the test cases not linked to
+    any suite, built from the catalog without further queries.
     """
     applications_data = []
     uncategorized_test_cases = [] # Test cases with no module or not in any suite
 
-    conn = None
     try:
-        conn = get_db_conn_from_models()
-        with conn.cursor(dictionary=True) as cursor:
-            # 1. Get all applications
-            cursor.execute("SELECT id, name FROM application ORDER BY name")
-            apps = cursor.fetchall()
-
-            for app_row in apps:
-                app_detail = {'id': app_row['id'], 'name': app_row['name'], 'suites': []}
-                
-                # 2. Get suites for this application
-                cursor.execute("SELECT SuiteID, Name FROM testsuites WHERE AppType = %s ORDER BY Name", (app_row['id'],))
-                suites = cursor.fetchall()
-                
-                suite_tc_ids_in_app = set()
-
-                for suite_row in suites:
-                    suite_detail = {'id': suite_row['SuiteID'], 'name': suite_row['Name'], 'test_cases': []}
-                    
-                    # 3. Get test cases for this suite
-                    cursor.execute("""
-                        SELECT tc.TestCaseID, tc.Code, tc.Name, tc.Module as TestCaseModule
-                        FROM testcases tc
-                        JOIN suitetestcases stc ON tc.TestCaseID = stc.TestCaseID
-                        WHERE stc.SuiteID = %s
-                        ORDER BY tc.Code
-                    """, (suite_row['SuiteID'],))
-                    test_cases_for_suite = cursor.fetchall()
-                    for tc in test_cases_for_suite:
-                        suite_detail['test_cases'].append(tc)
-                        suite_tc_ids_in_app.add(tc['TestCaseID'])
-                    
-                    if suite_detail['test_cases']: # Only add suite if it has test cases
-                        app_detail['suites'].append(suite_detail)
-                
-                # 4. Get test cases directly under this app but not in any of its defined suites (based on testcases.Module matching app name, or if Module_id links to app)
-                # This logic can be complex. For simplicity, we'll rely on suite linkage first.
-                # Test cases belonging to this app type but not in any of the suites above
-                # This part is tricky if 'testcases.Module' text doesn't directly map or if Module_id isn't used for app.
-                # For now, let's focus on suite-linked TCs per app. We'll get truly uncategorized later.
-
-                if app_detail['suites']: # Only add app if it has suites with test cases
-                    applications_data.append(app_detail)
-
-            # 5. Get all test case IDs that are part of *any* suite to exclude them from "truly uncategorized"
-            cursor.execute("SELECT DISTINCT TestCaseID FROM suitetestcases")
-            all_suite_linked_tc_ids = {row['TestCaseID'] for row in cursor.fetchall()}
-
-            # 6. Get all test cases and then find the ones not linked to any suite
-            cursor.execute("SELECT TestCaseID, Code, Name, Module as TestCaseModule FROM testcases ORDER BY Code")
-            all_tcs_raw = cursor.fetchall()
-            for tc_raw in all_tcs_raw:
-                if tc_raw['TestCaseID'] not in all_suite_linked_tc_ids:
-                    uncategorized_test_cases.append(tc_raw)
-
+        catalog = _catalog()
     except mysql.connector.Error as e:
         app.logger.error(f"Error fetching test cases for custom group selection: {e}", exc_info=True)
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
-    
+        return applications_data, uncategorized_test_cases
+
+    def as_selection(tc):
+        return {'TestCaseID': tc['TestCaseID'], 'Code': tc['Code'], 'Name': tc['Name'], 'TestCaseModule': tc['Module']}
+
+    for app_row in catalog.applications:
+        app_detail = {'id': app_row['id'], 'name': app_row['name'], 'suites': []}
+        for suite_row in catalog.suites_for_application(app_row['id']):
+            suite_test_cases = [as_selection(tc) for tc in catalog.test_cases_for_suite(suite_row['SuiteID'])]
+            if suite_test_cases: # Only add suite if it has test cases
+                app_detail['suites'].append({'id': suite_row['SuiteID'], 'name': suite_row['Name'], 'test_cases': suite_test_cases})
+        if app_detail['suites']: # Only add app if it has suites with test cases
+            applications_data.append(app_detail)
+
+    uncategorized_test_cases = [as_selection(tc) for tc in catalog.test_cases
+                                if tc['TestCaseID'] not in catalog.suite_linked_test_case_ids]
     return applications_data, uncategorized_test_cases
 
 
@@ -179,9 +179,10 @@ def admin_dashboard():
 
     user_name = current_user.username
     total_users = User.count_all()  # Count all users in the table
-    total_tests = TestAssignment.count_all()
-    completed_tests = TestAssignment.count_completed()
-    pending_tests = TestAssignment.count_pending()
+    assignment_stats = TestAssignment.get_statistics() or dict.fromkeys(TestAssignment.STATISTICS_BUCKETS, 0)
+    total_tests = assignment_stats['total']
+    completed_tests = assignment_stats['completed']
+    pending_tests = assignment_stats['pending']
 
     completed_percent = 0
     if total_tests > 0:
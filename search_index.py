@@ -0,0 +1,74 @@
+# search_index.py
+#
+# Full-text search terms and keyset page cursors for the results overview and the tester dashboard.
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from migrations import SEARCH_INDEXES, existing_indexes
+
+FT_MIN_TOKEN_SIZE = int(os.environ.get('FT_MIN_TOKEN_SIZE', '3'))  # MySQL's innodb_ft_min_token_size
+FULLTEXT_CHECK_SECONDS = 60  # How long fulltext_ready() trusts its last look at information_schema
+
+TESTCASE_MATCH = "MATCH(Code, Name, Module, Description) AGAINST (%s IN BOOLEAN MODE)"
+USER_MATCH = "MATCH(Username) AGAINST (%s IN BOOLEAN MODE)"
+BATCH_MATCH = "MATCH(ReferenceName, Notes) AGAINST (%s IN BOOLEAN MODE)"
+
+_fulltext_state = None  # (all FULLTEXT indexes present, checked at)
+_fulltext_lock = threading.Lock()
+
+
+def fulltext_ready(conn):
+    """
+    True when every FULLTEXT index of SEARCH_INDEXES exists; searches use LIKE until
+    then. Cached for FULLTEXT_CHECK_SECONDS per process, so a migration run later is
+    picked up without a restart. Never raises.
+    """
+    global _fulltext_state
+    now = time.monotonic()
+    state = _fulltext_state
+    if state and now - state[1] < FULLTEXT_CHECK_SECONDS:
+        return state[0]
+    with _fulltext_lock:
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            existing = existing_indexes(cursor)
+            ready = all((table, index) in existing
+                        for table, index, _, kind in SEARCH_INDEXES if kind == 'FULLTEXT')
+        except mysql.connector.Error as err:
+            print(f"Could not check the full-text indexes: {err}")
+            ready = False
+        finally:
+            if cursor: cursor.close()
+        _fulltext_state = (ready, now)
+        return ready
+
+
+def boolean_query(term):
+    """
+    '+word*' for every indexable word of `term`, for MATCH ... AGAINST (... IN BOOLEAN
+    MODE); None if no word is long enough for the full-text index.
+    """
+    words = [word for word in re.split(r'[^\w]+', term or '') if len(word) >= FT_MIN_TOKEN_SIZE]
+    return ' '.join(f'+{word}*' for word in words) or None
+
+
+def encode_cursor(sort_time, row_id):
+    """Opaque page cursor for keyset pagination on (time, id)."""
+    return f"{sort_time.strftime('%Y%m%d%H%M%S%f')}-{int(row_id)}"
+
+
+def decode_cursor(cursor_text):
+    """(time, id) from encode_cursor, or None for a missing or malformed cursor (first page)."""
+    match = re.fullmatch(r'(\d{20})-(\d+)', cursor_text or '')
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d%H%M%S%f'), int(match.group(2))
+    except ValueError:
+        return None
@@ -0,0 +1,162 @@
+# shared_markers.py
+#
+# Named values every host must agree on (cache and catalog versions, batch progress markers, pause/cancel requests).
+import os
+import re
+import threading
+import time
+
+import mysql.connector
+
+from atomic_file import new_version_token, write_text_atomic
+from db_pool import get_pool
+from migrations import TABLE_DDL
+from shared_run_store import RUN_STATE_STORE_ENV  # 'memory': single host, markers are files under MARKER_DIR
+
+MARKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'reports', 'markers')
+MARKER_CACHE_SECONDS = 1.0  # How stale a read_marker(..., cached=True) may be
+
+_table_ready = False
+_cache = {}  # name -> (value, read at)
+_cache_lock = threading.Lock()
+
+
+def _use_files():
+    return os.environ.get(RUN_STATE_STORE_ENV, 'mysql').strip().lower() == 'memory'
+
+
+def _marker_file(name):
+    return os.path.join(MARKER_DIR, re.sub(r'[^\w.-]', '_', name))
+
+
+def _connect():
+    global _table_ready
+    from models import DB_CONFIG
+    conn = get_pool(dict(DB_CONFIG, autocommit=True)).connection()
+    if not _table_ready:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(TABLE_DDL['shared_markers'])
+            _table_ready = True
+        finally:
+            cursor.close()
+    return conn
+
+
+def _remember(name, value):
+    with _cache_lock:
+        _cache[name] = (value, time.monotonic())
+
+
+def set_marker(name, value):
+    """Stores `value` under `name`. Raises mysql.connector.Error or OSError."""
+    if _use_files():
+        write_text_atomic(_marker_file(name), value)
+    else:
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    INSERT INTO shared_markers (Name, Value) VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE Value = VALUES(Value)
+                """, (name, value))
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+    _remember(name, value)
+
+
+def bump_marker(name):
+    """Sets `name` to a fresh version token. Never raises; returns False if the write failed."""
+    try:
+        set_marker(name, new_version_token())
+        return True
+    except (mysql.connector.Error, OSError, ValueError) as e:
+        print(f"Could not bump marker {name}: {e}")
+        return False
+
+
+def read_marker(name, cached=False):
+    """
+    The value of `name`, or None if it is unset or unreadable. With `cached`, a value
+    this process read or wrote within MARKER_CACHE_SECONDS is returned without a lookup.
+    """
+    if cached:
+        with _cache_lock:
+            entry = _cache.get(name)
+        if entry and time.monotonic() - entry[1] < MARKER_CACHE_SECONDS:
+            return entry[0]
+    value = None
+    try:
+        if _use_files():
+            with open(_marker_file(name), 'r', encoding='utf-8') as f:
+                value = f.read().strip() or None
+        else:
+            conn = _connect()
+            try:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT Value FROM shared_markers WHERE Name = %s", (name,))
+                    row = cursor.fetchone()
+                    value = row[0] if row else None
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
+    except FileNotFoundError:
+        pass
+    except (mysql.connector.Error, OSError, ValueError) as e:
+        print(f"Could not read marker {name}: {e}")
+        return None
+    _remember(name, value)
+    return value
+
+
+def read_markers(names):
+    """{name: value} of those of `names` that are set; {} if they can't be read."""
+    names = list(names)
+    if not names:
+        return {}
+    if _use_files():
+        values = {name: read_marker(name) for name in names}
+        return {name: value for name, value in values.items() if value is not None}
+    try:
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT Name, Value FROM shared_markers WHERE Name IN ({', '.join(['%s'] * len(names))})",
+                               tuple(names))
+                return dict(cursor.fetchall())
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+    except mysql.connector.Error as e:
+        print(f"Could not read markers: {e}")
+        return {}
+
+
+def clear_marker(name):
+    """Removes `name`; True if this call removed it. Raises mysql.connector.Error or OSError."""
+    if _use_files():
+        try:
+            os.remove(_marker_file(name))
+            removed = True
+        except FileNotFoundError:
+            removed = False
+    else:
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("DELETE FROM shared_markers WHERE Name = %s", (name,))
+                removed = cursor.rowcount == 1
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+    _remember(name, None)
+    return removed
@@ -0,0 +1,304 @@
+# shared_run_store.py
+#
+# Runner job state and output in MySQL, so every web worker and executor sees the same jobs and device claims.
+import hashlib
+import os
+import socket
+
+import mysql.connector
+
+from db_pool import get_pool
+from migrations import TABLE_DDL
+from run_registry import DeviceBusyError, RUN_QUEUED, RUN_RUNNING, RUN_FINISHED
+
+RUN_STATE_STORE_ENV = 'RUN_STATE_STORE'  # 'mysql' (default) or 'memory' for a single-process setup
+
+ACTIVE_STATES = (RUN_QUEUED, RUN_RUNNING)
+DEVICE_LOCK_TIMEOUT_SECONDS = 10
+ORPHAN_AFTER_SECONDS = 120      # Active jobs without a heartbeat for this long are expired
+MAX_FINISHED_JOBS = 500         # Finished jobs (and their output) kept in the store
+MAX_OUTPUT_BYTES = 4 * 1024 * 1024  # Output retained per job, like LiveOutputBuffer
+MAX_LISTED_JOBS = 200
+
+JOB_COLUMNS = """JobID, Kind, State, DeviceID, UserID, AssignmentID, BatchAssignmentID, OutputID,
+                 ReportPath, ExitCode, StartedAt, FinishedAt"""
+
+
+def store_from_env():
+    """The SharedRunStore to use unless RUN_STATE_STORE=memory; None means process-local state only."""
+    if os.environ.get(RUN_STATE_STORE_ENV, 'mysql').strip().lower() == 'memory':
+        return None
+    from models import DB_CONFIG
+    return SharedRunStore(DB_CONFIG)
+
+
+def _row_to_job(row):
+    return {
+        'job_id': row['JobID'],
+        'kind': row['Kind'],
+        'state': row['State'],
+        'running': row['State'] in ACTIVE_STATES,
+        'device_id': row['DeviceID'],
+        'user_id': row['UserID'],
+        'assignment_id': row['AssignmentID'],
+        'batch_assignment_id': row['BatchAssignmentID'],
+        'report_path': row['ReportPath'],
+        'exit_code': row['ExitCode'],
+        'started_at': row['StartedAt'].isoformat() if row['StartedAt'] else None,
+        'finished_at': row['FinishedAt'].isoformat() if row['FinishedAt'] else None,
+        'output_id': row['OutputID'],
+    }
+
+
+class SharedRunStore:
+    def __init__(self, db_config):
+        self.pool = get_pool(dict(db_config, autocommit=True))
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tables_ready = False
+
+    def _connect(self):
+        conn = self.pool.connection()
+        if not self._tables_ready:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(TABLE_DDL['runner_jobs'])
+                cursor.execute(TABLE_DDL['runner_job_output'])
+                self._tables_ready = True
+            finally:
+                cursor.close()
+        return conn
+
+    # --- Job lifecycle ---
+    def start(self, job_id, kind, device_id, user_id=None, assignment_id=None, batch_assignment_id=None,
+              output_id=None, allow_busy=False):
+        """
+        Records a new job for `device_id`. Raises DeviceBusyError if another job (in any
+        process) is queued or running on the device, unless `allow_busy`. Returns False
+        if the store is unreachable, so callers can fall back to their local check.
+        """
+        conn = None
+        cursor = None
+        lock_name = 'runner_device:' + hashlib.sha1(device_id.encode('utf-8')).hexdigest()[:32]
+        try:
+            conn = self._connect()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS got", (lock_name, DEVICE_LOCK_TIMEOUT_SECONDS))
+            if cursor.fetchone()['got'] != 1:
+                raise DeviceBusyError(device_id, None)
+            try:
+                self._expire_orphans(cursor, device_id)
+                cursor.execute("""
+                    SELECT JobID FROM runner_jobs
+                    WHERE DeviceID = %s AND State IN (%s, %s)
+                    ORDER BY StartedAt DESC LIMIT 1
+                """, (device_id,) + ACTIVE_STATES)
+                active = cursor.fetchone()
+                if active and not allow_busy:
+                    raise DeviceBusyError(device_id, active['JobID'])
+                cursor.execute("""
+                    INSERT INTO runner_jobs
+                    (JobID, Kind, State, DeviceID, UserID, AssignmentID, BatchAssignmentID, OutputID, OwnerID, StartedAt, HeartbeatAt)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(6), NOW())
+                """, (job_id, kind, RUN_QUEUED, device_id, user_id, assignment_id, batch_assignment_id, output_id, self.owner_id))
+                return True
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+                cursor.fetchone()
+        except mysql.connector.Error as err:
+            print(f"Shared run store unavailable, claiming device {device_id} locally only: {err}")
+            return False
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    def _expire_orphans(self, cursor, device_id):
+        cursor.execute("""
+            UPDATE runner_jobs
+            SET State = %s, FinishedAt = NOW(6),
+                ReportPath = 'Execution abandoned: the process running this job stopped responding.'
+            WHERE DeviceID = %s AND State IN (%s, %s) AND HeartbeatAt < NOW() - INTERVAL %s SECOND
+        """, (RUN_FINISHED, device_id) + ACTIVE_STATES + (ORPHAN_AFTER_SECONDS,))
+
+    def _execute(self, sql, params, description):
+        """Runs one write statement; returns the affected row count, or None on error."""
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor.rowcount
+        except mysql.connector.Error as err:
+            print(f"Shared run store error ({description}): {err}")
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    def set_running(self, job_id):
+        self._execute("UPDATE runner_jobs SET State = %s, HeartbeatAt = NOW() WHERE JobID = %s",
+                      (RUN_RUNNING, job_id), f"start job {job_id}")
+
+    def finish(self, job_id, report_path, exit_code, state):
+        self._execute("""
+            UPDATE runner_jobs SET State = %s, ReportPath = %s, ExitCode = %s, FinishedAt = NOW(6)
+            WHERE JobID = %s
+        """, (state, report_path, exit_code, job_id), f"finish job {job_id}")
+
+    def heartbeat(self, job_ids):
+        """Marks the owner's running jobs alive. Returns the IDs among them with a pending cancel request."""
+        if not job_ids:
+            return set()
+        conn = None
+        cursor = None
+        placeholders = ','.join(['%s'] * len(job_ids))
+        try:
+            conn = self._connect()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"UPDATE runner_jobs SET HeartbeatAt = NOW() WHERE JobID IN ({placeholders})", tuple(job_ids))
+            cursor.execute(f"SELECT JobID FROM runner_jobs WHERE JobID IN ({placeholders}) AND CancelRequested = 1", tuple(job_ids))
+            return {row['JobID'] for row in cursor.fetchall()}
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (heartbeat): {err}")
+            return set()
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    def request_cancel(self, job_id):
+        """For jobs owned by another process; the owner sees the flag on its next heartbeat."""
+        rowcount = self._execute("UPDATE runner_jobs SET CancelRequested = 1 WHERE JobID = %s AND State IN (%s, %s)",
+                                 (job_id,) + ACTIVE_STATES, f"cancel job {job_id}")
+        return bool(rowcount)
+
+    def claim_post_run(self, job_id):
+        """True exactly once per finished job, whichever worker asks first."""
+        rowcount = self._execute("""
+            UPDATE runner_jobs SET PostRunClaimed = 1
+            WHERE JobID = %s AND PostRunClaimed = 0 AND State NOT IN (%s, %s)
+        """, (job_id,) + ACTIVE_STATES, f"claim job {job_id}")
+        return rowcount == 1
+
+    def prune(self, keep=MAX_FINISHED_JOBS):
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT FinishedAt FROM runner_jobs WHERE State NOT IN (%s, %s)
+                ORDER BY FinishedAt DESC LIMIT 1 OFFSET %s
+            """, ACTIVE_STATES + (keep,))
+            cutoff = cursor.fetchone()
+            if cutoff:
+                cursor.execute("""
+                    DELETE o FROM runner_job_output o JOIN runner_jobs j ON j.JobID = o.JobID
+                    WHERE j.State NOT IN (%s, %s) AND j.FinishedAt <= %s
+                """, ACTIVE_STATES + (cutoff[0],))
+                cursor.execute("DELETE FROM runner_jobs WHERE State NOT IN (%s, %s) AND FinishedAt <= %s",
+                               ACTIVE_STATES + (cutoff[0],))
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (prune): {err}")
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    # --- Queries ---
+    def get(self, job_id):
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM runner_jobs WHERE JobID = %s", (job_id,))
+            row = cursor.fetchone()
+            return _row_to_job(row) if row else None
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (get job {job_id}): {err}")
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    def find(self, device_id=None, batch_assignment_id=None, user_id=None, kind=None, active_only=False):
+        """Jobs matching every given filter, newest first."""
+        conditions, params = [], []
+        for column, value in (('DeviceID', device_id), ('BatchAssignmentID', batch_assignment_id),
+                              ('UserID', user_id), ('Kind', kind)):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        if active_only:
+            conditions.append("State IN (%s, %s)")
+            params.extend(ACTIVE_STATES)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM runner_jobs {where} ORDER BY StartedAt DESC LIMIT {MAX_LISTED_JOBS}",
+                           tuple(params))
+            return [_row_to_job(row) for row in cursor.fetchall()]
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (find jobs): {err}")
+            return []
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    # --- Output mirror ---
+    def append_output(self, job_id, start_offset, data):
+        """Stores output bytes starting at absolute `start_offset` and trims beyond MAX_OUTPUT_BYTES."""
+        if not data:
+            return
+        end_offset = start_offset + len(data)
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO runner_job_output (JobID, StartOffset, Chunk) VALUES (%s, %s, %s)",
+                           (job_id, start_offset, data))
+            if end_offset > MAX_OUTPUT_BYTES:
+                cursor.execute("DELETE FROM runner_job_output WHERE JobID = %s AND StartOffset + LENGTH(Chunk) <= %s",
+                               (job_id, end_offset - MAX_OUTPUT_BYTES))
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (output of job {job_id}): {err}")
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
+
+    def read_output(self, job_id, offset=None):
+        """Same contract as JobExecutor.read_output, for jobs owned by another process."""
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT OutputID FROM runner_jobs WHERE JobID = %s", (job_id,))
+            job = cursor.fetchone()
+            if not job:
+                return None
+            cursor.execute("""
+                SELECT MIN(StartOffset) AS start_offset, MAX(StartOffset + LENGTH(Chunk)) AS end_offset
+                FROM runner_job_output WHERE JobID = %s
+            """, (job_id,))
+            window = cursor.fetchone()
+            start, end = int(window['start_offset'] or 0), int(window['end_offset'] or 0)
+            reset = offset is None or offset < start or offset > end
+            if reset:
+                offset = start
+            cursor.execute("""
+                SELECT StartOffset, Chunk FROM runner_job_output
+                WHERE JobID = %s AND StartOffset + LENGTH(Chunk) > %s ORDER BY StartOffset
+            """, (job_id, offset))
+            parts = [bytes(row['Chunk'])[max(0, offset - row['StartOffset']):] for row in cursor.fetchall()]
+            return {'text': b''.join(parts).decode('utf-8', errors='replace'), 'offset': end,
+                    'reset': reset, 'output_id': job['OutputID']}
+        except mysql.connector.Error as err:
+            print(f"Shared run store error (read output of job {job_id}): {err}")
+            return None
+        finally:
+            if cursor: cursor.close()
+            if conn and conn.is_connected(): conn.close()
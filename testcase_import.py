@@ -0,0 +1,345 @@
+# testcase_import.py
+#
+# Chunked bulk import of test cases and their steps from CSV or XLSX spreadsheets.
+import csv
+import json
+import os
+import re
+from datetime import datetime
+
+import mysql.connector
+
+from atomic_file import write_text_atomic
+from catalog import get_catalog, bump_catalog_version
+from query_cache import bump_data_version
+
+IMPORT_CHUNK_TEST_CASES = int(os.environ.get('IMPORT_CHUNK_TEST_CASES', '200'))
+STEP_ROWS_PER_INSERT = 1000
+MAX_REPORTED_ERRORS = 200
+PROGRESS_EVERY_ROWS = 1000
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+INPUT_TYPES = ('static', 'dynamic')
+PARAM_TYPES = ('text', 'password', 'number', 'select')
+
+# One row per step, with a header row naming the columns (case, spaces and
+# underscores don't matter):
+#   Code, Name, Module, Description, StepOrder, InputType, Input, ParamName,
+#   ParamType, ExpectedKeywords
+# The rows of one test case must be consecutive; Name, Module and Description are
+# taken from its first row. Module is the test suite name, as on the create form.
+# InputType is 'static' (default) or 'dynamic'; dynamic steps need ParamName and a
+# ParamType of text, password, number or select. ExpectedKeywords is comma-separated.
+#
+# Normalised header -> field
+COLUMNS = {
+    'code': 'code', 'testcasecode': 'code',
+    'name': 'name', 'testcasename': 'name',
+    'module': 'module', 'suite': 'module', 'testsuite': 'module',
+    'description': 'description',
+    'steporder': 'step_order', 'step': 'step_order',
+    'inputtype': 'input_type',
+    'input': 'input', 'inputvalue': 'input',
+    'paramname': 'param_name',
+    'paramtype': 'param_type', 'paraminputtype': 'param_type', 'inptype': 'param_type',
+    'expectedkeywords': 'expected_keywords', 'expectedresponse': 'expected_keywords',
+}
+REQUIRED_COLUMNS = ('code', 'name', 'module', 'expected_keywords')
+
+
+# Progress of imports started from the web, one small JSON file per import so every
+# web worker on this host can answer the status polls
+IMPORT_STATUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'reports', 'imports')
+
+
+def write_import_status(import_id, summary):
+    try:
+        write_text_atomic(os.path.join(IMPORT_STATUS_DIR, f'import_{import_id}.json'), json.dumps(summary))
+    except (OSError, ValueError) as e:
+        print(f"Could not write status of import {import_id}: {e}")
+
+
+def read_import_status(import_id):
+    """The last summary written for the import, or None if there is none (or the ID is malformed)."""
+    if not re.fullmatch(r'[0-9a-f]{16}', import_id or ''):
+        return None
+    try:
+        with open(os.path.join(IMPORT_STATUS_DIR, f'import_{import_id}.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ImportFileError(Exception):
+    """The file as a whole can't be imported (unsupported type, missing columns, missing reader)."""
+
+
+def _normalise_header(header):
+    return COLUMNS.get(str(header or '').strip().lower().replace(' ', '').replace('_', ''))
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Spreadsheet numbers such as step orders or numeric codes
+    return str(value).strip()
+
+
+def _rows_from_table(header, rows, first_line):
+    fields = [_normalise_header(h) for h in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in fields]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}.")
+    for line_no, values in enumerate(rows, start=first_line):
+        row = {field: _cell(value) for field, value in zip(fields, values) if field}
+        if any(row.values()):  # Skip blank lines
+            yield line_no, row
+
+
+def iter_rows(path):
+    """Yields (line number, {field: text}) for every non-empty data row of a CSV or XLSX file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            yield from _rows_from_table(header, reader, 2)
+    elif extension == '.xlsx':
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportFileError("Reading .xlsx files needs openpyxl (pip install openpyxl); or save the sheet as CSV.")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            yield from _rows_from_table(header, rows, 2)
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError(f"Unsupported file type '{extension}'; use {' or '.join(SUPPORTED_EXTENSIONS)}.")
+
+
+class TestCaseImporter:
+    def __init__(self, connect, created_by_user_id, chunk_size=IMPORT_CHUNK_TEST_CASES, on_progress=None, dry_run=False):
+        """
+        `connect` returns a DB connection (models.get_db_connection); `on_progress` is
+        called with the summary dict after every chunk and at the end. With dry_run the
+        file is only validated.
+        """
+        self.connect = connect
+        self.created_by_user_id = created_by_user_id
+        self.chunk_size = max(1, chunk_size)
+        self.on_progress = on_progress
+        self.dry_run = dry_run
+        self.summary = {'status': 'running', 'rows_read': 0, 'imported': 0, 'skipped': 0,
+                        'errors': [], 'error_count': 0, 'message': None}
+
+    def run(self, path):
+        """
+        Imports the file; returns the summary. Never raises: bad rows are recorded, and
+        anything that stops the import (unreadable file, database error) ends it with
+        status 'failed'.
+        """
+        try:
+            catalog = get_catalog(self.connect)
+            self._existing_codes = {tc['Code'].casefold() for tc in catalog.test_cases if tc['Code']}
+            self._suites_by_name = {}
+            for suite in sorted(catalog.suites_by_id.values(), key=lambda s: s['SuiteID']):
+                self._suites_by_name.setdefault((suite['Name'] or '').casefold(), suite)  # First match, like the create form
+            self._seen_codes = set()
+
+            chunk = []
+            for test_case in self._test_cases(iter_rows(path)):
+                chunk.append(test_case)
+                if len(chunk) >= self.chunk_size:
+                    self._write_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self._write_chunk(chunk)
+            self.summary['status'] = 'completed'
+            verb = 'validated' if self.dry_run else 'imported'
+            self.summary['message'] = (f"{self.summary['imported']} test case(s) {verb}, "
+                                       f"{self.summary['skipped']} skipped, from {self.summary['rows_read']} row(s).")
+        except Exception as e:  # csv.Error, zipfile.BadZipFile, openpyxl's InvalidFileException, DB errors, ...
+            self.summary['status'] = 'failed'
+            self.summary['message'] = f"Import stopped: {e}"
+        self._report()
+        return self.summary
+
+    def _report(self):
+        if self.on_progress:
+            self.on_progress(dict(self.summary))
+
+    def _error(self, line_no, code, message):
+        self.summary['error_count'] += 1
+        if len(self.summary['errors']) < MAX_REPORTED_ERRORS:
+            self.summary['errors'].append({'line': line_no, 'code': code, 'message': message})
+
+    def _test_cases(self, rows):
+        """Groups consecutive rows by Code and yields the test cases that pass validation."""
+        current = None
+        for line_no, row in rows:
+            self.summary['rows_read'] += 1
+            if self.summary['rows_read'] % PROGRESS_EVERY_ROWS == 0:
+                self._report()
+            code = row.get('code', '')
+            if current and code.casefold() == current['code'].casefold():
+                current['rows'].append((line_no, row))
+                continue
+            if current:
+                yield from self._validated(current)
+            current = {'code': code, 'line': line_no, 'rows': [(line_no, row)]}
+        if current:
+            yield from self._validated(current)
+
+    def _validated(self, group):
+        code, line_no = group['code'], group['line']
+        first = group['rows'][0][1]
+        problems = []
+        if not code:
+            problems.append("Code is empty.")
+        elif code.casefold() in self._seen_codes:
+            problems.append("Rows for this code are not consecutive, or the code appears twice in the file.")
+        elif code.casefold() in self._existing_codes:
+            problems.append("A test case with this code already exists.")
+        if not first.get('name'):
+            problems.append("Name is empty.")
+        suite = self._suites_by_name.get(first.get('module', '').casefold())
+        if not suite:
+            problems.append(f"Unknown module '{first.get('module', '')}'.")
+
+        steps = []
+        step_orders = set()
+        for position, (step_line, row) in enumerate(group['rows'], start=1):
+            step_order_text = row.get('step_order') or str(position)
+            try:
+                step_order = int(step_order_text)
+            except ValueError:
+                step_order = 0
+            if step_order < 1:
+                problems.append(f"Line {step_line}: StepOrder '{step_order_text}' is not a positive whole number.")
+            elif step_order in step_orders:
+                problems.append(f"Line {step_line}: StepOrder {step_order} is used twice.")
+            step_orders.add(step_order)
+
+            input_type = (row.get('input_type') or 'static').lower()
+            param_name = row.get('param_name') or None
+            param_type = (row.get('param_type') or '').lower() or None
+            if input_type not in INPUT_TYPES:
+                problems.append(f"Line {step_line}: InputType must be static or dynamic.")
+            elif input_type == 'dynamic':
+                if not param_name:
+                    problems.append(f"Line {step_line}: dynamic steps need a ParamName.")
+                if param_type not in PARAM_TYPES:
+                    problems.append(f"Line {step_line}: ParamType must be one of {', '.join(PARAM_TYPES)}.")
+            elif not row.get('input'):
+                problems.append(f"Line {step_line}: static steps need an Input.")
+            keywords = [k.strip() for k in row.get('expected_keywords', '').split(',') if k.strip()]
+            if not keywords:
+                problems.append(f"Line {step_line}: ExpectedKeywords is empty.")
+            steps.append((step_order, row.get('input', ''), ','.join(keywords), input_type,
+                          param_name if input_type == 'dynamic' else None,
+                          param_type if input_type == 'dynamic' else None))
+
+        if code:
+            self._seen_codes.add(code.casefold())
+        if problems:
+            self.summary['skipped'] += 1
+            self._error(line_no, code, ' '.join(problems))
+            return
+        yield {'code': code, 'line': line_no, 'name': first['name'], 'description': first.get('description') or None,
+               'suite': suite, 'steps': steps}
+
+    def _write_chunk(self, test_cases):
+        if self.dry_run:
+            self.summary['imported'] += len(test_cases)
+            self._report()
+            return
+        conn = self.connect()
+        if not conn:
+            raise mysql.connector.Error(msg="Could not connect to the database.")
+        cursor = conn.cursor()
+        try:
+            now = datetime.now()
+            conn.start_transaction()
+            # The catalog may be stale: re-check the codes, locking them until the commit
+            codes = [tc['code'] for tc in test_cases]
+            cursor.execute(f"SELECT Code FROM testcases WHERE Code IN ({', '.join(['%s'] * len(codes))}) FOR UPDATE",
+                           tuple(codes))
+            taken = {code.casefold() for (code,) in cursor.fetchall()}
+            for tc in test_cases:
+                if tc['code'].casefold() in taken:
+                    self.summary['skipped'] += 1
+                    self._error(tc['line'], tc['code'], "A test case with this code already exists.")
+            test_cases = [tc for tc in test_cases if tc['code'].casefold() not in taken]
+            if not test_cases:
+                conn.commit()
+                return
+            values_sql = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(test_cases))
+            params = []
+            for tc in test_cases:
+                params.extend((tc['code'], tc['name'], tc['suite']['Name'], tc['suite']['SuiteID'], tc['description'],
+                               self.created_by_user_id, now, self.created_by_user_id, now))
+            cursor.execute(f"""
+                INSERT INTO testcases
+                  (Code, Name, Module, Module_id, Description, CreatedBy, CreatedAt, ModifiedBy, ModifiedAt)
+                VALUES {values_sql}
+            """, tuple(params))
+            first_id = cursor.lastrowid
+
+            # IDs by code: one lookup for the chunk (auto-increment values need not be consecutive).
+            # Only rows from this INSERT on count; the codes were free when locked above.
+            codes = [tc['code'] for tc in test_cases]
+            cursor.execute(f"""
+                SELECT TestCaseID, Code FROM testcases
+                WHERE Code IN ({', '.join(['%s'] * len(codes))}) AND TestCaseID >= %s
+                ORDER BY TestCaseID
+            """, tuple(codes) + (first_id,))
+            ids_by_code = {}
+            for test_case_id, code in cursor.fetchall():
+                ids_by_code.setdefault(code.casefold(), test_case_id)
+            if len(ids_by_code) != len(test_cases):
+                raise mysql.connector.Error(msg="Could not read back the IDs of the imported test cases.")
+
+            step_rows = [(ids_by_code[tc['code'].casefold()],) + step for tc in test_cases for step in tc['steps']]
+            for start in range(0, len(step_rows), STEP_ROWS_PER_INSERT):
+                part = step_rows[start:start + STEP_ROWS_PER_INSERT]
+                cursor.execute(f"""
+                    INSERT INTO steps
+                      (TestCaseID, StepOrder, Input, ExpectedResponse, InputType, ParamName, InpType)
+                    VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(part))}
+                """, tuple(value for row in part for value in row))
+
+            suite_ids = sorted({tc['suite']['SuiteID'] for tc in test_cases})
+            cursor.execute(f"""
+                SELECT SuiteID, COALESCE(MAX(CaseOrder), 0) FROM suitetestcases
+                WHERE SuiteID IN ({', '.join(['%s'] * len(suite_ids))}) GROUP BY SuiteID
+            """, tuple(suite_ids))
+            next_order = {suite_id: 1 for suite_id in suite_ids}
+            next_order.update({suite_id: int(max_order) + 1 for suite_id, max_order in cursor.fetchall()})
+            links = []
+            for tc in test_cases:
+                suite_id = tc['suite']['SuiteID']
+                links.append((suite_id, ids_by_code[tc['code'].casefold()], next_order[suite_id]))
+                next_order[suite_id] += 1
+            cursor.execute(f"""
+                INSERT INTO suitetestcases (SuiteID, TestCaseID, CaseOrder)
+                VALUES {', '.join(['(%s, %s, %s)'] * len(links))}
+            """, tuple(value for link in links for value in link))
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        self.summary['imported'] += len(test_cases)
+        bump_catalog_version()
+        bump_data_version()
+        self._report()
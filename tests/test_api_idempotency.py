@@ -0,0 +1,150 @@
+# test_api_idempotency.py
+import types
+
+import mysql.connector
+import pytest
+
+import models
+import run_test
+
+
+class FakeKeysDb:
+    """api_idempotency_keys as ApiIdempotencyKey uses it, with a clock the test moves."""
+
+    def __init__(self):
+        self.rows = {}  # (TokenID, IdempotencyKey) -> row
+        self.now = 0
+
+    def connection(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        db, rows = self.db, self.db.rows
+        sql = ' '.join(sql.split())
+        self.rowcount = 0
+        if sql.startswith('CREATE'):
+            return
+        if sql.startswith('INSERT INTO api_idempotency_keys'):
+            token_id, key, request_hash = params
+            if (token_id, key) in rows:
+                raise mysql.connector.IntegrityError(msg='Duplicate entry', errno=1062)
+            rows[token_id, key] = {'RequestHash': request_hash, 'ResponseStatus': None, 'ResponseBody': None,
+                                   'CreatedAt': db.now}
+        elif sql.startswith('UPDATE api_idempotency_keys SET RequestHash'):
+            request_hash, token_id, key, timeout = params
+            row = rows[token_id, key]
+            if row['ResponseStatus'] is None and row['CreatedAt'] < db.now - timeout:
+                row.update(RequestHash=request_hash, CreatedAt=db.now)
+                self.rowcount = 1
+        elif sql.startswith('SELECT RequestHash'):
+            row = rows.get(params)
+            self.result = {k: row[k] for k in ('RequestHash', 'ResponseStatus', 'ResponseBody')} if row else None
+        elif sql.startswith('UPDATE api_idempotency_keys SET ResponseStatus'):
+            status, body, token_id, key = params
+            rows[token_id, key].update(ResponseStatus=status, ResponseBody=body)
+            self.rowcount = 1
+        elif sql.startswith('DELETE FROM api_idempotency_keys'):
+            row = rows.get(params)
+            if row and row['ResponseStatus'] is None:
+                del rows[params]
+                self.rowcount = 1
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def api(monkeypatch):
+    db = FakeKeysDb()
+    created = []
+
+    def create_ci_batch(user, data):
+        created.append(data)
+        if data.get('fail'):
+            return {'status': 'error', 'message': 'No test cases selected; nothing to run.'}, 422, False
+        return {'status': 'created', 'batch_assignment_id': len(created)}, 201, True
+
+    monkeypatch.setattr(models, 'get_db_connection', db.connection)
+    monkeypatch.setattr(models.ApiToken, 'authenticate', staticmethod(lambda raw: {'TokenID': 3, 'UserID': 1} if raw == 'tok' else None))
+    monkeypatch.setattr(models.User, 'get', staticmethod(lambda user_id: types.SimpleNamespace(id=user_id, role='tester', username='ci')))
+    monkeypatch.setattr(run_test, '_create_ci_batch', create_ci_batch)
+    client = run_test.app.test_client()
+
+    def post(data, key=None):
+        headers = {'Authorization': 'Bearer tok'}
+        if key:
+            headers['Idempotency-Key'] = key
+        return client.post('/api/v1/batches', json=data, headers=headers)
+    return types.SimpleNamespace(post=post, db=db, created=created)
+
+
+def test_a_retry_replays_the_original_response(api):
+    first = api.post({'suite_id': 4}, key='build-77')
+    retry = api.post({'suite_id': 4}, key='build-77')
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json() == {'status': 'created', 'batch_assignment_id': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert len(api.created) == 1
+    assert api.post({'suite_id': 4}).get_json()['batch_assignment_id'] == 2  # No key, no deduplication
+
+
+def test_the_same_key_with_another_request_is_refused(api):
+    api.post({'suite_id': 4}, key='build-77')
+    response = api.post({'suite_id': 5}, key='build-77')
+    assert response.status_code == 422
+    assert len(api.created) == 1
+
+
+def test_a_request_still_in_progress_is_not_run_twice(api):
+    assert models.ApiIdempotencyKey.reserve(3, 'build-77', models.ApiIdempotencyKey.hash_request({'suite_id': 4})) is None
+    response = api.post({'suite_id': 4}, key='build-77')
+    assert response.status_code == 409
+    assert api.created == []
+
+
+def test_a_stale_claim_is_taken_over(api):
+    request_hash = models.ApiIdempotencyKey.hash_request({'suite_id': 4})
+    assert models.ApiIdempotencyKey.reserve(3, 'build-77', request_hash) is None  # Its request never finished
+    api.db.now += models.IDEMPOTENCY_PROCESSING_TIMEOUT_SECONDS + 1
+    response = api.post({'suite_id': 4}, key='build-77')
+    assert response.status_code == 201
+    assert api.db.rows[3, 'build-77']['ResponseStatus'] == 201
+
+
+def test_a_request_that_created_nothing_can_be_retried(api):
+    assert api.post({'fail': True}, key='build-77').status_code == 422
+    assert api.db.rows == {}
+    assert api.post({'fail': True}, key='build-77').status_code == 422
+    assert len(api.created) == 2
+
+
+def test_keys_are_per_token(api):
+    request_hash = models.ApiIdempotencyKey.hash_request({'suite_id': 4})
+    assert models.ApiIdempotencyKey.reserve(3, 'build-77', request_hash) is None
+    assert models.ApiIdempotencyKey.reserve(4, 'build-77', request_hash) is None
@@ -0,0 +1,87 @@
+# test_assignment_statistics.py
+import types
+
+import pytest
+
+import models
+from models import TestAssignment
+
+
+class FakeConn:
+    """Answers get_statistics' two aggregates: rollup buckets first, then batch_test_assignments."""
+
+    def __init__(self, individual, batch):
+        self.results = [individual, batch]
+        self.statements = []
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=()):
+        self.statements.append(' '.join(sql.split()))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    state = types.SimpleNamespace(now=100.0, version='v1', computed=0, fail=False)
+
+    def get_statistics():
+        if state.fail:
+            return None
+        state.computed += 1
+        return {'total': state.computed, 'passed': 0}
+
+    monkeypatch.setattr(TestAssignment, 'get_statistics', staticmethod(get_statistics))
+    monkeypatch.setattr(TestAssignment, '_stats_cache', None)
+    monkeypatch.setattr(models, 'read_data_version', lambda: state.version)
+    monkeypatch.setattr(models, 'time', types.SimpleNamespace(monotonic=lambda: state.now, time=lambda: 1700000000.0 + state.now))
+    monkeypatch.setattr(models, 'ASSIGNMENT_STATS_TTL_SECONDS', 60)
+    return state
+
+
+def test_statistics_are_computed_once_per_ttl(stats):
+    first, computed_at = TestAssignment.get_statistics_cached()
+    stats.now += 59
+    assert TestAssignment.get_statistics_cached() == (first, computed_at)
+    assert stats.computed == 1
+    stats.now += 2
+    assert TestAssignment.get_statistics_cached()[0]['total'] == 2
+
+
+def test_a_data_version_bump_drops_the_cached_statistics(stats):
+    TestAssignment.get_statistics_cached()
+    stats.version = 'v2'  # An assignment was created or executed in another process
+    assert TestAssignment.get_statistics_cached()[0]['total'] == 2
+    assert TestAssignment.get_statistics_cached()[0]['total'] == 2
+
+
+def test_callers_get_their_own_copy(stats):
+    served, _ = TestAssignment.get_statistics_cached()
+    served['total'] = 999
+    assert TestAssignment.get_statistics_cached()[0]['total'] == 1
+
+
+def test_errors_are_not_cached(stats):
+    stats.fail = True
+    assert TestAssignment.get_statistics_cached() == (None, None)
+    stats.fail = False
+    assert TestAssignment.get_statistics_cached()[0]['total'] == 1
+
+
+def test_individual_and_batch_buckets_are_added_up(monkeypatch):
+    conn = FakeConn({'total': 5, 'completed': 3, 'passed': 2, 'failed': 1, 'in_progress': None, 'pending': 2},
+                    {'total': 2, 'completed': 1, 'passed': None, 'failed': 1, 'in_progress': 1, 'pending': 0})
+    monkeypatch.setattr(models, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(models, 'rollup_sources', lambda conn: ('rollup_executions_daily r', 'rollup_assignments r'))
+    assert TestAssignment.get_statistics() == {'total': 7, 'completed': 4, 'passed': 2, 'failed': 2,
+                                               'in_progress': 1, 'pending': 2}
+    assert 'FROM rollup_assignments r' in conn.statements[0]
@@ -0,0 +1,88 @@
+# test_batch_progress_etag.py
+import types
+
+import pytest
+
+import models
+import run_test
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.text = 'TC1 started\n'
+
+    def list_jobs(self, **filters):
+        return [{'job_id': 'job1', 'running': True}]
+
+    def read_output(self, job_id, offset=None):
+        data = self.text.encode('utf-8')
+        reset = offset is None or offset > len(data)
+        start = 0 if reset else offset
+        return {'text': data[start:].decode('utf-8'), 'offset': len(data), 'reset': reset, 'output_id': job_id}
+
+
+@pytest.fixture
+def poll(monkeypatch):
+    state = types.SimpleNamespace(version='v1', loads=0, executor=FakeExecutor())
+
+    def get_with_assignments(batch_id):
+        state.loads += 1
+        batch = types.SimpleNamespace(Status='IN_PROGRESS', AssignedToUserID=5, TotalTestCases=2,
+                                      CompletedTestCases=0, PassedTestCases=0)
+        return batch, [{'AssignmentID': 11, 'Status': 'IN_PROGRESS'}]
+
+    tester = models.User(5, 'tess', 'hash', 'tester')
+    monkeypatch.setattr(models.User, 'get_cached', staticmethod(lambda user_id: tester if user_id == 5 else None))
+    monkeypatch.setattr(run_test.BatchTestAssignment, 'get_with_assignments', staticmethod(get_with_assignments))
+    monkeypatch.setattr(run_test, 'read_progress_version', lambda batch_id, cached=False: state.version)
+    monkeypatch.setattr(run_test, 'read_control', lambda batch_id, cached=False: None)
+    monkeypatch.setattr(run_test, 'executor', state.executor)
+
+    client = run_test.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '5'
+        session['_fresh'] = True
+
+    def get(query, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return client.get(f'/tester/get_batch_progress/9{query}', headers=headers)
+    state.get = get
+    return state
+
+
+def test_unchanged_poll_gets_304_without_reading_the_batch(poll):
+    first = poll.get('?offset=0')
+    assert first.status_code == 200
+    body = first.get_json()
+    assert (body['live_output'], body['output_id']) == ('TC1 started\n', 'job1')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert poll.loads == 1
+
+    again = poll.get(f"?offset={body['offset']}&output_id=job1", etag)
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert poll.loads == 1
+
+
+def test_progress_or_new_output_answers_in_full(poll):
+    body = poll.get('?offset=0').get_json()
+    query = f"?offset={body['offset']}&output_id=job1"
+    etag = poll.get(query).headers['ETag']
+
+    poll.version = 'v2'  # The runner committed progress
+    changed = poll.get(query, etag)
+    assert changed.status_code == 200
+    etag = changed.headers['ETag']
+
+    poll.executor.text += 'TC1 PASS\n'
+    more_output = poll.get(query, etag)
+    assert more_output.status_code == 200
+    assert more_output.get_json()['live_output'] == 'TC1 PASS\n'
+
+
+def test_no_etag_without_a_progress_marker(poll):
+    poll.version = None
+    response = poll.get('?offset=0')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
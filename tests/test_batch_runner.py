@@ -0,0 +1,198 @@
+# test_batch_runner.py
+import threading
+
+import pytest
+
+import batch_runner
+from batch_control import CONTROL_PAUSE, CONTROL_CANCEL
+from result_cache import RESULT_CACHE_TTL_ENV
+
+
+class FakeBatchDb:
+    """The rows batch_runner.py reads and writes for one batch, shared by all its connections."""
+
+    def __init__(self, test_case_count, status='PENDING'):
+        self.lock = threading.Lock()
+        self.batch = {'Status': status, 'TotalTestCases': test_case_count, 'CompletedTestCases': 0, 'PassedTestCases': 0}
+        self.assignments = {100 + i: {'AssignmentID': 100 + i, 'TestCaseID': i, 'TestCaseCode': f'TC{i}', 'IndividualStatus': 'PENDING'}
+                            for i in range(1, test_case_count + 1)}
+        self.progress_updates = []  # (completed, passed) per progress stage commit
+
+    def connection(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        db = self.db
+        sql = ' '.join(sql.split())
+        with db.lock:
+            if sql.startswith("SELECT Status, TotalTestCases"):
+                self.rows = [dict(db.batch)]
+            elif sql.startswith("SELECT CompletedTestCases"):
+                self.rows = [dict(db.batch)]
+            elif sql.startswith("UPDATE batch_test_assignments SET Status = 'IN_PROGRESS'"):
+                db.batch['Status'] = 'IN_PROGRESS'
+            elif sql.startswith("SELECT ta.AssignmentID"):
+                self.rows = [dict(a) for a in db.assignments.values()]
+            elif sql.startswith("UPDATE test_assignments ta SET ta.Status"):
+                db.assignments[params[-1]]['IndividualStatus'] = params[0]
+                self.rowcount = 1
+            elif sql.startswith("SELECT Status FROM test_assignments"):
+                self.rows = [{'Status': db.assignments[params[0]]['IndividualStatus']}]
+            elif sql.startswith("UPDATE batch_test_assignments SET CompletedTestCases"):
+                db.batch.update(CompletedTestCases=params[0], PassedTestCases=params[1])
+                db.progress_updates.append(params[:2])
+            elif sql.startswith("UPDATE batch_test_assignments SET Status = %s"):
+                db.batch.update(Status=params[0], CompletedTestCases=params[1], PassedTestCases=params[2])
+            elif not sql.startswith("INSERT INTO rollup_assignments"):
+                raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeRunner:
+    """generic_runner.py: releases the device, then records its result a little later."""
+
+    def __init__(self, db, assignment_id, events, released, status='EXECUTED_PASS'):
+        self.db = db
+        self.assignment_id = assignment_id
+        self.events = events
+        self.released = released  # Set by the test when the result may be written
+        self.status = status
+        self.returncode = None
+        self.stdout = self._stdout()
+        self.stderr = iter(())
+
+    def _stdout(self):
+        yield 'Dialing\n'
+        yield batch_runner.DEVICE_RELEASED_MARKER + '\n'
+        self.released.wait(timeout=5)
+        self.events.append(('recorded', self.assignment_id))
+        with self.db.lock:
+            self.db.assignments[self.assignment_id]['IndividualStatus'] = self.status
+
+    def wait(self):
+        self.returncode = 0
+
+
+@pytest.fixture
+def run_batch(monkeypatch):
+    def run(db, control=lambda batch_id: None, statuses=None):
+        events = []
+        releases = []  # One per runner, set once the next runner started or the batch is winding down
+
+        def popen(cmd, **kwargs):
+            assignment_id = int(cmd[-1])
+            events.append(('started', assignment_id))
+            if releases:
+                releases[-1].set()
+            releases.append(threading.Event())
+            return FakeRunner(db, assignment_id, events, releases[-1], (statuses or {}).get(assignment_id, 'EXECUTED_PASS'))
+
+        finish = batch_runner.BatchProgressStage.finish
+
+        def finish_after_release(stage):
+            for release in releases:
+                release.set()
+            return finish(stage)
+
+        cleared = []
+        monkeypatch.setattr(batch_runner, 'get_batch_runner_db_connection', db.connection)
+        monkeypatch.setattr(batch_runner.subprocess, 'Popen', popen)
+        monkeypatch.setattr(batch_runner.BatchProgressStage, 'finish', finish_after_release)
+        monkeypatch.setattr(batch_runner, 'read_control', control)
+        monkeypatch.setattr(batch_runner, 'clear_control', cleared.append)
+        monkeypatch.setattr(batch_runner, 'bump_progress_version', lambda batch_id: None)
+        monkeypatch.setattr(batch_runner, 'bump_data_version', lambda: None)
+        monkeypatch.setattr(batch_runner, 'log_to_batch_stdout', lambda kind, message: None)
+        monkeypatch.setattr(batch_runner.sys, 'argv', ['batch_runner.py', '7', '1', 'dev-1', '13', 'NO_PASSWORD_PLACEHOLDER', '{}'])
+        monkeypatch.delenv(RESULT_CACHE_TTL_ENV, raising=False)
+        with pytest.raises(SystemExit):
+            batch_runner.main_batch_runner()
+        return events, cleared
+    return run
+
+
+def test_next_test_case_starts_once_the_device_is_released(run_batch):
+    db = FakeBatchDb(3)
+    events, _ = run_batch(db, statuses={102: 'EXECUTED_FAIL'})
+    # Each runner records its result only after the next one has started
+    assert events.index(('started', 102)) < events.index(('recorded', 101))
+    assert events.index(('started', 103)) < events.index(('recorded', 102))
+    assert db.progress_updates == [(1, 1), (2, 1), (3, 2)]  # Accounted in submission order
+    assert db.batch['Status'] == 'COMPLETED_FAIL'
+    assert (db.batch['CompletedTestCases'], db.batch['PassedTestCases']) == (3, 2)
+
+
+def test_all_passed_completes_the_batch(run_batch):
+    db = FakeBatchDb(2)
+    _, cleared = run_batch(db)
+    assert db.batch['Status'] == 'COMPLETED_PASS'
+    assert cleared == [7]
+
+
+def test_pause_stops_at_a_test_case_boundary_and_keeps_progress(run_batch):
+    db = FakeBatchDb(3)
+
+    def read_control(batch_id):
+        return CONTROL_PAUSE if any(a['IndividualStatus'] != 'PENDING' for a in db.assignments.values()) else None
+
+    events, cleared = run_batch(db, control=read_control)
+    assert [event for event in events if event[0] == 'started'] == [('started', 101)]
+    assert db.batch['Status'] == 'IN_PROGRESS'
+    assert (db.batch['CompletedTestCases'], db.batch['PassedTestCases']) == (1, 1)
+    assert cleared == []  # The control marker keeps the batch paused until it is resumed
+    assert db.assignments[102]['IndividualStatus'] == 'PENDING'
+
+
+def test_cancel_ends_the_batch_cancelled(run_batch):
+    db = FakeBatchDb(3)
+
+    def read_control(batch_id):
+        return CONTROL_CANCEL if any(a['IndividualStatus'] != 'PENDING' for a in db.assignments.values()) else None
+
+    events, cleared = run_batch(db, control=read_control)
+    assert [event for event in events if event[0] == 'started'] == [('started', 101)]
+    assert db.batch['Status'] == 'CANCELLED'
+    assert db.batch['CompletedTestCases'] == 1
+    assert cleared == [7]
+
+
+def test_resume_skips_executed_test_cases(run_batch):
+    db = FakeBatchDb(3, status='IN_PROGRESS')
+    db.batch.update(CompletedTestCases=1, PassedTestCases=1)
+    db.assignments[101]['IndividualStatus'] = 'EXECUTED_PASS'
+    events, _ = run_batch(db)
+    assert [event for event in events if event[0] == 'started'] == [('started', 102), ('started', 103)]
+    assert db.batch['Status'] == 'COMPLETED_PASS'
+    assert (db.batch['CompletedTestCases'], db.batch['PassedTestCases']) == (3, 3)
@@ -0,0 +1,98 @@
+# test_bulk_batch_create.py
+import mysql.connector
+import pytest
+
+import models
+from models import BatchTestAssignment
+
+
+class FakeConn:
+    """Records create_with_assignments' statements and transaction calls; `fail_on` makes a statement raise."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.statements = []
+        self.events = []
+        self.in_transaction = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.in_transaction = True
+        self.events.append('begin')
+
+    def commit(self):
+        self.in_transaction = False
+        self.events.append('commit')
+
+    def rollback(self):
+        self.in_transaction = False
+        self.events.append('rollback')
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.events.append('close')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if self.conn.fail_on and sql.startswith(self.conn.fail_on):
+            raise mysql.connector.Error(msg='Lock wait timeout exceeded', errno=1205)
+        self.conn.statements.append((sql, params))
+        if sql.startswith('INSERT INTO batch_test_assignments'):
+            self.lastrowid = 42
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def bumps(monkeypatch):
+    bumps = []
+    monkeypatch.setattr(models, 'bump_data_version', lambda: bumps.append(1))
+    monkeypatch.setattr(models, 'BULK_INSERT_ROWS', 3)
+    return bumps
+
+
+def create(conn, monkeypatch, test_case_ids):
+    monkeypatch.setattr(models, 'get_db_connection', lambda: conn)
+    return BatchTestAssignment.create_with_assignments(5, 1, 'SUITE', 10, 'login', test_case_ids)
+
+
+def test_assignments_are_inserted_in_chunks_in_one_transaction(monkeypatch, bumps):
+    conn = FakeConn()
+    assert create(conn, monkeypatch, [100, 101, 102, 103, 104, 105, 106]) == 42
+    assert conn.events == ['begin', 'commit', 'close']
+    assert bumps == [1]
+
+    batch_sql, batch_params = conn.statements[0]
+    assert batch_sql.startswith('INSERT INTO batch_test_assignments')
+    assert batch_params[-1] == 7  # TotalTestCases
+    inserts = [(sql, params) for sql, params in conn.statements if sql.startswith('INSERT INTO test_assignments')]
+    assert [sql.count("'PENDING'") for sql, params in inserts] == [3, 3, 1]
+    assert [params[::6] for sql, params in inserts] == [(100, 101, 102), (103, 104, 105), (106,)]
+    assert inserts[0][1][:6] == (100, 5, 1, 'MEDIUM', None, 42)
+    rollup_sql, rollup_params = conn.statements[-1]
+    assert rollup_sql.startswith('INSERT INTO rollup_assignments')
+    assert rollup_params == (1, 42)
+
+
+def test_a_failure_after_the_inserts_rolls_the_whole_batch_back(monkeypatch, bumps):
+    conn = FakeConn(fail_on='INSERT INTO rollup_assignments')
+    assert create(conn, monkeypatch, [100, 101, 102, 103]) is None
+    assert conn.events == ['begin', 'rollback', 'close']
+    assert bumps == []
+
+
+def test_no_connection_creates_nothing(monkeypatch, bumps):
+    monkeypatch.setattr(models, 'get_db_connection', lambda: None)
+    assert BatchTestAssignment.create_with_assignments(5, 1, 'SUITE', 10, 'login', [100]) is None
+    assert bumps == []
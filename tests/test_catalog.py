@@ -0,0 +1,129 @@
+# test_catalog.py
+import types
+
+import mysql.connector
+import pytest
+
+import catalog
+import run_test
+from catalog import get_catalog
+
+
+class FakeCatalogDb:
+    """The four tables Catalog.load reads; `loads` counts reloads."""
+
+    def __init__(self):
+        self.tables = {
+            'application': [{'id': 1, 'name': 'ussd'}, {'id': 2, 'name': 'Airtime'}],
+            'testsuites': [{'SuiteID': 10, 'Name': 'login', 'AppType': 1}, {'SuiteID': 11, 'Name': 'Balance', 'AppType': 1}],
+            'testcases': [{'TestCaseID': 100, 'Code': 'TC2', 'Name': 'PIN', 'Module': 'login'},
+                          {'TestCaseID': 101, 'Code': 'tc1', 'Name': 'Menu', 'Module': 'login'}],
+            'suitetestcases': [{'SuiteID': 10, 'TestCaseID': 100}, {'SuiteID': 10, 'TestCaseID': 101},
+                               {'SuiteID': 11, 'TestCaseID': 999}],  # A dangling link is ignored
+        }
+        self.loads = 0
+        self.down = False
+
+    def connect(self):
+        return None if self.down else FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.closed = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def is_connected(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        table = sql.split(' FROM ')[1].strip()
+        if table == 'application':
+            self.db.loads += 1
+        self.rows = [dict(row) for row in self.db.tables[table]]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeCatalogDb()
+    state = types.SimpleNamespace(version='v1', now=100.0)
+    monkeypatch.setattr(catalog, '_catalog', None)
+    monkeypatch.setattr(catalog, 'read_catalog_version', lambda: state.version)
+    monkeypatch.setattr(catalog, 'time', types.SimpleNamespace(monotonic=lambda: state.now))
+    monkeypatch.setattr(catalog, 'CATALOG_TTL_SECONDS', 600)
+    db.state = state
+    return db
+
+
+def test_the_tree_is_ordered_like_the_old_queries(db):
+    tree = get_catalog(db.connect)
+    assert [a['name'] for a in tree.applications] == ['Airtime', 'ussd']
+    assert [s['Name'] for s in tree.suites_for_application(1)] == ['Balance', 'login']
+    assert [tc['Code'] for tc in tree.test_cases_for_suite(10)] == ['tc1', 'TC2']
+    assert tree.test_cases_for_suite(11) == []
+    assert tree.suite_linked_test_case_ids == {100, 101}
+
+
+def test_the_tree_is_reused_until_the_version_changes(db):
+    first = get_catalog(db.connect)
+    assert get_catalog(db.connect) is first
+    assert db.loads == 1
+
+    db.tables['application'].append({'id': 3, 'name': 'Data'})
+    db.state.version = 'v2'  # Another process committed a catalog change
+    second = get_catalog(db.connect)
+    assert second is not first
+    assert 'Data' in [a['name'] for a in second.applications]
+    assert db.loads == 2
+
+
+def test_the_tree_is_reloaded_after_its_ttl(db):
+    get_catalog(db.connect)
+    db.state.now += 599
+    get_catalog(db.connect)
+    assert db.loads == 1
+    db.state.now += 2
+    get_catalog(db.connect)
+    assert db.loads == 2
+
+
+def test_a_stale_tree_is_served_while_the_database_is_down(db):
+    first = get_catalog(db.connect)
+    db.down = True
+    db.state.version = 'v2'
+    assert get_catalog(db.connect) is first
+    db.down = False
+    assert get_catalog(db.connect) is not first  # Retried on the next request
+
+
+def test_no_connection_and_no_tree_raises(db):
+    db.down = True
+    with pytest.raises(mysql.connector.Error):
+        get_catalog(db.connect)
+
+
+def test_dashboard_helpers_fall_back_to_their_default(db, monkeypatch):
+    db.down = True
+    monkeypatch.setattr(run_test, 'get_db_conn_from_models', db.connect)
+    assert run_test.get_all_applications_for_dashboard() == []
+    assert run_test.get_suite_by_id_for_dashboard(10) is None
+    db.down = False
+    assert run_test.get_suite_by_id_for_dashboard(10)['Name'] == 'login'
@@ -0,0 +1,97 @@
+# test_db_pool.py
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.rolled_back = 0
+        self.closed = False
+        self.fail_rollback = False
+
+    def ping(self, reconnect=False):
+        pass
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise RuntimeError("connection lost")
+        self.rolled_back += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    connections = []
+
+    def connect(**config):
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', connect)
+    return connections
+
+
+def make_pool(size=1, max_overflow=0, timeout=0.05):
+    return ConnectionPool({'host': 'db', 'user': 'test', 'database': 'test'}, size=size,
+                          max_overflow=max_overflow, recycle_seconds=0, timeout=timeout, pre_ping=False)
+
+
+def test_exhausted_pool_raises_after_timeout(opened):
+    pool = make_pool(size=1, max_overflow=1)
+    first = pool.connection()
+    second = pool.connection()
+    with pytest.raises(PoolError):
+        pool.connection()
+    metrics = pool.metrics()
+    assert metrics['timeouts'] == 1
+    assert metrics['in_use'] == 2
+    first.close()
+    second.close()
+
+
+def test_released_connection_is_reused(opened):
+    pool = make_pool(size=1)
+    pool.connection().close()
+    pool.connection().close()
+    assert len(opened) == 1
+    assert pool.metrics()['borrowed'] == 2
+
+
+def test_release_rolls_back_open_transaction(opened):
+    pool = make_pool(size=1)
+    conn = pool.connection()
+    opened[0].in_transaction = True
+    conn.close()
+    assert opened[0].rolled_back == 1
+    assert pool.metrics()['idle'] == 1
+
+
+def test_connection_that_fails_rollback_is_discarded(opened):
+    pool = make_pool(size=1)
+    conn = pool.connection()
+    opened[0].in_transaction = True
+    opened[0].fail_rollback = True
+    conn.close()
+    assert opened[0].closed
+    metrics = pool.metrics()
+    assert metrics['idle'] == 0
+    assert metrics['discarded'] == 1
+    pool.connection().close()
+    assert len(opened) == 2
+
+
+def test_overflow_connection_is_closed_on_release(opened):
+    pool = make_pool(size=1, max_overflow=1)
+    first = pool.connection()
+    second = pool.connection()
+    first.close()
+    second.close()
+    assert sum(conn.closed for conn in opened) == 1
+    assert pool.metrics()['idle'] == 1
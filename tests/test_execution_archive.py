@@ -0,0 +1,72 @@
+# test_execution_archive.py
+import zipfile
+
+import pytest
+
+import execution_archive
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    archive_dir = tmp_path / 'archive'
+    reports_dir = tmp_path / 'reports'
+    reports_dir.mkdir()
+    monkeypatch.setattr(execution_archive, 'ARCHIVE_DIR', str(archive_dir))
+    monkeypatch.setattr(execution_archive, 'REPORTS_DIR', str(reports_dir))
+    return archive_dir, reports_dir
+
+
+def archive(execution_id, step_results):
+    files = execution_archive._screenshot_files(execution_id, step_results)
+    return execution_archive._write_bundle('2025-01', [(execution_id, step_results, files)]), files
+
+
+def test_steps_and_screenshots_round_trip(dirs):
+    archive_dir, reports_dir = dirs
+    screenshot_dir = reports_dir / 'screenshots_exec_11'
+    screenshot_dir.mkdir()
+    (screenshot_dir / 'step_1.png').write_bytes(b'\x89PNG one')
+    (reports_dir / 'elsewhere.png').write_bytes(b'\x89PNG two')
+    steps = [
+        {'StepResultID': 1, 'StepOrder': 1, 'ActualOutput': 'Welcome', 'Screenshot': 'screenshots_exec_11/step_1.png'},
+        {'StepResultID': 2, 'StepOrder': 2, 'ActualOutput': 'Balance', 'Screenshot': 'elsewhere.png'},
+        {'StepResultID': 3, 'StepOrder': 3, 'ActualOutput': 'Bye', 'Screenshot': '../outside.png'},
+    ]
+
+    bundle_path, files = archive(11, steps)
+    assert bundle_path.startswith('2025/executions_2025-01_') and bundle_path.endswith('.zip')
+    assert sorted(files) == ['elsewhere.png', 'screenshots_exec_11/step_1.png']
+    assert list(archive_dir.rglob('*.tmp')) == []
+
+    assert execution_archive.load_archived_steps(11, bundle_path) == steps
+    assert execution_archive.read_archived_file(11, bundle_path, 'screenshots_exec_11/step_1.png') == b'\x89PNG one'
+    assert execution_archive.read_archived_file(11, bundle_path, 'elsewhere.png') == b'\x89PNG two'
+    assert execution_archive.read_archived_file(11, bundle_path, 'missing.png') is None
+    assert execution_archive.read_archived_file(11, bundle_path, execution_archive.STEPS_MEMBER) is None
+
+
+def test_executions_of_a_month_share_a_bundle(dirs):
+    bundle_path = execution_archive._write_bundle('2025-01', [(1, [{'StepOrder': 1}], {}), (2, [], {})])
+    assert execution_archive.load_archived_steps(1, bundle_path) == [{'StepOrder': 1}]
+    assert execution_archive.load_archived_steps(2, bundle_path) == []
+    with pytest.raises(OSError):
+        execution_archive.load_archived_steps(3, bundle_path)
+
+
+def test_unreadable_bundles_raise_oserror(dirs):
+    archive_dir, _ = dirs
+    with pytest.raises(OSError):
+        execution_archive.load_archived_steps(1, '2025/missing.zip')
+    (archive_dir / '2025').mkdir(parents=True)
+    (archive_dir / '2025' / 'corrupt.zip').write_bytes(b'not a zip')
+    with pytest.raises(OSError):
+        execution_archive.load_archived_steps(1, '2025/corrupt.zip')
+    assert execution_archive.read_archived_file(1, '2025/corrupt.zip', 'step_1.png') is None
+
+
+def test_bundle_paths_outside_the_archive_are_refused(dirs, tmp_path):
+    with zipfile.ZipFile(tmp_path / 'outside.zip', 'w') as bundle:
+        bundle.writestr(f'1/{execution_archive.STEPS_MEMBER}', '[]')
+    with pytest.raises(OSError):
+        execution_archive.load_archived_steps(1, '../outside.zip')
+    assert execution_archive.read_archived_file(1, '../outside.zip', 'x.png') is None
@@ -0,0 +1,82 @@
+# test_incremental_selection.py
+import json
+from datetime import datetime
+
+import models
+from result_cache import compute_steps_version
+
+
+STEP = {'StepOrder': 1, 'Input': '*123#', 'ExpectedResponse': 'Welcome', 'InputType': 'static', 'ParamName': None}
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = list(results)  # One fetchall() result per execute()
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, results):
+        self.results = results
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.results)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def candidate(test_case_id, code, last_run=None, status=None, modified=datetime(2026, 1, 1), steps_version=None):
+    params = json.dumps({'steps_version': steps_version}) if steps_version else None
+    return {'TestCaseID': test_case_id, 'Code': code, 'Name': code, 'ModifiedAt': modified,
+            'LastExecutionTime': last_run, 'LastOverallStatus': status, 'LastParameters': params}
+
+
+def select(monkeypatch, candidates, steps, **kwargs):
+    monkeypatch.setattr(models, 'get_db_connection', lambda: FakeConn([candidates, steps]))
+    return models.TestCaseModel.get_incremental_test_cases_for_application(1, **kwargs)
+
+
+def test_selection_reasons(monkeypatch):
+    current = compute_steps_version([STEP])
+    candidates = [
+        candidate(1, 'TC1'),
+        candidate(2, 'TC2', datetime(2026, 2, 1), 'FAIL'),
+        candidate(3, 'TC3', datetime(2026, 2, 1), 'PASS', modified=datetime(2026, 3, 1)),
+        candidate(4, 'TC4', datetime(2026, 2, 1), 'PASS', steps_version='0' * 16),
+        candidate(5, 'TC5', datetime(2026, 2, 1), 'PASS', steps_version=current),
+    ]
+    steps = [dict(STEP, TestCaseID=tc_id) for tc_id in (4, 5)]
+    selected = select(monkeypatch, candidates, steps)
+    assert [(row['Code'], row['SelectionReason']) for row in selected] == [
+        ('TC1', 'NEVER_RUN'), ('TC2', 'FAILED'), ('TC3', 'CHANGED'), ('TC4', 'CHANGED')]
+    assert all('LastParameters' not in row for row in selected)
+
+
+def test_fill_with_stable_takes_least_recently_run_first(monkeypatch):
+    candidates = [
+        candidate(1, 'TC1'),
+        candidate(2, 'TC2', datetime(2026, 2, 3), 'PASS'),
+        candidate(3, 'TC3', datetime(2026, 2, 1), 'PASS'),
+        candidate(4, 'TC4', datetime(2026, 2, 2), 'PASS'),
+    ]
+    selected = select(monkeypatch, candidates, [], max_test_cases=3, fill_with_stable=True)
+    assert [row['Code'] for row in selected] == ['TC1', 'TC3', 'TC4']
+    assert [row['SelectionReason'] for row in selected] == ['NEVER_RUN', 'STABLE', 'STABLE']
+
+
+def test_cap_never_drops_required_cases(monkeypatch):
+    candidates = [candidate(1, 'TC1'), candidate(2, 'TC2'), candidate(3, 'TC3', datetime(2026, 2, 1), 'PASS')]
+    selected = select(monkeypatch, candidates, [], max_test_cases=1, fill_with_stable=True)
+    assert [row['Code'] for row in selected] == ['TC1', 'TC2']
@@ -0,0 +1,92 @@
+# test_job_executor.py
+import pytest
+
+import batch_control
+import job_executor
+import shared_markers
+from job_executor import JobExecutor
+from run_registry import RunRegistry
+
+
+@pytest.fixture(autouse=True)
+def file_markers(tmp_path, monkeypatch):
+    monkeypatch.setenv(shared_markers.RUN_STATE_STORE_ENV, 'memory')
+    monkeypatch.setattr(shared_markers, 'MARKER_DIR', str(tmp_path / 'markers'))
+    monkeypatch.setattr(shared_markers, '_cache', {})
+
+
+class FakeStore:
+    """The job listing of a SharedRunStore, backed by the registries of every executor."""
+
+    def __init__(self):
+        self.registries = []
+
+    def find(self, device_id=None, batch_assignment_id=None, user_id=None, kind=None, active_only=False):
+        runs = [run for registry in self.registries
+                for run in registry.find(device_id, batch_assignment_id, user_id, kind, active_only)]
+        return [run.to_dict() for run in sorted(runs, key=lambda run: run.started_at, reverse=True)]
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    store = FakeStore()
+    submitted = []
+
+    def new_executor():
+        executor = JobExecutor(registry=RunRegistry(), logger=None, store=store)
+        executor.log = lambda message: None
+        executor.submit = lambda kind, args, device_id, user_id=None, **kwargs: submitted.append(
+            (executor, kind, args, device_id, kwargs.get('batch_assignment_id')))
+        store.registries.append(executor.registry)
+        return executor
+
+    return new_executor, submitted
+
+
+def finished_batch_run(executor, batch_id, device_id='dev-1'):
+    run = executor.registry.start(device_id, 1, batch_assignment_id=batch_id, kind='batch')
+    run.args = [str(batch_id), '1', device_id, '13', 'secret', '{}']
+    executor.registry.finish(run.run_id, None, exit_code=0)
+    return run
+
+
+def test_the_owner_resumes_a_paused_batch_itself(executors):
+    new_executor, submitted = executors
+    owner = new_executor()
+    run = finished_batch_run(owner, 7)
+    assert not owner.resume_batch(7)  # Not paused
+    batch_control.request_control(7, batch_control.CONTROL_PAUSE)
+    assert owner.resume_batch(7)
+    assert submitted == [(owner, 'batch', run.args, 'dev-1', 7)]
+    assert batch_control.read_control(7) is None
+
+
+def test_another_executor_hands_the_resume_over_to_the_owner(executors):
+    new_executor, submitted = executors
+    owner, other = new_executor(), new_executor()
+    run = finished_batch_run(owner, 7)
+    batch_control.request_control(7, batch_control.CONTROL_PAUSE)
+
+    assert not other.resume_batch(7)  # Without hand_over only the owner can resume
+    assert other.resume_batch(7, hand_over=True)
+    assert submitted == []
+    assert shared_markers.read_marker(job_executor._resume_marker(7)) == run.run_id
+
+    other._take_resume_requests()  # Not its batch: leaves the request alone
+    assert submitted == []
+    owner._take_resume_requests()
+    assert submitted == [(owner, 'batch', run.args, 'dev-1', 7)]
+    assert shared_markers.read_marker(job_executor._resume_marker(7)) is None
+    owner._take_resume_requests()
+    assert len(submitted) == 1
+
+
+def test_no_resume_while_the_device_is_busy(executors):
+    new_executor, submitted = executors
+    owner = new_executor()
+    finished_batch_run(owner, 7)
+    owner.registry.start('dev-1', 2, kind='test')
+    batch_control.request_control(7, batch_control.CONTROL_PAUSE)
+    assert not owner.resume_batch(7)
+    assert submitted == []
+    assert batch_control.read_control(7) == batch_control.CONTROL_PAUSE
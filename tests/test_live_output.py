@@ -0,0 +1,60 @@
+# test_live_output.py
+import gzip
+
+from live_output import LiveOutputBuffer
+
+
+def test_reads_continue_from_the_returned_offset():
+    buffer = LiveOutputBuffer('run-1')
+    buffer.append('line 1\n')
+    text, offset, reset = buffer.read_from(0)
+    assert (text, offset, reset) == ('line 1\n', 7, False)
+    buffer.append('line 2\n')
+    buffer.append('')
+    assert buffer.read_from(offset) == ('line 2\n', 14, False)
+    assert buffer.read_from(14) == ('', 14, False)
+    assert buffer.end_offset == 14
+
+
+def test_offsets_count_utf8_bytes():
+    buffer = LiveOutputBuffer('run-1')
+    buffer.append('Salio é\n')
+    assert buffer.end_offset == len('Salio é\n'.encode('utf-8'))
+    buffer.append('next\n')
+    assert buffer.read_from(buffer.end_offset - 5)[0] == 'next\n'
+
+
+def test_wrap_around_drops_oldest_output_and_resets_late_readers():
+    buffer = LiveOutputBuffer('run-1', max_bytes=10)
+    buffer.append('aaaa\n')
+    buffer.append('bbbb\n')
+    buffer.append('cccc\n')  # Over the limit: the first chunk goes
+    assert buffer.dropped_bytes() == 5
+    assert buffer.get_text() == 'bbbb\ncccc\n'
+    assert buffer.read_from(0) == ('bbbb\ncccc\n', 15, True)
+    assert buffer.read_from(7) == ('bb\ncccc\n', 15, False)  # Mid-chunk offsets still inside the window
+
+
+def test_offsets_of_another_run_reset():
+    buffer = LiveOutputBuffer('run-1')
+    buffer.append('short\n')
+    assert buffer.read_from(500) == ('short\n', 6, True)
+    assert buffer.read_from(None) == ('short\n', 6, True)
+
+
+def test_the_newest_chunk_is_kept_even_if_it_alone_is_too_big():
+    buffer = LiveOutputBuffer('run-1', max_bytes=4)
+    buffer.append('0123456789\n')
+    assert buffer.get_text() == '0123456789\n'
+
+
+def test_close_spills_retained_output(tmp_path):
+    spill_path = tmp_path / 'runs' / 'run-1.log.gz'
+    buffer = LiveOutputBuffer('run-1', max_bytes=10, spill_path=str(spill_path))
+    for line in ('aaaa\n', 'bbbb\n', 'cccc\n'):
+        buffer.append(line)
+    assert buffer.close() == str(spill_path)
+    assert buffer.finished
+    with gzip.open(spill_path, 'rt', encoding='utf-8') as f:
+        assert f.read() == '[... first 5 bytes of output were not retained ...]\nbbbb\ncccc\n'
+    assert LiveOutputBuffer('run-2').close() is None
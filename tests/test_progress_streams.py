@@ -0,0 +1,86 @@
+# test_progress_streams.py
+import types
+
+import pytest
+
+import run_test
+
+
+class FakeExecutor:
+    def __init__(self, owned, ticks_running):
+        self.owned = owned
+        self.ticks_running = ticks_running
+        self.store_reads = 0
+        self.output_reads = 0
+
+    def _job(self):
+        return {'job_id': 'job1', 'running': self.ticks_running > 0}
+
+    def owns_job(self, job_id):
+        return self.owned
+
+    def get(self, job_id):
+        if not self.owned:
+            self.store_reads += 1
+        return self._job()
+
+    def list_jobs(self, **filters):
+        self.store_reads += 1
+        return [self._job()]
+
+    def read_output(self, job_id, offset=None):
+        self.output_reads += 1
+        if not self.owned:
+            self.store_reads += 1
+        return {'text': '', 'offset': 0, 'reset': offset is None, 'output_id': job_id}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    fake_time = types.SimpleNamespace(time=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    monkeypatch.setattr(run_test, 'time', fake_time)
+    return now
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    snapshot = types.SimpleNamespace(Status='IN_PROGRESS', TotalTestCases=2, CompletedTestCases=0, PassedTestCases=0)
+    monkeypatch.setattr(run_test.BatchTestAssignment, 'get_with_assignments', staticmethod(lambda batch_id: (snapshot, [])))
+    monkeypatch.setattr(run_test, 'read_progress_version', lambda batch_id, cached=False: 'v1')
+    monkeypatch.setattr(run_test, 'read_control', lambda batch_id, cached=False: None)
+
+
+def test_remote_batch_job_is_read_from_the_store_every_few_seconds(monkeypatch, clock, batch):
+    executor = FakeExecutor(owned=False, ticks_running=10 ** 6)
+    monkeypatch.setattr(run_test, 'executor', executor)
+    events = run_test.batch_progress_events(9)
+    next(events)  # Initial output reset
+    next(events)  # Initial progress snapshot
+    started = clock[0]
+    reads_before = executor.store_reads
+    next(events)  # The next event is a keepalive, SSE_KEEPALIVE_SECONDS later
+    elapsed = clock[0] - started
+    reads = executor.store_reads - reads_before
+    assert reads <= 2 * (elapsed / run_test.SSE_STORE_POLL_SECONDS + 1)
+    assert elapsed / run_test.SSE_POLL_SECONDS > 2 * reads  # Far fewer store reads than ticks
+
+
+def test_local_batch_job_is_read_from_memory_every_tick(monkeypatch, clock, batch):
+    executor = FakeExecutor(owned=True, ticks_running=10 ** 6)
+    monkeypatch.setattr(run_test, 'executor', executor)
+    events = run_test.batch_progress_events(9)
+    next(events)
+    next(events)
+    started, output_reads = clock[0], executor.output_reads
+    next(events)
+    ticks = (clock[0] - started) / run_test.SSE_POLL_SECONDS
+    assert executor.output_reads - output_reads >= ticks
+    assert executor.store_reads == 1  # Only the initial lookup of the batch's job
+
+
+def test_stream_ends_when_the_batch_job_stops(monkeypatch, clock, batch):
+    executor = FakeExecutor(owned=False, ticks_running=0)
+    monkeypatch.setattr(run_test, 'executor', executor)
+    events = list(run_test.batch_progress_events(9))
+    assert events[-1].startswith('event: done')
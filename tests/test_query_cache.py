@@ -0,0 +1,91 @@
+# test_query_cache.py
+import pytest
+
+import query_cache
+import shared_markers
+from query_cache import QueryCache
+
+
+@pytest.fixture
+def data_version_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(shared_markers.RUN_STATE_STORE_ENV, 'memory')
+    monkeypatch.setattr(shared_markers, 'MARKER_DIR', str(tmp_path / 'markers'))
+    monkeypatch.setattr(shared_markers, '_cache', {})
+    return tmp_path / 'markers' / query_cache.DATA_VERSION_MARKER
+
+
+def counting_loader(results):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return results[len(calls) - 1]
+
+    return loader, calls
+
+
+def test_query_cache_serves_hits_until_data_version_bump(data_version_file):
+    cache = QueryCache(max_entries=10, ttl_seconds=60)
+    loader, calls = counting_loader([{'total': 1}, {'total': 2}])
+    assert cache.get_or_load('q', loader) == {'total': 1}
+    assert cache.get_or_load('q', loader) == {'total': 1}
+    assert len(calls) == 1
+
+    query_cache.bump_data_version()
+    assert data_version_file.exists()
+    assert cache.get_or_load('q', loader) == {'total': 2}
+    assert len(calls) == 2
+
+
+def test_query_cache_bump_changes_version_every_time(data_version_file):
+    query_cache.bump_data_version()
+    first = query_cache.read_data_version()
+    query_cache.bump_data_version()
+    assert first and query_cache.read_data_version() != first
+
+
+def test_query_cache_expires_entries(data_version_file, monkeypatch):
+    cache = QueryCache(max_entries=10, ttl_seconds=60)
+    loader, calls = counting_loader([['old'], ['new']])
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    cache.get_or_load('q', loader)
+    now[0] += 61
+    assert cache.get_or_load('q', loader) == ['new']
+    assert cache.metrics()['expired'] == 1
+
+
+def test_query_cache_returns_copies(data_version_file):
+    cache = QueryCache(max_entries=10, ttl_seconds=60)
+    cache.get_or_load('q', lambda: [{'total': 1}])[0]['total'] = 99
+    assert cache.get_or_load('q', lambda: None) == [{'total': 1}]
+
+
+def test_query_cache_does_not_cache_loader_errors(data_version_file):
+    cache = QueryCache(max_entries=10, ttl_seconds=60)
+
+    def failing():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('q', failing)
+    assert cache.get_or_load('q', lambda: 'loaded') == 'loaded'
+
+
+def test_query_cache_evicts_least_recently_used(data_version_file):
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    cache.get_or_load('a', lambda: 'a')
+    cache.get_or_load('b', lambda: 'b')
+    cache.get_or_load('a', lambda: 'stale')
+    cache.get_or_load('c', lambda: 'c')
+    assert cache.get_or_load('a', lambda: 'reloaded') == 'a'
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
+    assert cache.metrics()['evictions'] >= 1
+
+
+def test_query_cache_disabled_with_zero_ttl(data_version_file):
+    cache = QueryCache(max_entries=10, ttl_seconds=0)
+    loader, calls = counting_loader(['x', 'y'])
+    cache.get_or_load('q', loader)
+    cache.get_or_load('q', loader)
+    assert len(calls) == 2
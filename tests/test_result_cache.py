@@ -0,0 +1,85 @@
+# test_result_cache.py
+import mysql.connector
+import pytest
+
+import result_cache
+
+
+STEPS = [
+    {'StepOrder': 1, 'Input': '*123#', 'ExpectedResponse': 'Welcome', 'InputType': 'static', 'ParamName': None},
+    {'StepOrder': 2, 'Input': '', 'ExpectedResponse': 'PIN', 'InputType': 'dynamic', 'ParamName': 'pin'},
+]
+
+
+def test_steps_version_changes_when_a_step_is_edited():
+    edited = [dict(STEPS[0], ExpectedResponse='Hello'), STEPS[1]]
+    assert result_cache.compute_steps_version(STEPS) == result_cache.compute_steps_version(list(reversed(STEPS)))
+    assert result_cache.compute_steps_version(STEPS) != result_cache.compute_steps_version(edited)
+
+
+def test_cache_key_only_depends_on_consumed_params():
+    version = result_cache.compute_steps_version(STEPS)
+    params = result_cache.resolve_step_params(STEPS, {'pin': '1234', 'unused': 'x'})
+    assert params == {'pin': '1234'}
+    key = result_cache.build_cache_key(7, version, params, 'build-1', 'android-13')
+    assert key == result_cache.build_cache_key(
+        7, version, result_cache.resolve_step_params(STEPS, {'pin': '1234'}), 'build-1', 'android-13')
+    assert key != result_cache.build_cache_key(
+        7, version, result_cache.resolve_step_params(STEPS, {'pin': '9999'}), 'build-1', 'android-13')
+    assert key != result_cache.build_cache_key(7, version, params, 'build-2', 'android-13')
+    assert key != result_cache.build_cache_key(
+        7, result_cache.compute_steps_version(STEPS[:1]), params, 'build-1', 'android-13')
+
+
+def test_is_cached_link():
+    assert result_cache.is_cached_link('{"cache_key": "k", "assignment_id": 1}', 2)
+    assert not result_cache.is_cached_link({'cache_key': 'k', 'assignment_id': 2}, 2)
+    assert not result_cache.is_cached_link({'assignment_id': 1}, 2)
+    assert not result_cache.is_cached_link('not json', 2)
+
+
+class FakeCursor:
+    def __init__(self, row=None, error=None):
+        self.row = row
+        self.error = error
+        self.sql = None
+        self.params = None
+
+    def execute(self, sql, params):
+        if self.error:
+            raise self.error
+        self.sql = sql
+        self.params = params
+
+    def fetchone(self):
+        return self.row
+
+
+def test_find_cached_pass_execution_looks_up_the_key_within_ttl():
+    cursor = FakeCursor({'ExecutionID': 1, 'ExecutionTime': 't1'})
+    assert result_cache.find_cached_pass_execution(cursor, 7, 'k', 30) == {'ExecutionID': 1, 'ExecutionTime': 't1'}
+    assert 'rc.CacheKey = %s' in cursor.sql
+    cache_key, not_before, test_case_id = cursor.params
+    assert (cache_key, test_case_id) == ('k', 7)
+    assert result_cache.datetime.now() - not_before >= result_cache.timedelta(minutes=30)
+    assert result_cache.find_cached_pass_execution(FakeCursor(), 7, 'k', 30) is None
+
+
+def test_find_cached_pass_execution_disabled_without_ttl():
+    cursor = FakeCursor({'ExecutionID': 1, 'ExecutionTime': 't1'})
+    assert result_cache.find_cached_pass_execution(cursor, 7, 'k', 0) is None
+    assert cursor.params is None
+
+
+def test_missing_cache_table_means_no_cached_results():
+    missing = mysql.connector.Error(msg="Table doesn't exist", errno=1146)
+    assert result_cache.find_cached_pass_execution(FakeCursor(error=missing), 7, 'k', 30) is None
+    assert result_cache.record_pass_execution(FakeCursor(error=missing), 1, 'k', 't1') is False
+    with pytest.raises(mysql.connector.Error):
+        result_cache.find_cached_pass_execution(FakeCursor(error=mysql.connector.Error(msg="gone", errno=2013)), 7, 'k', 30)
+
+
+def test_record_pass_execution():
+    cursor = FakeCursor()
+    assert result_cache.record_pass_execution(cursor, 1, 'k', 't1') is True
+    assert cursor.params == (1, 'k', 't1')
@@ -0,0 +1,127 @@
+# test_rollups.py
+import mysql.connector
+import pytest
+
+import rollups
+from rollups import (count_assignments, count_executions, set_assignment_status, rollups_built,
+                     rollup_sources, rebuild_rollups, LIVE_ASSIGNMENTS, LIVE_EXECUTIONS_DAILY)
+
+
+class FakeConn:
+    """Records the statements rollups.py runs; `results` are handed to fetchone in order."""
+
+    def __init__(self, results=(), error=None, rowcount=1):
+        self.statements = []
+        self.results = list(results)
+        self.error = error
+        self.rowcount = rowcount
+        self.events = []
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.events.append('begin')
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        self.conn.statements.append((sql, params))
+        if self.conn.error and sql.startswith('SELECT BuiltAt'):
+            raise self.conn.error
+        self.rowcount = self.conn.rowcount if sql.startswith('UPDATE') else 0
+
+    def fetchone(self):
+        return self.conn.results.pop(0)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(rollups, '_built', False)
+    monkeypatch.setattr(rollups, '_tables_ready', True)
+
+
+def test_counts_pass_the_sign_ahead_of_the_where_params():
+    conn = FakeConn()
+    cursor = conn.cursor()
+    count_executions(cursor, "te.TestCaseID = %s", (7,), sign=-1)
+    count_assignments(cursor, "ta.AssignmentID = %s", (3,))
+    (executions_sql, executions_params), (assignments_sql, assignments_params) = conn.statements
+    assert executions_sql.startswith('INSERT INTO rollup_executions_daily')
+    assert 'WHERE te.TestCaseID = %s' in executions_sql
+    assert executions_params == (-1, 7)
+    assert assignments_sql.startswith('INSERT INTO rollup_assignments')
+    assert assignments_params == (1, 3)
+
+
+def test_a_status_change_moves_the_row_between_rollup_buckets():
+    conn = FakeConn(rowcount=1)
+    updated = set_assignment_status(conn.cursor(), 3, 'PASSED', execution_id=40,
+                                    extra_where=" AND ta.Status = %s", extra_params=('IN_PROGRESS',))
+    assert updated == 1
+    (remove_sql, remove_params), (update_sql, update_params), (add_sql, add_params) = conn.statements
+    assert remove_sql.startswith('INSERT INTO rollup_assignments') and remove_params == (-1, 3, 'IN_PROGRESS')
+    assert update_sql.startswith('UPDATE test_assignments ta SET ta.Status = %s, ta.ExecutionID = %s')
+    assert update_params == ('PASSED', 40, 3, 'IN_PROGRESS')
+    assert add_sql.startswith('INSERT INTO rollup_assignments') and add_params == (1, 3, 'IN_PROGRESS')
+
+
+def test_a_status_change_that_matched_nothing_reports_zero():
+    conn = FakeConn(rowcount=0)
+    assert set_assignment_status(conn.cursor(), 3, 'PASSED') == 0
+    assert conn.statements[1][1] == ('PASSED', 3)
+
+
+def test_built_is_remembered_once_true():
+    conn = FakeConn(results=[None, ('2026-01-01',)])
+    assert not rollups_built(conn)
+    assert rollups_built(conn)
+    assert rollups_built(conn)
+    assert len(conn.statements) == 2
+
+
+def test_a_missing_meta_table_counts_as_not_built():
+    conn = FakeConn(error=mysql.connector.Error(msg="Table doesn't exist", errno=1146))
+    assert not rollups_built(conn)
+    assert rollup_sources(conn) == (LIVE_EXECUTIONS_DAILY, LIVE_ASSIGNMENTS)
+
+
+def test_other_errors_are_not_swallowed():
+    conn = FakeConn(error=mysql.connector.Error(msg="Lost connection", errno=2013))
+    with pytest.raises(mysql.connector.Error):
+        rollups_built(conn)
+
+
+def test_dashboards_read_the_rollup_tables_once_built():
+    assert rollup_sources(FakeConn(results=[('2026-01-01',)])) == ('rollup_executions_daily r', 'rollup_assignments r')
+
+
+def test_rebuild_gives_up_when_another_holds_the_lock():
+    conn = FakeConn(results=[(0,)])
+    assert rebuild_rollups(conn) is False
+    assert conn.events == []
+    assert not rollups._built
+
+
+def test_rebuild_recomputes_everything_in_one_transaction():
+    conn = FakeConn(results=[(1,), (1,)])
+    assert rebuild_rollups(conn) is True
+    assert conn.events == ['begin', 'commit']
+    statements = [sql for sql, params in conn.statements]
+    assert statements.index('DELETE FROM rollup_executions_daily') < statements.index('DELETE FROM rollup_assignments')
+    assert statements[-1] == 'SELECT RELEASE_LOCK(%s)'
+    assert rollups._built
@@ -0,0 +1,53 @@
+# test_run_registry.py
+import pytest
+
+from run_registry import RunRegistry, DeviceBusyError, RUN_CANCELLED
+
+
+def test_a_device_runs_one_job_at_a_time():
+    registry = RunRegistry()
+    first = registry.start('dev-1', user_id=1)
+    with pytest.raises(DeviceBusyError) as busy:
+        registry.start('dev-1', user_id=2)
+    assert busy.value.run_id == first.run_id
+    other_device = registry.start('dev-2', user_id=2)  # Other devices are unaffected
+    assert registry.active_run_for_device('dev-2') is other_device
+
+    registry.finish(first.run_id, 'report.html', exit_code=0)
+    assert first.done.is_set() and not first.running
+    assert registry.active_run_for_device('dev-1') is None
+    assert registry.start('dev-1', user_id=2).running
+
+
+def test_a_queued_job_takes_the_device_over():
+    registry = RunRegistry()
+    running = registry.start('dev-1', user_id=1, kind='batch', batch_assignment_id=5)
+    queued = registry.start('dev-1', user_id=1, kind='batch', batch_assignment_id=6, allow_busy=True)
+    assert registry.active_run_for_device('dev-1') is queued
+    registry.finish(running.run_id, None, state=RUN_CANCELLED)
+    assert registry.active_run_for_device('dev-1') is queued
+    assert [run.batch_assignment_id for run in registry.find(device_id='dev-1', active_only=True)] == [6]
+
+
+def test_post_run_bookkeeping_is_claimed_once_after_the_run():
+    registry = RunRegistry()
+    run = registry.start('dev-1', user_id=1)
+    assert not registry.claim_post_run(run.run_id)  # Still running
+    registry.finish(run.run_id, None)
+    assert registry.claim_post_run(run.run_id)
+    assert not registry.claim_post_run(run.run_id)
+    assert not registry.claim_post_run('unknown')
+
+
+def test_prune_keeps_the_newest_finished_runs():
+    registry = RunRegistry(max_finished_runs=1)
+    older = registry.start('dev-1', user_id=1)
+    registry.finish(older.run_id, None)
+    newer = registry.start('dev-1', user_id=1)
+    registry.finish(newer.run_id, None)
+    active = registry.start('dev-2', user_id=2)
+    registry.prune()
+    assert registry.get(older.run_id) is None
+    assert registry.get(newer.run_id) is newer
+    assert registry.get(active.run_id) is active
+    assert registry.latest_for_user(2) is active
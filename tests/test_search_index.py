@@ -0,0 +1,32 @@
+# test_search_index.py
+from datetime import datetime
+
+import pytest
+
+from search_index import boolean_query, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip_keeps_microseconds():
+    sort_time = datetime(2025, 3, 9, 14, 5, 7, 123456)
+    assert decode_cursor(encode_cursor(sort_time, 42)) == (sort_time, 42)
+
+
+def test_cursors_sort_like_their_keys():
+    earlier = encode_cursor(datetime(2025, 1, 1, 0, 0, 0), 9)
+    later = encode_cursor(datetime(2025, 1, 1, 0, 0, 1), 1)
+    assert earlier.split('-')[0] < later.split('-')[0]
+
+
+@pytest.mark.parametrize('cursor_text', [
+    None, '', 'abc', '20250309140507123456', '20250309140507123456-', '2025030914050712345-1',
+    '20251309140507123456-1', '20250309140507123456-1; DROP TABLE testcases',
+])
+def test_malformed_cursor_means_first_page(cursor_text):
+    assert decode_cursor(cursor_text) is None
+
+
+def test_boolean_query():
+    assert boolean_query('balance check') == '+balance* +check*'
+    assert boolean_query('pin-reset, ok') == '+pin* +reset*'
+    assert boolean_query('a ok') is None
+    assert boolean_query(None) is None
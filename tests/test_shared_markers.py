@@ -0,0 +1,125 @@
+# test_shared_markers.py
+import pytest
+
+import batch_control
+import progress_version
+import shared_markers
+
+
+@pytest.fixture(autouse=True)
+def file_markers(tmp_path, monkeypatch):
+    monkeypatch.setenv(shared_markers.RUN_STATE_STORE_ENV, 'memory')
+    monkeypatch.setattr(shared_markers, 'MARKER_DIR', str(tmp_path / 'markers'))
+    monkeypatch.setattr(shared_markers, '_cache', {})
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith('CREATE'):
+            return
+        if sql.lstrip().startswith('INSERT'):
+            self.table[params[0]] = params[1]
+        elif sql.lstrip().startswith('DELETE'):
+            self.rowcount = int(self.table.pop(params[0], None) is not None)
+        elif 'IN (' in sql:
+            self._rows = [(name, self.table[name]) for name in params if name in self.table]
+        else:
+            self._rows = [(self.table[params[0]],)] if params[0] in self.table else []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def mysql_markers(monkeypatch):
+    table = {}
+    monkeypatch.setenv(shared_markers.RUN_STATE_STORE_ENV, 'mysql')
+    monkeypatch.setattr(shared_markers, '_connect', lambda: FakeConnection(table))
+    return table
+
+
+def test_file_markers_round_trip():
+    assert shared_markers.read_marker('batch_control:1') is None
+    shared_markers.set_marker('batch_control:1', 'PAUSE')
+    assert shared_markers.read_marker('batch_control:1') == 'PAUSE'
+    assert shared_markers.read_markers(['batch_control:1', 'batch_control:2']) == {'batch_control:1': 'PAUSE'}
+    assert shared_markers.clear_marker('batch_control:1') is True
+    assert shared_markers.clear_marker('batch_control:1') is False
+    assert shared_markers.read_marker('batch_control:1') is None
+
+
+def test_mysql_markers_are_seen_by_every_process(mysql_markers):
+    shared_markers.set_marker('batch_control:1', 'CANCEL')
+    assert mysql_markers == {'batch_control:1': 'CANCEL'}
+    mysql_markers['data_version'] = 'set-by-another-host'
+    assert shared_markers.read_marker('data_version') == 'set-by-another-host'
+    assert shared_markers.read_markers(['data_version', 'other']) == {'data_version': 'set-by-another-host'}
+    assert shared_markers.clear_marker('batch_control:1') is True
+    assert shared_markers.clear_marker('batch_control:1') is False
+
+
+def test_cached_reads_go_stale_for_at_most_the_cache_period(mysql_markers, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(shared_markers.time, 'monotonic', lambda: now[0])
+    mysql_markers['data_version'] = 'v1'
+    assert shared_markers.read_marker('data_version', cached=True) == 'v1'
+    mysql_markers['data_version'] = 'v2'
+    assert shared_markers.read_marker('data_version', cached=True) == 'v1'
+    assert shared_markers.read_marker('data_version') == 'v2'
+    mysql_markers['data_version'] = 'v3'
+    now[0] += shared_markers.MARKER_CACHE_SECONDS
+    assert shared_markers.read_marker('data_version', cached=True) == 'v3'
+
+
+def test_unreachable_store_reads_as_unset(monkeypatch):
+    def unreachable():
+        raise shared_markers.mysql.connector.Error(msg="down")
+
+    monkeypatch.setenv(shared_markers.RUN_STATE_STORE_ENV, 'mysql')
+    monkeypatch.setattr(shared_markers, '_connect', unreachable)
+    assert shared_markers.read_marker('batch_control:1') is None
+    assert shared_markers.read_markers(['batch_control:1']) == {}
+    assert shared_markers.bump_marker('data_version') is False
+    with pytest.raises(shared_markers.mysql.connector.Error):
+        shared_markers.set_marker('batch_control:1', 'PAUSE')
+
+
+def test_batch_control_requests():
+    batch_control.request_control(7, batch_control.CONTROL_PAUSE)
+    assert batch_control.read_control(7) == batch_control.CONTROL_PAUSE
+    assert batch_control.read_control(8) is None
+    batch_control.clear_control(7)
+    assert batch_control.read_control(7) is None
+    with pytest.raises(ValueError):
+        batch_control.request_control(7, 'STOP')
+
+
+def test_progress_version_changes_on_every_bump():
+    assert progress_version.read_progress_version(3) is None
+    progress_version.bump_progress_version(3)
+    first = progress_version.read_progress_version(3)
+    progress_version.bump_progress_version(3)
+    assert first and progress_version.read_progress_version(3) != first
+    progress_version.bump_progress_version(None)  # Not a batch: ignored
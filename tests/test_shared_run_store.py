@@ -0,0 +1,179 @@
+# test_shared_run_store.py
+from datetime import datetime, timedelta
+
+import mysql.connector
+import pytest
+
+import shared_run_store
+from run_registry import DeviceBusyError, RUN_QUEUED, RUN_RUNNING, RUN_FINISHED
+from shared_run_store import SharedRunStore, ORPHAN_AFTER_SECONDS
+
+
+class FakeJobsDb:
+    """The runner_jobs statements of SharedRunStore against a dict, with a clock the test moves."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.now = datetime(2026, 1, 1, 12, 0, 0)
+        self.lock_free = True
+        self.down = False
+
+    def connection(self):
+        if self.down:
+            raise mysql.connector.Error(msg="Can't connect", errno=2003)
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        db, jobs = self.db, self.db.jobs
+        sql = ' '.join(sql.split())
+        self.rows, self.rowcount = [], 0
+        if sql.startswith('CREATE'):
+            return
+        if sql.startswith('SELECT GET_LOCK'):
+            self.rows = [{'got': 1 if db.lock_free else 0}]
+        elif sql.startswith('SELECT RELEASE_LOCK'):
+            self.rows = [{'released': 1}]
+        elif 'Execution abandoned' in sql:
+            state, device_id, seconds = params[0], params[1], params[-1]
+            for job in jobs.values():
+                if (job['DeviceID'] == device_id and job['State'] in (RUN_QUEUED, RUN_RUNNING)
+                        and job['HeartbeatAt'] < db.now - timedelta(seconds=seconds)):
+                    job.update(State=state, FinishedAt=db.now, ReportPath='Execution abandoned')
+                    self.rowcount += 1
+        elif sql.startswith('SELECT JobID FROM runner_jobs WHERE DeviceID'):
+            self.rows = [{'JobID': job['JobID']} for job in jobs.values()
+                         if job['DeviceID'] == params[0] and job['State'] in params[1:]][:1]
+        elif sql.startswith('INSERT INTO runner_jobs'):
+            job_id, kind, state, device_id, user_id, assignment_id, batch_id, output_id, owner_id = params
+            jobs[job_id] = {'JobID': job_id, 'Kind': kind, 'State': state, 'DeviceID': device_id, 'UserID': user_id,
+                            'AssignmentID': assignment_id, 'BatchAssignmentID': batch_id, 'OutputID': output_id,
+                            'OwnerID': owner_id, 'ReportPath': None, 'ExitCode': None, 'CancelRequested': 0,
+                            'PostRunClaimed': 0, 'StartedAt': db.now, 'FinishedAt': None, 'HeartbeatAt': db.now}
+        elif sql.startswith('UPDATE runner_jobs SET State = %s, HeartbeatAt'):
+            jobs[params[1]].update(State=params[0], HeartbeatAt=db.now)
+        elif sql.startswith('UPDATE runner_jobs SET HeartbeatAt'):
+            for job_id in params:
+                jobs[job_id]['HeartbeatAt'] = db.now
+        elif sql.startswith('SELECT JobID FROM runner_jobs WHERE JobID IN'):
+            self.rows = [{'JobID': job_id} for job_id in params if jobs[job_id]['CancelRequested']]
+        elif sql.startswith('UPDATE runner_jobs SET CancelRequested'):
+            job = jobs.get(params[0])
+            if job and job['State'] in params[1:]:
+                job['CancelRequested'] = 1
+                self.rowcount = 1
+        elif sql.startswith('UPDATE runner_jobs SET PostRunClaimed'):
+            job = jobs.get(params[0])
+            if job and not job['PostRunClaimed'] and job['State'] not in params[1:]:
+                job['PostRunClaimed'] = 1
+                self.rowcount = 1
+        elif sql.startswith('UPDATE runner_jobs SET State = %s, ReportPath'):
+            jobs[params[3]].update(State=params[0], ReportPath=params[1], ExitCode=params[2], FinishedAt=db.now)
+        elif sql.startswith('SELECT JobID, Kind'):
+            self.rows = [dict(jobs[params[0]])] if params[0] in jobs else []
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeJobsDb()
+    monkeypatch.setattr(shared_run_store, 'get_pool', lambda config: db)
+    return db
+
+
+def new_store(owner_id):
+    store = SharedRunStore({})
+    store.owner_id = owner_id
+    return store
+
+
+def test_device_claims_hold_across_processes(db):
+    first, second = new_store('web-1:100'), new_store('web-2:200')
+    assert first.start('job1', 'test', 'dev-1', user_id=1)
+    with pytest.raises(DeviceBusyError) as busy:
+        second.start('job2', 'test', 'dev-1', user_id=2)
+    assert busy.value.run_id == 'job1'
+    assert second.start('job3', 'test', 'dev-2', user_id=2)
+    assert second.start('job4', 'batch', 'dev-1', user_id=2, allow_busy=True)  # Queued behind job1
+
+    first.finish('job1', 'report.html', 0, RUN_FINISHED)
+    assert second.get('job1')['running'] is False
+    assert second.get('job1')['report_path'] == 'report.html'
+
+
+def test_a_held_device_lock_refuses_the_claim(db):
+    db.lock_free = False
+    with pytest.raises(DeviceBusyError):
+        new_store('web-1:100').start('job1', 'test', 'dev-1')
+
+
+def test_store_outage_falls_back_to_the_local_claim(db):
+    db.down = True
+    assert new_store('web-1:100').start('job1', 'test', 'dev-1') is False
+
+
+def test_jobs_without_heartbeat_are_expired_as_orphans(db):
+    crashed, alive, other = new_store('web-1:100'), new_store('web-2:200'), new_store('web-3:300')
+    crashed.start('job1', 'test', 'dev-1')
+    crashed.set_running('job1')
+    alive.start('job2', 'test', 'dev-2')
+    alive.set_running('job2')
+
+    db.now += timedelta(seconds=ORPHAN_AFTER_SECONDS - 10)
+    assert alive.heartbeat(['job2']) == set()
+    db.now += timedelta(seconds=20)  # job1's owner has been silent for too long, job2's has not
+
+    assert other.start('job3', 'test', 'dev-1')
+    assert db.jobs['job1']['State'] == RUN_FINISHED
+    assert db.jobs['job1']['ReportPath'] == 'Execution abandoned'
+    with pytest.raises(DeviceBusyError):
+        other.start('job4', 'test', 'dev-2')
+
+
+def test_cancel_requests_reach_the_owner_on_its_heartbeat(db):
+    owner, other = new_store('web-1:100'), new_store('web-2:200')
+    owner.start('job1', 'test', 'dev-1')
+    owner.start('job2', 'test', 'dev-2')
+    assert other.request_cancel('job1')
+    assert not other.request_cancel('unknown')
+    assert owner.heartbeat(['job1', 'job2']) == {'job1'}
+    assert owner.heartbeat([]) == set()
+
+
+def test_post_run_is_claimed_once_by_any_worker(db):
+    first, second = new_store('web-1:100'), new_store('web-2:200')
+    first.start('job1', 'batch', 'dev-1', batch_assignment_id=5)
+    assert not second.claim_post_run('job1')  # Still queued
+    first.finish('job1', None, 0, RUN_FINISHED)
+    assert second.claim_post_run('job1')
+    assert not first.claim_post_run('job1')
@@ -0,0 +1,177 @@
+# test_testcase_import.py
+import csv
+
+import pytest
+
+import testcase_import
+from catalog import Catalog
+
+HEADER = 'Code,Name,Module,StepOrder,InputType,Input,ParamName,ParamType,ExpectedKeywords\n'
+
+
+@pytest.fixture(autouse=True)
+def catalog(monkeypatch):
+    catalog = Catalog(applications=[{'id': 1, 'name': 'USSD'}],
+                      suites=[{'SuiteID': 5, 'Name': 'Balance', 'AppType': 1}],
+                      test_cases=[{'TestCaseID': 1, 'Code': 'TC-EXISTING', 'Name': 'Existing', 'Module': 'Balance'}],
+                      memberships=[{'SuiteID': 5, 'TestCaseID': 1}])
+    monkeypatch.setattr(testcase_import, 'get_catalog', lambda connect: catalog)
+    return catalog
+
+
+def write_csv(tmp_path, body, name='cases.csv'):
+    path = tmp_path / name
+    path.write_text(HEADER + body, encoding='utf-8')
+    return str(path)
+
+
+def run_import(path, **kwargs):
+    kwargs.setdefault('dry_run', True)
+    return testcase_import.TestCaseImporter(connect=lambda: None, created_by_user_id=1, **kwargs).run(path)
+
+
+def test_valid_rows_are_grouped_by_code(tmp_path):
+    path = write_csv(tmp_path,
+                     'TC-1,Check balance,Balance,1,static,*123#,,,Welcome\n'
+                     'TC-1,,,2,dynamic,,pin,password,Balance\n'
+                     '\n'
+                     'TC-2,Mini statement,balance,,static,*124#,,,Statement\n')
+    summary = run_import(path)
+    assert summary['status'] == 'completed'
+    assert summary['rows_read'] == 3
+    assert summary['imported'] == 2
+    assert summary['skipped'] == 0
+    assert summary['errors'] == []
+
+
+def test_invalid_test_cases_are_skipped_with_their_line(tmp_path):
+    path = write_csv(tmp_path,
+                     'TC-EXISTING,Duplicate,Balance,1,static,*1#,,,OK\n'
+                     'TC-3,Unknown suite,Airtime,1,static,*1#,,,OK\n'
+                     'TC-4,Bad steps,Balance,1,dynamic,,,text,OK\n'
+                     'TC-4,,,1,static,,,,\n'
+                     'TC-5,Good,Balance,1,static,*1#,,,OK\n'
+                     'TC-3,Repeated,Balance,1,static,*1#,,,OK\n')
+    summary = run_import(path)
+    assert summary['status'] == 'completed'
+    assert summary['imported'] == 1
+    assert summary['skipped'] == 4
+    errors = {(error['line'], error['code']): error['message'] for error in summary['errors']}
+    assert 'already exists' in errors[(2, 'TC-EXISTING')]
+    assert "Unknown module 'Airtime'" in errors[(3, 'TC-3')]
+    assert 'need a ParamName' in errors[(4, 'TC-4')]
+    assert 'used twice' in errors[(4, 'TC-4')]
+    assert 'static steps need an Input' in errors[(4, 'TC-4')]
+    assert 'ExpectedKeywords is empty' in errors[(4, 'TC-4')]
+    assert 'not consecutive' in errors[(7, 'TC-3')]
+
+
+def test_missing_columns_fail_the_import(tmp_path):
+    path = tmp_path / 'cases.csv'
+    path.write_text('Code,Name\nTC-1,Check balance\n', encoding='utf-8')
+    summary = run_import(str(path))
+    assert summary['status'] == 'failed'
+    assert 'module' in summary['message'] and 'expected_keywords' in summary['message']
+
+
+def test_unsupported_file_type_fails_the_import(tmp_path):
+    path = tmp_path / 'cases.txt'
+    path.write_text(HEADER, encoding='utf-8')
+    summary = run_import(str(path))
+    assert summary['status'] == 'failed'
+    assert 'Unsupported file type' in summary['message']
+
+
+def test_oversized_csv_field_fails_the_import(tmp_path):
+    path = write_csv(tmp_path, 'TC-1,' + 'x' * (csv.field_size_limit() + 1) + ',Balance,1,static,*1#,,,OK\n')
+    summary = run_import(path)
+    assert summary['status'] == 'failed'
+    assert summary['message'].startswith('Import stopped:')
+
+
+def test_corrupt_xlsx_fails_the_import(tmp_path):
+    path = tmp_path / 'cases.xlsx'
+    path.write_bytes(b'not a spreadsheet')
+    summary = run_import(str(path))
+    assert summary['status'] == 'failed'
+
+
+def test_xlsx_rows_are_read(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER.strip().split(','))
+    sheet.append(['TC-1', 'Check balance', 'Balance', 1.0, 'static', '*123#', None, None, 'Welcome'])
+    path = str(tmp_path / 'cases.xlsx')
+    workbook.save(path)
+    summary = run_import(path)
+    assert summary['status'] == 'completed'
+    assert summary['imported'] == 1
+
+
+def test_unavailable_database_fails_the_import(tmp_path):
+    path = write_csv(tmp_path, 'TC-1,Check balance,Balance,1,static,*123#,,,Welcome\n')
+    summary = run_import(path, dry_run=False)
+    assert summary['status'] == 'failed'
+    assert summary['imported'] == 0
+
+
+class FakeCursor:
+    def __init__(self, taken_codes):
+        self.taken_codes = taken_codes
+        self.statements = []
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.statements.append(sql)
+        if 'FOR UPDATE' in sql:
+            self._rows = [(code,) for code in params if code in self.taken_codes]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+        self.closed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_codes_taken_since_the_catalog_was_loaded_are_skipped(tmp_path):
+    cursor = FakeCursor(taken_codes={'TC-1'})
+    conn = FakeConnection(cursor)
+    path = write_csv(tmp_path, 'TC-1,Check balance,Balance,1,static,*123#,,,Welcome\n')
+    summary = testcase_import.TestCaseImporter(connect=lambda: conn, created_by_user_id=1).run(path)
+    assert summary['status'] == 'completed'
+    assert summary['imported'] == 0
+    assert summary['skipped'] == 1
+    assert summary['errors'] == [{'line': 2, 'code': 'TC-1', 'message': 'A test case with this code already exists.'}]
+    assert conn.committed and conn.closed
+    assert not any('INSERT' in sql for sql in cursor.statements)
+
+
+def test_import_status_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(testcase_import, 'IMPORT_STATUS_DIR', str(tmp_path / 'imports'))
+    testcase_import.write_import_status('0123456789abcdef', {'status': 'running', 'imported': 3})
+    assert testcase_import.read_import_status('0123456789abcdef') == {'status': 'running', 'imported': 3}
+    assert testcase_import.read_import_status('fedcba9876543210') is None
+    assert testcase_import.read_import_status('../../etc/passwd') is None
@@ -0,0 +1,129 @@
+# test_user_cache.py
+import types
+
+import pytest
+
+import models
+from models import User
+
+
+class FakeUsersDb:
+    """users rows behind User.get, with a clock the test moves."""
+
+    def __init__(self):
+        self.rows = {5: {'username': 'tess', 'role': 'tester', 'is_active': True}}
+        self.loads = 0
+        self.now = 100.0
+
+    def get(self, user_id):
+        self.loads += 1
+        row = self.rows.get(int(user_id))
+        return User(int(user_id), row['username'], 'hash', row['role'], row['is_active']) if row else None
+
+    def connection(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT UserID FROM users WHERE Username'):
+            return
+        if sql.startswith('UPDATE users SET IsActive'):
+            status, user_id = params
+            self.db.rows[int(user_id)]['is_active'] = status
+        elif sql.startswith('UPDATE users SET Username'):
+            username, role, user_id = params[0], params[1], params[-1]
+            self.db.rows[int(user_id)].update(username=username, role=role)
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+        self.rowcount = 1
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeUsersDb()
+    monkeypatch.setattr(User, 'get', staticmethod(db.get))
+    monkeypatch.setattr(User, '_cache', {})
+    monkeypatch.setattr(models, 'get_db_connection', db.connection)
+    monkeypatch.setattr(models, 'time', types.SimpleNamespace(monotonic=lambda: db.now))
+    monkeypatch.setattr(models, 'USER_CACHE_TTL_SECONDS', 30)
+    return db
+
+
+def test_hits_are_served_from_the_cache_as_copies(db):
+    first = User.get_cached('5')
+    first.role = 'admin'  # A request mutating its user must not leak into the cache
+    second = User.get_cached(5)
+    assert db.loads == 1
+    assert second is not first
+    assert second.role == 'tester'
+
+
+def test_misses_are_not_cached(db):
+    assert User.get_cached(6) is None
+    db.rows[6] = {'username': 'nina', 'role': 'tester', 'is_active': True}
+    assert User.get_cached(6).username == 'nina'
+    assert db.loads == 2
+
+
+def test_entries_expire_after_the_ttl(db):
+    User.get_cached(5)
+    db.now += 29
+    User.get_cached(5)
+    assert db.loads == 1
+    db.now += 2
+    User.get_cached(5)
+    assert db.loads == 2
+
+
+def test_a_zero_ttl_disables_the_cache(db, monkeypatch):
+    monkeypatch.setattr(models, 'USER_CACHE_TTL_SECONDS', 0)
+    User.get_cached(5)
+    User.get_cached(5)
+    assert db.loads == 2
+    assert User._cache == {}
+
+
+def test_invalidate_drops_one_user_or_all(db):
+    db.rows[6] = {'username': 'nina', 'role': 'tester', 'is_active': True}
+    User.get_cached(5)
+    User.get_cached(6)
+    User.invalidate_cache('5')
+    assert set(User._cache) == {6}
+    User.invalidate_cache()
+    assert User._cache == {}
+
+
+def test_deactivation_and_updates_take_effect_on_the_next_request(db):
+    assert User.get_cached(5).is_active
+    assert User.deactivate(5, 1)[0]
+    assert not User.get_cached(5).is_active
+
+    assert User.update(5, 'tessa', 'admin')[0]
+    cached = User.get_cached(5)
+    assert (cached.username, cached.role) == ('tessa', 'admin')
@@ -0,0 +1,105 @@
+# test_ussd_rate_limiter.py
+import mysql.connector
+import pytest
+
+import ussd_rate_limiter
+from ussd_rate_limiter import UssdSessionLimiter, UssdLimiterTimeout, short_code_of
+
+
+class FakeLockServer:
+    """Named locks as MySQL keeps them: held by one connection until released or disconnected."""
+
+    def __init__(self):
+        self.locks = {}  # lock name -> connection
+
+    def connect(self, **config):
+        return FakeLockConn(self)
+
+
+class FakeLockConn:
+    def __init__(self, server):
+        self.server = server
+        self.connected = True
+
+    def cursor(self):
+        return FakeLockCursor(self)
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+        self.server.locks = {name: conn for name, conn in self.server.locks.items() if conn is not self}
+
+
+class FakeLockCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def execute(self, sql, params):
+        locks = self.conn.server.locks
+        name = params[0]
+        if sql.startswith("SELECT GET_LOCK"):
+            self.result = 1 if locks.setdefault(name, self.conn) is self.conn else 0
+        else:
+            self.result = 1 if locks.pop(name, None) is self.conn else 0
+
+    def fetchone(self):
+        return (self.result,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeLockServer()
+    monkeypatch.setattr(ussd_rate_limiter.mysql.connector, 'connect', server.connect)
+    monkeypatch.setattr(ussd_rate_limiter.time, 'sleep', lambda seconds: None)
+    return server
+
+
+def test_short_code_of():
+    assert short_code_of('*123*4*1#') == '*123#'
+    assert short_code_of(' *150# ') == '*150#'
+
+
+def test_slots_are_shared_per_short_code(server):
+    first, second, third = (UssdSessionLimiter({}, max_sessions=2, wait_timeout_seconds=0.01) for _ in range(3))
+    first.acquire('*123*1#')
+    second.acquire('*123*2#')
+    assert first.held_lock_name != second.held_lock_name
+    with pytest.raises(UssdLimiterTimeout):
+        third.acquire('*123#')
+    assert third.acquire('*150#') >= 0  # Another short code has its own slots
+    third.release()
+
+    first.release()
+    assert first.held_lock_name is None
+    third.acquire('*123#')
+    assert server.locks[third.held_lock_name] is third.conn
+
+
+def test_acquire_is_reentrant_until_released(server):
+    limiter = UssdSessionLimiter({}, max_sessions=1, wait_timeout_seconds=0.01)
+    limiter.acquire('*123#')
+    assert limiter.acquire('*123*9#') == 0.0
+    assert list(server.locks) == [limiter.held_lock_name]
+
+
+def test_closed_connection_frees_the_slot(server):
+    crashed = UssdSessionLimiter({}, max_sessions=1, wait_timeout_seconds=0.01)
+    crashed.acquire('*123#')
+    crashed.conn.close()  # What MySQL does for a runner that died
+    UssdSessionLimiter({}, max_sessions=1, wait_timeout_seconds=0.01).acquire('*123#')
+
+
+def test_limiter_outage_does_not_block(monkeypatch):
+    def unreachable(**config):
+        raise mysql.connector.Error(msg="Can't connect", errno=2003)
+    monkeypatch.setattr(ussd_rate_limiter.mysql.connector, 'connect', unreachable)
+    limiter = UssdSessionLimiter({}, max_sessions=1, wait_timeout_seconds=60)
+    assert limiter.acquire('*123#') < 1
+    assert limiter.held_lock_name is None
+    limiter.release()
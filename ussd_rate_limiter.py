@@ -0,0 +1,93 @@
+# ussd_rate_limiter.py
+#
+# Caps concurrent USSD sessions per short code with MySQL named locks, shared by every runner on every host.
+import hashlib
+import os
+import time
+import mysql.connector
+
+MAX_SESSIONS_ENV = 'USSD_MAX_SESSIONS_PER_CODE'  # Concurrent sessions allowed per short code
+WAIT_TIMEOUT_ENV = 'USSD_LIMITER_TIMEOUT_SECONDS'  # Give up waiting for a slot after this long
+DEFAULT_MAX_SESSIONS = 2
+DEFAULT_WAIT_TIMEOUT_SECONDS = 300
+POLL_INTERVAL_SECONDS = 0.5
+
+
+class UssdLimiterTimeout(Exception):
+    pass
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def short_code_of(ussd_input):
+    """'*123*4*1#' -> '*123#'. Sessions are throttled per service code, not per full string."""
+    body = ussd_input.strip().lstrip('*').rstrip('#')
+    return f"*{body.split('*')[0]}#"
+
+
+class UssdSessionLimiter:
+    def __init__(self, db_config, max_sessions=None, wait_timeout_seconds=None):
+        # Own connection: the slot must stay held while the runner commits its own work
+        self.db_config = dict(db_config, autocommit=True)
+        self.max_sessions = max_sessions or max(1, _env_int(MAX_SESSIONS_ENV, DEFAULT_MAX_SESSIONS))
+        self.wait_timeout_seconds = wait_timeout_seconds or _env_int(WAIT_TIMEOUT_ENV, DEFAULT_WAIT_TIMEOUT_SECONDS)
+        self.conn = None
+        self.held_lock_name = None
+
+    def _lock_name(self, short_code, slot):
+        # MySQL lock names are limited to 64 characters
+        digest = hashlib.sha1(short_code.encode('utf-8')).hexdigest()[:16]
+        return f"ussd_limiter:{digest}:{slot}"
+
+    def acquire(self, ussd_input):
+        """
+        Blocks until a session slot for the short code of `ussd_input` is free.
+        Returns the seconds spent waiting. If the limiter database is unreachable the
+        call returns immediately so a limiter outage never blocks test execution.
+        """
+        if self.held_lock_name:
+            return 0.0
+        short_code = short_code_of(ussd_input)
+        wait_started = time.monotonic()
+        try:
+            if not self.conn or not self.conn.is_connected():
+                self.conn = mysql.connector.connect(**self.db_config)
+            cursor = self.conn.cursor()
+            try:
+                while True:
+                    for slot in range(self.max_sessions):
+                        lock_name = self._lock_name(short_code, slot)
+                        cursor.execute("SELECT GET_LOCK(%s, 0)", (lock_name,))
+                        if cursor.fetchone()[0] == 1:
+                            self.held_lock_name = lock_name
+                            return time.monotonic() - wait_started
+                    if time.monotonic() - wait_started >= self.wait_timeout_seconds:
+                        raise UssdLimiterTimeout(
+                            f"No free USSD session slot for {short_code} after {self.wait_timeout_seconds}s "
+                            f"({self.max_sessions} concurrent session(s) allowed).")
+                    time.sleep(POLL_INTERVAL_SECONDS)
+            finally:
+                cursor.close()
+        except mysql.connector.Error as err:
+            print(f"RUNNER_WARN: USSD limiter unavailable, dialing without a slot: {err}", flush=True)
+            return time.monotonic() - wait_started
+
+    def release(self):
+        try:
+            if self.held_lock_name and self.conn and self.conn.is_connected():
+                cursor = self.conn.cursor()
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (self.held_lock_name,))
+                cursor.fetchone()
+                cursor.close()
+        except mysql.connector.Error as err:
+            print(f"RUNNER_WARN: Failed to release USSD limiter slot {self.held_lock_name}: {err}", flush=True)
+        finally:
+            self.held_lock_name = None
+            if self.conn and self.conn.is_connected():
+                self.conn.close()
+            self.conn = None